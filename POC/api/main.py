@@ -1,32 +1,117 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 from fastapi import APIRouter, FastAPI
+from starlette.types import ASGIApp, Receive, Scope, Send
 
-from POC.api.routes.forms import field_forms, db_forms, tag_forms
-from POC.api.routes.backend import field_apis, db_apis
-from POC.api.routes import base
-
-app = FastAPI(title="Dynamic-DB")
-api_router = APIRouter()
-api_router.include_router(db_apis.router, prefix="/api/databases", tags=["databases"])
-api_router.include_router(field_apis.router, prefix="/api/fields", tags=["fields"])
-api_router.include_router(
-    db_forms.router,
-    prefix="/forms/databases",
-    tags=["databases"],
-    include_in_schema=False,
-)
-api_router.include_router(
-    field_forms.router,
-    prefix="/forms/fields",
-    tags=["fields"],
-    include_in_schema=False,
-)
-api_router.include_router(
-    tag_forms.router,
-    prefix="/forms/tags",
-    tags=["tags"],
-    include_in_schema=False,
+from POC.api.routes.backend import (
+    field_apis,
+    db_apis,
+    record_apis,
+    tag_apis,
+    admin_apis,
+    generated_apis,
+    metrics_apis,
+    report_apis,
+    workflow_apis,
 )
+from POC.core.config import Settings
+from POC.db.database import Database
+from POC.db.instrumentation import QueryTrackingMiddleware
+from POC.gen.migrate import run_migration
+from POC.gen.validate import ValidationPool
+from POC.helpers.db_helpers import migrating_dbs
+from POC.reports.scheduler import ReportScheduler
+from POC.workflows.engine import WorkflowEngine
+
+
+class LazyFrontend:
+    """The FastUI forms and pages, imported and built on their first request.
+
+    FastUI and the form modules are most of the app's import time, and an
+    API-only worker never needs them.
+    """
+
+    def __init__(self, app: FastAPI) -> None:
+        self.app = app
+        self.router: ASGIApp | None = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if self.router is None:
+            from POC.api.routes.base import frontend_router
+
+            self.router = frontend_router(self.app)
+        await self.router(scope, receive, send)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    database: Database = app.state.database
+    await database.prepare()
+    async with database.session() as session:
+        await generated_apis.mount_generated(session, app.state.db_routers)
+        migrating = await migrating_dbs(session)
+    reports: ReportScheduler = app.state.reports
+    # Copy-and-swaps cut off by the last shutdown carry on from their last
+    # committed batch.
+    tasks = [asyncio.create_task(run_migration(database, db_id)) for db_id in migrating]
+    if app.state.settings.backup_interval_s:
+        tasks.append(asyncio.create_task(database.backup_forever()))
+    # The first tick also catches up on runs missed while the app was down.
+    if app.state.settings.report_tick_s:
+        tasks.append(asyncio.create_task(reports.run_forever()))
+    workflows: WorkflowEngine = app.state.workflows
+    if app.state.settings.workflow_poll_s:
+        workflows.start()
+    yield
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await workflows.close()
+    await reports.close()
+    app.state.validation.close()
+    app.state.db_routers.clear()
+    await database.dispose()
+
+
+def create_app(settings: Settings | None = None) -> FastAPI:
+    """Build the app; the database is not opened until it starts."""
+    settings = settings or Settings.from_env()
+    app = FastAPI(title="Dynamic-DB", lifespan=lifespan)
+    app.state.settings = settings
+    app.state.database = Database(settings)
+    app.state.reports = ReportScheduler(settings, app.state.database)
+    app.state.workflows = WorkflowEngine(settings, app.state.database)
+    app.state.validation = ValidationPool(settings.validation_workers)
+    app.add_middleware(
+        QueryTrackingMiddleware, n_plus_one_threshold=settings.n_plus_one_threshold
+    )
+    # Per-database record routers, mounted and unmounted at runtime. This
+    # comes before the frontend's catch-all.
+    app.state.db_routers = generated_apis.DbRouters(dependency_overrides_provider=app)
+    app.mount(generated_apis.MOUNT_PATH, app.state.db_routers)
+    api_router = APIRouter()
+    api_router.include_router(
+        db_apis.router, prefix="/api/databases", tags=["databases"]
+    )
+    api_router.include_router(field_apis.router, prefix="/api/fields", tags=["fields"])
+    api_router.include_router(
+        record_apis.router, prefix="/api/databases", tags=["records"]
+    )
+    api_router.include_router(tag_apis.router, prefix="/api/tags", tags=["tags"])
+    api_router.include_router(
+        report_apis.router, prefix="/api/reports", tags=["reports"]
+    )
+    api_router.include_router(
+        workflow_apis.router, prefix="/api/workflows", tags=["workflows"]
+    )
+    api_router.include_router(admin_apis.router, prefix="/api/admin", tags=["admin"])
+    api_router.include_router(metrics_apis.router)
+    app.include_router(api_router)
+    if settings.frontend:
+        # Matches every path the API does not, so it comes last.
+        app.mount("", LazyFrontend(app))
+    return app
 
-api_router.include_router(base.router, tags=["base"], include_in_schema=False)
 
-app.include_router(api_router)
+app = create_app()
@@ -0,0 +1,48 @@
+from typing import Annotated
+from fastapi import APIRouter, Depends, HTTPException
+from POC.db.database import Database, SessionDep, get_database
+from POC.db.models.stock_models.db_models import BackupResult, QueryPlan
+from POC.helpers.db_helpers import generate_db
+from POC.helpers.plan_helpers import explain_hot_queries
+
+router = APIRouter()
+
+
+@router.get(
+    "/query-plans",
+    response_model=list[QueryPlan],
+    tags=["admin"],
+    summary="EXPLAIN QUERY PLAN for the queries the API runs per request",
+    description="With database_id, the database is generated and lookups on its indexed fields are included.\nfull_scan marks plans that read every row of a table.",
+)
+async def api_get_query_plans(
+    session: SessionDep, database_id: int | None = None
+) -> list[QueryPlan]:
+    compiled = None
+    if database_id is not None:
+        try:
+            compiled = await generate_db(session, database_id)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        if compiled is None:
+            raise HTTPException(status_code=404, detail="Database not found")
+    return await explain_hot_queries(session, database_id or 1, compiled)
+
+
+@router.post(
+    "/backup",
+    response_model=BackupResult,
+    tags=["admin"],
+    summary="Snapshot the database file while it stays in use",
+    description="Copies backup_pages_per_step pages at a time through the SQLite backup API, pausing between steps so writers are not held up.\nOnly the backup_keep newest snapshots are kept.",
+)
+async def api_backup_database(
+    database: Annotated[Database, Depends(get_database)],
+) -> BackupResult:
+    try:
+        snapshot = await database.backup()
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return BackupResult(
+        path=str(snapshot.path), pages=snapshot.pages, seconds=snapshot.seconds
+    )
@@ -1,12 +1,46 @@
+from pathlib import Path
+from datetime import datetime as dt
 from typing import Sequence
-from fastapi import APIRouter, HTTPException
-from sqlmodel import Session, select
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+)
+from fastapi.responses import StreamingResponse
+from sqlmodel import col, select
+from POC.api.routes.backend.generated_apis import DbRoutersDep
+from POC.db.database import DatabaseDep, SessionDep
 from POC.db.models.stock_models.db_models import (
+    CompilerCacheStats,
+    ComponentCacheStats,
     DbInfoForm,
     DbInfo,
     DbInfoModel,
-    db_engine,
+    GeneratedDbInfo,
+    MetadataCacheStats,
+    MigrationProgress,
+    Page,
+    QuarantinedRowModel,
+    QueryCacheStats,
+    SchemaVersionModel,
+    SpreadsheetImportResult,
+)
+from POC.gen.export import ExportFormat, export_response
+from POC.gen.migrate import ACTIVE_STATUSES, migration_progress, run_migration
+from POC.gen.validate import get_validation
+from POC.helpers.api_helpers import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    PageOrder,
+    paginate,
 )
+from POC.helpers.cache_helpers import get_db_metadata, not_modified
+from POC.helpers.db_helpers import generate_db, outstanding_migration
+from POC.helpers.excel_helpers import import_spreadsheet
 
 router = APIRouter()
 
@@ -19,13 +53,12 @@ router = APIRouter()
     summary="Create basic information for a new database",
     description="Create a new database with the provided information.\ncreated_at, updated_at, and status are automatically set.",
 )
-async def api_create_database(new_db: DbInfoForm) -> DbInfoModel:
+async def api_create_database(new_db: DbInfoForm, session: SessionDep) -> DbInfoModel:
     db_info = DbInfo(**new_db.model_dump())
-    with Session(db_engine) as session:
-        db = DbInfoModel(**db_info.model_dump())
-        session.add(db)
-        session.commit()
-        session.refresh(db)
+    db = DbInfoModel(**db_info.model_dump())
+    session.add(db)
+    await session.commit()
+    await session.refresh(db)
     return db
 
 
@@ -34,29 +67,58 @@ async def api_create_database(new_db: DbInfoForm) -> DbInfoModel:
     response_model=DbInfoModel,
     tags=["databases"],
 )
-async def api_get_database(database_id: int) -> DbInfoModel:
-    with Session(db_engine) as session:
-        # db: DbInfo = session.query(DbInfo).filter(DbInfo.id == database_id).first()
-        statement = select(DbInfoModel).where(DbInfoModel.id == database_id)
-        db: DbInfoModel | None = session.exec(statement).first()
-        if db is None:
-            raise HTTPException(status_code=404, detail="Database not found")
+async def api_get_database(
+    database_id: int,
+    request: Request,
+    response: Response,
+    session: SessionDep,
+    database: DatabaseDep,
+) -> DbInfoModel | Response:
+    metadata = await get_db_metadata(session, database_id, database.metadata)
+    if metadata is None:
+        raise HTTPException(status_code=404, detail="Database not found")
+    if not_modified(request, response, metadata.etag):
+        return Response(status_code=304, headers=dict(response.headers))
 
-    return db
+    return metadata.db
 
 
 @router.get(
     "/read",
-    response_model=Sequence[DbInfoModel],
+    response_model=Page,
     tags=["databases"],
+    summary="List databases one keyset page at a time",
+    description="Pass next_cursor back as cursor to fetch the following page.\nfields is a comma separated projection, e.g. fields=id,name.",
 )
-async def api_get_all_databases() -> Sequence[DbInfoModel]:
-    with Session(db_engine) as session:
-        # statement = select(DbInfo).where(DbInfo.status != "deleted")
-        statement = select(DbInfoModel)
-        dbs: Sequence[DbInfoModel] = session.exec(statement).all()
+async def api_get_all_databases(
+    session: SessionDep,
+    status: str | None = None,
+    category: str | None = None,
+    fields: str | None = None,
+    order: PageOrder = "id",
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+) -> Page:
+    filters = []
+    if status is not None:
+        filters.append(col(DbInfoModel.status) == status)
+    if category is not None:
+        filters.append(col(DbInfoModel.category) == category)
+    return await paginate(session, DbInfoModel, filters, order, fields, limit, cursor)
+
 
-    return dbs
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    tags=["databases"],
+    summary="Stream the information of every database as CSV, NDJSON or XLSX",
+)
+async def api_export_databases(
+    session: SessionDep,
+    export_format: ExportFormat = Query(default="csv", alias="format"),
+) -> StreamingResponse:
+    statement = select(DbInfoModel).order_by(DbInfoModel.id)  # type: ignore[arg-type]
+    return export_response(session, statement, export_format, "databases")
 
 
 @router.put(
@@ -65,20 +127,22 @@ async def api_get_all_databases() -> Sequence[DbInfoModel]:
     response_model_exclude_none=True,
     tags=["databases"],
 )
-async def api_update_database(database_id: int, db: DbInfoForm) -> DbInfoModel:
+async def api_update_database(
+    database_id: int, db: DbInfoForm, session: SessionDep, database: DatabaseDep
+) -> DbInfoModel:
     db_info = DbInfo(**db.model_dump(), db_id=database_id)
-    with Session(db_engine) as session:
-        statement = select(DbInfoModel).where(DbInfoModel.id == database_id)
-        old_db: DbInfoModel | None = session.exec(statement).first()
-        if old_db is None:
-            raise HTTPException(status_code=404, detail="Database not found")
-        old_db.name = db_info.name
-        old_db.description = db_info.description
-        old_db.category = db_info.category
-        old_db.updated_at = db_info.updated_at
-        session.add(old_db)
-        session.commit()
-        session.refresh(old_db)
+    statement = select(DbInfoModel).where(DbInfoModel.id == database_id)
+    old_db: DbInfoModel | None = (await session.exec(statement)).first()
+    if old_db is None:
+        raise HTTPException(status_code=404, detail="Database not found")
+    old_db.name = db_info.name
+    old_db.description = db_info.description
+    old_db.category = db_info.category
+    old_db.updated_at = db_info.updated_at
+    session.add(old_db)
+    await session.commit()
+    database.metadata.invalidate(database_id)
+    await session.refresh(old_db)
 
     return old_db
 
@@ -88,14 +152,192 @@ async def api_update_database(database_id: int, db: DbInfoForm) -> DbInfoModel:
     response_model=DbInfoModel,
     tags=["databases"],
 )
-async def api_delete_database(database_id: int) -> DbInfoModel:
-    with Session(db_engine) as session:
-        statement = select(DbInfoModel).where(DbInfoModel.id == database_id)
-        db: DbInfoModel | None = session.exec(statement).first()
-        if db is None:
-            raise HTTPException(status_code=404, detail="Database not found")
-        db.status = "deleted"
-        session.add(db)
-        session.commit()
-        session.refresh(db)
+async def api_delete_database(
+    database_id: int,
+    session: SessionDep,
+    database: DatabaseDep,
+    db_routers: DbRoutersDep,
+) -> DbInfoModel:
+    statement = select(DbInfoModel).where(DbInfoModel.id == database_id)
+    db: DbInfoModel | None = (await session.exec(statement)).first()
+    if db is None:
+        raise HTTPException(status_code=404, detail="Database not found")
+    db.status = "deleted"
+    db.updated_at = dt.now()
+    session.add(db)
+    await session.commit()
+    database.metadata.invalidate(database_id)
+    db_routers.unmount(database_id)
+    await session.refresh(db)
     return db
+
+
+@router.post(
+    "/generate/{database_id}",
+    response_model=GeneratedDbInfo,
+    tags=["databases"],
+    summary="Compile the database's active fields into a real table",
+)
+async def api_generate_database(
+    database_id: int,
+    session: SessionDep,
+    database: DatabaseDep,
+    db_routers: DbRoutersDep,
+    background_tasks: BackgroundTasks,
+) -> GeneratedDbInfo:
+    try:
+        compiled = await generate_db(session, database_id)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if compiled is None:
+        raise HTTPException(status_code=404, detail="Database not found")
+    # Starts an outstanding migration, or resumes one cut off by a restart.
+    migration = await outstanding_migration(session, database_id)
+    migrating_to = None
+    if migration is not None and migration.status in ACTIVE_STATUSES:
+        migrating_to = migration.version
+        background_tasks.add_task(run_migration, database, database_id)
+    db = await session.get(DbInfoModel, database_id)
+    assert db is not None
+    return GeneratedDbInfo(
+        db_id=compiled.db_id,
+        version=compiled.version,
+        table_name=compiled.table.name,
+        columns=list(compiled.columns),
+        migrating_to=migrating_to,
+        api_path=(
+            db_routers.mount(database_id, db.short_name)
+            if db.status != "deleted"
+            else None
+        ),
+    )
+
+
+@router.get(
+    "/migrations/{database_id}",
+    response_model=list[SchemaVersionModel],
+    tags=["databases"],
+    summary="Schema versions of a database and the progress of their migrations",
+    description="copied_rows of total_rows have been copied while status is copying.",
+)
+async def api_get_migrations(
+    database_id: int, session: SessionDep
+) -> Sequence[SchemaVersionModel]:
+    statement = (
+        select(SchemaVersionModel)
+        .where(SchemaVersionModel.db_id == database_id)
+        .order_by(SchemaVersionModel.version)  # type: ignore[arg-type]
+    )
+    return (await session.exec(statement)).all()
+
+
+@router.get(
+    "/migrations/{database_id}/progress",
+    response_model=MigrationProgress,
+    tags=["databases"],
+    summary="Progress and ETA of the database's latest copy-and-swap migration",
+    description="conversions lists the fields whose values change data type. Rows with a value that does not convert are left out of the table and listed at /migrations/{database_id}/quarantine.",
+)
+async def api_get_migration_progress(
+    database_id: int, session: SessionDep
+) -> MigrationProgress:
+    statement = (
+        select(SchemaVersionModel)
+        .where(
+            SchemaVersionModel.db_id == database_id,
+            col(SchemaVersionModel.from_version).is_not(None),
+        )
+        .order_by(col(SchemaVersionModel.version).desc())
+    )
+    migration = (await session.exec(statement)).first()
+    if migration is None:
+        raise HTTPException(status_code=404, detail="Migration not found")
+    applied = select(SchemaVersionModel).where(
+        SchemaVersionModel.db_id == database_id,
+        SchemaVersionModel.version == migration.from_version,
+    )
+    return migration_progress(migration, (await session.exec(applied)).one().fields)
+
+
+@router.get(
+    "/migrations/{database_id}/quarantine",
+    response_model=Page,
+    tags=["databases"],
+    summary="Records left out of the table because a value did not convert",
+    description="Each item holds the record as it was and, per failed value, the column, expected type and value.",
+)
+async def api_get_quarantine(
+    database_id: int,
+    session: SessionDep,
+    version: int | None = None,
+    fields: str | None = None,
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+) -> Page:
+    filters = [col(QuarantinedRowModel.db_id) == database_id]
+    if version is not None:
+        filters.append(col(QuarantinedRowModel.version) == version)
+    return await paginate(
+        session, QuarantinedRowModel, filters, "id", fields, limit, cursor
+    )
+
+
+@router.get(
+    "/generated/stats",
+    response_model=CompilerCacheStats,
+    tags=["databases"],
+)
+async def api_get_compiler_stats(database: DatabaseDep) -> CompilerCacheStats:
+    return CompilerCacheStats(**database.compiled.stats())
+
+
+@router.get(
+    "/queries/stats",
+    response_model=QueryCacheStats,
+    tags=["databases"],
+)
+async def api_get_query_cache_stats(database: DatabaseDep) -> QueryCacheStats:
+    return QueryCacheStats.model_validate(database.queries.stats())
+
+
+@router.get(
+    "/metadata/stats",
+    response_model=MetadataCacheStats,
+    tags=["databases"],
+)
+async def api_get_metadata_cache_stats(database: DatabaseDep) -> MetadataCacheStats:
+    return MetadataCacheStats.model_validate(database.metadata.stats())
+
+
+@router.get(
+    "/components/stats",
+    response_model=ComponentCacheStats,
+    tags=["databases"],
+)
+async def api_get_component_cache_stats(
+    database: DatabaseDep,
+) -> ComponentCacheStats:
+    return ComponentCacheStats.model_validate(database.components.stats())
+
+
+@router.post(
+    "/import",
+    response_model=SpreadsheetImportResult,
+    tags=["databases"],
+    summary="Create a database from an XLSX or CSV file",
+    description="Field types are inferred from a sample of the rows, then every row is loaded.\nRows that do not match the inferred types are reported per chunk, and summed up per field.",
+)
+async def api_import_spreadsheet(
+    file: UploadFile, request: Request, session: SessionDep, name: str | None = None
+) -> SpreadsheetImportResult:
+    filename = Path(file.filename or "import.xlsx")
+    file_type = filename.suffix.lstrip(".").lower()
+    if file_type not in ("xlsx", "csv"):
+        raise HTTPException(status_code=415, detail="Only .xlsx and .csv are supported")
+    return await import_spreadsheet(
+        session,
+        file.file,
+        name or filename.stem,
+        file_type=file_type,
+        pool=get_validation(request),
+    )
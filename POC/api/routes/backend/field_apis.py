@@ -1,38 +1,136 @@
 from typing import Sequence
-from fastapi import APIRouter, HTTPException
-from sqlmodel import Session, select
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import ColumnElement
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from datetime import datetime as dt
+from POC.db.database import DatabaseDep, SessionDep
+from POC.gen.compiler import (
+    column_names,
+    compile_computed,
+    compile_relations,
+    normalize_data_type,
+)
+from POC.gen.export import ExportFormat, export_response
+from POC.gen.expressions import parse
+from POC.gen.migrate import ACTIVE_STATUSES, run_migration
 from POC.db.models.stock_models.db_models import (
     FieldInfoForm,
     FieldInfo,
     FieldInfoModel,
     DbInfoModel,
-    db_engine,
+    Page,
+)
+from POC.helpers.api_helpers import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    PageOrder,
+    paginate,
+    paginate_loaded,
 )
+from POC.helpers.cache_helpers import get_db_metadata, not_modified
+from POC.helpers.db_helpers import applied_version, generate_db, outstanding_migration
 
 router = APIRouter()
 
 
+async def active_fields(
+    session: AsyncSession, database_id: int
+) -> Sequence[FieldInfoModel]:
+    statement = (
+        select(FieldInfoModel)
+        .where(FieldInfoModel.db_id == database_id, FieldInfoModel.is_active)
+        .order_by(FieldInfoModel.id)  # type: ignore[arg-type]
+    )
+    return (await session.exec(statement)).all()
+
+
+def check_computed(fields: Sequence[FieldInfo], status_code: int = 422) -> None:
+    # The field set must still compile: expressions parse, name numeric
+    # fields that exist, and do not depend on each other in a circle.
+    if not any(field.expression for field in fields):
+        return
+    try:
+        compile_computed(fields, column_names(fields))
+    except ValueError as e:
+        raise HTTPException(status_code=status_code, detail=str(e))
+
+
+async def check_relationships(
+    session: AsyncSession, database_id: int, fields: Sequence[FieldInfo]
+) -> None:
+    # Parent fields refer to id or a unique field of the related database,
+    # and child fields to a parent field there that refers back here.
+    if not any(field.relationship for field in fields):
+        return
+    try:
+        relations = compile_relations(fields, column_names(fields))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    for relation in relations:
+        related = await session.get(DbInfoModel, relation.db_id)
+        if related is None or related.status == "deleted":
+            raise HTTPException(
+                status_code=422, detail=f"Database {relation.db_id} not found"
+            )
+        if relation.kind == "parent" and relation.key == "id":
+            continue
+        related_fields = (
+            fields
+            if relation.db_id == database_id
+            else await active_fields(session, relation.db_id)
+        )
+        by_column = dict(zip(column_names(related_fields), related_fields))
+        key = by_column.get(relation.key)
+        if relation.kind == "parent":
+            if key is None or not key.unique:
+                raise HTTPException(
+                    status_code=422,
+                    detail=f"{relation.key!r} is not a unique field of database {relation.db_id}",
+                )
+        elif (
+            key is None
+            or key.relationship != "parent"
+            or key.related_db_id != database_id
+            or (key.related_key or "id") != "id"
+        ):
+            raise HTTPException(
+                status_code=422,
+                detail=f"{relation.key!r} is not a parent field of database {relation.db_id} referring to this one",
+            )
+
+
 @router.post(
     "/create/{database_id}",
     response_model=FieldInfoModel,
     response_model_exclude_none=True,
     tags=["fields"],
 )
-async def api_create_field(form: FieldInfoForm, database_id: int) -> FieldInfoModel:
+async def api_create_field(
+    form: FieldInfoForm, database_id: int, session: SessionDep, database: DatabaseDep
+) -> FieldInfoModel:
     field_info = FieldInfo(**form.model_dump(), db_id=database_id)
-    with Session(db_engine) as session:
-        db_statement = select(DbInfoModel).where(DbInfoModel.id == database_id)
-        db = session.exec(db_statement).first()
-        if db is None:
-            raise ValueError("Database not found")
-        db.updated_at = dt.now()
-        session.add(db)
-        field = FieldInfoModel(**field_info.model_dump())
-        field.db_id = database_id
-        session.add(field)
-        session.commit()
-        session.refresh(field)
+    try:
+        normalize_data_type(field_info.data_type)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    db_statement = select(DbInfoModel).where(DbInfoModel.id == database_id)
+    db = (await session.exec(db_statement)).first()
+    if db is None:
+        raise ValueError("Database not found")
+    db.updated_at = dt.now()
+    db.version += 1
+    session.add(db)
+    field = FieldInfoModel(**field_info.model_dump())
+    field.db_id = database_id
+    fields = [*await active_fields(session, database_id), field]
+    check_computed(fields)
+    await check_relationships(session, database_id, fields)
+    session.add(field)
+    await session.commit()
+    database.metadata.invalidate(database_id)
+    await session.refresh(field)
 
     return field
 
@@ -42,44 +140,103 @@ async def api_create_field(form: FieldInfoForm, database_id: int) -> FieldInfoMo
     response_model=FieldInfoModel,
     tags=["fields"],
 )
-async def api_get_field(database_id: int, field_id: int) -> FieldInfoModel:
-    with Session(db_engine) as session:
-        # db: DbInfo = session.query(DbInfo).filter(DbInfo.id == database_id).first()
-        statement = select(FieldInfoModel).where(
-            FieldInfoModel.id == field_id and FieldInfoModel.db_id == database_id
-        )
-        db: FieldInfoModel | None = session.exec(statement).first()
-        if db is None:
-            raise HTTPException(status_code=404, detail="Field not found")
+async def api_get_field(
+    database_id: int, field_id: int, session: SessionDep
+) -> FieldInfoModel:
+    # db: DbInfo = session.query(DbInfo).filter(DbInfo.id == database_id).first()
+    statement = select(FieldInfoModel).where(
+        FieldInfoModel.id == field_id, FieldInfoModel.db_id == database_id
+    )
+    db: FieldInfoModel | None = (await session.exec(statement)).first()
+    if db is None:
+        raise HTTPException(status_code=404, detail="Field not found")
     return db
 
 
+def field_filters(
+    database_id: int | None, is_active: bool | None, data_type: str | None
+) -> list[ColumnElement[bool]]:
+    filters: list[ColumnElement[bool]] = []
+    if database_id is not None:
+        filters.append(col(FieldInfoModel.db_id) == database_id)
+    if is_active is not None:
+        filters.append(col(FieldInfoModel.is_active) == is_active)
+    if data_type is not None:
+        filters.append(col(FieldInfoModel.data_type) == data_type)
+    return filters
+
+
 @router.get(
     "/read",
-    response_model=Sequence[FieldInfoModel],
+    response_model=Page,
     tags=["fields"],
+    summary="List fields of every database one keyset page at a time",
+    description="Pass next_cursor back as cursor to fetch the following page.\nfields is a comma separated projection, e.g. fields=id,name,data_type.",
 )
-async def api_get_all_fields() -> Sequence[FieldInfoModel]:
-    with Session(db_engine) as session:
-        statement = select(FieldInfoModel).where(FieldInfoModel.is_active)
-        dbs: Sequence[FieldInfoModel] = session.exec(statement).all()
-
-    return dbs
+async def api_get_all_fields(
+    session: SessionDep,
+    is_active: bool | None = True,
+    data_type: str | None = None,
+    fields: str | None = None,
+    order: PageOrder = "id",
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+) -> Page:
+    filters = field_filters(None, is_active, data_type)
+    return await paginate(
+        session, FieldInfoModel, filters, order, fields, limit, cursor
+    )
 
 
 @router.get(
     "/read/{database_id}",
-    response_model=Sequence[FieldInfoModel],
+    response_model=Page,
     tags=["fields"],
+    summary="List the fields of one database one keyset page at a time",
+    description="Served from the metadata cache; the ETag changes whenever the database or its fields do.",
 )
-async def api_get_fields(database_id: int) -> Sequence[FieldInfoModel]:
-    with Session(db_engine) as session:
-        # db: DbInfo = session.query(DbInfo).filter(DbInfo.id == database_id).first()
-        statement = select(FieldInfoModel).where(
-            FieldInfoModel.db_id == database_id and FieldInfoModel.is_active
-        )
-        dbs: Sequence[FieldInfoModel] = session.exec(statement).all()
-    return dbs
+async def api_get_fields(
+    database_id: int,
+    request: Request,
+    response: Response,
+    session: SessionDep,
+    database: DatabaseDep,
+    is_active: bool | None = True,
+    data_type: str | None = None,
+    fields: str | None = None,
+    order: PageOrder = "id",
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+) -> Page | Response:
+    metadata = await get_db_metadata(session, database_id, database.metadata)
+    if metadata is None:
+        return Page(items=[])
+    if not_modified(request, response, metadata.etag):
+        return Response(status_code=304, headers=dict(response.headers))
+    rows = [
+        field
+        for field in metadata.fields
+        if (is_active is None or field.is_active == is_active)
+        and (data_type is None or field.data_type == data_type)
+    ]
+    return paginate_loaded(FieldInfoModel, rows, order, fields, limit, cursor)
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    tags=["fields"],
+    summary="Stream field definitions as CSV, NDJSON or XLSX",
+)
+async def api_export_fields(
+    session: SessionDep,
+    database_id: int | None = None,
+    export_format: ExportFormat = Query(default="csv", alias="format"),
+) -> StreamingResponse:
+    statement = select(FieldInfoModel).order_by(FieldInfoModel.id)  # type: ignore[arg-type]
+    if database_id is not None:
+        statement = statement.where(FieldInfoModel.db_id == database_id)
+    return export_response(session, statement, export_format, "fields")
 
 
 @router.put(
@@ -87,32 +244,76 @@ async def api_get_fields(database_id: int) -> Sequence[FieldInfoModel]:
     response_model=FieldInfoModel,
     response_model_exclude_none=True,
     tags=["fields"],
+    description="A new data_type or required converts the stored values in the background; records keep the old schema until it is done. Follow it at /api/databases/migrations/{database_id}/progress.",
 )
 async def api_update_field(
-    database_id: int, field_id: int, field_form: FieldInfoForm
+    database_id: int,
+    field_id: int,
+    field_form: FieldInfoForm,
+    session: SessionDep,
+    database: DatabaseDep,
+    background_tasks: BackgroundTasks,
 ) -> FieldInfoModel:
     field_info = FieldInfo(**field_form.model_dump())
-    with Session(db_engine) as session:
-        db_statement = select(DbInfoModel).where(DbInfoModel.id == database_id)
-        db = session.exec(db_statement).first()
-        if db is None:
-            raise ValueError("Database not found")
-        db.updated_at = dt.now()
-        session.add(db)
-        statement = select(FieldInfoModel).where(
-            FieldInfoModel.id == field_id and FieldInfoModel.db_id == database_id
-        )
-        old_db: FieldInfoModel | None = session.exec(statement).first()
-        if old_db is None:
-            raise HTTPException(status_code=404, detail="Field not found")
-        old_db.name = field_info.name
-        old_db.data_type = field_info.data_type
-        old_db.required = field_info.required
-        old_db.default = field_info.default
-        old_db.updated_at = field_info.updated_at
-        session.add(old_db)
-        session.commit()
-        session.refresh(old_db)
+    try:
+        normalize_data_type(field_info.data_type)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    db_statement = select(DbInfoModel).where(DbInfoModel.id == database_id)
+    db = (await session.exec(db_statement)).first()
+    if db is None:
+        raise ValueError("Database not found")
+    db.updated_at = dt.now()
+    db.version += 1
+    session.add(db)
+    statement = select(FieldInfoModel).where(
+        FieldInfoModel.id == field_id, FieldInfoModel.db_id == database_id
+    )
+    old_db: FieldInfoModel | None = (await session.exec(statement)).first()
+    if old_db is None:
+        raise HTTPException(status_code=404, detail="Field not found")
+    old_name = old_db.name
+    rewrite = (old_db.data_type, old_db.required) != (
+        field_info.data_type,
+        field_info.required,
+    )
+    old_db.name = field_info.name
+    old_db.data_type = field_info.data_type
+    old_db.required = field_info.required
+    old_db.default = field_info.default
+    old_db.indexed = field_info.indexed
+    old_db.unique = field_info.unique
+    old_db.searchable = field_info.searchable
+    old_db.expression = field_info.expression
+    old_db.relationship = field_info.relationship
+    old_db.related_db_id = field_info.related_db_id
+    old_db.related_key = field_info.related_key
+    old_db.updated_at = field_info.updated_at
+    fields = await active_fields(session, database_id)
+    if old_name != old_db.name:
+        # Expressions follow the field to its new name.
+        for field in fields:
+            if field.expression and field.id != old_db.id:
+                expression = parse(field.expression).rename(old_name, old_db.name)
+                if expression != field.expression:
+                    field.expression = expression
+                    field.updated_at = field_info.updated_at
+                    session.add(field)
+    check_computed(fields)
+    await check_relationships(session, database_id, fields)
+    session.add(old_db)
+    await session.commit()
+    database.metadata.invalidate(database_id)
+    if rewrite and await applied_version(session, database_id) is not None:
+        # Records the copy-and-swap that rewrites the table, if one is needed.
+        try:
+            await generate_db(session, database_id)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        migration = await outstanding_migration(session, database_id)
+        if migration is not None and migration.status in ACTIVE_STATUSES:
+            background_tasks.add_task(run_migration, database, database_id)
+    await session.refresh(old_db)
 
     return old_db
 
@@ -122,18 +323,27 @@ async def api_update_field(
     response_model=FieldInfo,
     tags=["fields"],
 )
-async def api_delete_field(database_id: int, field_id: int) -> FieldInfo:
-    with Session(db_engine) as session:
-        statement = select(FieldInfoModel).where(
-            FieldInfoModel.id == field_id and FieldInfoModel.db_id == database_id
-        )
-        db: FieldInfoModel | None = session.exec(statement).first()
-        if db is None:
-            raise HTTPException(status_code=404, detail="Field not found")
-        db.is_active = False
-        session.add(db)
-        session.commit()
-        session.refresh(db)
+async def api_delete_field(
+    database_id: int, field_id: int, session: SessionDep, database: DatabaseDep
+) -> FieldInfo:
+    statement = select(FieldInfoModel).where(
+        FieldInfoModel.id == field_id, FieldInfoModel.db_id == database_id
+    )
+    db: FieldInfoModel | None = (await session.exec(statement)).first()
+    if db is None:
+        raise HTTPException(status_code=404, detail="Field not found")
+    # Computed fields that use this one would no longer compile.
+    remaining = [f for f in await active_fields(session, database_id) if f.id != db.id]
+    check_computed(remaining, status_code=409)
+    db.is_active = False
+    session.add(db)
+    parent_db = await session.get(DbInfoModel, db.db_id)
+    if parent_db is not None:
+        parent_db.version += 1
+        session.add(parent_db)
+    await session.commit()
+    database.metadata.invalidate(db.db_id)
+    await session.refresh(db)
     return db
 
 
@@ -142,18 +352,24 @@ async def api_delete_field(database_id: int, field_id: int) -> FieldInfo:
     response_model=Sequence[FieldInfoModel],
     tags=["fields"],
 )
-async def api_delete_fields(database_id: int) -> Sequence[FieldInfoModel]:
-    with Session(db_engine) as session:
-        db_statement = select(DbInfoModel).where(DbInfoModel.id == database_id)
-        db: DbInfoModel | None = session.exec(db_statement).first()
-        if db is None or db.status == "deleted":
-            statement = select(FieldInfoModel).where(
-                FieldInfoModel.db_id == database_id and FieldInfoModel.is_active
-            )
-            db_fields: Sequence[FieldInfoModel] = session.exec(statement).all()
-            if db_fields is not None and len(db_fields) > 0:
-                for field in db_fields:
-                    field.is_active = False
-                session.add_all(db_fields)
-                session.commit()
+async def api_delete_fields(
+    database_id: int, session: SessionDep, database: DatabaseDep
+) -> Sequence[FieldInfoModel]:
+    db_statement = select(DbInfoModel).where(DbInfoModel.id == database_id)
+    db: DbInfoModel | None = (await session.exec(db_statement)).first()
+    db_fields: Sequence[FieldInfoModel] = []
+    if db is None or db.status == "deleted":
+        statement = select(FieldInfoModel).where(
+            FieldInfoModel.db_id == database_id, FieldInfoModel.is_active
+        )
+        db_fields = (await session.exec(statement)).all()
+        if db_fields is not None and len(db_fields) > 0:
+            for field in db_fields:
+                field.is_active = False
+            session.add_all(db_fields)
+            if db is not None:
+                db.version += 1
+                session.add(db)
+            await session.commit()
+            database.metadata.invalidate(database_id)
     return db_fields
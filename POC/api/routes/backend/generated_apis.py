@@ -0,0 +1,323 @@
+import re
+import time
+from dataclasses import dataclass
+from typing import Annotated, Any, Callable
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse
+from pydantic import ValidationError
+from sqlalchemy import Select, delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import col
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.routing import get_route_path
+from starlette.types import ASGIApp, Receive, Scope, Send
+from POC.db.database import Database, DatabaseDep, SessionDep
+from POC.db.models.stock_models.db_models import (
+    DbInfoModel,
+    Page,
+    RecordQuery,
+    SchemaVersionModel,
+)
+from POC.gen.compiler import CompiledDb
+from POC.gen.query import compile_query
+from POC.helpers.api_helpers import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    decode_cursor,
+    encode_cursor,
+)
+from POC.helpers.db_helpers import generate_db
+from POC.helpers.relation_helpers import expand_records, parse_expand
+from POC.workflows.engine import get_workflows
+from POC.workflows.queue import enqueue
+
+MOUNT_PATH = "/api/db"
+# Short names are used as a path segment as they are.
+MOUNTABLE_NAME = re.compile(r"^[A-Za-z0-9_-]+$")
+# How long a short name no database has is answered 404 without a lookup.
+NOT_FOUND_TTL = 2.0
+NOT_FOUND_MAXSIZE = 1024
+
+
+async def _compiled(session: AsyncSession, db_id: int) -> CompiledDb:
+    try:
+        compiled = await generate_db(session, db_id)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if compiled is None:
+        raise HTTPException(status_code=404, detail="Database not found")
+    return compiled
+
+
+def _validated(compiled: CompiledDb, record: dict[str, Any]) -> dict[str, Any]:
+    try:
+        return compiled.validate(record)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False))
+
+
+async def _written(session: AsyncSession, statement: Any) -> Any:
+    # Unique fields and foreign keys are enforced by SQLite.
+    try:
+        return (await session.execute(statement)).first()
+    except IntegrityError as e:
+        await session.rollback()
+        raise HTTPException(status_code=409, detail=str(e.orig))
+
+
+EXPAND_DESCRIPTION = (
+    "Relationship fields to replace with their records, comma separated;"
+    " follow further with dots, e.g. Customer,Items.Product"
+)
+
+
+def build_db_router(db_id: int, dependency_overrides_provider: Any = None) -> APIRouter:
+    """CRUD on the records of one generated database.
+
+    The handlers compile the database through ``generate_db`` on every
+    request, so a schema change or migration never needs a remount.
+    """
+    router = APIRouter(dependency_overrides_provider=dependency_overrides_provider)
+
+    @router.get("/records", response_model=Page, tags=["records"])
+    async def api_list_records(
+        session: SessionDep,
+        limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: str | None = None,
+        expand: str | None = Query(default=None, description=EXPAND_DESCRIPTION),
+    ) -> Page:
+        tree = parse_expand(expand)
+        compiled = await _compiled(session, db_id)
+        table = compiled.table
+        statement = select(table).order_by(table.c.id).limit(limit + 1)
+        if cursor is not None:
+            statement = statement.where(table.c.id > decode_cursor(cursor, "id")[0])
+        rows = (await session.execute(statement)).all()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor("id", [rows[-1].id])
+        items = [dict(row._mapping) for row in rows]
+        await expand_records(session, compiled, items, tree)
+        return Page(items=items, next_cursor=next_cursor)
+
+    @router.post(
+        "/records/query",
+        response_model=Page,
+        tags=["records"],
+        summary="Filter, sort and project records with a JSON query",
+        description='For example {"where": {"Price": {"gte": 10, "lt": 20}}, "sort": ["-Price"], "fields": ["Name", "Price"]}.\nOperators: eq, ne, gt, gte, lt, lte, in and contains.',
+    )
+    async def api_query_records(
+        session: SessionDep, database: DatabaseDep, query: RecordQuery
+    ) -> Page:
+        compiled = await _compiled(session, db_id)
+        try:
+            statement, params = compile_query(compiled, query, database.queries)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        rows = (await session.execute(statement, params)).all()
+        return Page(items=[dict(row._mapping) for row in rows])
+
+    @router.get("/records/{record_id}", tags=["records"])
+    async def api_get_record(
+        record_id: int,
+        session: SessionDep,
+        expand: str | None = Query(default=None, description=EXPAND_DESCRIPTION),
+    ) -> dict[str, Any]:
+        tree = parse_expand(expand)
+        compiled = await _compiled(session, db_id)
+        table = compiled.table
+        statement = select(table).where(table.c.id == record_id)
+        row = (await session.execute(statement)).first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Record not found")
+        record = dict(row._mapping)
+        await expand_records(session, compiled, [record], tree)
+        return record
+
+    @router.post("/records", status_code=201, tags=["records"])
+    async def api_create_record(
+        request: Request, session: SessionDep, record: dict[str, Any] = Body()
+    ) -> dict[str, Any]:
+        compiled = await _compiled(session, db_id)
+        values = _validated(compiled, record)
+        statement = insert(compiled.table).values(values).returning(compiled.table)
+        record = dict((await _written(session, statement))._mapping)
+        # Workflows and triggers run from the queue, after the response.
+        enqueue(session, db_id, "created", [record["id"]])
+        await session.commit()
+        get_workflows(request).wake()
+        return record
+
+    @router.put("/records/{record_id}", tags=["records"])
+    async def api_update_record(
+        record_id: int,
+        request: Request,
+        session: SessionDep,
+        record: dict[str, Any] = Body(),
+    ) -> dict[str, Any]:
+        compiled = await _compiled(session, db_id)
+        values = _validated(compiled, record)
+        table = compiled.table
+        statement = (
+            update(table).where(table.c.id == record_id).values(values).returning(table)
+        )
+        row = await _written(session, statement)
+        if row is None:
+            raise HTTPException(status_code=404, detail="Record not found")
+        enqueue(session, db_id, "updated", [record_id])
+        await session.commit()
+        get_workflows(request).wake()
+        return dict(row._mapping)
+
+    @router.delete("/records/{record_id}", tags=["records"])
+    async def api_delete_record(
+        record_id: int, request: Request, session: SessionDep
+    ) -> dict[str, Any]:
+        table = (await _compiled(session, db_id)).table
+        statement = delete(table).where(table.c.id == record_id).returning(table)
+        row = await _written(session, statement)
+        if row is None:
+            raise HTTPException(status_code=404, detail="Record not found")
+        record = dict(row._mapping)
+        # The row is gone, so delete triggers match on this copy of it.
+        payload = {"rows": [jsonable_encoder(record)]}
+        enqueue(session, db_id, "deleted", [record_id], payload)
+        await session.commit()
+        get_workflows(request).wake()
+        return record
+
+    return router
+
+
+@dataclass
+class MountedDb:
+    db_id: int
+    short_name: str
+    # Built on the first request, so mounting thousands of databases at
+    # start-up is only dictionary inserts.
+    router: ASGIApp | None = None
+
+
+class DbRouters:
+    """ASGI app that serves ``/{short_name}/...`` with that database's router.
+
+    Dispatch is one dict lookup on the short name, however many databases
+    are mounted, and mounting or unmounting at runtime only changes the
+    dict. A short name belongs to the first database mounted with it.
+
+    A database generated by another worker process is not in the dict yet:
+    a short name it lacks is looked up in the app's database and mounted
+    then. Names found nowhere are remembered for ``NOT_FOUND_TTL`` seconds.
+    """
+
+    def __init__(
+        self,
+        build: Callable[[int, Any], ASGIApp] = build_db_router,
+        dependency_overrides_provider: Any = None,
+    ) -> None:
+        self.build = build
+        # The app, so its dependency overrides reach the mounted routers.
+        self.dependency_overrides_provider = dependency_overrides_provider
+        self._by_name: dict[str, MountedDb] = {}
+        self._by_id: dict[int, MountedDb] = {}
+        # Short names no database had, and when that was looked up.
+        self._not_found: dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._by_name)
+
+    def mount(self, db_id: int, short_name: str) -> str | None:
+        """Mount the database and return its path, or None if its short name
+        cannot be used in a path or is taken by another database."""
+        current = self._by_id.get(db_id)
+        if current is not None and current.short_name == short_name:
+            return f"{MOUNT_PATH}/{short_name}"
+        owner = self._by_name.get(short_name)
+        if owner is not None or not MOUNTABLE_NAME.match(short_name):
+            self.unmount(db_id)
+            return None
+        self.unmount(db_id)
+        mounted = MountedDb(db_id, short_name)
+        self._by_name[short_name] = self._by_id[db_id] = mounted
+        self._not_found.pop(short_name, None)
+        return f"{MOUNT_PATH}/{short_name}"
+
+    def unmount(self, db_id: int) -> None:
+        mounted = self._by_id.pop(db_id, None)
+        if mounted is not None:
+            del self._by_name[mounted.short_name]
+
+    def clear(self) -> None:
+        self._by_name.clear()
+        self._by_id.clear()
+        self._not_found.clear()
+
+    def path(self, db_id: int) -> str | None:
+        mounted = self._by_id.get(db_id)
+        return None if mounted is None else f"{MOUNT_PATH}/{mounted.short_name}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        name = get_route_path(scope)[1:].partition("/")[0]
+        mounted = self._by_name.get(name)
+        if mounted is None and "app" in scope:
+            mounted = await self._lookup(scope["app"].state.database, name)
+        if mounted is None:
+            response = JSONResponse({"detail": "Database not found"}, status_code=404)
+            await response(scope, receive, send)
+            return
+        if mounted.router is None:
+            mounted.router = self.build(
+                mounted.db_id, self.dependency_overrides_provider
+            )
+        scope = {**scope, "root_path": scope.get("root_path", "") + f"/{name}"}
+        await mounted.router(scope, receive, send)
+
+    async def _lookup(self, database: Database, name: str) -> MountedDb | None:
+        # Mounts the database generated with this short name, if any.
+        now = time.monotonic()
+        if not MOUNTABLE_NAME.match(name):
+            return None
+        if now - self._not_found.get(name, -NOT_FOUND_TTL) < NOT_FOUND_TTL:
+            return None
+        await database.prepare()
+        async with database.session() as session:
+            statement = generated_statement().where(col(DbInfoModel.short_name) == name)
+            row = (await session.execute(statement)).first()
+        if row is not None and self.mount(row.id, name) is not None:
+            return self._by_name[name]
+        if len(self._not_found) >= NOT_FOUND_MAXSIZE:
+            self._not_found.clear()
+        self._not_found[name] = now
+        return None
+
+
+def get_db_routers(request: Request) -> DbRouters:
+    db_routers: DbRouters = request.app.state.db_routers
+    return db_routers
+
+
+DbRoutersDep = Annotated[DbRouters, Depends(get_db_routers)]
+
+
+def generated_statement() -> Select:
+    # Every database with an applied schema that is not deleted, oldest first.
+    generated = select(col(SchemaVersionModel.db_id)).where(
+        col(SchemaVersionModel.status) == "applied"
+    )
+    return (
+        select(col(DbInfoModel.id), col(DbInfoModel.short_name))
+        .where(
+            col(DbInfoModel.id).in_(generated),
+            col(DbInfoModel.status).is_distinct_from("deleted"),
+        )
+        .order_by(col(DbInfoModel.id))
+    )
+
+
+async def mount_generated(session: AsyncSession, db_routers: DbRouters) -> None:
+    for db_id, short_name in (await session.execute(generated_statement())).all():
+        db_routers.mount(db_id, short_name)
@@ -0,0 +1,19 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from POC.db.instrumentation import sql_metrics
+from POC.reports.scheduler import report_metrics
+
+router = APIRouter()
+
+
+@router.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    tags=["admin"],
+    summary="SQL, per-request query and report run metrics, for Prometheus",
+)
+async def api_get_metrics() -> PlainTextResponse:
+    return PlainTextResponse(
+        sql_metrics.render() + report_metrics.render(),
+        media_type="text/plain; version=0.0.4",
+    )
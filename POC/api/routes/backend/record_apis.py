@@ -0,0 +1,136 @@
+from typing import Literal
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+from POC.db.database import SessionDep
+from POC.db.models.stock_models.db_models import BulkIngestResult, Page
+from POC.gen.export import ExportFormat, export_response
+from POC.gen.ingest import CHUNK_SIZE, ingest_rows, iter_csv_rows, iter_ndjson_rows
+from POC.gen.search import highlighted, search_statement
+from POC.gen.validate import get_validation
+from POC.helpers.api_helpers import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    decode_cursor,
+    encode_cursor,
+)
+from POC.helpers.db_helpers import generate_db
+from POC.workflows.engine import get_workflows
+
+router = APIRouter()
+
+
+@router.post(
+    "/{database_id}/records/bulk",
+    response_model=BulkIngestResult,
+    tags=["records"],
+    summary="Stream NDJSON or CSV records into a generated database",
+    description="The request body is read as a stream and inserted in chunked transactions.\nRows that fail validation are reported per chunk, and summed up per field, without aborting the load.",
+)
+async def api_bulk_ingest_records(
+    database_id: int,
+    request: Request,
+    session: SessionDep,
+    data_format: Literal["ndjson", "csv"] | None = Query(default=None, alias="format"),
+    chunk_size: int = Query(default=CHUNK_SIZE, ge=1, le=50_000),
+) -> BulkIngestResult:
+    try:
+        compiled = await generate_db(session, database_id)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if compiled is None:
+        raise HTTPException(status_code=404, detail="Database not found")
+
+    if data_format is None:
+        content_type = request.headers.get("content-type", "")
+        data_format = "csv" if "csv" in content_type else "ndjson"
+    parse = iter_csv_rows if data_format == "csv" else iter_ndjson_rows
+    result = await ingest_rows(
+        session,
+        compiled,
+        parse(request.stream()),
+        chunk_size,
+        get_validation(request),
+    )
+    get_workflows(request).wake()
+    return result
+
+
+@router.get(
+    "/{database_id}/records/export",
+    response_class=StreamingResponse,
+    tags=["records"],
+    summary="Stream every record of a generated database as CSV, NDJSON or XLSX",
+)
+async def api_export_records(
+    database_id: int,
+    session: SessionDep,
+    export_format: ExportFormat = Query(default="csv", alias="format"),
+) -> StreamingResponse:
+    try:
+        compiled = await generate_db(session, database_id)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if compiled is None:
+        raise HTTPException(status_code=404, detail="Database not found")
+    statement = select(compiled.table).order_by(compiled.table.c.id)
+    return export_response(
+        session,
+        statement,
+        export_format,
+        compiled.table.name,
+    )
+
+
+@router.get(
+    "/{database_id}/search",
+    response_model=Page,
+    tags=["records"],
+    summary="Search the searchable fields of a generated database",
+    description="Every word of q must match; the last one also matches as a prefix.\nResults are ranked by bm25, best first, with the matched words wrapped in <mark> tags.",
+)
+async def api_search_records(
+    database_id: int,
+    session: SessionDep,
+    q: str = Query(min_length=1),
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+) -> Page:
+    try:
+        compiled = await generate_db(session, database_id)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if compiled is None:
+        raise HTTPException(status_code=404, detail="Database not found")
+    if not compiled.searchable:
+        raise HTTPException(status_code=422, detail="Database has no searchable fields")
+    if not q.split():
+        raise HTTPException(status_code=422, detail="q has no words to search for")
+
+    after = decode_cursor(cursor, "rank") if cursor is not None else None
+    try:
+        result = await session.execute(search_statement(compiled, q, limit + 1, after))
+    except OperationalError as e:
+        raise HTTPException(status_code=422, detail=str(e.orig))
+    rows = result.all()
+    # Each row is the record, its rank, then one highlight per searchable
+    # field; read by position, as a field may itself be called rank.
+    width = len(compiled.table.c)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor("rank", [rows[-1][width], rows[-1].id])
+    items = [
+        {
+            "id": row.id,
+            "rank": row[width],
+            "record": dict(zip(compiled.table.c.keys(), row[:width])),
+            "highlights": {
+                name: highlighted(value)
+                for name, value in zip(compiled.searchable, row[width + 1 :])
+            },
+        }
+        for row in rows
+    ]
+    return Page(items=items, next_cursor=next_cursor)
@@ -0,0 +1,155 @@
+from datetime import datetime as dt
+from typing import Annotated, Sequence
+from fastapi import APIRouter, Depends, HTTPException
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from POC.db.database import SessionDep
+from POC.db.models.stock_models.db_models import (
+    ReportForm,
+    Report,
+    ReportModel,
+    ReportRunModel,
+)
+from POC.helpers.db_helpers import generate_db
+from POC.reports.runner import report_statement
+from POC.reports.schedule import next_run
+from POC.reports.scheduler import ReportScheduler, get_reports
+
+router = APIRouter()
+
+ReportsDep = Annotated[ReportScheduler, Depends(get_reports)]
+
+
+async def check_report(session: AsyncSession, form: ReportForm) -> None:
+    # The query must build against the database's generated table now, not
+    # fail in a worker at the first scheduled run.
+    try:
+        compiled = await generate_db(session, form.db_id)
+        if compiled is None:
+            raise HTTPException(status_code=404, detail="Database not found")
+        report_statement(compiled.table, form.columns, form.group_by, form.aggregates)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+async def get_report(session: AsyncSession, report_id: int) -> ReportModel:
+    report = await session.get(ReportModel, report_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    return report
+
+
+@router.post(
+    "/create",
+    response_model=ReportModel,
+    tags=["reports"],
+    summary="Define a report on a database and schedule it",
+    description="The columns, groups and aggregates are checked against the database's table.\nnext_run_at is the first scheduled run; manual reports have none.",
+)
+async def api_create_report(
+    form: ReportForm, session: SessionDep, reports: ReportsDep
+) -> ReportModel:
+    await check_report(session, form)
+    report = ReportModel(**Report(**form.model_dump()).model_dump())
+    report.next_run_at = next_run(report, dt.now(), reports.settings.report_real_time_s)
+    session.add(report)
+    await session.commit()
+    await session.refresh(report)
+    return report
+
+
+@router.get(
+    "/read",
+    response_model=list[ReportModel],
+    tags=["reports"],
+)
+async def api_get_reports(
+    session: SessionDep, database_id: int | None = None
+) -> Sequence[ReportModel]:
+    statement = select(ReportModel).where(col(ReportModel.is_active))
+    if database_id is not None:
+        statement = statement.where(ReportModel.db_id == database_id)
+    return (await session.exec(statement.order_by(col(ReportModel.id)))).all()
+
+
+@router.get(
+    "/read/{report_id}",
+    response_model=ReportModel,
+    tags=["reports"],
+)
+async def api_get_report(report_id: int, session: SessionDep) -> ReportModel:
+    return await get_report(session, report_id)
+
+
+@router.put(
+    "/update/{report_id}",
+    response_model=ReportModel,
+    tags=["reports"],
+    summary="Change a report; its schedule starts again from now",
+)
+async def api_update_report(
+    report_id: int, form: ReportForm, session: SessionDep, reports: ReportsDep
+) -> ReportModel:
+    report = await get_report(session, report_id)
+    await check_report(session, form)
+    for name, value in form.model_dump().items():
+        setattr(report, name, value)
+    report.updated_at = dt.now()
+    report.next_run_at = next_run(
+        report, report.updated_at, reports.settings.report_real_time_s
+    )
+    session.add(report)
+    await session.commit()
+    await session.refresh(report)
+    return report
+
+
+@router.delete(
+    "/delete/{report_id}",
+    response_model=ReportModel,
+    tags=["reports"],
+)
+async def api_delete_report(report_id: int, session: SessionDep) -> ReportModel:
+    report = await get_report(session, report_id)
+    report.is_active = False
+    report.next_run_at = None
+    report.updated_at = dt.now()
+    session.add(report)
+    await session.commit()
+    await session.refresh(report)
+    return report
+
+
+@router.post(
+    "/run/{report_id}",
+    response_model=ReportRunModel,
+    tags=["reports"],
+    summary="Run a report now and wait for it",
+    description="The run takes a worker like a scheduled one and leaves the schedule as it is.\n409 while the report is already running.",
+)
+async def api_run_report(
+    report_id: int, session: SessionDep, reports: ReportsDep
+) -> ReportRunModel:
+    report = await get_report(session, report_id)
+    if reports.is_running(report_id):
+        raise HTTPException(status_code=409, detail="Report is already running")
+    return await reports.run(report)
+
+
+@router.get(
+    "/runs/{report_id}",
+    response_model=list[ReportRunModel],
+    tags=["reports"],
+    summary="A report's runs, newest first",
+)
+async def api_get_report_runs(
+    report_id: int, session: SessionDep, limit: int = 50
+) -> Sequence[ReportRunModel]:
+    await get_report(session, report_id)
+    statement = (
+        select(ReportRunModel)
+        .where(ReportRunModel.report_id == report_id)
+        .order_by(col(ReportRunModel.id).desc())
+        .limit(limit)
+    )
+    return (await session.exec(statement)).all()
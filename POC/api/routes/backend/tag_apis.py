@@ -0,0 +1,80 @@
+from fastapi import APIRouter, HTTPException, Query
+from sqlmodel import col, delete, select
+from POC.db.database import SessionDep
+from POC.db.models.stock_models.db_models import (
+    DbInfoModel,
+    DbTagLink,
+    DbTagsForm,
+    Page,
+    TagsInfo,
+)
+from POC.helpers.api_helpers import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    PageOrder,
+    paginate,
+)
+from POC.helpers.tag_helpers import TagMatch, resolve_tags, tagged_db_filter
+
+router = APIRouter()
+
+
+@router.get(
+    "/databases/{database_id}",
+    response_model=list[str],
+    tags=["tags"],
+)
+async def api_get_database_tags(database_id: int, session: SessionDep) -> list[str]:
+    statement = (
+        select(TagsInfo.tag_name)
+        .join(DbTagLink, col(DbTagLink.tag_id) == col(TagsInfo.id))
+        .where(DbTagLink.db_id == database_id)
+        .order_by(TagsInfo.tag_name)
+    )
+    return list((await session.exec(statement)).all())
+
+
+@router.put(
+    "/databases/{database_id}",
+    response_model=list[str],
+    tags=["tags"],
+    summary="Replace the tags of a database",
+    description="Every tag must already exist; unknown names are rejected.",
+)
+async def api_set_database_tags(
+    database_id: int, form: DbTagsForm, session: SessionDep
+) -> list[str]:
+    if await session.get(DbInfoModel, database_id) is None:
+        raise HTTPException(status_code=404, detail="Database not found")
+    tags = await resolve_tags(session, form.tag_names)
+    unknown = set(form.tag_names) - {tag.tag_name for tag in tags}
+    if unknown:
+        raise HTTPException(
+            status_code=422, detail=f"Unknown tags: {', '.join(sorted(unknown))}"
+        )
+    await session.exec(  # type: ignore[call-overload]
+        delete(DbTagLink).where(col(DbTagLink.db_id) == database_id)
+    )
+    session.add_all(DbTagLink(db_id=database_id, tag_id=tag.id) for tag in tags)
+    await session.commit()
+    return sorted(tag.tag_name for tag in tags)
+
+
+@router.get(
+    "/databases",
+    response_model=Page,
+    tags=["tags"],
+    summary="List databases by tag",
+    description="match=any returns databases with at least one of the tags, match=all those with every tag.\nPaginated like /api/databases/read.",
+)
+async def api_get_databases_by_tag(
+    session: SessionDep,
+    tag: list[str] = Query(min_length=1),
+    match: TagMatch = "any",
+    fields: str | None = None,
+    order: PageOrder = "id",
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+) -> Page:
+    filters = [tagged_db_filter(tag, match)]
+    return await paginate(session, DbInfoModel, filters, order, fields, limit, cursor)
@@ -0,0 +1,306 @@
+from datetime import datetime as dt
+from typing import Annotated, Sequence
+from fastapi import APIRouter, Depends, HTTPException
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from POC.db.database import SessionDep
+from POC.db.models.stock_models.db_models import (
+    EventModel,
+    NotificationModel,
+    RecordWorkflowModel,
+    TransitionRequest,
+    Trigger,
+    TriggerForm,
+    TriggerModel,
+    Workflow,
+    WorkflowForm,
+    WorkflowModel,
+)
+from POC.gen.compiler import CompiledDb
+from POC.helpers.db_helpers import generate_db
+from POC.workflows.engine import WorkflowEngine, get_workflows
+from POC.workflows.queue import enqueue
+
+router = APIRouter()
+
+WorkflowsDep = Annotated[WorkflowEngine, Depends(get_workflows)]
+
+
+async def compiled_db(session: AsyncSession, db_id: int) -> CompiledDb:
+    try:
+        compiled = await generate_db(session, db_id)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if compiled is None:
+        raise HTTPException(status_code=404, detail="Database not found")
+    return compiled
+
+
+def check_columns(compiled: CompiledDb, names: list[str], settable: bool) -> None:
+    generated = {f.column for f in compiled.computed if f.generated} if settable else ()
+    unknown = [n for n in names if n not in compiled.table.c or n in generated]
+    if unknown:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Not a field the workflow can use: {', '.join(unknown)}",
+        )
+
+
+async def find_workflow(
+    session: AsyncSession, db_id: int, name: str
+) -> WorkflowModel | None:
+    statement = select(WorkflowModel).where(
+        WorkflowModel.db_id == db_id,
+        WorkflowModel.name == name,
+        col(WorkflowModel.is_active),
+    )
+    return (await session.exec(statement)).first()
+
+
+async def get_workflow(session: AsyncSession, workflow_id: int) -> WorkflowModel:
+    workflow = await session.get(WorkflowModel, workflow_id)
+    if workflow is None:
+        raise HTTPException(status_code=404, detail="Workflow not found")
+    return workflow
+
+
+async def check_workflow(
+    session: AsyncSession, form: WorkflowForm, workflow_id: int | None = None
+) -> None:
+    compiled = await compiled_db(session, form.db_id)
+    check_columns(compiled, form.required_fields, settable=False)
+    settable = list(form.auto_change)
+    if form.timestamp_field:
+        settable.append(form.timestamp_field)
+    check_columns(compiled, settable, settable=True)
+    existing = await find_workflow(session, form.db_id, form.name)
+    if existing is not None and existing.id != workflow_id:
+        raise HTTPException(status_code=409, detail="Workflow already exists")
+
+
+@router.post(
+    "/create",
+    response_model=WorkflowModel,
+    tags=["workflows"],
+    summary="Define a workflow records of a database move through",
+    description="Required, auto-change and timestamp fields must be fields of the generated database.\nA default workflow is where new records start.",
+)
+async def api_create_workflow(form: WorkflowForm, session: SessionDep) -> WorkflowModel:
+    await check_workflow(session, form)
+    workflow = WorkflowModel(**Workflow(**form.model_dump()).model_dump())
+    session.add(workflow)
+    await session.commit()
+    await session.refresh(workflow)
+    return workflow
+
+
+@router.get(
+    "/read",
+    response_model=list[WorkflowModel],
+    tags=["workflows"],
+)
+async def api_get_workflows(
+    database_id: int, session: SessionDep
+) -> Sequence[WorkflowModel]:
+    statement = (
+        select(WorkflowModel)
+        .where(WorkflowModel.db_id == database_id, col(WorkflowModel.is_active))
+        .order_by(col(WorkflowModel.id))
+    )
+    return (await session.exec(statement)).all()
+
+
+@router.put(
+    "/update/{workflow_id}",
+    response_model=WorkflowModel,
+    tags=["workflows"],
+)
+async def api_update_workflow(
+    workflow_id: int, form: WorkflowForm, session: SessionDep
+) -> WorkflowModel:
+    workflow = await get_workflow(session, workflow_id)
+    await check_workflow(session, form, workflow_id)
+    for name, value in form.model_dump().items():
+        setattr(workflow, name, value)
+    workflow.updated_at = dt.now()
+    session.add(workflow)
+    await session.commit()
+    await session.refresh(workflow)
+    return workflow
+
+
+@router.delete(
+    "/delete/{workflow_id}",
+    response_model=WorkflowModel,
+    tags=["workflows"],
+)
+async def api_delete_workflow(workflow_id: int, session: SessionDep) -> WorkflowModel:
+    workflow = await get_workflow(session, workflow_id)
+    workflow.is_active = False
+    workflow.updated_at = dt.now()
+    session.add(workflow)
+    await session.commit()
+    await session.refresh(workflow)
+    return workflow
+
+
+@router.post(
+    "/triggers/create",
+    response_model=TriggerModel,
+    tags=["workflows"],
+    summary="Fire on record changes: move the record on, notify, or both",
+)
+async def api_create_trigger(form: TriggerForm, session: SessionDep) -> TriggerModel:
+    compiled = await compiled_db(session, form.db_id)
+    if form.field is not None:
+        check_columns(compiled, [form.field], settable=False)
+    if form.workflow is not None:
+        if await find_workflow(session, form.db_id, form.workflow) is None:
+            raise HTTPException(
+                status_code=422, detail=f"No workflow {form.workflow!r}"
+            )
+    trigger = TriggerModel(**Trigger(**form.model_dump()).model_dump())
+    session.add(trigger)
+    await session.commit()
+    await session.refresh(trigger)
+    return trigger
+
+
+@router.get(
+    "/triggers/read",
+    response_model=list[TriggerModel],
+    tags=["workflows"],
+)
+async def api_get_triggers(
+    database_id: int, session: SessionDep
+) -> Sequence[TriggerModel]:
+    statement = (
+        select(TriggerModel)
+        .where(TriggerModel.db_id == database_id, col(TriggerModel.is_active))
+        .order_by(col(TriggerModel.id))
+    )
+    return (await session.exec(statement)).all()
+
+
+@router.delete(
+    "/triggers/delete/{trigger_id}",
+    response_model=TriggerModel,
+    tags=["workflows"],
+)
+async def api_delete_trigger(trigger_id: int, session: SessionDep) -> TriggerModel:
+    trigger = await session.get(TriggerModel, trigger_id)
+    if trigger is None:
+        raise HTTPException(status_code=404, detail="Trigger not found")
+    trigger.is_active = False
+    trigger.updated_at = dt.now()
+    session.add(trigger)
+    await session.commit()
+    await session.refresh(trigger)
+    return trigger
+
+
+@router.post(
+    "/transition/{database_id}/{record_id}",
+    response_model=EventModel,
+    status_code=202,
+    tags=["workflows"],
+    summary="Queue a record's move to another workflow",
+    description="The move is applied by the workflow workers; the returned event's status says when it is done, or why it failed.",
+)
+async def api_transition_record(
+    database_id: int,
+    record_id: int,
+    transition: TransitionRequest,
+    session: SessionDep,
+    workflows: WorkflowsDep,
+) -> EventModel:
+    if await find_workflow(session, database_id, transition.workflow) is None:
+        raise HTTPException(status_code=404, detail="Workflow not found")
+    event = enqueue(
+        session,
+        database_id,
+        "transition",
+        [record_id],
+        {"workflow": transition.workflow},
+    )
+    await session.commit()
+    await session.refresh(event)
+    workflows.wake()
+    return event
+
+
+@router.get(
+    "/state/{database_id}/{record_id}",
+    response_model=WorkflowModel,
+    tags=["workflows"],
+    summary="The workflow a record is in",
+)
+async def api_get_record_workflow(
+    database_id: int, record_id: int, session: SessionDep
+) -> WorkflowModel:
+    statement = (
+        select(WorkflowModel)
+        .join(
+            RecordWorkflowModel,
+            col(RecordWorkflowModel.workflow_id) == col(WorkflowModel.id),
+        )
+        .where(
+            RecordWorkflowModel.db_id == database_id,
+            RecordWorkflowModel.record_id == record_id,
+        )
+    )
+    workflow = (await session.exec(statement)).first()
+    if workflow is None:
+        raise HTTPException(status_code=404, detail="Record is in no workflow")
+    return workflow
+
+
+@router.get(
+    "/events/{event_id}",
+    response_model=EventModel,
+    tags=["workflows"],
+)
+async def api_get_event(event_id: int, session: SessionDep) -> EventModel:
+    event = await session.get(EventModel, event_id)
+    if event is None:
+        raise HTTPException(status_code=404, detail="Event not found")
+    return event
+
+
+@router.get(
+    "/notifications",
+    response_model=list[NotificationModel],
+    tags=["workflows"],
+    summary="Toast notifications, newest first",
+)
+async def api_get_notifications(
+    session: SessionDep,
+    database_id: int | None = None,
+    unread: bool = False,
+    limit: int = 50,
+) -> Sequence[NotificationModel]:
+    statement = select(NotificationModel).where(NotificationModel.channel == "toast")
+    if database_id is not None:
+        statement = statement.where(NotificationModel.db_id == database_id)
+    if unread:
+        statement = statement.where(col(NotificationModel.read).is_(False))
+    statement = statement.order_by(col(NotificationModel.id).desc()).limit(limit)
+    return (await session.exec(statement)).all()
+
+
+@router.put(
+    "/notifications/read/{notification_id}",
+    response_model=NotificationModel,
+    tags=["workflows"],
+)
+async def api_read_notification(
+    notification_id: int, session: SessionDep
+) -> NotificationModel:
+    notification = await session.get(NotificationModel, notification_id)
+    if notification is None:
+        raise HTTPException(status_code=404, detail="Notification not found")
+    notification.read = True
+    session.add(notification)
+    await session.commit()
+    await session.refresh(notification)
+    return notification
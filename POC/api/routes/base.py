@@ -1,40 +1,61 @@
+import gzip
+import hashlib
+import re
+from functools import cache
+from typing import Any
 from fastui.events import GoToEvent
 from fastui import FastUI, prebuilt_html, components as c, AnyComponent
-from fastapi import APIRouter
-from fastapi.responses import HTMLResponse, RedirectResponse
-from starlette.routing import Route
+from fastapi import APIRouter, Request, Response
+from fastapi.responses import RedirectResponse
+from starlette.routing import Route, compile_path
 from POC.api.routes.forms.db_forms import router as form_db_router
 from POC.api.routes.forms.field_forms import router as form_field_router
 from POC.api.routes.forms.tag_forms import router as form_tag_router
+from POC.helpers.cache_helpers import not_modified
 
-all_routes = [
-    ("/databases" + route.path, route.name)
-    for route in form_db_router.routes
-    if isinstance(route, Route)
-    and route.methods is not None
-    and "GET" in route.methods
-    and "{" not in route.path
+FORM_ROUTERS = [
+    ("/forms/databases", form_db_router, "databases"),
+    ("/forms/fields", form_field_router, "fields"),
+    ("/forms/tags", form_tag_router, "tags"),
 ]
-all_routes.extend(
-    [
-        ("/fields" + route.path, route.name)
-        for route in form_field_router.routes
+# The landing page only changes with the FastUI release it loads.
+LANDING_MAX_AGE = 7 * 24 * 3600
+
+
+@cache
+def all_routes() -> list[tuple[str, str]]:
+    # The welcome page links every GET form without path parameters.
+    return [
+        (prefix.removeprefix("/forms") + route.path, route.name)
+        for prefix, form_router, _ in FORM_ROUTERS
+        for route in form_router.routes
         if isinstance(route, Route)
         and route.methods is not None
         and "GET" in route.methods
         and "{" not in route.path
     ]
-)
-all_routes.extend(
-    [
-        ("/tags" + route.path, route.name)
-        for route in form_tag_router.routes
+
+
+@cache
+def page_paths() -> list[re.Pattern[str]]:
+    # The client-side paths the landing page has pages for: every GET form,
+    # as the browser sees it.
+    routers = [(prefix, form_router) for prefix, form_router, _ in FORM_ROUTERS]
+    return [
+        compile_path((prefix + route.path).removeprefix("/forms"))[0]
+        for prefix, form_router in [*routers, ("", router)]
+        for route in form_router.routes
         if isinstance(route, Route)
+        and (prefix or route.path.startswith("/forms/"))
         and route.methods is not None
         and "GET" in route.methods
-        and "{" not in route.path
     ]
-)
+
+
+def is_page(path: str) -> bool:
+    return any(regex.match(path) for regex in page_paths())
+
+
 router = APIRouter()
 
 
@@ -65,7 +86,7 @@ async def welcome() -> list[AnyComponent]:
                         ),
                     ]
                 )
-                for route in all_routes
+                for route in all_routes()
             ]
         )
     ]
@@ -81,7 +102,59 @@ async def home_redirect() -> RedirectResponse:
     return RedirectResponse("/welcome", status_code=302)
 
 
+@cache
+def landing_page() -> tuple[bytes, bytes, str]:
+    # The page, gzipped once, and its ETag.
+    html = prebuilt_html(title="FastUI Demo", api_root_url="/forms").encode()
+    etag = f'"{hashlib.sha256(html).hexdigest()[:16]}"'
+    return html, gzip.compress(html, compresslevel=9), etag
+
+
+def accepts_gzip(request: Request) -> bool:
+    # A coding with q=0 is refused, and * stands for any not listed.
+    qualities: dict[str, float] = {}
+    for part in request.headers.get("accept-encoding", "").split(","):
+        coding, *params = part.split(";")
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.strip().lower()] = quality
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
+
+
 @router.get("/{path:path}")
-async def html_landing() -> HTMLResponse:
-    """Simple HTML page which serves the React app, comes last as it matches all paths."""
-    return HTMLResponse(prebuilt_html(title="FastUI Demo", api_root_url="/forms"))
+async def html_landing(request: Request, response: Response) -> Response:
+    """Simple HTML page which serves the React app, comes last as it matches all paths.
+
+    The same page for every path, so it is sent gzipped when the client takes
+    it. Only the paths the app has pages for are cached by the browser; any
+    other path is checked again each time.
+    """
+    html, compressed, etag = landing_page()
+    response.headers["Vary"] = "Accept-Encoding"
+    if is_page(request.url.path):
+        response.headers["Cache-Control"] = f"public, max-age={LANDING_MAX_AGE}"
+        if not_modified(request, response, etag):
+            return Response(status_code=304, headers=dict(response.headers))
+    else:
+        response.headers["Cache-Control"] = "no-cache"
+    if accepts_gzip(request):
+        response.headers["Content-Encoding"] = "gzip"
+        html = compressed
+    return Response(html, media_type="text/html", headers=dict(response.headers))
+
+
+def frontend_router(dependency_overrides_provider: Any = None) -> APIRouter:
+    """The forms and pages, with the catch-all HTML landing last."""
+    frontend = APIRouter(dependency_overrides_provider=dependency_overrides_provider)
+    for prefix, form_router, tag in FORM_ROUTERS:
+        frontend.include_router(
+            form_router, prefix=prefix, tags=[tag], include_in_schema=False
+        )
+    frontend.include_router(router, tags=["base"], include_in_schema=False)
+    return frontend
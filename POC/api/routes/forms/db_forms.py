@@ -2,20 +2,31 @@ from typing import Annotated
 from fastui import FastUI, components as c, AnyComponent
 from fastui.events import GoToEvent
 from fastui.forms import fastui_form
-from typing import Sequence
-from fastapi import APIRouter, HTTPException
-from sqlmodel import Session, select
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from sqlmodel import select
+from POC.api.routes.backend.generated_apis import DbRoutersDep
+from POC.db.database import DatabaseDep, SessionDep
 from POC.db.models.stock_models.db_models import (
     DbInfoForm,
     DbInfo,
     DbInfoModel,
-    db_engine,
     AddFieldForm,
     FieldInfoModel,
 )
+from POC.helpers.api_helpers import paginate
+from POC.helpers.cache_helpers import DbMetadata, get_db_metadata, not_modified
+from POC.helpers.form_helpers import (
+    FIELD_PAGE_SIZE,
+    json_response,
+    model_form,
+    paged_table,
+    render,
+)
 
 router = APIRouter()
 
+DB_PAGE_SIZE = 50
+
 
 @router.get(
     "/create",
@@ -40,9 +51,9 @@ async def create_new_database() -> list[AnyComponent]:
                             class_name="text-center",
                         ),
                         c.Markdown(text="---"),
-                        c.ModelForm(
+                        model_form(
+                            DbInfoForm,
                             loading=[c.Text(text="Submitting")],
-                            model=DbInfoForm,
                             submit_url="/forms/databases/create",
                         ),
                     ]
@@ -60,13 +71,13 @@ async def create_new_database() -> list[AnyComponent]:
 )
 async def submit_database_form(
     form: Annotated[DbInfoForm, fastui_form(DbInfoForm)],
+    session: SessionDep,
 ) -> list[AnyComponent]:
-    with Session(db_engine) as session:
-        valid_db = DbInfo(**form.model_dump())
-        db = DbInfoModel(**valid_db.model_dump())
-        session.add(db)
-        session.commit()
-        database_id = db.id  # Get the newly created database id
+    valid_db = DbInfo(**form.model_dump())
+    db = DbInfoModel(**valid_db.model_dump())
+    session.add(db)
+    await session.commit()
+    database_id = db.id  # Get the newly created database id
     return [
         c.Paragraph(text=f"Name: {db.name}"),
         c.Paragraph(text=f"Description: {db.description}"),
@@ -81,32 +92,19 @@ async def submit_database_form(
             class_name="text-center",
         ),
         c.Markdown(text="---"),
-        c.ModelForm(
+        model_form(
+            AddFieldForm,
             loading=[c.Text(text="Submitting")],
-            model=AddFieldForm,
             method="GET",
             submit_url=f"/forms/fields/create/{database_id}",
         ),
     ]
 
 
-@router.get(
-    "/read/{database_id}",
-    response_model=FastUI,
-    response_model_exclude_none=True,
-)
-async def display_database(database_id: int) -> list[AnyComponent]:
-    with Session(db_engine) as session:
-        statement = select(DbInfoModel).where(DbInfoModel.id == database_id)
-        db: DbInfoModel | None = session.exec(statement).first()
-        if db is None:
-            raise HTTPException(status_code=404, detail="Database not found")
-
-        display_db = DbInfo(**db.model_dump())
-        fields_statement = select(FieldInfoModel).where(
-            FieldInfoModel.db_id == database_id
-        )
-        db_fields = session.exec(fields_statement).all()
+def database_page(metadata: DbMetadata, page: int) -> list[AnyComponent]:
+    display_db = DbInfo(**metadata.db.model_dump())
+    start = (page - 1) * FIELD_PAGE_SIZE
+    db_fields = metadata.fields[start : start + FIELD_PAGE_SIZE]
 
     return [
         c.Page(
@@ -124,11 +122,11 @@ async def display_database(database_id: int) -> list[AnyComponent]:
                             class_name="text-center",
                         ),
                         c.Markdown(text="---"),
-                        c.ModelForm(
+                        model_form(
+                            DbInfo,
                             submit_url="/forms/databases/read",
                             display_mode="inline",
-                            initial=display_db.model_dump(mode="json"),  # mode="json"),
-                            model=DbInfo,
+                            initial=display_db.model_dump(mode="json"),
                         ),
                         c.Heading(
                             text=f"{display_db.display_name}: Fields",
@@ -141,9 +139,9 @@ async def display_database(database_id: int) -> list[AnyComponent]:
                             class_name="text-center",
                         ),
                         c.Markdown(text="---"),
-                        c.Table(data=db_fields)
-                        if db_fields
-                        else c.Text(text="No fields found"),
+                        *paged_table(
+                            db_fields, FieldInfoModel, page, len(metadata.fields)
+                        ),
                     ]
                 ),
             ]
@@ -152,34 +150,69 @@ async def display_database(database_id: int) -> list[AnyComponent]:
 
 
 @router.get(
-    "/read",
+    "/read/{database_id}",
     response_model=FastUI,
     response_model_exclude_none=True,
 )
-async def display_all_databases() -> list[AnyComponent]:
-    with Session(db_engine) as session:
-        # statement = select(DbInfo).where(DbInfo.status != "deleted")
-        statement = select(DbInfoModel)
-        dbs: Sequence[DbInfoModel] = session.exec(statement).all()
+async def display_database(
+    database_id: int,
+    request: Request,
+    response: Response,
+    session: SessionDep,
+    database: DatabaseDep,
+    page: int = Query(default=1, ge=1),
+) -> Response:
+    metadata = await get_db_metadata(session, database_id, database.metadata)
+    if metadata is None:
+        raise HTTPException(status_code=404, detail="Database not found")
+    if not_modified(request, response, metadata.etag):
+        return Response(status_code=304, headers=dict(response.headers))
 
-    return [
-        c.Page(
+    key = (database_id, metadata.etag, "database", page)
+    body = database.components.get(key)
+    if body is None:
+        body = render(database_page(metadata, page))
+        database.components.put(key, body)
+    return json_response(body, response)
+
+
+@router.get(
+    "/read",
+    response_model=FastUI,
+    response_model_exclude_none=True,
+)
+async def display_all_databases(
+    session: SessionDep, cursor: str | None = None
+) -> list[AnyComponent]:
+    page = await paginate(
+        session, DbInfoModel, [], fields="id,name", limit=DB_PAGE_SIZE, cursor=cursor
+    )
+    components: list[AnyComponent] = [
+        c.Div(
             components=[
-                c.Div(
-                    components=[
-                        c.Heading(
-                            text=" ",
-                        ),
-                        c.Button(
-                            text=db.name,
-                            on_click=GoToEvent(url=f"/databases/read/{db.id}"),
-                        ),
-                    ]
-                )
-                for db in dbs
+                c.Heading(
+                    text=" ",
+                ),
+                c.Button(
+                    text=db["name"],
+                    on_click=GoToEvent(url=f"/databases/read/{db['id']}"),
+                ),
             ]
         )
+        for db in page.items
     ]
+    if page.next_cursor is not None:
+        components.append(
+            c.Button(
+                text="Next Page",
+                named_style="secondary",
+                on_click=GoToEvent(
+                    url="/databases/read", query={"cursor": page.next_cursor}
+                ),
+            )
+        )
+
+    return [c.Page(components=components)]
 
 
 @router.get(
@@ -187,14 +220,15 @@ async def display_all_databases() -> list[AnyComponent]:
     response_model=FastUI,
     response_model_exclude_none=True,
 )
-async def get_update_database_form(database_id: int) -> list[AnyComponent]:
-    with Session(db_engine) as session:
-        statement = select(DbInfoModel).where(DbInfoModel.id == database_id)
-        db: DbInfoModel | None = session.exec(statement).first()
-        if db is None:
-            raise HTTPException(status_code=404, detail="Database not found")
-        if db is not None:
-            db_info: DbInfoForm = DbInfoForm(**db.model_dump())
+async def get_update_database_form(
+    database_id: int, session: SessionDep
+) -> list[AnyComponent]:
+    statement = select(DbInfoModel).where(DbInfoModel.id == database_id)
+    db: DbInfoModel | None = (await session.exec(statement)).first()
+    if db is None:
+        raise HTTPException(status_code=404, detail="Database not found")
+    if db is not None:
+        db_info: DbInfoForm = DbInfoForm(**db.model_dump())
 
     return [
         c.Page(
@@ -202,11 +236,11 @@ async def get_update_database_form(database_id: int) -> list[AnyComponent]:
                 c.Div(
                     components=[
                         c.Markdown(text="---"),
-                        c.ModelForm(
+                        model_form(
+                            DbInfoForm,
                             submit_url=f"/forms/databases/update/{database_id}",
                             initial=db_info.model_dump(),
                             loading=[c.Text(text="Submitting")],
-                            model=DbInfoForm,
                         ),
                     ]
                 ),
@@ -222,24 +256,31 @@ async def get_update_database_form(database_id: int) -> list[AnyComponent]:
     response_model_exclude_none=True,
 )
 async def submit_update_database_form(
-    database_id: int, form: Annotated[DbInfoForm, fastui_form(DbInfoForm)]
+    database_id: int,
+    form: Annotated[DbInfoForm, fastui_form(DbInfoForm)],
+    session: SessionDep,
+    database: DatabaseDep,
+    db_routers: DbRoutersDep,
 ) -> list[AnyComponent]:
     db_info = DbInfo(**form.model_dump())
-    with Session(db_engine) as session:
-        statement = select(DbInfoModel).where(DbInfoModel.id == database_id)
-        db: DbInfoModel | None = session.exec(statement).first()
-        if db is None:
-            raise HTTPException(status_code=404, detail="Database not found")
-
-        db.short_name = db_info.short_name
-        db.display_name = db_info.display_name
-        db.category = db_info.category
-        db.alias = db_info.alias
-        db.description = db_info.description
-        db.updated_at = db_info.updated_at
-        session.add(db)
-        session.commit()
-        session.refresh(db)
+    statement = select(DbInfoModel).where(DbInfoModel.id == database_id)
+    db: DbInfoModel | None = (await session.exec(statement)).first()
+    if db is None:
+        raise HTTPException(status_code=404, detail="Database not found")
+
+    db.short_name = db_info.short_name
+    db.display_name = db_info.display_name
+    db.category = db_info.category
+    db.alias = db_info.alias
+    db.description = db_info.description
+    db.updated_at = db_info.updated_at
+    session.add(db)
+    await session.commit()
+    database.metadata.invalidate(database_id)
+    if db_routers.path(database_id) is not None:
+        # Follow a new short name; mounting under the same one is a no-op.
+        db_routers.mount(database_id, db.short_name)
+    await session.refresh(db)
     return [
         c.Page(
             components=[
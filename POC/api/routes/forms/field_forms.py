@@ -1,17 +1,32 @@
 from typing import Annotated
 from fastui import FastUI, components as c, AnyComponent
+from fastui.events import GoToEvent
 from fastui.forms import fastui_form
-from fastapi import APIRouter
-from sqlmodel import Session, select
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from sqlmodel import col, func, select
 from datetime import datetime as dt
+from POC.api.routes.backend.field_apis import (
+    active_fields,
+    check_computed,
+    check_relationships,
+)
+from POC.db.database import DatabaseDep, SessionDep
 from POC.db.models.stock_models.db_models import (
     FieldInfoForm,
     FieldInfo,
     FieldInfoModel,
-    db_engine,
     AddFieldForm,
     DbInfoModel,
 )
+from POC.gen.compiler import normalize_data_type
+from POC.helpers.cache_helpers import get_db_metadata, not_modified
+from POC.helpers.form_helpers import (
+    FIELD_PAGE_SIZE,
+    json_response,
+    model_form,
+    paged_table,
+    render,
+)
 
 router = APIRouter()
 
@@ -23,9 +38,9 @@ router = APIRouter()
 )
 async def get_field_form(database_id: int) -> list[AnyComponent]:
     return [
-        c.ModelForm(
+        model_form(
+            FieldInfoForm,
             loading=[c.Text(text="Submitting")],
-            model=FieldInfoForm,
             submit_url=f"/forms/fields/create/{database_id}",
         ),
     ]
@@ -37,39 +52,62 @@ async def get_field_form(database_id: int) -> list[AnyComponent]:
     response_model_exclude_none=True,
 )
 async def submit_field_form(
-    field_form: Annotated[FieldInfoForm, fastui_form(FieldInfoForm)], database_id: int
+    field_form: Annotated[FieldInfoForm, fastui_form(FieldInfoForm)],
+    database_id: int,
+    session: SessionDep,
+    database: DatabaseDep,
 ) -> list[AnyComponent]:
-    with Session(db_engine) as session:
-        db_statement = select(DbInfoModel).where(DbInfoModel.id == database_id)
-        db = session.exec(db_statement).first()
-        if db is None:
-            raise ValueError("Database not found")
-        db.updated_at = dt.now()
-        session.add(db)
-        field_info = FieldInfo(**field_form.model_dump())
-        field_info.db_id = database_id
-        db_field = FieldInfoModel(**field_info.model_dump())
-        session.add(db_field)
-        session.commit()
-        session.refresh(db_field)
-    with Session(db_engine) as session:
-        field_statement = select(FieldInfoModel).where(
-            FieldInfoModel.db_id == database_id
-        )
-        db_fields = session.exec(field_statement).all()
-        display_db_fields = [FieldInfoForm(**field.model_dump()) for field in db_fields]
+    db_statement = select(DbInfoModel).where(DbInfoModel.id == database_id)
+    db = (await session.exec(db_statement)).first()
+    if db is None:
+        raise ValueError("Database not found")
+    field_info = FieldInfo(**field_form.model_dump())
+    field_info.db_id = database_id
+    db_field = FieldInfoModel(**field_info.model_dump())
+    # The same checks as the API, shown on the form instead of saving.
+    try:
+        normalize_data_type(db_field.data_type)
+    except ValueError as e:
+        return [c.Text(text=str(e))]
+    fields = [*await active_fields(session, database_id), db_field]
+    try:
+        check_computed(fields)
+        await check_relationships(session, database_id, fields)
+    except HTTPException as e:
+        return [c.Text(text=e.detail)]
+    db.updated_at = dt.now()
+    db.version += 1
+    session.add(db)
+    session.add(db_field)
+    await session.commit()
+    database.metadata.invalidate(database_id)
+    await session.refresh(db_field)
+
+    # The newest page of the database's fields, the new one last.
+    field_statement = (
+        select(FieldInfoModel)
+        .where(FieldInfoModel.db_id == database_id)
+        .order_by(col(FieldInfoModel.id).desc())
+        .limit(FIELD_PAGE_SIZE)
+    )
+    db_fields = (await session.exec(field_statement)).all()
+    display_db_fields = [
+        FieldInfoForm(**field.model_dump()) for field in reversed(db_fields)
+    ]
 
     return [
         c.Div(
             components=[
-                c.Table(data=display_db_fields)
-                if len(display_db_fields) > 0
-                else c.Text(text="No fields found"),
+                c.Table(data=display_db_fields),
+                c.Link(
+                    components=[c.Text(text="All fields")],
+                    on_click=GoToEvent(url=f"/fields/read/{database_id}"),
+                ),
             ]
         ),
-        c.ModelForm(
+        model_form(
+            AddFieldForm,
             loading=[c.Text(text="Submitting")],
-            model=AddFieldForm,
             method="GET",
             submit_url=f"/forms/fields/create/{database_id}",
         ),
@@ -81,19 +119,21 @@ async def submit_field_form(
     response_model=FastUI,
     response_model_exclude_none=True,
 )
-async def display_all_fields() -> list[AnyComponent]:
-    with Session(db_engine) as session:
-        field_statement = select(FieldInfoModel)
-        db_fields = session.exec(field_statement).all()
+async def display_all_fields(
+    session: SessionDep, page: int = Query(default=1, ge=1)
+) -> list[AnyComponent]:
+    count_statement = select(func.count()).select_from(FieldInfoModel)
+    total = (await session.exec(count_statement)).one()
+    field_statement = (
+        select(FieldInfoModel)
+        .order_by(col(FieldInfoModel.id))
+        .offset((page - 1) * FIELD_PAGE_SIZE)
+        .limit(FIELD_PAGE_SIZE)
+    )
+    db_fields = (await session.exec(field_statement)).all()
 
     return [
-        c.Div(
-            components=[
-                c.Table(data=db_fields)
-                if len(db_fields) > 0
-                else c.Text(text="No fields found"),
-            ]
-        ),
+        c.Div(components=paged_table(db_fields, FieldInfoModel, page, total)),
     ]
 
 
@@ -102,19 +142,28 @@ async def display_all_fields() -> list[AnyComponent]:
     response_model=FastUI,
     response_model_exclude_none=True,
 )
-async def display_database_fields(database_id: int) -> list[AnyComponent]:
-    with Session(db_engine) as session:
-        field_statement = select(FieldInfoModel).where(
-            FieldInfoModel.db_id == database_id
-        )
-        db_fields = session.exec(field_statement).all()
+async def display_database_fields(
+    database_id: int,
+    request: Request,
+    response: Response,
+    session: SessionDep,
+    database: DatabaseDep,
+    page: int = Query(default=1, ge=1),
+) -> list[AnyComponent] | Response:
+    metadata = await get_db_metadata(session, database_id, database.metadata)
+    if metadata is None:
+        return [c.Div(components=paged_table([], FieldInfoModel, page, 0))]
+    if not_modified(request, response, metadata.etag):
+        return Response(status_code=304, headers=dict(response.headers))
 
-    return [
-        c.Div(
-            components=[
-                c.Table(data=db_fields)
-                if len(db_fields) > 0
-                else c.Text(text="No fields found"),
-            ]
-        ),
-    ]
+    key = (database_id, metadata.etag, "fields", page)
+    body = database.components.get(key)
+    if body is None:
+        start = (page - 1) * FIELD_PAGE_SIZE
+        db_fields = metadata.fields[start : start + FIELD_PAGE_SIZE]
+        total = len(metadata.fields)
+        body = render(
+            [c.Div(components=paged_table(db_fields, FieldInfoModel, page, total))]
+        )
+        database.components.put(key, body)
+    return json_response(body, response)
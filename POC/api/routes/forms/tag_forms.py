@@ -1,35 +1,46 @@
 from __future__ import annotations as _annotations
 from typing import Annotated
-from fastapi import APIRouter
+from fastapi import APIRouter, Query
 from fastui import AnyComponent, FastUI
 from fastui import components as c
+from fastui.components.display import DisplayLookup
+from fastui.events import GoToEvent
 from fastui.forms import (
     SelectSearchResponse,
     fastui_form,
     SelectOption,
 )
-from sqlmodel import Session, select
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select
+from POC.db.database import DatabaseDep, SessionDep
 from POC.db.models.stock_models.db_models import (
+    DbInfoModel,
     TagsInfo,
-    db_engine,
     SelectTagForm,
     CreateTagsForm,
 )
+from POC.helpers.form_helpers import model_form
+from POC.helpers.tag_helpers import (
+    SEARCH_LIMIT,
+    get_tag_index,
+    resolve_tags,
+    tagged_db_filter,
+)
 
 router = APIRouter()
 
 
 @router.get("/search", response_model=SelectSearchResponse)
-async def search_view() -> SelectSearchResponse:
-    with Session(db_engine) as session:
-        statement = select(TagsInfo)
-        data = session.exec(statement).all()
-        """for tag in data:
-            tags[tag.tag_name].append({"value": tag.tag_name, "label": tag.tag_name})"""
-        tags: list[SelectOption] = [
-            SelectOption(value=tag.tag_name, label=tag.tag_name) for tag in data
-        ]
-        # options = [{"label": k, "options": v} for k, v in tags.items()]
+async def search_view(
+    session: SessionDep,
+    database: DatabaseDep,
+    q: str = "",
+    limit: int = Query(default=SEARCH_LIMIT, ge=1, le=100),
+) -> SelectSearchResponse:
+    index = await get_tag_index(session, database.tags)
+    tags: list[SelectOption] = [
+        SelectOption(value=name, label=name) for name in index.search(q, limit)
+    ]
 
     return SelectSearchResponse(options=tags)
 
@@ -44,8 +55,8 @@ def select_tags():
                     text="Form showing different ways of doing select.",
                     class_name="text-center",
                 ),
-                c.ModelForm(
-                    model=SelectTagForm,
+                model_form(
+                    SelectTagForm,
                     display_mode="page",
                     submit_url="/forms/tags/select",
                 ),
@@ -57,15 +68,32 @@ def select_tags():
 @router.post("/select", response_model=FastUI, response_model_exclude_none=True)
 async def submit_selected_tags(
     form: Annotated[SelectTagForm, fastui_form(SelectTagForm)],
+    session: SessionDep,
 ):
-    all_tags: list[TagsInfo] = []
-    for tag_name in form.tag_name:
-        with Session(db_engine) as session:
-            statement = select(TagsInfo).where(TagsInfo.tag_name == tag_name)
-            data = session.exec(statement).all()
-            all_tags.extend(data)
+    all_tags = await resolve_tags(session, form.tag_name)
+    if not all_tags:
+        return [c.Text(text="No matching tags")]
 
-    return [c.Table(data=all_tags)]
+    statement = select(DbInfoModel).where(
+        tagged_db_filter([tag.tag_name for tag in all_tags], "all")
+    )
+    databases = (await session.exec(statement)).all()
+    components: list[AnyComponent] = [c.Table(data=all_tags)]
+    if databases:
+        components += [
+            c.Heading(text="Databases with every selected tag", level=3),
+            c.Table(
+                data=databases,
+                columns=[
+                    DisplayLookup(
+                        field="name", on_click=GoToEvent(url="/databases/read/{id}")
+                    ),
+                    DisplayLookup(field="category"),
+                    DisplayLookup(field="status"),
+                ],
+            ),
+        ]
+    return components
 
 
 @router.get("/create", response_model=FastUI, response_model_exclude_none=True)
@@ -73,8 +101,8 @@ def create_new_tag():
     return [
         c.Page(
             components=[
-                c.ModelForm(
-                    model=CreateTagsForm,
+                model_form(
+                    CreateTagsForm,
                     display_mode="page",
                     submit_url="/forms/tags/create",
                 ),
@@ -84,16 +112,23 @@ def create_new_tag():
 
 
 @router.post("/create", response_model=FastUI, response_model_exclude_none=True)
-def submit_new_tag(
+async def submit_new_tag(
     form: Annotated[CreateTagsForm, fastui_form(CreateTagsForm)],
+    session: SessionDep,
+    database: DatabaseDep,
 ) -> list[AnyComponent]:
-    with Session(db_engine) as session:
-        db = TagsInfo(**form.model_dump())
-        session.add(db)
-        session.commit()
-        session.refresh(db)
-    with Session(db_engine) as session:
-        statement = select(TagsInfo)
-        data = session.exec(statement).all()
+    db = TagsInfo(**form.model_dump())
+    session.add(db)
+    try:
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        return [c.Text(text=f"Tag {form.tag_name} already exists")]
+    await session.refresh(db)
+    if database.tags.loaded:
+        database.tags.add(db.tag_name)
+
+    statement = select(TagsInfo)
+    data = (await session.exec(statement)).all()
 
     return [c.Text(text="Tag created successfully"), c.Table(data=data)]
@@ -0,0 +1,105 @@
+"""Throughput of the database endpoints as the number of in-flight requests grows.
+
+Alongside requests per second it reports the worst event loop stall seen by a
+1 ms heartbeat task, which is what the blocking path costs every other request
+sharing the worker. Compares the async session layer used by the routers
+against the old blocking path (a synchronous ``Session`` opened inside an
+``async def`` handler) on a scratch SQLite file, so the real database is never
+touched.
+
+    python -m POC.benchmarks.bench_async_sessions
+"""
+
+import asyncio
+import time
+import httpx
+from fastapi import FastAPI
+from sqlmodel import Session, create_engine, select
+from POC.api.main import app
+from POC.benchmarks.common import scratch_app
+from POC.db.models.stock_models.db_models import DbInfo, DbInfoForm, DbInfoModel
+
+CONCURRENCY = [1, 4, 16, 64]
+REQUESTS = 512
+READ_RATIO = 0.75
+
+NEW_DB = DbInfoForm(
+    name="Bench",
+    short_name="BENCH",
+    display_name="Bench Database",
+    category="Bench",
+    alias="Bench",
+    description="Benchmark database",
+).model_dump()
+
+
+def build_blocking_app(sync_url: str) -> FastAPI:
+    engine = create_engine(sync_url)
+    blocking_app = FastAPI()
+
+    @blocking_app.post("/api/databases/create")
+    async def create(new_db: DbInfoForm) -> DbInfoModel:
+        with Session(engine) as session:
+            db = DbInfoModel(**DbInfo(**new_db.model_dump()).model_dump())
+            session.add(db)
+            session.commit()
+            session.refresh(db)
+        return db
+
+    @blocking_app.get("/api/databases/read/{database_id}")
+    async def read(database_id: int) -> DbInfoModel | None:
+        with Session(engine) as session:
+            statement = select(DbInfoModel).where(DbInfoModel.id == database_id)
+            return session.exec(statement).first()
+
+    return blocking_app
+
+
+async def heartbeat(wakes: list[float]) -> None:
+    while True:
+        await asyncio.sleep(0.001)
+        wakes.append(time.perf_counter())
+
+
+async def run(target: FastAPI, concurrency: int) -> tuple[float, float]:
+    limit = asyncio.Semaphore(concurrency)
+    wakes: list[float] = []
+    transport = httpx.ASGITransport(app=target)  # type: ignore[arg-type]
+    async with httpx.AsyncClient(transport=transport, base_url="http://b") as client:
+
+        async def one(i: int) -> None:
+            async with limit:
+                if i % int(1 / (1 - READ_RATIO)) == 0:
+                    await client.post("/api/databases/create", json=NEW_DB)
+                else:
+                    await client.get(f"/api/databases/read/{i % 50 + 1}")
+
+        monitor = asyncio.create_task(heartbeat(wakes))
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(REQUESTS)))
+        end = time.perf_counter()
+        monitor.cancel()
+        ticks = [start, *wakes, end]
+        stall = max(b - a for a, b in zip(ticks, ticks[1:])) - 0.001
+        return REQUESTS / (end - start), max(stall, 0.0) * 1000
+
+
+async def main() -> None:
+    async with scratch_app() as (_, path, _):
+        blocking_app = build_blocking_app(f"sqlite:///{path}")
+        print(f"{REQUESTS} requests, {READ_RATIO:.0%} reads")
+        print(
+            f"{'in-flight':>10} {'blocking req/s':>15} {'stall ms':>9}"
+            f" {'async req/s':>12} {'stall ms':>9}"
+        )
+        for concurrency in CONCURRENCY:
+            blocking, blocking_stall = await run(blocking_app, concurrency)
+            non_blocking, stall = await run(app, concurrency)
+            print(
+                f"{concurrency:>10} {blocking:>15.0f} {blocking_stall:>9.1f}"
+                f" {non_blocking:>12.0f} {stall:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,76 @@
+"""Rows per second through ``POST /api/databases/{id}/records/bulk``.
+
+Streams generated NDJSON and CSV bodies at a few chunk sizes into a scratch
+database, with 1% of rows invalid so the error path is exercised too.
+
+    python -m POC.benchmarks.bench_bulk_ingest [rows]
+"""
+
+import asyncio
+import json
+import sys
+import time
+from typing import AsyncIterator
+from POC.benchmarks.common import create_database, scratch_app
+
+ROWS = 100_000
+CHUNK_SIZES = [100, 1000, 5000]
+FIELDS = [
+    ("name", "str", True),
+    ("quantity", "int", True),
+    ("price", "float", False),
+    ("active", "bool", False),
+    ("ordered_on", "date", False),
+]
+
+
+def make_row(i: int) -> dict:
+    return {
+        "name": f"item {i}",
+        "quantity": "bad" if i % 100 == 99 else i,
+        "price": i * 0.5,
+        "active": i % 2 == 0,
+        "ordered_on": f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}",
+    }
+
+
+async def ndjson_body(rows: int) -> AsyncIterator[bytes]:
+    for start in range(0, rows, 1000):
+        stop = min(start + 1000, rows)
+        lines = (json.dumps(make_row(i)) for i in range(start, stop))
+        yield ("\n".join(lines) + "\n").encode()
+
+
+async def csv_body(rows: int) -> AsyncIterator[bytes]:
+    yield (",".join(name for name, _, _ in FIELDS) + "\n").encode()
+    for start in range(0, rows, 1000):
+        stop = min(start + 1000, rows)
+        lines = (
+            ",".join(str(v) for v in make_row(i).values()) for i in range(start, stop)
+        )
+        yield ("\n".join(lines) + "\n").encode()
+
+
+async def main(rows: int) -> None:
+    print(f"{rows} rows, {len(FIELDS)} fields")
+    print(f"{'format':>7} {'chunk':>6} {'rows/s':>9} {'inserted':>9} {'failed':>7}")
+    for data_format, body in (("ndjson", ndjson_body), ("csv", csv_body)):
+        for chunk_size in CHUNK_SIZES:
+            async with scratch_app() as (client, _, _):
+                db_id = await create_database(client, FIELDS)
+                start = time.perf_counter()
+                response = await client.post(
+                    f"/api/databases/{db_id}/records/bulk",
+                    params={"format": data_format, "chunk_size": chunk_size},
+                    content=body(rows),
+                )
+                elapsed = time.perf_counter() - start
+                result = response.json()
+                print(
+                    f"{data_format:>7} {chunk_size:>6} {rows / elapsed:>9.0f}"
+                    f" {result['rows_inserted']:>9} {result['rows_failed']:>7}"
+                )
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else ROWS))
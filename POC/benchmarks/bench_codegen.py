@@ -0,0 +1,153 @@
+"""Generated record models against compiling them at runtime.
+
+Renders the models of many databases, then measures:
+
+- render/regen: writing both modules, and rewriting them after one
+  database's schema changed;
+- cold start: in a fresh process, the imports plus the first build of one
+  database, by ``compile_db`` or from the generated module;
+- first request: a record request to a database the process has not
+  compiled yet, through the API, with and without generated models.
+
+    python -m POC.benchmarks.bench_codegen [databases]
+"""
+
+import asyncio
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import httpx
+from sqlmodel import select
+from POC.benchmarks.common import create_database, scratch_app
+from POC.db.models.stock_models.db_models import FieldInfo, SchemaVersionModel
+from POC.gen import codegen
+from POC.gen.codegen import DB_MODELS_FILE, write_model_files
+from POC.db.database import Database
+from POC.gen.compiler import compile_db
+from POC.gen.migrate import field_specs
+
+DATABASES = 1000
+FIELDS = 12
+RUNS = 200
+DATA_TYPES = ["str", "int", "float", "bool", "date", "datetime", "json", "str"]
+
+COLD_START = """
+import sys, time
+from pathlib import Path
+start = time.perf_counter()
+from POC.db.models.stock_models.db_models import SchemaVersionModel
+from POC.gen import codegen
+from POC.gen.migrate import compile_version
+imported = time.perf_counter()
+codegen.GENERATED_DIR = Path(sys.argv[1])
+schema = SchemaVersionModel.model_validate_json(sys.argv[2])
+first = time.perf_counter()
+if sys.argv[3] == "generated":
+    compiled = codegen.load_generated(schema)
+    assert compiled is not None
+else:
+    compiled = compile_version(schema.db_id, schema.version, schema.fields)
+compiled.validate_many([{}])
+print(imported - start, time.perf_counter() - first)
+"""
+
+
+def synthetic_schema(db_id: int, version: int = 1) -> SchemaVersionModel:
+    fields = [
+        FieldInfo(
+            id=db_id * FIELDS + i,
+            name=f"field {i}",
+            data_type=DATA_TYPES[(db_id + i) % len(DATA_TYPES)],
+            required=False,
+            default="",
+            indexed=i == 0,
+        )
+        for i in range(FIELDS)
+    ]
+    compiled = compile_db(db_id, version, fields)
+    return SchemaVersionModel(
+        db_id=db_id, version=version, fields=field_specs(compiled, fields)
+    )
+
+
+def cold_start(directory: Path, schema: SchemaVersionModel, mode: str) -> list[float]:
+    runs = []
+    for _ in range(3):
+        output = subprocess.run(
+            [sys.executable, "-c", COLD_START, str(directory)]
+            + [schema.model_dump_json(), mode],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        # The last line; the engine logs its start-up DDL before it.
+        runs.append([float(value) for value in output.splitlines()[-1].split()])
+    # Best of three, for the imports and for the first build.
+    return [min(run[i] for run in runs) * 1e3 for i in range(2)]
+
+
+async def first_request_ms(
+    client: httpx.AsyncClient, database: Database, db_id: int
+) -> float:
+    total = 0.0
+    for _ in range(RUNS):
+        database.compiled.clear()
+        start = time.perf_counter()
+        await client.post(f"/api/databases/{db_id}/records/bulk", content=b"")
+        total += time.perf_counter() - start
+    return total / RUNS * 1e3
+
+
+async def main(n: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        async with scratch_app() as (client, _, database):
+            fields = [
+                (f"field {i}", DATA_TYPES[i % len(DATA_TYPES)], False)
+                for i in range(FIELDS)
+            ]
+            db_id = await create_database(client, fields)
+            await client.post(f"/api/databases/generate/{db_id}")
+            async with database.session() as session:
+                real = (await session.exec(select(SchemaVersionModel))).one()
+            schemas = [synthetic_schema(i) for i in range(db_id + 1, db_id + n)]
+            schemas.append(real)
+
+            start = time.perf_counter()
+            write_model_files(schemas, directory)
+            render = time.perf_counter() - start
+            size = (directory / DB_MODELS_FILE).stat().st_size
+            schemas[n // 2] = synthetic_schema(schemas[n // 2].db_id, version=2)
+            start = time.perf_counter()
+            result = write_model_files(schemas, directory)
+            regen = time.perf_counter() - start
+            assert result.rendered == [schemas[n // 2].db_id]
+            print(f"{n} databases x {FIELDS} fields, {size / 1e6:.1f} MB of models")
+            print(f"render all {render:.2f}s, regen after one change {regen:.2f}s")
+
+            print(f"{'cold start':>10} {'imports ms':>11} {'first build ms':>15}")
+            for mode in ("compiled", "generated"):
+                imports, first = cold_start(directory, real, mode)
+                print(f"{mode:>10} {imports:>11.1f} {first:>15.1f}")
+
+            codegen.GENERATED_DIR = directory
+            start = time.perf_counter()
+            codegen.generated_module()
+            imported = (time.perf_counter() - start) * 1e3
+            print(f"generated module import, in process: {imported:.1f} ms")
+
+            generated = await first_request_ms(client, database, db_id)
+            codegen.reload_generated()
+            write_model_files([], directory)
+            compiled = await first_request_ms(client, database, db_id)
+            codegen.reload_generated()
+            print(
+                f"first record request: compiled {compiled:.2f} ms,"
+                f" generated {generated:.2f} ms"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else DATABASES))
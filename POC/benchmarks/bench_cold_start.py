@@ -0,0 +1,75 @@
+"""Import-to-first-response time of a fresh worker.
+
+Each run is a new process pointed at a throwaway SQLite file, which
+imports the app, starts it (the engine and the tables), and serves one
+request: an API read, or the first FastUI page, which also imports the
+forms. "api only" is the app with the frontend turned off.
+
+    python -m POC.benchmarks.bench_cold_start
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+RUNS = 5
+
+COLD_START = """
+import sys, time
+start = time.perf_counter()
+from fastapi.testclient import TestClient
+from POC.api.main import app
+imported = time.perf_counter()
+with TestClient(app) as client:
+    started = time.perf_counter()
+    assert client.get(sys.argv[1]).status_code == 200
+    responded = time.perf_counter()
+print(imported - start, started - imported, responded - started)
+"""
+
+CASES = [
+    ("api", "true", "/api/databases/read"),
+    ("forms", "true", "/forms/welcome"),
+    ("api only", "false", "/api/databases/read"),
+]
+
+
+def cold_start(directory: Path, frontend: str, url: str) -> list[float]:
+    runs = []
+    for i in range(RUNS):
+        env = {
+            **os.environ,
+            "DYNAMIC_DB_DATABASE_URL": f"sqlite:///{directory / f'{i}.sqlite3'}",
+            "DYNAMIC_DB_FRONTEND": frontend,
+        }
+        output = subprocess.run(
+            [sys.executable, "-c", COLD_START, url],
+            capture_output=True,
+            text=True,
+            check=True,
+            env=env,
+        ).stdout
+        runs.append([float(value) for value in output.split()])
+    # Best of the runs, for each phase.
+    return [min(run[i] for run in runs) * 1e3 for i in range(3)]
+
+
+def main() -> None:
+    print(
+        f"{'first request':>13} {'import ms':>10} {'startup ms':>11}"
+        f" {'response ms':>12} {'total ms':>9}"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, frontend, url in CASES:
+            imported, started, responded = cold_start(Path(tmp), frontend, url)
+            total = imported + started + responded
+            print(
+                f"{name:>13} {imported:>10.1f} {started:>11.1f}"
+                f" {responded:>12.1f} {total:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Compile time of a user database versus its number of fields.
+
+Reports a cold ``compile_db`` (table plus pydantic validator) next to a warm
+``CompiledDbCache`` lookup, which is what the record hot path pays.
+
+    python -m POC.benchmarks.bench_compiler
+"""
+
+import timeit
+from POC.db.models.stock_models.db_models import FieldInfo
+from POC.gen.compiler import COLUMN_TYPES, CompiledDbCache, compile_db
+
+FIELD_COUNTS = [1, 10, 50, 100, 500, 1000]
+
+
+def make_fields(n: int) -> list[FieldInfo]:
+    data_types = list(COLUMN_TYPES)
+    return [
+        FieldInfo(
+            name=f"field {i}",
+            data_type=data_types[i % len(data_types)],
+            required=i % 2 == 0,
+            default="",
+        )
+        for i in range(n)
+    ]
+
+
+def main() -> None:
+    cache = CompiledDbCache()
+    print(f"{'fields':>7} {'compile ms':>11} {'cached us':>10}")
+    for n in FIELD_COUNTS:
+        fields = make_fields(n)
+        runs = max(3, 300 // n)
+        compile_s = timeit.timeit(lambda: compile_db(1, n, fields), number=runs)
+        cache.put(compile_db(1, n, fields))
+        cached_s = timeit.timeit(lambda: cache.get(1, n), number=100_000)
+        print(
+            f"{n:>7} {compile_s / runs * 1e3:>11.2f} {cached_s / 100_000 * 1e6:>10.3f}"
+        )
+    print(cache.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Computed fields: NumPy over whole columns versus row-by-row Python.
+
+The fields are those of model_creation.km, ``Comp 1 = Field 1 plus Field 2``
+and ``Comp 2 = Comp 1 times Field 3``, plus a stored ``Root = sqrt(Comp 2)``
+that SQLite cannot generate. Each row count is computed one row at a time,
+as a single-record write does, and one batch at a time, as bulk ingest and
+recomputation do. Then the stored column of a table is recomputed in
+batches, next to reading the generated ones back.
+
+    python -m POC.benchmarks.bench_computed
+"""
+
+import random
+import time
+import timeit
+from sqlalchemy import create_engine, func, insert, select
+from POC.db.models.stock_models.db_models import FieldInfo
+from POC.gen.compiler import compile_db, compute_columns, compute_row
+from POC.gen.migrate import recompute
+
+ROW_COUNTS = [100, 1_000, 10_000, 100_000]
+TABLE_ROWS = 200_000
+
+
+def make_fields() -> list[FieldInfo]:
+    fields = [
+        FieldInfo(
+            id=i, name=f"Field {i}", data_type="float", required=False, default=""
+        )
+        for i in (1, 2, 3)
+    ]
+    for i, (name, expression) in enumerate(
+        (
+            ("Comp 1", "Field 1 Plus Field 2"),
+            ("Comp 2", "Comp 1 Times Field 3"),
+            ("Root", "sqrt(Comp 2)"),
+        ),
+        4,
+    ):
+        fields.append(
+            FieldInfo(
+                id=i,
+                name=name,
+                data_type="float",
+                required=False,
+                default="",
+                expression=expression,
+            )
+        )
+    return fields
+
+
+def make_rows(n: int) -> list[dict[str, float | None]]:
+    rng = random.Random(n)
+    return [
+        {
+            f"Field {i}": None if rng.random() < 0.01 else rng.uniform(0, 100)
+            for i in (1, 2, 3)
+        }
+        for _ in range(n)
+    ]
+
+
+def main() -> None:
+    compiled = compile_db(1, 1, make_fields())
+    inputs = ["Field 1", "Field 2", "Field 3"]
+    print(f"{'rows':>8} {'row by row ms':>14} {'numpy ms':>9} {'speedup':>8}")
+    for n in ROW_COUNTS:
+        rows = make_rows(n)
+        runs = max(3, 100_000 // n)
+        by_row = timeit.timeit(
+            lambda: [compute_row(compiled.computed, dict(row)) for row in rows],
+            number=runs,
+        )
+        batched = timeit.timeit(
+            lambda: compute_columns(
+                compiled.computed,
+                {name: [row[name] for row in rows] for name in inputs},
+                n,
+            ),
+            number=runs,
+        )
+        print(
+            f"{n:>8} {by_row / runs * 1e3:>14.2f} {batched / runs * 1e3:>9.2f}"
+            f" {by_row / batched:>7.1f}x"
+        )
+
+    engine = create_engine("sqlite://")
+    compiled.table.create(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(compiled.table), make_rows(TABLE_ROWS))
+        start = time.perf_counter()
+        recompute(connection, compiled, ["Root"])
+        recomputed = time.perf_counter() - start
+        start = time.perf_counter()
+        connection.execute(select(func.sum(compiled.table.c["Comp 2"]))).scalar()
+        generated = time.perf_counter() - start
+    print(
+        f"\n{TABLE_ROWS} rows: recompute Root {recomputed * 1e3:.0f} ms,"
+        f" sum of generated Comp 2 {generated * 1e3:.0f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Latency of the FastUI pages of a database with 5000 fields.
+
+Each page is timed four ways: "reload" drops the database's metadata first,
+as a change to it does; "render" only drops the rendered pages; "cached"
+is served from the database's ``components`` cache; and "304" sends the ETag back and gets
+no body. The pages of every field in the system are read with SQL each
+time. The landing page is timed with and without gzip.
+
+The fields are written straight to the SQLite file, as posting them one
+at a time would take minutes.
+
+    python -m POC.benchmarks.bench_frontend [fields]
+"""
+
+import asyncio
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import Callable
+import httpx
+from POC.benchmarks.common import create_database, scratch_app
+
+FIELDS = 5000
+RUNS = 50
+
+
+def add_fields(path: Path, n: int) -> None:
+    # Copies of the database's first field under other names.
+    with sqlite3.connect(path) as connection:
+        columns = [
+            f'"{row[1]}"'
+            for row in connection.execute("PRAGMA table_info(fieldinfomodel)")
+            if row[1] != "id"
+        ]
+        first = connection.execute(
+            f"SELECT {', '.join(columns)} FROM fieldinfomodel"
+        ).fetchone()
+        name = columns.index('"name"')
+        connection.executemany(
+            f"INSERT INTO fieldinfomodel ({', '.join(columns)})"
+            f" VALUES ({', '.join('?' * len(columns))})",
+            (first[:name] + (f"field {i}",) + first[name + 1 :] for i in range(1, n)),
+        )
+
+
+async def timed_ms(
+    client: httpx.AsyncClient,
+    url: str,
+    headers: dict[str, str],
+    before: Callable[[], None] = lambda: None,
+) -> tuple[float, int]:
+    size = 0
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        before()
+        size = (await client.get(url, headers=headers)).num_bytes_downloaded
+    return (time.perf_counter() - start) / RUNS * 1e3, size
+
+
+async def main(n: int) -> None:
+    async with scratch_app() as (client, path, database):
+        db_id = await create_database(client, [("field 0", "str", False)])
+        add_fields(path, n)
+        database.metadata.invalidate(db_id)
+        print(f"{n} fields, mean of {RUNS} requests")
+        print(
+            f"{'page':>32} {'bytes':>8} {'reload ms':>10} {'render ms':>10}"
+            f" {'cached ms':>10} {'304 ms':>8}"
+        )
+        for url in (f"/forms/databases/read/{db_id}", f"/forms/fields/read/{db_id}"):
+            etag = (await client.get(url)).headers["etag"]
+            reload, size = await timed_ms(
+                client, url, {}, lambda: database.metadata.invalidate(db_id)
+            )
+            render, _ = await timed_ms(client, url, {}, database.components.clear)
+            cached, _ = await timed_ms(client, url, {})
+            not_modified, _ = await timed_ms(client, url, {"If-None-Match": etag})
+            print(
+                f"{url:>32} {size:>8} {reload:>10.2f} {render:>10.2f}"
+                f" {cached:>10.2f} {not_modified:>8.2f}"
+            )
+        url = "/forms/fields/read?page=50"
+        ms, size = await timed_ms(client, url, {})
+        print(f"{url:>32} {size:>8} {'':>10} {ms:>10.2f}")
+        print(database.components.stats())
+
+        print(f"{'landing':>32} {'bytes':>8} {'ms':>10}")
+        for encoding in ("identity", "gzip"):
+            ms, size = await timed_ms(
+                client, "/databases/read", {"Accept-Encoding": encoding}
+            )
+            print(f"{encoding:>32} {size:>8} {ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else FIELDS))
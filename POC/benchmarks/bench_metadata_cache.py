@@ -0,0 +1,52 @@
+"""Request latency of the metadata reads with and without the cache.
+
+"uncached" invalidates the entry before every request, which is what each
+request paid before the cache; "304" sends the ETag back and gets no body.
+
+    python -m POC.benchmarks.bench_metadata_cache [fields]
+"""
+
+import asyncio
+import sys
+import time
+import httpx
+from POC.benchmarks.common import create_database, scratch_app
+from POC.db.database import Database
+
+FIELDS = 50
+RUNS = 500
+
+
+async def timed_ms(
+    client: httpx.AsyncClient,
+    url: str,
+    headers: dict[str, str],
+    database: Database,
+    invalidate: int | None,
+) -> float:
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        if invalidate is not None:
+            database.metadata.invalidate(invalidate)
+        await client.get(url, headers=headers)
+    return (time.perf_counter() - start) / RUNS * 1e3
+
+
+async def main(n: int) -> None:
+    async with scratch_app() as (client, _, database):
+        fields = [(f"field {i}", "str", False) for i in range(n)]
+        db_id = await create_database(client, fields)
+        print(f"{'endpoint':>28} {'uncached ms':>12} {'cached ms':>10} {'304 ms':>8}")
+        for url in (f"/api/databases/read/{db_id}", f"/api/fields/read/{db_id}"):
+            etag = (await client.get(url)).headers["etag"]
+            uncached = await timed_ms(client, url, {}, database, db_id)
+            cached = await timed_ms(client, url, {}, database, None)
+            not_modified = await timed_ms(
+                client, url, {"If-None-Match": etag}, database, None
+            )
+            print(f"{url:>28} {uncached:>12.3f} {cached:>10.3f} {not_modified:>8.3f}")
+        print(database.metadata.stats())
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else FIELDS))
@@ -0,0 +1,131 @@
+"""Copy-and-swap migration throughput, and what writers see meanwhile.
+
+Retypes one column of a multi-million-row table at a few batch sizes while
+a client keeps posting small bulk inserts through the API, and reports the
+worst insert latency. One value in a hundred does not convert and is
+quarantined. The field is retyped in the catalogue directly, so the run is
+timed here rather than started by the field update. "one shot" is the same
+rewrite as a single ``INSERT ... SELECT`` with a CAST, i.e. how long a
+non-batched migration holds the lock.
+
+    python -m POC.benchmarks.bench_migration [rows]
+"""
+
+import asyncio
+import sqlite3
+import sys
+import time
+from pathlib import Path
+import httpx
+from POC.benchmarks.common import create_database, scratch_app
+from POC.gen.compiler import record_table_name
+from POC.gen.migrate import run_migration
+
+ROWS = 2_000_000
+BATCH_SIZES = [1000, 5000, 20000]
+FIELDS = [("name", "str", False), ("quantity", "str", False), ("price", "str", False)]
+WRITE_BODY = b"".join(
+    b'{"name": "live", "quantity": "%d", "price": "1.5"}\n' % i for i in range(10)
+)
+
+
+def fill(path: Path, db_id: int, rows: int) -> None:
+    with sqlite3.connect(path) as connection:
+        connection.executemany(
+            f"INSERT INTO {record_table_name(db_id)} (name, quantity, price)"
+            " VALUES (?, ?, ?)",
+            (
+                (f"item {i}", "n/a" if i % 100 == 0 else str(i), str(i * 0.5))
+                for i in range(rows)
+            ),
+        )
+
+
+def retype(path: Path, db_id: int, field_id: int, data_type: str) -> None:
+    with sqlite3.connect(path) as connection:
+        connection.execute(
+            "UPDATE fieldinfomodel SET data_type = ? WHERE id = ?",
+            (data_type, field_id),
+        )
+        connection.execute(
+            "UPDATE dbinfomodel SET version = version + 1 WHERE id = ?", (db_id,)
+        )
+
+
+def one_shot(path: Path, db_id: int) -> float:
+    table = record_table_name(db_id)
+    with sqlite3.connect(path) as connection:
+        connection.execute(
+            "CREATE TABLE one_shot (id INTEGER PRIMARY KEY, name VARCHAR,"
+            " quantity INTEGER, price VARCHAR)"
+        )
+        start = time.perf_counter()
+        connection.execute(
+            "INSERT INTO one_shot SELECT id, name, CAST(quantity AS INTEGER), price"
+            f" FROM {table}"
+        )
+        return time.perf_counter() - start
+
+
+async def writer(
+    client: httpx.AsyncClient, db_id: int, stop: asyncio.Event
+) -> list[float]:
+    latencies = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.post(
+            f"/api/databases/{db_id}/records/bulk",
+            content=WRITE_BODY,
+            headers={"content-type": "application/x-ndjson"},
+        )
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.01)
+    return latencies
+
+
+async def run(rows: int, batch_size: int) -> None:
+    async with scratch_app() as (client, path, database):
+        db_id = await create_database(client, FIELDS)
+        await client.post(f"/api/databases/generate/{db_id}")
+        fill(path, db_id, rows)
+        fields = (await client.get(f"/api/fields/read/{db_id}")).json()["items"]
+        quantity = next(f for f in fields if f["name"] == "quantity")
+        retype(path, db_id, quantity["id"], "int")
+        # Plans the copy-and-swap; records keep the old schema until the swap.
+        await client.post(f"/api/databases/{db_id}/records/bulk", content=b"")
+
+        stop = asyncio.Event()
+        writes = asyncio.create_task(writer(client, db_id, stop))
+        start = time.perf_counter()
+        await run_migration(database, db_id, batch_size)
+        elapsed = time.perf_counter() - start
+        stop.set()
+        latencies = sorted(await writes)
+
+        migration = (await client.get(f"/api/databases/migrations/{db_id}")).json()[-1]
+        p50 = latencies[len(latencies) // 2] * 1e3
+        done = migration["copied_rows"] + migration["quarantined_rows"]
+        print(
+            f"{batch_size:>7} {elapsed:>8.1f} {done / elapsed:>10.0f}"
+            f" {migration['quarantined_rows']:>11}"
+            f" {len(latencies):>7} {p50:>8.1f} {latencies[-1] * 1e3:>9.1f}"
+            f" {migration['status']:>8}"
+        )
+        if batch_size == BATCH_SIZES[-1]:
+            print(
+                f"one shot: the same rewrite holds the lock {one_shot(path, db_id):.1f}s"
+            )
+
+
+async def main(rows: int) -> None:
+    print(f"{rows} rows, retyping one of {len(FIELDS)} columns")
+    print(
+        f"{'batch':>7} {'secs':>8} {'rows/s':>10} {'quarantined':>11} {'writes':>7}"
+        f" {'p50 ms':>8} {'max ms':>9} {'status':>8}"
+    )
+    for batch_size in BATCH_SIZES:
+        await run(rows, batch_size)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else ROWS))
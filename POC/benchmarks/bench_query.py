@@ -0,0 +1,128 @@
+"""Record queries: statements cached by shape against building them each time.
+
+A few query shapes run against a generated database with varying values.
+Each is timed three ways: from the shape cache, which is what
+``POST /records/query`` does; built on every call and compiled through
+SQLAlchemy's compiled cache; and built and compiled from scratch on every
+call, with the compiled cache turned off. Prints the median time per query
+and the shape cache's stats.
+
+    python -m POC.benchmarks.bench_query [rows]
+"""
+
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+from typing import Any
+from sqlalchemy.ext.asyncio import AsyncConnection
+from POC.benchmarks.common import create_database, scratch_app
+from POC.db.models.stock_models.db_models import RecordQuery
+from POC.gen.compiler import CompiledDb
+from POC.gen.query import (
+    QueryCache,
+    build_query,
+    compile_query,
+    query_params,
+    query_shape,
+)
+from POC.helpers.db_helpers import generate_db
+
+ROWS = 10_000
+REPEATS = 2_000
+FIELDS = [
+    ("Name", "str", False),
+    ("Price", "float", False),
+    ("Stock", "int", False),
+    ("Category", "str", False),
+]
+CATEGORIES = ["tools", "garden", "kitchen", "toys"]
+
+
+def shapes(rng: random.Random) -> dict[str, dict[str, Any]]:
+    low = rng.randrange(0, 90)
+    return {
+        "eq": {"where": {"Category": {"eq": rng.choice(CATEGORIES)}}, "limit": 20},
+        "range+sort": {
+            "where": {"Price": {"gte": low, "lt": low + 10}},
+            "sort": ["-Price"],
+            "limit": 20,
+        },
+        "in+contains": {
+            "where": {
+                "Category": {"in": rng.sample(CATEGORIES, 2)},
+                "Name": {"contains": str(rng.randrange(10))},
+            },
+            "fields": ["Name", "Price"],
+            "limit": 20,
+        },
+    }
+
+
+async def timed(
+    connection: AsyncConnection,
+    compiled: CompiledDb,
+    name: str,
+    cache: QueryCache | None,
+) -> float:
+    rng = random.Random(0)
+    timings = []
+    for _ in range(REPEATS):
+        query = RecordQuery(**shapes(rng)[name])
+        start = time.perf_counter()
+        if cache is not None:
+            statement, params = compile_query(compiled, query, cache)
+        else:
+            statement = build_query(compiled, query_shape(query))
+            params = query_params(compiled, query)
+        (await connection.execute(statement, params)).all()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1e6
+
+
+def ndjson(rows: int) -> bytes:
+    rng = random.Random(0)
+    records = (
+        {
+            "Name": f"item {i}",
+            "Price": round(rng.uniform(0, 100), 2),
+            "Stock": rng.randrange(50),
+            "Category": rng.choice(CATEGORIES),
+        }
+        for i in range(rows)
+    )
+    return "".join(json.dumps(record) + "\n" for record in records).encode()
+
+
+async def main(rows: int) -> None:
+    modes = ["shape cache", "sql cache", "no cache"]
+    async with scratch_app() as (client, path, database):
+        db_id = await create_database(client, FIELDS)
+        await client.post(f"/api/databases/generate/{db_id}")
+        await client.post(f"/api/databases/{db_id}/records/bulk", content=ndjson(rows))
+        engine = database.engine
+        async with database.session() as session:
+            compiled = await generate_db(session, db_id)
+        assert compiled is not None
+
+        print(f"{rows} rows, median of {REPEATS} queries, microseconds")
+        print(f"{'shape':>12}" + "".join(f"{mode:>13}" for mode in modes))
+        async with engine.connect() as connection:
+            # compiled_cache can only be switched off per connection.
+            uncached = await engine.connect()
+            await uncached.execution_options(compiled_cache=None)
+            for name in shapes(random.Random(0)):
+                medians = [
+                    await timed(connection, compiled, name, database.queries),
+                    await timed(connection, compiled, name, None),
+                    await timed(uncached, compiled, name, None),
+                ]
+                print(f"{name:>12}" + "".join(f"{m:>13.0f}" for m in medians))
+            await uncached.close()
+        print(database.queries.stats())
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else ROWS))
@@ -0,0 +1,118 @@
+"""Relationship fields: expand= against one request per related record.
+
+Orders have a parent field to customers, and line items one to orders;
+orders also have the child field listing their items. A page of orders is
+read with its customers expanded, and the same customers are then fetched
+the way a client without expand= would, one request per order. Each side
+prints the SQL statements the server ran and the wall time. Expanding the
+items as well adds two, the items database's row and one IN query, whatever
+the page size.
+
+    python -m POC.benchmarks.bench_relations
+"""
+
+import asyncio
+import json
+import time
+from typing import Any
+from sqlalchemy import Engine, event
+from POC.benchmarks.common import create_database, scratch_app
+
+CUSTOMERS = 200
+ORDERS = 5_000
+ITEMS_PER_ORDER = 3
+PAGE_SIZES = [10, 100, 500]
+
+
+def ndjson(rows: list[dict[str, Any]]) -> bytes:
+    return "".join(json.dumps(row) + "\n" for row in rows).encode()
+
+
+async def main() -> None:
+    statements = 0
+
+    def count(*args: Any) -> None:
+        nonlocal statements
+        statements += 1
+
+    async with scratch_app() as (client, _, _):
+        customers_id = await create_database(client, [("Name", "str", False)], "C")
+        orders_id = await create_database(client, [("Name", "str", False)], "O")
+        items_id = await create_database(client, [("Name", "str", False)], "I")
+        for db_id, field in (
+            (orders_id, ("Customer", "int", "parent", customers_id, None)),
+            (items_id, ("Order", "int", "parent", orders_id, None)),
+            (orders_id, ("Items", "list", "child", items_id, "Order")),
+        ):
+            name, data_type, relationship, related_db_id, key = field
+            await client.post(
+                f"/api/fields/create/{db_id}",
+                json={
+                    "name": name,
+                    "data_type": data_type,
+                    "required": False,
+                    "default": "",
+                    "relationship": relationship,
+                    "related_db_id": related_db_id,
+                    "related_key": key,
+                },
+            )
+        paths = {}
+        for db_id, rows in (
+            (customers_id, [{"Name": f"C{i}"} for i in range(CUSTOMERS)]),
+            (
+                orders_id,
+                [
+                    {"Name": f"O{i}", "Customer": i % CUSTOMERS + 1}
+                    for i in range(ORDERS)
+                ],
+            ),
+            (
+                items_id,
+                [
+                    {"Name": f"I{i}", "Order": i // ITEMS_PER_ORDER + 1}
+                    for i in range(ORDERS * ITEMS_PER_ORDER)
+                ],
+            ),
+        ):
+            generated = await client.post(f"/api/databases/generate/{db_id}")
+            paths[db_id] = generated.json()["api_path"]
+            await client.post(
+                f"/api/databases/{db_id}/records/bulk",
+                content=ndjson(rows),
+                headers={"content-type": "application/x-ndjson"},
+            )
+        orders, customers = paths[orders_id], paths[customers_id]
+
+        event.listen(Engine, "before_cursor_execute", count)
+        print(
+            f"{'page':>5} {'expand stmts':>12} {'ms':>7}"
+            f" {'per record stmts':>16} {'ms':>7} {'+items stmts':>12}"
+        )
+        for size in PAGE_SIZES:
+            # Warm: the databases are compiled on their first read.
+            params: dict[str, str | int] = {"limit": size, "expand": "Customer"}
+            await client.get(f"{orders}/records", params=params)
+
+            statements, start = 0, time.perf_counter()
+            await client.get(f"{orders}/records", params=params)
+            expanded = (statements, (time.perf_counter() - start) * 1e3)
+
+            statements, start = 0, time.perf_counter()
+            page = await client.get(f"{orders}/records", params={"limit": size})
+            for order in page.json()["items"]:
+                await client.get(f"{customers}/records/{order['Customer']}")
+            per_record = (statements, (time.perf_counter() - start) * 1e3)
+
+            statements = 0
+            params["expand"] = "Customer,Items"
+            await client.get(f"{orders}/records", params=params)
+            print(
+                f"{size:>5} {expanded[0]:>12} {expanded[1]:>7.1f}"
+                f" {per_record[0]:>16} {per_record[1]:>7.1f} {statements:>12}"
+            )
+        event.remove(Engine, "before_cursor_execute", count)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,115 @@
+"""Report runs: the API's event loop while a heavy report runs.
+
+A grouped report over a large generated table is run three ways while a
+task on the event loop wakes every few milliseconds, standing in for the
+requests the API serves meanwhile: in the loop itself, on a thread, and in
+the scheduler's process pool. The worst and typical wake-up delays show how
+long requests would have waited.
+
+    python -m POC.benchmarks.bench_reports
+"""
+
+import asyncio
+import multiprocessing
+import random
+import statistics
+import tempfile
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from pathlib import Path
+from typing import Awaitable, Callable
+from sqlalchemy import create_engine, insert
+from POC.db.models.stock_models.db_models import FieldInfo
+from POC.gen.compiler import compile_db
+from POC.reports.runner import ReportJob, run_report
+
+TABLE_ROWS = 500_000
+TICK_S = 0.005
+
+
+def make_table(directory: Path) -> tuple[str, str]:
+    fields = [
+        FieldInfo(id=1, name="Region", data_type="str", required=False, default=""),
+        FieldInfo(id=2, name="Amount", data_type="float", required=False, default=""),
+    ]
+    compiled = compile_db(1, 1, fields)
+    url = f"sqlite:///{directory / 'reports.sqlite3'}"
+    engine = create_engine(url)
+    compiled.table.create(engine)
+    rng = random.Random(0)
+    with engine.begin() as connection:
+        connection.execute(
+            insert(compiled.table),
+            [
+                {"Region": f"Region {rng.randrange(1000)}", "Amount": rng.random()}
+                for _ in range(TABLE_ROWS)
+            ],
+        )
+    engine.dispose()
+    return url, compiled.table.name
+
+
+async def wake_ups(run: Callable[[], Awaitable[object]]) -> tuple[float, list[float]]:
+    delays: list[float] = []
+    done = False
+
+    async def ticker() -> None:
+        while not done:
+            start = time.perf_counter()
+            await asyncio.sleep(TICK_S)
+            delays.append(time.perf_counter() - start - TICK_S)
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(TICK_S * 2)
+    start = time.perf_counter()
+    await run()
+    seconds = time.perf_counter() - start
+    done = True
+    await task
+    return seconds, delays
+
+
+async def measure(job: ReportJob, pool: Executor) -> None:
+    loop = asyncio.get_running_loop()
+
+    async def inline() -> object:
+        return run_report(job)
+
+    # Start the workers first, so the first run does not pay for the spawn.
+    await loop.run_in_executor(pool, time.sleep, 0)
+    print(f"{'run':>8} {'seconds':>8} {'median delay ms':>16} {'max delay ms':>13}")
+    for name, run in (
+        ("inline", inline),
+        ("thread", lambda: asyncio.to_thread(run_report, job)),
+        ("process", lambda: loop.run_in_executor(pool, run_report, job)),
+    ):
+        seconds, delays = await wake_ups(run)
+        print(
+            f"{name:>8} {seconds:>8.2f} {statistics.median(delays) * 1e3:>16.2f}"
+            f" {max(delays) * 1e3:>13.1f}"
+        )
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        url, table = make_table(Path(directory))
+        job = ReportJob(
+            1,
+            "Bench",
+            url,
+            table,
+            (),
+            ("Region",),
+            ("count", "sum:Amount", "avg:Amount"),
+            "xlsx",
+            str(Path(directory) / "bench.xlsx"),
+        )
+        pool = ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            asyncio.run(measure(job, pool))
+        finally:
+            pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Routing cost of per-database record routers as databases are added.
+
+"dict" is DbRouters: one lookup on the short name. "route list" is what
+including a router per database in the app would give: five routes per
+database, matched one by one. Both dispatch to a no-op endpoint, so the
+numbers are routing alone. "app" is a record read through the whole app,
+with the other databases mounted next to the one being read.
+
+    python -m POC.benchmarks.bench_routing
+"""
+
+import asyncio
+import time
+from typing import Any
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route, Router
+from starlette.types import ASGIApp, Message
+from POC.api.main import app
+from POC.api.routes.backend.generated_apis import DbRouters
+from POC.benchmarks.common import create_database, scratch_app
+
+COUNTS = [10, 100, 1000, 10_000]
+RUNS = 2000
+APP_RUNS = 500
+METHODS = [("GET", "/records"), ("POST", "/records")] + [
+    (method, "/records/{record_id}") for method in ("GET", "PUT", "DELETE")
+]
+
+
+async def ok(request: Request) -> Response:
+    return Response(b"")
+
+
+def db_router(db_id: int, dependency_overrides_provider: Any = None) -> ASGIApp:
+    return Router([Route(path, ok, methods=[method]) for method, path in METHODS])
+
+
+def route_list(n: int) -> Router:
+    return Router(
+        [
+            Route(f"/api/db/db{i}{path}", ok, methods=[method])
+            for i in range(n)
+            for method, path in METHODS
+        ]
+    )
+
+
+async def dispatch_us(
+    app: ASGIApp, path: str, root_path: str = "", runs: int = RUNS
+) -> float:
+    async def receive() -> Message:
+        return {"type": "http.request", "body": b""}
+
+    async def send(message: Message) -> None:
+        pass
+
+    scope = {
+        "type": "http",
+        "method": "DELETE",
+        "path": path,
+        "root_path": root_path,
+        "query_string": b"",
+        "headers": [],
+    }
+    start = time.perf_counter()
+    for _ in range(runs):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - start) / runs * 1e6
+
+
+async def main() -> None:
+    print(f"{'databases':>9} {'dict us':>8} {'route list us':>14} {'app ms':>7}")
+    db_routers: DbRouters = app.state.db_routers
+    async with scratch_app() as (client, _, _):
+        db_id = await create_database(client, [("Title", "str", False)])
+        generated = await client.post(f"/api/databases/generate/{db_id}")
+        path = generated.json()["api_path"]
+        record = (await client.post(f"{path}/records", json={"Title": "a"})).json()
+        for n in COUNTS:
+            routers = DbRouters(build=db_router)
+            for i in range(n):
+                routers.mount(i, f"db{i}")
+            # The last database mounted, the worst case for a route list.
+            last = f"/db{n - 1}/records/1"
+            dict_us = await dispatch_us(routers, f"/api/db{last}", "/api")
+            # Fewer runs as the list grows; each one walks all of it.
+            list_runs = max(10, RUNS * 10 // n)
+            list_us = await dispatch_us(route_list(n), f"/api/db{last}", runs=list_runs)
+
+            for i in range(n - 1):
+                db_routers.mount(-i - 1, f"other{i}")
+            start = time.perf_counter()
+            for _ in range(APP_RUNS):
+                await client.get(f"{path}/records/{record['id']}")
+            app_ms = (time.perf_counter() - start) / APP_RUNS * 1e3
+            for i in range(n - 1):
+                db_routers.unmount(-i - 1)
+            print(f"{n:>9} {dict_us:>8.1f} {list_us:>14.1f} {app_ms:>7.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
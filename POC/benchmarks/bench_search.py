@@ -0,0 +1,99 @@
+"""Full-text search: query latency, and what the index adds to bulk ingest.
+
+A corpus of generated titles and notes is loaded three ways into scratch
+databases: without searchable fields, with them indexed by the triggers one
+row at a time, and with them indexed the way bulk ingest does, one
+INSERT ... SELECT per chunk. Each prints rows per second. Queries then run
+through ``GET /api/databases/{id}/search`` against the indexed corpus, from
+a rare word to a prefix matching most rows, and print median latency.
+
+    python -m POC.benchmarks.bench_search [rows]
+"""
+
+import asyncio
+import random
+import statistics
+import sys
+import time
+from dataclasses import replace
+from typing import Iterator
+from POC.benchmarks.common import create_database, scratch_app
+from POC.gen.ingest import CHUNK_SIZE, ingest_rows
+from POC.helpers.db_helpers import generate_db
+
+ROWS = 1_000_000
+REPEATS = 20
+WORDS = [
+    f"{a}{b}"
+    for a in ("ka", "lo", "mi", "ne", "ru", "so", "ti", "va")
+    for b in ("ber", "dal", "fen", "gor", "hin", "mar", "pel", "ton")
+]
+QUERIES = ["zephyr", "kaber", "kaber lodal", "mi", "k"]
+LOADS = ["no search", "row triggers", "chunk index"]
+
+
+def make_rows(rows: int) -> Iterator[dict[str, str]]:
+    rng = random.Random(0)
+    for i in range(rows):
+        # One row in 100k says zephyr, so rare words are in the mix.
+        title = " ".join(rng.choices(WORDS, k=4))
+        notes = " ".join(rng.choices(WORDS, k=12))
+        yield {"Title": title if i % 100_000 else f"zephyr {title}", "Notes": notes}
+
+
+async def load(rows: int, mode: str) -> None:
+    async with scratch_app() as (client, _, database):
+        db_id = await create_database(client, [], f"S{LOADS.index(mode)}")
+        for name in ("Title", "Notes"):
+            await client.post(
+                f"/api/fields/create/{db_id}",
+                json={
+                    "name": name,
+                    "data_type": "str",
+                    "required": False,
+                    "default": "",
+                    "searchable": mode != "no search",
+                },
+            )
+        await client.post(f"/api/databases/generate/{db_id}")
+
+        async with database.session() as session:
+            compiled = await generate_db(session, db_id)
+            assert compiled is not None
+            if mode == "row triggers":
+                # Not paused, so the triggers index every row as it lands.
+                compiled = replace(compiled, searchable=())
+            start = time.perf_counter()
+            result = await ingest_rows(session, compiled, make_rows(rows), CHUNK_SIZE)
+            elapsed = time.perf_counter() - start
+        print(f"{mode:>13} {rows / elapsed:>9.0f} {result.rows_inserted:>9}")
+
+        if mode != "chunk index":
+            return
+        print()
+        print(f"{'query':>12} {'median ms':>10} {'p95 ms':>7} {'matches':>8}")
+        for q in QUERIES:
+            timings = []
+            for _ in range(REPEATS):
+                start = time.perf_counter()
+                response = await client.get(
+                    f"/api/databases/{db_id}/search", params={"q": q, "limit": 50}
+                )
+                timings.append((time.perf_counter() - start) * 1000)
+            page = response.json()
+            matches = f"{len(page['items'])}{'+' if page['next_cursor'] else ''}"
+            p95 = statistics.quantiles(timings, n=20)[-1]
+            print(
+                f"{q:>12} {statistics.median(timings):>10.2f} {p95:>7.2f} {matches:>8}"
+            )
+
+
+async def main(rows: int) -> None:
+    print(f"{rows} rows, chunks of {CHUNK_SIZE}")
+    print(f"{'load':>13} {'rows/s':>9} {'inserted':>9}")
+    for mode in LOADS:
+        await load(rows, mode)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else ROWS))
@@ -0,0 +1,87 @@
+"""Import time and peak memory of ``import_spreadsheet`` on generated sheets.
+
+Workbooks are written with openpyxl's write-only mode into a temp directory and
+imported in increasing size order, so a flat peak RSS column means memory does
+not grow with the sheet.
+
+    python -m POC.benchmarks.bench_spreadsheet_import [rows ...]
+"""
+
+import asyncio
+import csv
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from openpyxl import Workbook
+from POC.benchmarks.common import scratch_app
+from POC.helpers.excel_helpers import import_spreadsheet
+
+ROWS = [10_000, 100_000]
+HEADER = ["name", "quantity", "price", "active", "ordered_on", "note"]
+
+
+def make_rows(n: int):
+    start = datetime(2024, 1, 1)
+    for i in range(n):
+        yield [
+            f"item {i}",
+            i,
+            i * 0.25,
+            i % 3 == 0,
+            start + timedelta(days=i % 365),
+            None if i % 5 else "restock",
+        ]
+
+
+def write_xlsx(path: Path, n: int) -> None:
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(HEADER)
+    for row in make_rows(n):
+        sheet.append(row)
+    workbook.save(path)
+
+
+def write_csv(path: Path, n: int) -> None:
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        for row in make_rows(n):
+            writer.writerow(["" if v is None else v for v in row])
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def main(sizes: list[int]) -> None:
+    print(
+        f"{'type':>5} {'rows':>9} {'write s':>8} {'import s':>9} {'rows/s':>8} {'peak MB':>8}"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            for file_type, write in (("csv", write_csv), ("xlsx", write_xlsx)):
+                path = Path(tmp) / f"sheet_{n}.{file_type}"
+                start = time.perf_counter()
+                write(path, n)
+                written = time.perf_counter() - start
+                async with scratch_app() as (_, _, database):
+                    async with database.session() as session:
+                        start = time.perf_counter()
+                        result = await import_spreadsheet(
+                            session, path, path.stem, file_type=file_type
+                        )
+                        elapsed = time.perf_counter() - start
+                assert result.ingest.rows_inserted == n, result.ingest
+                print(
+                    f"{file_type:>5} {n:>9} {written:>8.1f} {elapsed:>9.1f}"
+                    f" {n / elapsed:>8.0f} {peak_rss_mb():>8.0f}"
+                )
+                path.unlink()
+
+
+if __name__ == "__main__":
+    asyncio.run(main([int(n) for n in sys.argv[1:]] or ROWS))
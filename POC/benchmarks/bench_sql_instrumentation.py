@@ -0,0 +1,78 @@
+"""Per-statement cost of SQL instrumentation against ``echo=True``.
+
+Runs a primary key lookup many times on a file SQLite database, keeping
+the best of several rounds: with no hooks, with echo (every statement
+logged to a stream), with empty cursor listeners, and with the
+instrumentation hooks, without and with sampled statement logging. Log
+output goes to a discarded stream, so only formatting and handlers count.
+
+    python -m POC.benchmarks.bench_sql_instrumentation
+"""
+
+import io
+import logging
+import tempfile
+import time
+from pathlib import Path
+from sqlalchemy import Engine, create_engine, event, text
+from POC.db.instrumentation import (
+    RequestQueries,
+    SqlInstrumentation,
+    SqlMetrics,
+    current_queries,
+    logger,
+)
+
+RUNS = 10_000
+ROUNDS = 5
+
+
+def lookups_us(engine: Engine) -> float:
+    current_queries.set(RequestQueries())
+    with engine.connect() as connection:
+        statement = text("SELECT name FROM t WHERE id = :id")
+        start = time.perf_counter()
+        for i in range(RUNS):
+            connection.execute(statement, {"id": i % 100}).all()
+        elapsed = time.perf_counter() - start
+    current_queries.set(None)
+    return elapsed / RUNS * 1e6
+
+
+def main() -> None:
+    sink = logging.StreamHandler(io.StringIO())
+    for name in ("sqlalchemy.engine.Engine", logger.name):
+        logging.getLogger(name).addHandler(sink)
+        logging.getLogger(name).propagate = False
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{Path(tmp) / 'bench.sqlite3'}"
+        with create_engine(url).begin() as connection:
+            connection.execute(text("CREATE TABLE t (id INTEGER PRIMARY KEY, name)"))
+            connection.execute(
+                text("INSERT INTO t VALUES (:id, 'x')"),
+                [{"id": i} for i in range(100)],
+            )
+        cases: list[tuple[str, Engine]] = [
+            ("none", create_engine(url)),
+            ("echo=True", create_engine(url, echo=True)),
+        ]
+        # What SQLAlchemy charges for having cursor listeners at all.
+        empty = create_engine(url)
+        for name in ("before_cursor_execute", "after_cursor_execute"):
+            event.listen(empty, name, lambda *args: None)
+        cases.append(("empty hooks", empty))
+        for rate in (0.0, 0.01, 1.0):
+            engine = create_engine(url)
+            SqlInstrumentation(1000, rate, SqlMetrics()).attach(engine)
+            cases.append((f"hooks, {rate:.0%} logged", engine))
+        logger.setLevel(logging.INFO)
+        # The best of several rounds of each case is kept.
+        best = [min(lookups_us(engine) for _ in range(ROUNDS)) for _, engine in cases]
+        print(f"{'':>17} {'us/statement':>13} {'overhead us':>12}")
+        for (name, engine), us in zip(cases, best):
+            print(f"{name:>17} {us:>13.1f} {us - best[0]:>12.1f}")
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
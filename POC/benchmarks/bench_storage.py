@@ -0,0 +1,161 @@
+"""SQLite storage profiles under a read/write mix, and backups under writes.
+
+Readers do primary key lookups and short range scans while one writer
+commits single-row inserts and updates, each on its own connection and
+thread, for a fixed time per profile. Then, on a larger database with the
+tuned profile, a backup runs while the writer keeps writing, throttled and
+in one step, with the writes that went through meanwhile and the longest.
+
+The database lives in a temp directory under the current one rather than
+/tmp, which is often memory-backed and makes syncs free.
+
+    python -m POC.benchmarks.bench_storage
+"""
+
+import random
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+from sqlalchemy import Engine, create_engine, text
+from sqlalchemy.exc import OperationalError
+from POC.core.config import BACKUP_PAGES_PER_STEP, BACKUP_STEP_SLEEP_MS
+from POC.db.storage import STORAGE_PROFILES, apply_storage_profile, backup_database
+
+ROWS = 20_000
+BACKUP_ROWS = 200_000
+READERS = 4
+SECONDS = 3.0
+
+
+def profile_engine(path: Path, profile: str) -> Engine:
+    engine = create_engine(f"sqlite:///{path}", pool_size=READERS + 2)
+    apply_storage_profile(engine, STORAGE_PROFILES[profile])
+    return engine
+
+
+def seed(path: Path, rows: int = ROWS) -> None:
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as connection:
+        connection.execute(
+            text("CREATE TABLE records (id INTEGER PRIMARY KEY, name TEXT, n INTEGER)")
+        )
+        connection.execute(
+            text("INSERT INTO records (name, n) VALUES (:name, :n)"),
+            [{"name": f"record {i}" * 8, "n": i} for i in range(rows)],
+        )
+    engine.dispose()
+
+
+class Mix:
+    def __init__(self, engine: Engine) -> None:
+        self.engine = engine
+        self.stop = threading.Event()
+        self.reads = 0
+        self.busy = 0
+        self.write_ms: list[float] = []
+        self.lock = threading.Lock()
+
+    def reader(self) -> None:
+        reads = 0
+        with self.engine.connect() as connection:
+            while not self.stop.is_set():
+                start = random.randrange(ROWS)
+                try:
+                    connection.execute(
+                        text("SELECT * FROM records WHERE id = :id"), {"id": start}
+                    ).all()
+                    connection.execute(
+                        text("SELECT * FROM records WHERE id >= :id LIMIT 20"),
+                        {"id": start},
+                    ).all()
+                    connection.commit()
+                    reads += 2
+                except OperationalError:
+                    connection.rollback()
+                    with self.lock:
+                        self.busy += 1
+        with self.lock:
+            self.reads += reads
+
+    def writer(self) -> None:
+        with self.engine.connect() as connection:
+            while not self.stop.is_set():
+                start = time.perf_counter()
+                try:
+                    connection.execute(
+                        text("INSERT INTO records (name, n) VALUES ('new', 0)")
+                    )
+                    connection.execute(
+                        text("UPDATE records SET n = n + 1 WHERE id = :id"),
+                        {"id": random.randrange(ROWS)},
+                    )
+                    connection.commit()
+                except OperationalError:
+                    connection.rollback()
+                    with self.lock:
+                        self.busy += 1
+                    continue
+                self.write_ms.append((time.perf_counter() - start) * 1e3)
+
+    def run(self, seconds: float, readers: int = READERS) -> None:
+        threads = [threading.Thread(target=self.reader) for _ in range(readers)]
+        threads.append(threading.Thread(target=self.writer))
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        self.stop.set()
+        for thread in threads:
+            thread.join()
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory(dir=Path.cwd()) as tmp:
+        print(
+            f"{'profile':>8} {'reads/s':>9} {'writes/s':>9} {'write p50 ms':>13}"
+            f" {'write p99 ms':>13} {'busy':>5}"
+        )
+        for profile in STORAGE_PROFILES:
+            path = Path(tmp) / f"{profile}.sqlite3"
+            seed(path)
+            mix = Mix(profile_engine(path, profile))
+            mix.run(SECONDS)
+            mix.engine.dispose()
+            writes = sorted(mix.write_ms)
+            p99 = writes[int(len(writes) * 0.99)] if writes else 0.0
+            print(
+                f"{profile:>8} {mix.reads / SECONDS:>9.0f}"
+                f" {len(writes) / SECONDS:>9.0f}"
+                f" {statistics.median(writes) if writes else 0.0:>13.2f}"
+                f" {p99:>13.2f} {mix.busy:>5}"
+            )
+
+        path = Path(tmp) / "backup.sqlite3"
+        seed(path, BACKUP_ROWS)
+        print(
+            f"\n{'backup':>10} {'pages':>6} {'seconds':>8} {'writes':>7}"
+            f" {'longest write ms':>17}"
+        )
+        for name, pages, sleep in (
+            ("throttled", BACKUP_PAGES_PER_STEP, BACKUP_STEP_SLEEP_MS / 1e3),
+            ("one step", -1, 0.0),
+        ):
+            mix = Mix(profile_engine(path, "tuned"))
+            writer = threading.Thread(target=mix.writer)
+            writer.start()
+            time.sleep(0.2)
+            before = len(mix.write_ms)
+            snapshot = backup_database(path, Path(tmp) / name, pages, sleep, keep=1)
+            during = mix.write_ms[before:]
+            mix.stop.set()
+            writer.join()
+            mix.engine.dispose()
+            print(
+                f"{name:>10} {snapshot.pages:>6} {snapshot.seconds:>8.2f}"
+                f" {len(during):>7} {max(during, default=0.0):>17.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
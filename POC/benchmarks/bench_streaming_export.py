@@ -0,0 +1,100 @@
+"""Time to first byte, total time and peak RSS of the record export endpoint.
+
+The app is served by uvicorn on a local port (httpx's in-process transport
+buffers whole responses, which would hide time to first byte) and each size is
+exported in increasing order, so a flat peak RSS column means memory does not
+grow with the table. XLSX has to be finished before its first byte can be sent,
+so it is only run up to 100k rows.
+
+    python -m POC.benchmarks.bench_streaming_export [rows ...]
+"""
+
+import asyncio
+import resource
+import socket
+import sqlite3
+import sys
+import time
+import httpx
+import uvicorn
+from POC.api.main import app
+from POC.benchmarks.common import create_database, scratch_app
+
+ROWS = [10_000, 100_000, 1_000_000]
+FORMATS = ["csv", "ndjson", "xlsx"]
+FIELDS = [
+    ("name", "str", True),
+    ("quantity", "int", True),
+    ("price", "float", False),
+    ("ordered_on", "date", False),
+]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def fill(path: str, table: str, start: int, stop: int) -> None:
+    with sqlite3.connect(path) as connection:
+        connection.executemany(
+            f'INSERT INTO "{table}" (name, quantity, price, ordered_on)'
+            " VALUES (?, ?, ?, ?)",
+            (
+                (f"item {i}", i, i * 0.25, f"2024-{i % 12 + 1:02d}-01")
+                for i in range(start, stop)
+            ),
+        )
+
+
+async def main(sizes: list[int]) -> None:
+    port = free_port()
+    async with scratch_app() as (client, path, _):
+        db_id = await create_database(client, FIELDS)
+        table = (await client.post(f"/api/databases/generate/{db_id}")).json()
+        server = uvicorn.Server(
+            uvicorn.Config(app, port=port, log_level="warning", lifespan="off")
+        )
+        serving = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+
+        url = f"http://127.0.0.1:{port}/api/databases/{db_id}/records/export"
+        print(
+            f"{'rows':>9} {'format':>7} {'ttfb ms':>8} {'total s':>8} {'MB':>6} {'peak RSS MB':>12}"
+        )
+        filled = 0
+        async with httpx.AsyncClient(timeout=None) as http:
+            for n in sorted(sizes):
+                fill(str(path), table["table_name"], filled, n)
+                filled = n
+                for export_format in FORMATS:
+                    if export_format == "xlsx" and n > 100_000:
+                        continue
+                    size = 0
+                    start = time.perf_counter()
+                    ttfb = 0.0
+                    async with http.stream(
+                        "GET", url, params={"format": export_format}
+                    ) as response:
+                        async for chunk in response.aiter_raw():
+                            if not size:
+                                ttfb = time.perf_counter() - start
+                            size += len(chunk)
+                    total = time.perf_counter() - start
+                    print(
+                        f"{n:>9} {export_format:>7} {ttfb * 1e3:>8.1f} {total:>8.2f}"
+                        f" {size / 2**20:>6.1f} {peak_rss_mb():>12.0f}"
+                    )
+
+        server.should_exit = True
+        await serving
+
+
+if __name__ == "__main__":
+    asyncio.run(main([int(n) for n in sys.argv[1:]] or ROWS))
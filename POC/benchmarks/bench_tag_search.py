@@ -0,0 +1,58 @@
+"""Latency of ``TagIndex.search`` on 100k tags against a full linear scan.
+
+The linear scan is what ``search_view`` used to do on every keystroke: walk
+every tag and build an option for each one.
+
+    python -m POC.benchmarks.bench_tag_search [tags]
+"""
+
+import random
+import string
+import sys
+import time
+from POC.helpers.tag_helpers import SEARCH_LIMIT, TagIndex
+
+TAGS = 100_000
+QUERIES = ["a", "ma", "mar", "ket", "quarterly rep", "zzzz", ""]
+RUNS = 1000
+
+
+def make_tags(n: int) -> list[str]:
+    random.seed(7)
+    words = [
+        "".join(random.choices(string.ascii_lowercase, k=random.randint(3, 9)))
+        for _ in range(5000)
+    ]
+    words += ["marketing", "quarterly", "report", "finance", "ops"]
+    tags: set[str] = {"quarterly report"}
+    while len(tags) < n:
+        tags.add(" ".join(random.choices(words, k=random.randint(1, 3))))
+    return list(tags)
+
+
+def timed_us(fn, runs: int) -> tuple[float, float]:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2] * 1e6, samples[int(len(samples) * 0.99)] * 1e6
+
+
+def main(n: int) -> None:
+    tags = make_tags(n)
+    index = TagIndex()
+    start = time.perf_counter()
+    index.load(tags)
+    print(f"{len(index)} distinct tags indexed in {time.perf_counter() - start:.2f}s")
+    print(f"{'query':>15} {'hits':>5} {'p50 us':>8} {'p99 us':>8} {'scan us':>9}")
+    for q in QUERIES:
+        hits = len(index.search(q))
+        p50, p99 = timed_us(lambda: index.search(q, SEARCH_LIMIT), RUNS)
+        scan, _ = timed_us(lambda: [t for t in tags if q in t.lower()], 5)
+        print(f"{q!r:>15} {hits:>5} {p50:>8.1f} {p99:>8.1f} {scan:>9.0f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else TAGS)
@@ -0,0 +1,148 @@
+"""Bulk validation throughput: a pydantic model per row, or a list per field.
+
+A sheet of text cells, as CSV gives them, with errors injected into 1% of
+its rows, is checked in chunks of 5000 rows:
+
+- by ``CompiledDb.validate_many``, a model per row, as bulk loads did;
+- a field at a time in this process, by ``validate_columns``;
+- a field at a time in a ``ValidationPool`` of worker processes.
+
+The sheet is then imported with ``import_spreadsheet``, with and without
+workers, checking chunks ahead of the inserts. Pools only help with CPUs to
+spare; the number here is printed first.
+
+    python -m POC.benchmarks.bench_validation [rows]
+"""
+
+import asyncio
+import csv
+import os
+import sys
+import tempfile
+import time
+from itertools import islice
+from pathlib import Path
+from typing import Any, Iterator
+from POC.benchmarks.common import scratch_app
+from POC.db.models.stock_models.db_models import FieldInfo
+from POC.gen.compiler import CompiledDb, compile_db
+from POC.gen.validate import ValidationPool, validate_columns
+from POC.helpers.excel_helpers import import_spreadsheet
+
+ROWS = 1_000_000
+CHUNK_SIZE = 5000
+WORKERS = [2, 4]
+FIELDS = [
+    ("name", "str"),
+    ("quantity", "int"),
+    ("price", "float"),
+    ("active", "bool"),
+    ("ordered_on", "date"),
+    ("note", "str"),
+]
+
+
+def make_rows(n: int) -> Iterator[list[str]]:
+    for i in range(n):
+        # Past the rows field types are inferred from, 1 in 100 is bad.
+        bad = i >= 1000 and i % 100 == 0
+        yield [
+            f"item {i}",
+            "n/a" if bad and i % 200 == 0 else str(i),
+            str(i * 0.25),
+            "true" if i % 3 else "false",
+            "2024-13-01" if bad and i % 200 else f"2024-{i % 12 + 1:02d}-15",
+            "" if i % 5 else "restock",
+        ]
+
+
+def chunks(n: int) -> Iterator[list[dict[str, Any]]]:
+    names = [name for name, _ in FIELDS]
+    rows = ({k: v for k, v in zip(names, row) if v} for row in make_rows(n))
+    while chunk := list(islice(rows, CHUNK_SIZE)):
+        yield chunk
+
+
+def compiled_sheet() -> CompiledDb:
+    return compile_db(
+        1,
+        1,
+        [
+            FieldInfo(id=i, name=name, data_type=data_type, required=False, default="")
+            for i, (name, data_type) in enumerate(FIELDS, start=1)
+        ],
+    )
+
+
+async def validation(n: int) -> None:
+    compiled = compiled_sheet()
+    print(f"{'validation':>16} {'rows/s':>9} {'invalid':>8}")
+
+    def report(label: str, elapsed: float, invalid: int) -> None:
+        print(f"{label:>16} {n / elapsed:>9.0f} {invalid:>8}")
+
+    # Only the checks are timed, not making the rows.
+    elapsed, invalid = 0.0, 0
+    for chunk in chunks(n):
+        start = time.perf_counter()
+        invalid += len(compiled.validate_many(chunk)[1])
+        elapsed += time.perf_counter() - start
+    report("model per row", elapsed, invalid)
+
+    elapsed, invalid = 0.0, 0
+    for chunk in chunks(n):
+        start = time.perf_counter()
+        errors = validate_columns(compiled.inputs, chunk)[1]
+        invalid += len({error.index for error in errors})
+        elapsed += time.perf_counter() - start
+    report("list per field", elapsed, invalid)
+
+    for workers in WORKERS:
+        pool = ValidationPool(workers)
+        # Spawning the workers is paid once per process, so not timed.
+        await pool.validate(compiled.inputs, next(chunks(CHUNK_SIZE)))
+        batches = list(chunks(n))
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(pool.validate(compiled.inputs, batch) for batch in batches)
+        )
+        elapsed = time.perf_counter() - start
+        pool.close()
+        invalid = sum(len({e.index for e in errors}) for _, errors in results)
+        report(f"{workers} workers", elapsed, invalid)
+
+
+async def imports(n: int, path: Path) -> None:
+    print()
+    print(f"{'import':>16} {'rows/s':>9} {'failed':>8}")
+    for workers in [0, *WORKERS]:
+        pool = ValidationPool(workers)
+        async with scratch_app() as (_, _, database):
+            async with database.session() as session:
+                start = time.perf_counter()
+                result = await import_spreadsheet(
+                    session, path, f"sheet{workers}", file_type="csv", pool=pool
+                )
+                elapsed = time.perf_counter() - start
+        pool.close()
+        label = f"{workers} workers" if workers else "in process"
+        print(f"{label:>16} {n / elapsed:>9.0f} {result.ingest.rows_failed:>8}")
+    for summary in result.ingest.columns:
+        print(f"  {summary.column}: {summary.count} x {summary.expected}, e.g.", end="")
+        print(f" row {summary.rows[0]} {summary.samples[0]}")
+
+
+async def main(n: int) -> None:
+    print(f"{n} rows, chunks of {CHUNK_SIZE}, {os.cpu_count()} CPUs")
+    await validation(n)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "sheet.csv"
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow([name for name, _ in FIELDS])
+            writer.writerows(make_rows(n))
+        await imports(n, path)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else ROWS))
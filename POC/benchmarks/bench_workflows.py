@@ -0,0 +1,102 @@
+"""Workflow events: queue throughput, and what triggers cost a request.
+
+A scratch database gets a default workflow and five triggers, each writing
+a toast. Its record changes are queued and drained at a few batch sizes,
+one transaction per batch, to give events per second. Then single-record
+creates are timed with more and more triggers defined; the request only
+writes the event, so its latency should not move.
+
+    python -m POC.benchmarks.bench_workflows
+"""
+
+import asyncio
+import statistics
+import time
+from POC.benchmarks.common import create_database, scratch_app
+from POC.core.config import Settings
+from POC.db.database import Database
+from POC.workflows.engine import WorkflowEngine
+from POC.workflows.queue import enqueue
+
+EVENTS = 5_000
+BATCH_SIZES = [1, 20, 200, 1000]
+TRIGGER_COUNTS = [5, 50, 500]
+REQUESTS = 200
+FIELDS = [("Title", "str", False), ("Status", "str", False)]
+
+
+async def main() -> None:
+    async with scratch_app() as (client, path, _):
+        db_id = await create_database(client, FIELDS)
+        generated = await client.post(f"/api/databases/generate/{db_id}")
+        records = f"{generated.json()['api_path']}/records"
+        await client.post(
+            "/api/workflows/create",
+            json={
+                "name": "Open",
+                "db_id": db_id,
+                "is_default": True,
+                "auto_change": {"Status": "open"},
+            },
+        )
+
+        defined = 0
+
+        async def add_triggers(count: int) -> None:
+            for i in range(defined, defined + count):
+                await client.post(
+                    "/api/workflows/triggers/create",
+                    json={
+                        "name": f"Trigger {i}",
+                        "db_id": db_id,
+                        "event": "updated",
+                        "notify": ["toast"],
+                    },
+                )
+
+        await add_triggers(5)
+        defined = 5
+        ids = [
+            (await client.post(records, json={"Title": f"Record {i}"})).json()["id"]
+            for i in range(EVENTS)
+        ]
+        print(f"{'batch size':>10} {'events/s':>9}")
+        for batch_size in BATCH_SIZES:
+            settings = Settings(
+                database_url=f"sqlite:///{path}", workflow_batch_size=batch_size
+            )
+            database = Database(settings)
+            engine = WorkflowEngine(settings, database)
+            # The creates above queued events of their own.
+            while await engine.drain():
+                pass
+            async with database.session() as session:
+                for record_id in ids:
+                    enqueue(session, db_id, "updated", [record_id])
+                await session.commit()
+            start = time.perf_counter()
+            drained = 0
+            while events := await engine.drain():
+                drained += events
+            seconds = time.perf_counter() - start
+            print(f"{batch_size:>10} {drained / seconds:>9.0f}")
+            await database.dispose()
+
+        print(f"\n{'triggers':>8} {'update median ms':>17} {'p95 ms':>7}")
+        for count in TRIGGER_COUNTS:
+            await add_triggers(count - defined)
+            defined = count
+            times = []
+            for i in range(REQUESTS):
+                start = time.perf_counter()
+                await client.put(f"{records}/{ids[i]}", json={"Title": "Changed"})
+                times.append(time.perf_counter() - start)
+            times.sort()
+            print(
+                f"{defined:>8} {statistics.median(times) * 1e3:>17.2f}"
+                f" {times[int(len(times) * 0.95)] * 1e3:>7.2f}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,59 @@
+import tempfile
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator
+import httpx
+from POC.api.main import app
+from POC.core.config import Settings
+from POC.db.database import Database
+
+
+@asynccontextmanager
+async def scratch_app() -> AsyncIterator[tuple[httpx.AsyncClient, Path, Database]]:
+    """Point the app at a throwaway SQLite file and yield a client for it."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.sqlite3"
+        database = Database(Settings(database_url=f"sqlite:///{path}"))
+        await database.prepare()
+        original = app.state.database
+        app.state.database = database
+        transport = httpx.ASGITransport(app=app)  # type: ignore[arg-type]
+        try:
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://bench", timeout=None
+            ) as client:
+                yield client, path, database
+        finally:
+            app.state.database = original
+            app.state.db_routers.clear()
+            await database.dispose()
+
+
+async def create_database(
+    client: httpx.AsyncClient,
+    fields: list[tuple[str, str, bool]],
+    short_name: str = "BENCH",
+) -> int:
+    response = await client.post(
+        "/api/databases/create",
+        json={
+            "name": "Bench",
+            "short_name": short_name,
+            "display_name": "Bench Database",
+            "category": "Bench",
+            "alias": "Bench",
+            "description": "Benchmark database",
+        },
+    )
+    db_id = response.json()["id"]
+    for name, data_type, required in fields:
+        await client.post(
+            f"/api/fields/create/{db_id}",
+            json={
+                "name": name,
+                "data_type": data_type,
+                "required": required,
+                "default": "",
+            },
+        )
+    return db_id
@@ -0,0 +1,98 @@
+import os
+from typing import Literal
+from pydantic import BaseModel, Field
+
+# Settings.from_env reads DYNAMIC_DB_DATABASE_URL, DYNAMIC_DB_FRONTEND, ...
+ENV_PREFIX = "DYNAMIC_DB_"
+
+POOL_SIZE = 10
+POOL_MAX_OVERFLOW = 20
+SLOW_QUERY_MS = 100.0
+N_PLUS_ONE_THRESHOLD = 10
+DATABASE_URL = "sqlite:///database_db.sqlite3"
+# 256 pages of 4 KiB per backup step, then a pause for writers.
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_SLEEP_MS = 10.0
+BACKUP_KEEP = 7
+REPORT_WORKERS = 2
+REPORT_TICK_S = 30.0
+REPORT_TIMEOUT_S = 600.0
+REPORT_REAL_TIME_S = 60.0
+WORKFLOW_WORKERS = 2
+# Handing chunks to workers only pays with a CPU to spare for the inserts.
+VALIDATION_WORKERS = min(2, (os.cpu_count() or 1) - 1)
+WORKFLOW_BATCH_SIZE = 200
+WORKFLOW_LEASE_S = 60.0
+WORKFLOW_MAX_ATTEMPTS = 5
+WORKFLOW_RETENTION_S = 24 * 3600.0
+
+
+class Settings(BaseModel):
+    """What ``create_app`` builds the app from.
+
+    Nothing here touches disk: the engine is created and the tables are
+    brought up to date when the app starts, or on its first request.
+    """
+
+    database_url: str = DATABASE_URL
+    # PRAGMAs applied to every SQLite connection, see POC.db.storage.
+    storage_profile: Literal["tuned", "default"] = "tuned"
+    # Statements at least this slow are logged as warnings and counted.
+    slow_query_ms: float = Field(default=SLOW_QUERY_MS, ge=0)
+    # Fraction of the other statements logged, with their time, at info level.
+    sql_log_sample_rate: float = Field(default=0.0, ge=0, le=1)
+    # Runs of one statement shape in a request that are reported as N+1.
+    n_plus_one_threshold: int = Field(default=N_PLUS_ONE_THRESHOLD, ge=2)
+    pool_size: int = POOL_SIZE
+    pool_max_overflow: int = POOL_MAX_OVERFLOW
+    # Online snapshots of a SQLite database file. Every backup_interval_s
+    # seconds while the app runs (0: only through POST /api/admin/backup),
+    # into backup_dir (default: "backups" beside the database).
+    backup_interval_s: float = Field(default=0.0, ge=0)
+    backup_dir: str | None = None
+    backup_pages_per_step: int = Field(default=BACKUP_PAGES_PER_STEP, ge=1)
+    backup_step_sleep_ms: float = Field(default=BACKUP_STEP_SLEEP_MS, ge=0)
+    backup_keep: int = Field(default=BACKUP_KEEP, ge=1)
+    # Scheduled reports run in report_workers processes, at most
+    # report_concurrency at a time. Due reports are looked for every
+    # report_tick_s seconds (0: only run through POST /api/reports/run).
+    # Files go to report_dir (default: "reports" beside the database).
+    report_workers: int = Field(default=REPORT_WORKERS, ge=1)
+    report_concurrency: int = Field(default=REPORT_WORKERS, ge=1)
+    report_tick_s: float = Field(default=REPORT_TICK_S, ge=0)
+    report_timeout_s: float = Field(default=REPORT_TIMEOUT_S, gt=0)
+    report_real_time_s: float = Field(default=REPORT_REAL_TIME_S, gt=0)
+    report_dir: str | None = None
+    smtp_host: str = "localhost"
+    smtp_port: int = 25
+    smtp_sender: str = "reports@localhost"
+    # Record changes queue an event that workflow_workers background tasks
+    # apply, workflow_batch_size events per transaction. An idle worker is
+    # woken by the next change, or looks every workflow_poll_s seconds
+    # (0: no workers; events wait in the queue). A worker holds its batch
+    # for workflow_lease_s before another may claim it; a failed event is
+    # retried after workflow_retry_s, doubling, up to workflow_max_attempts.
+    workflow_workers: int = Field(default=WORKFLOW_WORKERS, ge=1)
+    workflow_batch_size: int = Field(default=WORKFLOW_BATCH_SIZE, ge=1)
+    workflow_poll_s: float = Field(default=1.0, ge=0)
+    workflow_lease_s: float = Field(default=WORKFLOW_LEASE_S, gt=0)
+    workflow_max_attempts: int = Field(default=WORKFLOW_MAX_ATTEMPTS, ge=1)
+    workflow_retry_s: float = Field(default=5.0, ge=0)
+    # Processed events are kept this long; failed ones until deleted.
+    workflow_retention_s: float = Field(default=WORKFLOW_RETENTION_S, ge=0)
+    workflow_maintenance_s: float = Field(default=60.0, ge=0)
+    # Bulk loads check chunks of at least 1000 rows in validation_workers
+    # processes, that many chunks ahead of the inserts (0: in the API process).
+    validation_workers: int = Field(default=VALIDATION_WORKERS, ge=0)
+    # Serve the FastUI forms and pages; API-only workers never import them.
+    frontend: bool = True
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        return cls.model_validate(
+            {
+                name: os.environ[ENV_PREFIX + name.upper()]
+                for name in cls.model_fields
+                if ENV_PREFIX + name.upper() in os.environ
+            }
+        )
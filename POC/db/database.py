@@ -0,0 +1,202 @@
+import asyncio
+import logging
+from pathlib import Path
+from typing import Annotated, AsyncIterator
+from fastapi import Depends, Request
+from sqlalchemy import Connection, Engine, create_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from POC.core.config import Settings
+from POC.db.instrumentation import SqlInstrumentation
+from POC.db.models.stock_models import db_models  # noqa: F401 registers the tables
+from POC.db.schema import sync_table
+from POC.db.storage import (
+    STORAGE_PROFILES,
+    Snapshot,
+    apply_storage_profile,
+    backup_database,
+    sqlite_path,
+)
+from POC.gen.compiler import CompiledDbCache
+from POC.gen.query import QueryCache
+from POC.helpers.cache_helpers import ComponentCache, MetadataCache
+from POC.helpers.tag_helpers import TagIndex
+
+logger = logging.getLogger("POC.db")
+
+
+def create_schema(connection: Connection) -> None:
+    SQLModel.metadata.create_all(connection)
+    # create_all skips tables that exist, so add columns and indexes added since.
+    for table in SQLModel.metadata.sorted_tables:
+        sync_table(connection, table)
+
+
+class Database:
+    """The engine and session factory of one app, made on first use, and the
+    caches of what the database holds.
+
+    Creating one does no I/O. The app's lifespan calls ``prepare``; a
+    request served without it (a TestClient used outside ``with``)
+    prepares the database itself. Its sessions carry it in ``info``, so
+    helpers given a session find its caches with ``session_database``.
+    """
+
+    def __init__(self, settings: Settings) -> None:
+        self.settings = settings
+        self._engine: AsyncEngine | None = None
+        self._sync_engine: Engine | None = None
+        self._session_maker: async_sessionmaker[AsyncSession] | None = None
+        self._prepared = False
+        self.compiled = CompiledDbCache()
+        self.metadata = MetadataCache()
+        self.components = ComponentCache()
+        self.queries = QueryCache()
+        self.tags = TagIndex()
+        # Databases whose copy-and-swap migration has a runner.
+        self.migrating: set[int] = set()
+
+    @property
+    def engine(self) -> AsyncEngine:
+        if self._engine is None:
+            # aiosqlite runs each connection on its own thread, so queries
+            # awaited through this engine hand the event loop back to other
+            # requests instead of blocking it.
+            url = self.settings.database_url.replace(
+                "sqlite://", "sqlite+aiosqlite://", 1
+            )
+            self._engine = create_async_engine(
+                url,
+                pool_size=self.settings.pool_size,
+                max_overflow=self.settings.pool_max_overflow,
+                pool_pre_ping=True,
+            )
+            SqlInstrumentation(
+                self.settings.slow_query_ms, self.settings.sql_log_sample_rate
+            ).attach(self._engine.sync_engine)
+            if self._engine.dialect.name == "sqlite":
+                apply_storage_profile(
+                    self._engine.sync_engine,
+                    STORAGE_PROFILES[self.settings.storage_profile],
+                )
+        return self._engine
+
+    @property
+    def sync_engine(self) -> Engine:
+        """A blocking engine on the same database, for long work run in a
+        worker thread so that its Python side does not hold up the event
+        loop the way ``run_sync`` on ``engine`` would."""
+        if self._sync_engine is None:
+            self._sync_engine = create_engine(self.settings.database_url)
+            SqlInstrumentation(
+                self.settings.slow_query_ms, self.settings.sql_log_sample_rate
+            ).attach(self._sync_engine)
+            if self._sync_engine.dialect.name == "sqlite":
+                apply_storage_profile(
+                    self._sync_engine,
+                    STORAGE_PROFILES[self.settings.storage_profile],
+                )
+        return self._sync_engine
+
+    @property
+    def session_maker(self) -> async_sessionmaker[AsyncSession]:
+        if self._session_maker is None:
+            self._session_maker = async_sessionmaker(
+                self.engine,
+                class_=AsyncSession,
+                expire_on_commit=False,
+                info={"database": self},
+            )
+        return self._session_maker
+
+    async def prepare(self) -> None:
+        """Create the tables, and add the columns and indexes they lack."""
+        if self._prepared:
+            return
+        async with self.engine.begin() as connection:
+            await connection.run_sync(create_schema)
+        self._prepared = True
+
+    async def backup(self) -> Snapshot:
+        """Snapshot the database file without stopping reads or writes."""
+        path = sqlite_path(self.settings.database_url)
+        if path is None:
+            raise ValueError("Only a SQLite database file can be backed up")
+        directory = self.settings.backup_dir or path.parent / "backups"
+        return await asyncio.to_thread(
+            backup_database,
+            path,
+            Path(directory),
+            self.settings.backup_pages_per_step,
+            self.settings.backup_step_sleep_ms / 1e3,
+            self.settings.backup_keep,
+        )
+
+    async def backup_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.settings.backup_interval_s)
+            try:
+                snapshot = await self.backup()
+            except Exception:
+                logger.exception("scheduled backup failed")
+            else:
+                logger.info(
+                    "backed up %d pages to %s in %.2fs",
+                    snapshot.pages,
+                    snapshot.path,
+                    snapshot.seconds,
+                )
+
+    def session(self) -> AsyncSession:
+        return self.session_maker()
+
+    def clear_caches(self) -> None:
+        for cache in (
+            self.compiled,
+            self.metadata,
+            self.components,
+            self.queries,
+            self.tags,
+        ):
+            cache.clear()
+
+    async def dispose(self) -> None:
+        if self._engine is not None:
+            await self._engine.dispose()
+        if self._sync_engine is not None:
+            self._sync_engine.dispose()
+        self._engine = self._session_maker = self._sync_engine = None
+        self._prepared = False
+        self.clear_caches()
+
+
+def get_database(request: Request) -> Database:
+    database: Database = request.app.state.database
+    return database
+
+
+DatabaseDep = Annotated[Database, Depends(get_database)]
+
+
+async def get_session(database: DatabaseDep) -> AsyncIterator[AsyncSession]:
+    await database.prepare()
+    async with database.session() as session:
+        yield session
+
+
+SessionDep = Annotated[AsyncSession, Depends(get_session)]
+
+
+def session_database(session: AsyncSession) -> Database:
+    # The Database a session was opened from, for its caches.
+    database: Database = session.info["database"]
+    return database
+
+
+def session_engine(session: AsyncSession) -> AsyncEngine:
+    # Streaming responses outlive the request's session, so they open their
+    # own connection on the engine the session is bound to.
+    bind = session.bind
+    assert isinstance(bind, AsyncEngine)
+    return bind
@@ -0,0 +1,254 @@
+import logging
+import random
+import re
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Iterable
+from sqlalchemy import Connection, Engine, event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger("POC.sql")
+
+STATEMENT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+STATEMENT_CACHE_SIZE = 1024
+OPERATIONS = {"select", "insert", "update", "delete", "pragma"}
+# "IN (?, ?, ?)" and multi-row VALUES vary in length with the data, not the
+# code that ran them.
+_PARAMETER_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+_VALUES_ROWS = re.compile(r"(\(\?\))(?:\s*,\s*\(\?\))+")
+
+
+# Statements come from SQLAlchemy's compiled cache, so the same few strings
+# repeat; caching keeps the regexes off the per-statement path.
+@lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def statement_shape(statement: str) -> str:
+    return _VALUES_ROWS.sub(
+        r"\1", _PARAMETER_LIST.sub("?", " ".join(statement.split()))
+    )
+
+
+@lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def statement_operation(statement: str) -> str:
+    operation = statement.lstrip()[:8].split(None, 1)
+    name = operation[0].lower() if operation else ""
+    return name if name in OPERATIONS else "other"
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        i = bisect_left(self.buckets, value)
+        if i < len(self.buckets):
+            self.counts[i] += 1
+
+    def samples(self, name: str, labels: str) -> Iterable[str]:
+        cumulative = 0
+        for bucket, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bucket:g}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f"{name}_sum{{{labels}}} {self.sum:.6f}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+
+class SqlMetrics:
+    """Process-wide SQL counters, rendered in the Prometheus text format."""
+
+    def __init__(self) -> None:
+        self.statements: dict[str, Histogram] = {}
+        self.queries_per_request: dict[str, Histogram] = {}
+        self.slow: Counter[str] = Counter()
+        self.n_plus_one: Counter[str] = Counter()
+
+    def observe_statement(self, operation: str, seconds: float) -> None:
+        histogram = self.statements.get(operation)
+        if histogram is None:
+            histogram = self.statements[operation] = Histogram(STATEMENT_BUCKETS)
+        histogram.observe(seconds)
+
+    def observe_request(self, route: str, queries: int) -> None:
+        histogram = self.queries_per_request.get(route)
+        if histogram is None:
+            histogram = Histogram(QUERY_COUNT_BUCKETS)
+            self.queries_per_request[route] = histogram
+        histogram.observe(queries)
+
+    def clear(self) -> None:
+        self.statements.clear()
+        self.queries_per_request.clear()
+        self.slow.clear()
+        self.n_plus_one.clear()
+
+    def render(self) -> str:
+        lines = [
+            "# HELP dynamic_db_sql_statement_seconds Time spent executing SQL statements.",
+            "# TYPE dynamic_db_sql_statement_seconds histogram",
+        ]
+        for operation, histogram in sorted(self.statements.items()):
+            lines.extend(
+                histogram.samples(
+                    "dynamic_db_sql_statement_seconds", f'operation="{operation}"'
+                )
+            )
+        lines += [
+            "# HELP dynamic_db_sql_queries_per_request SQL statements run per request.",
+            "# TYPE dynamic_db_sql_queries_per_request histogram",
+        ]
+        for route, histogram in sorted(self.queries_per_request.items()):
+            lines.extend(
+                histogram.samples(
+                    "dynamic_db_sql_queries_per_request", f'route="{_label(route)}"'
+                )
+            )
+        lines += [
+            "# HELP dynamic_db_sql_slow_statements_total Statements over the slow query threshold.",
+            "# TYPE dynamic_db_sql_slow_statements_total counter",
+        ]
+        for operation, count in sorted(self.slow.items()):
+            lines.append(
+                f'dynamic_db_sql_slow_statements_total{{operation="{operation}"}} {count}'
+            )
+        lines += [
+            "# HELP dynamic_db_sql_n_plus_one_total Statement shapes one request repeated past the threshold.",
+            "# TYPE dynamic_db_sql_n_plus_one_total counter",
+        ]
+        for route, count in sorted(self.n_plus_one.items()):
+            lines.append(
+                f'dynamic_db_sql_n_plus_one_total{{route="{_label(route)}"}} {count}'
+            )
+        return "\n".join(lines) + "\n"
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+sql_metrics = SqlMetrics()
+
+
+@dataclass
+class RequestQueries:
+    count: int = 0
+    seconds: float = 0.0
+    shapes: Counter[str] = field(default_factory=Counter)
+    # Set once the response is sent; later statements are not counted.
+    done: bool = False
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        """Statement shapes run at least ``threshold`` times, most first."""
+        return [(s, n) for s, n in self.shapes.most_common() if n >= threshold]
+
+
+# Statements run while a request is being served are added to its
+# RequestQueries; the hooks run in the request's context, greenlets included.
+current_queries: ContextVar[RequestQueries | None] = ContextVar(
+    "current_queries", default=None
+)
+
+
+class SqlInstrumentation:
+    """Engine event hooks timing every statement.
+
+    Every statement feeds the latency histogram and the current request's
+    counts. Statements over ``slow_query_ms`` are logged as warnings; of the
+    rest, a ``log_sample_rate`` fraction is logged at info level.
+    """
+
+    def __init__(
+        self,
+        slow_query_ms: float,
+        log_sample_rate: float = 0.0,
+        metrics: SqlMetrics = sql_metrics,
+    ) -> None:
+        self.slow_query_ms = slow_query_ms
+        self.log_sample_rate = log_sample_rate
+        self.metrics = metrics
+
+    def attach(self, engine: Engine) -> None:
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+
+    def _before(self, conn: Connection, *args: Any) -> None:
+        # A connection runs one statement at a time.
+        conn.info["query_start"] = time.perf_counter()
+
+    def _after(
+        self,
+        conn: Connection,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: Any,
+        executemany: bool,
+    ) -> None:
+        seconds = time.perf_counter() - conn.info.pop("query_start")
+        operation = statement_operation(statement)
+        self.metrics.observe_statement(operation, seconds)
+        queries = current_queries.get()
+        if queries is not None and not queries.done:
+            queries.count += 1
+            queries.seconds += seconds
+            queries.shapes[statement_shape(statement)] += 1
+        ms = seconds * 1e3
+        if ms >= self.slow_query_ms:
+            self.metrics.slow[operation] += 1
+            logger.warning("slow query, %.1f ms: %s", ms, statement)
+        elif self.log_sample_rate and random.random() < self.log_sample_rate:
+            logger.info("%.2f ms: %s", ms, statement)
+
+
+class QueryTrackingMiddleware:
+    """Counts the SQL each HTTP request runs and flags N+1 patterns.
+
+    The count is recorded, per route, when the response is complete, so
+    background tasks run after it are not charged to the request.
+    """
+
+    def __init__(self, app: ASGIApp, n_plus_one_threshold: int) -> None:
+        self.app = app
+        self.n_plus_one_threshold = n_plus_one_threshold
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        queries = RequestQueries()
+        token = current_queries.set(queries)
+
+        async def send_and_record(message: Message) -> None:
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get(
+                "more_body", False
+            ):
+                queries.done = True
+                self.record(scope, queries)
+
+        try:
+            await self.app(scope, receive, send_and_record)
+        finally:
+            current_queries.reset(token)
+
+    def record(self, scope: Scope, queries: RequestQueries) -> None:
+        route = getattr(scope.get("route"), "path", None) or "unmatched"
+        sql_metrics.observe_request(route, queries.count)
+        for shape, runs in queries.repeated(self.n_plus_one_threshold):
+            sql_metrics.n_plus_one[route] += 1
+            logger.warning(
+                "possible N+1 on %s %s: %d runs of %s",
+                scope["method"],
+                scope["path"],
+                runs,
+                shape,
+            )
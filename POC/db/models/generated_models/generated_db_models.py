@@ -0,0 +1,31 @@
+# Generated by POC.gen.codegen from the applied schema of every database.
+# Do not edit: a region is rewritten when its database's schema changes.
+# ruff: noqa
+# fmt: off
+import datetime
+from typing import Callable, Optional
+from pydantic import BaseModel, ConfigDict, Field
+from sqlalchemy import (
+    JSON,
+    Boolean,
+    Column,
+    Computed,
+    Date,
+    DateTime,
+    Float,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Time,
+)
+from POC.gen.compiler import JsonDict, JsonList, JsonValue, Relation, foreign_key
+
+# (schema version, fingerprint, builder of the table and validator, columns)
+GeneratedDb = tuple[
+    int, str, Callable[[], tuple[Table, type[BaseModel]]], tuple[str, ...]
+]
+
+
+DB_MODELS: dict[int, GeneratedDb] = {}
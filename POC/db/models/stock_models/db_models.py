@@ -1,10 +1,12 @@
 from __future__ import annotations
-from sqlmodel import SQLModel, Field, create_engine
+from sqlalchemy import JSON, Index
+from sqlmodel import SQLModel, Field
 
-from datetime import datetime as dt, timedelta, date
-from typing import Literal, Optional
+from datetime import datetime as dt
+from typing import Any, Literal, Optional
 from pydantic import (
     BaseModel,
+    ConfigDict,
     FieldSerializationInfo,
     field_serializer,
     Field as PydanticField,
@@ -12,14 +14,12 @@ from pydantic import (
 )
 # from pydantic.functional_validators import WrapValidator
 
-NOW: dt = dt.now() - timedelta(hours=25)
-TODAY: date = NOW.date()
-TODAY_STR = TODAY.strftime("%Y-%m-%d")
-sqlite_url = f"sqlite:///database_db_{TODAY_STR}.sqlite3"
-
 DATA_TYPES = Literal[
     "str", "int", "float", "bool", "date", "datetime", "time", "json", "list", "dict"
 ]
+# A parent field holds the key of one record of the related database; a
+# child field lists the related records whose parent field points back.
+RELATIONSHIP_TYPES = ("parent", "child")
 
 
 # Form Definition
@@ -56,6 +56,7 @@ class DbInfo(DbInfoForm):
     created_at: dt = Field(default_factory=dt.now)
     updated_at: dt = Field(default_factory=dt.now)
     status: Optional[str] = Field(default="building", max_length=100)
+    version: int = Field(default=1)
 
     @field_serializer("created_at", "updated_at", when_used="always")
     def dt_to_json(self, v: dt, info: FieldSerializationInfo) -> str | dt:
@@ -64,7 +65,13 @@ class DbInfo(DbInfoForm):
 
 # Model with Table Configuration
 class DbInfoModel(DbInfo, table=True):  # type: ignore
-    ...
+    # Keyset pagination seeks on (updated_at, id); the list filters on status
+    # and category, and SQLite appends the id to every index.
+    __table_args__ = (
+        Index("ix_dbinfomodel_updated_at_id", "updated_at", "id"),
+        Index("ix_dbinfomodel_status", "status"),
+        Index("ix_dbinfomodel_category", "category"),
+    )
 
 
 class TDBInfo(BaseModel):
@@ -97,6 +104,53 @@ class FieldInfoForm(SQLModel):
         title="Default Value",
         description="The default value for this field in the database",
     )
+    indexed: bool = Field(
+        default=False,
+        title="Indexed",
+        description="Index this field for fast lookups and sorting",
+        sa_column_kwargs={"server_default": "0"},
+    )
+    unique: bool = Field(
+        default=False,
+        title="Unique",
+        description="Reject records that repeat a value of this field",
+        sa_column_kwargs={"server_default": "0"},
+    )
+    searchable: bool = Field(
+        default=False,
+        title="Searchable",
+        description="Find records by the words in this text field",
+        sa_column_kwargs={"server_default": "0"},
+    )
+    expression: Optional[str] = Field(
+        default=None,
+        title="Expression",
+        description="Compute this int or float field from others, e.g. Field 1 plus Field 2",
+    )
+    relationship: Optional[str] = Field(
+        default=None,
+        title="Relationship Type",
+        description="parent: holds the key of a record of the related database; child: lists the related records that name this one as their parent",
+    )
+    related_db_id: Optional[int] = Field(
+        default=None,
+        title="Relationship Database",
+        description="The database this field relates records to",
+    )
+    related_key: Optional[str] = Field(
+        default=None,
+        title="Relationship Database Key",
+        description="For a parent, the related field it refers to, id if empty; for a child, the related parent field that refers back",
+    )
+
+    @field_validator("relationship")
+    @classmethod
+    def check_relationship(cls, v: Optional[str]) -> Optional[str]:
+        if v is not None and v not in RELATIONSHIP_TYPES:
+            raise ValueError(
+                f"relationship must be one of {', '.join(RELATIONSHIP_TYPES)}"
+            )
+        return v
 
 
 class FieldInfo(FieldInfoForm):
@@ -112,7 +166,69 @@ class FieldInfo(FieldInfoForm):
 
 
 class FieldInfoModel(FieldInfo, table=True):  # type: ignore
-    ...
+    __table_args__ = (
+        Index("ix_fieldinfomodel_updated_at_id", "updated_at", "id"),
+        Index("ix_fieldinfomodel_db_id_is_active", "db_id", "is_active"),
+    )
+
+
+class SchemaVersion(SQLModel):
+    # One row per compiled field set of a database. "applied" rows describe
+    # the record table as it is; a pending, copying or failed row is a
+    # copy-and-swap migration towards that version, with its progress.
+    db_id: int
+    version: int
+    from_version: Optional[int] = None
+    status: str = Field(default="applied", max_length=20)
+    fields: list[dict[str, Any]] = Field(default_factory=list, sa_type=JSON)
+    total_rows: int = 0
+    copied_rows: int = 0
+    # Rows whose values did not convert to a field's new data type.
+    quarantined_rows: int = 0
+    last_id: int = 0
+    error: Optional[str] = None
+    created_at: dt = Field(default_factory=dt.now)
+    started_at: Optional[dt] = None
+    updated_at: dt = Field(default_factory=dt.now)
+
+
+class SchemaVersionModel(SchemaVersion, table=True):  # type: ignore
+    __table_args__ = (
+        Index("ix_schemaversionmodel_db_id_version", "db_id", "version", unique=True),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+
+
+class QuarantinedRow(SQLModel):
+    # A record left out of the table by the migration to ``version``: its
+    # values as they were, and each one that did not convert.
+    db_id: int
+    version: int
+    row_id: int
+    record: dict[str, Any] = Field(default_factory=dict, sa_type=JSON)
+    errors: list[dict[str, Any]] = Field(default_factory=list, sa_type=JSON)
+    created_at: dt = Field(default_factory=dt.now)
+
+
+class QuarantinedRowModel(QuarantinedRow, table=True):  # type: ignore
+    __table_args__ = (
+        Index(
+            "ix_quarantinedrowmodel_db_id_version_row_id",
+            "db_id",
+            "version",
+            "row_id",
+            unique=True,
+        ),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+
+
+class SearchPauseModel(SQLModel, table=True):  # type: ignore
+    """A record table whose search triggers are off. Bulk ingest adds and
+    removes the row inside its own write transaction, so no other
+    connection ever sees it."""
+
+    table_name: str = Field(primary_key=True)
 
 
 class CreateTagsForm(SQLModel):
@@ -123,9 +239,17 @@ class CreateTagsForm(SQLModel):
 
 
 class TagsInfo(CreateTagsForm, table=True):  # type: ignore
+    __table_args__ = (Index("ix_tagsinfo_tag_name", "tag_name", unique=True),)
     id: Optional[int] = Field(default=None, primary_key=True)
 
 
+class DbTagLink(SQLModel, table=True):  # type: ignore
+    # The primary key serves database -> tags, the index tag -> databases.
+    __table_args__ = (Index("ix_dbtaglink_tag_id_db_id", "tag_id", "db_id"),)
+    db_id: int = Field(foreign_key="dbinfomodel.id", primary_key=True)
+    tag_id: int = Field(foreign_key="tagsinfo.id", primary_key=True)
+
+
 class SelectTagForm(SQLModel):
     tag_name: list[str] = PydanticField(
         json_schema_extra={"search_url": "/forms/tags/search"}
@@ -139,6 +263,332 @@ class SelectTagForm(SQLModel):
         return [v]
 
 
+REPORT_SCHEDULES = ("manual", "real_time", "daily", "weekly", "monthly", "yearly")
+REPORT_OUTPUTS = ("csv", "xlsx")
+REPORT_WEEKDAYS = ("M", "T", "W", "Th", "F", "Sa", "Su")
+
+
+class ReportForm(SQLModel):
+    name: str = Field(title="Report Name", description="Also names the files")
+    db_id: int = Field(title="Database", description="The database reported on")
+    schedule: str = Field(
+        default="manual",
+        title="Schedule",
+        description="manual, real_time, daily, weekly, monthly or yearly",
+        max_length=20,
+    )
+    at: str = Field(
+        default="00:00",
+        title="Time",
+        description="Time of day of daily and longer schedules, HH:MM",
+        max_length=5,
+    )
+    days: str = Field(
+        default="",
+        title="Days",
+        description="Weekdays of daily and weekly runs, e.g. M,W,F; empty for every day, or Mondays when weekly",
+    )
+    day: int = Field(
+        default=1,
+        ge=1,
+        le=31,
+        title="Day of Month",
+        description="Monthly and yearly runs; the last day of shorter months",
+    )
+    month: int = Field(default=1, ge=1, le=12, title="Month", description="Yearly runs")
+    output: str = Field(
+        default="csv", title="Output", description="csv or xlsx", max_length=10
+    )
+    columns: list[str] = Field(
+        default_factory=list,
+        sa_type=JSON,
+        title="Columns",
+        description="Columns to list; all when empty",
+    )
+    group_by: list[str] = Field(
+        default_factory=list,
+        sa_type=JSON,
+        title="Group By",
+        description="Columns to group the aggregates by",
+    )
+    aggregates: list[str] = Field(
+        default_factory=list,
+        sa_type=JSON,
+        title="Aggregates",
+        description="count, or count, sum, avg, min or max of a column: sum:Amount",
+    )
+    email_to: str = Field(default="", title="To", description="Comma separated")
+    email_cc: str = Field(default="", title="CC", description="Comma separated")
+    email_bcc: str = Field(default="", title="BCC", description="Comma separated")
+    save_location: str = Field(
+        default="",
+        title="Save Location",
+        description="Folder under the reports directory",
+    )
+    is_active: bool = Field(default=True)
+
+    @field_validator("schedule")
+    @classmethod
+    def check_schedule(cls, v: str) -> str:
+        if v not in REPORT_SCHEDULES:
+            raise ValueError(f"schedule must be one of {', '.join(REPORT_SCHEDULES)}")
+        return v
+
+    @field_validator("output")
+    @classmethod
+    def check_output(cls, v: str) -> str:
+        if v not in REPORT_OUTPUTS:
+            raise ValueError(f"output must be one of {', '.join(REPORT_OUTPUTS)}")
+        return v
+
+    @field_validator("at")
+    @classmethod
+    def check_at(cls, v: str) -> str:
+        hour, _, minute = v.partition(":")
+        if (
+            not (hour.isdigit() and minute.isdigit())
+            or int(hour) > 23
+            or int(minute) > 59
+        ):
+            raise ValueError("at must be a time of day, HH:MM")
+        return f"{int(hour):02d}:{int(minute):02d}"
+
+    @field_validator("days")
+    @classmethod
+    def check_days(cls, v: str) -> str:
+        days = [day.strip() for day in v.split(",") if day.strip()]
+        unknown = set(days) - set(REPORT_WEEKDAYS)
+        if unknown:
+            raise ValueError(
+                f"days are {', '.join(REPORT_WEEKDAYS)}, not {', '.join(sorted(unknown))}"
+            )
+        return ",".join(days)
+
+
+class Report(ReportForm):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    created_at: dt = Field(default_factory=dt.now)
+    updated_at: dt = Field(default_factory=dt.now)
+    # None for manual reports.
+    next_run_at: Optional[dt] = None
+
+
+class ReportModel(Report, table=True):  # type: ignore
+    __table_args__ = (
+        Index("ix_reportmodel_is_active_next_run_at", "is_active", "next_run_at"),
+    )
+
+
+class ReportRun(SQLModel):
+    report_id: int
+    # The occurrence run; None for a manual run.
+    scheduled_for: Optional[dt] = None
+    # Occurrences passed over while the app was down; one run covers them.
+    missed: int = 0
+    status: str = Field(default="running", max_length=20)
+    path: Optional[str] = None
+    rows: int = 0
+    bytes: int = 0
+    emailed: bool = False
+    seconds: float = 0.0
+    error: Optional[str] = None
+    started_at: dt = Field(default_factory=dt.now)
+    finished_at: Optional[dt] = None
+
+
+class ReportRunModel(ReportRun, table=True):  # type: ignore
+    __table_args__ = (Index("ix_reportrunmodel_report_id_id", "report_id", "id"),)
+    id: Optional[int] = Field(default=None, primary_key=True)
+
+
+WORKFLOW_NOTIFICATIONS = ("toast", "email")
+TRIGGER_EVENTS = ("created", "updated", "deleted")
+EVENT_KINDS = (*TRIGGER_EVENTS, "transition")
+
+
+def _check_notify(v: list[str]) -> list[str]:
+    unknown = set(v) - set(WORKFLOW_NOTIFICATIONS)
+    if unknown:
+        raise ValueError(
+            f"notify is any of {', '.join(WORKFLOW_NOTIFICATIONS)}, not {', '.join(sorted(unknown))}"
+        )
+    return v
+
+
+class WorkflowForm(SQLModel):
+    name: str = Field(title="Workflow Name", description="Unique in its database")
+    db_id: int = Field(title="Database")
+    is_default: bool = Field(
+        default=False,
+        title="Create",
+        description="New records start in this workflow",
+    )
+    required_fields: list[str] = Field(
+        default_factory=list,
+        sa_type=JSON,
+        title="Required Fields",
+        description="Fields a record needs a value in to enter the workflow",
+    )
+    next_workflows: list[str] = Field(
+        default_factory=list,
+        sa_type=JSON,
+        title="Possible Workflows",
+        description="Workflows a record can move on to; any when empty",
+    )
+    auto_change: dict[str, Any] = Field(
+        default_factory=dict,
+        sa_type=JSON,
+        title="Auto Change Fields",
+        description="Field values set on entering the workflow",
+    )
+    timestamp_field: Optional[str] = Field(
+        default=None,
+        title="Timestamp",
+        description="Field set to the time the record entered the workflow",
+    )
+    notify: list[str] = Field(
+        default_factory=list,
+        sa_type=JSON,
+        title="Notification",
+        description="toast, email or both, on entering the workflow",
+    )
+    email_to: str = Field(default="", title="Email To", description="Comma separated")
+    description: Optional[str] = Field(default=None, title="Description")
+    is_active: bool = Field(default=True)
+
+    @field_validator("notify")
+    @classmethod
+    def check_notify(cls, v: list[str]) -> list[str]:
+        return _check_notify(v)
+
+
+class Workflow(WorkflowForm):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    created_at: dt = Field(default_factory=dt.now)
+    updated_at: dt = Field(default_factory=dt.now)
+
+
+class WorkflowModel(Workflow, table=True):  # type: ignore
+    __table_args__ = (Index("ix_workflowmodel_db_id_name", "db_id", "name"),)
+
+
+class TriggerForm(SQLModel):
+    name: str = Field(title="Trigger Name")
+    db_id: int = Field(title="Database")
+    event: str = Field(
+        title="Event", description="created, updated or deleted", max_length=20
+    )
+    field: Optional[str] = Field(
+        default=None,
+        title="When Field",
+        description="Only fire when this field of the record equals value",
+    )
+    value: Any = Field(default=None, sa_type=JSON, title="Value")
+    workflow: Optional[str] = Field(
+        default=None,
+        title="Move To",
+        description="Workflow the record moves to, when it may",
+    )
+    notify: list[str] = Field(default_factory=list, sa_type=JSON, title="Notification")
+    email_to: str = Field(default="", title="Email To", description="Comma separated")
+    message: str = Field(default="", title="Message")
+    is_active: bool = Field(default=True)
+
+    @field_validator("event")
+    @classmethod
+    def check_event(cls, v: str) -> str:
+        if v not in TRIGGER_EVENTS:
+            raise ValueError(f"event must be one of {', '.join(TRIGGER_EVENTS)}")
+        return v
+
+    @field_validator("notify")
+    @classmethod
+    def check_notify(cls, v: list[str]) -> list[str]:
+        return _check_notify(v)
+
+
+class Trigger(TriggerForm):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    created_at: dt = Field(default_factory=dt.now)
+    updated_at: dt = Field(default_factory=dt.now)
+
+
+class TriggerModel(Trigger, table=True):  # type: ignore
+    __table_args__ = (Index("ix_triggermodel_db_id_event", "db_id", "event"),)
+
+
+class Event(SQLModel):
+    """A record change waiting for the workflow engine.
+
+    Written in the transaction that changes the records, so a change and
+    its event commit or roll back together.
+    """
+
+    db_id: int
+    kind: str = Field(max_length=20)
+    record_ids: list[int] = Field(default_factory=list, sa_type=JSON)
+    # The deleted rows of a delete; the workflow asked for by a transition.
+    payload: dict[str, Any] = Field(default_factory=dict, sa_type=JSON)
+    # pending, processing, done or failed.
+    status: str = Field(default="pending", max_length=20)
+    attempts: int = 0
+    available_at: dt = Field(default_factory=dt.now)
+    # A processing event whose lease ran out is claimed again.
+    locked_until: Optional[dt] = None
+    error: Optional[str] = None
+    created_at: dt = Field(default_factory=dt.now)
+    processed_at: Optional[dt] = None
+
+
+class EventModel(Event, table=True):  # type: ignore
+    __table_args__ = (
+        Index("ix_eventmodel_status_available_at_id", "status", "available_at", "id"),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+
+
+class RecordWorkflowModel(SQLModel, table=True):  # type: ignore
+    """The workflow a record is in."""
+
+    __table_args__ = (
+        Index(
+            "ix_recordworkflowmodel_db_id_record_id", "db_id", "record_id", unique=True
+        ),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+    db_id: int
+    record_id: int
+    workflow_id: int
+    entered_at: dt = Field(default_factory=dt.now)
+
+
+class Notification(SQLModel):
+    db_id: int
+    record_id: Optional[int] = None
+    channel: str = Field(max_length=20)
+    message: str
+    # Email recipients, comma separated.
+    recipients: str = ""
+    created_at: dt = Field(default_factory=dt.now)
+    # Emails are sent after their transaction commits, in batches.
+    sent_at: Optional[dt] = None
+    # An unsent email is claimed by one sender at a time, until this.
+    locked_until: Optional[dt] = None
+    read: bool = False
+
+
+class NotificationModel(Notification, table=True):  # type: ignore
+    __table_args__ = (
+        Index("ix_notificationmodel_channel_sent_at", "channel", "sent_at"),
+        Index("ix_notificationmodel_db_id_id", "db_id", "id"),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+
+
+class TransitionRequest(BaseModel):
+    workflow: str
+
+
 class AddFieldForm(BaseModel): ...
 
 
@@ -146,7 +596,190 @@ class MethodNotAllowedResponse(BaseModel):
     detail: str = "Method Not Allowed"
 
 
-# create the engine
-db_engine = create_engine(sqlite_url, echo=True)
+class GeneratedDbInfo(BaseModel):
+    db_id: int
+    version: int
+    table_name: str
+    columns: list[str]
+    # Set while a copy-and-swap towards a newer version is outstanding.
+    migrating_to: Optional[int] = None
+    # Where the record CRUD routes are mounted; None if the short name is
+    # taken by another database or is not usable in a path.
+    api_path: Optional[str] = None
+
+
+class FieldConversion(BaseModel):
+    column: str
+    from_type: str
+    to_type: str
+
+
+class MigrationProgress(BaseModel):
+    db_id: int
+    version: int
+    from_version: int
+    status: str
+    total_rows: int
+    copied_rows: int
+    quarantined_rows: int
+    # Share of total_rows copied or quarantined, 0 to 1.
+    progress: float
+    rows_per_s: Optional[float] = None
+    # Seconds left at rows_per_s, while the copy runs.
+    eta_s: Optional[float] = None
+    conversions: list[FieldConversion] = []
+    error: Optional[str] = None
+
+
+class CompilerCacheStats(BaseModel):
+    size: int
+    maxsize: int
+    hits: int
+    misses: int
+    evictions: int
+
+
+class MetadataCacheStats(BaseModel):
+    size: int
+    maxsize: int
+    ttl: float
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    invalidations: int
+    hit_ratio: float
+
+
+class QueryCacheStats(BaseModel):
+    size: int
+    maxsize: int
+    hits: int
+    misses: int
+    evictions: int
+    hit_ratio: float
+
+
+class ComponentCacheStats(BaseModel):
+    size: int
+    maxsize: int
+    hits: int
+    misses: int
+    evictions: int
+    hit_ratio: float
+
+
+class QueryPlan(BaseModel):
+    name: str
+    sql: str
+    plan: list[str]
+    full_scan: bool
+
+
+class CodegenResult(BaseModel):
+    # db_ids whose generated classes were rendered, kept as they were, or
+    # dropped because the database is gone.
+    rendered: list[int] = []
+    reused: list[int] = []
+    removed: list[int] = []
+
+
+class BackupResult(BaseModel):
+    path: str
+    pages: int
+    seconds: float
+
+
+class RowError(BaseModel):
+    row: int
+    detail: str
+    # Set for a value that failed its field's check.
+    column: str | None = None
+    expected: str | None = None
+    value: str | None = None
+
+
+class ColumnErrors(BaseModel):
+    """The failed values of one field over a whole load."""
+
+    column: str
+    expected: str
+    count: int = 0
+    # The first few rows and distinct values that failed.
+    rows: list[int] = []
+    samples: list[str] = []
+
+
+class ChunkResult(BaseModel):
+    chunk: int
+    first_row: int
+    inserted: int = 0
+    failed: int = 0
+    detail: str | None = None
+    errors: list[RowError] = []
+
+
+class BulkIngestResult(BaseModel):
+    db_id: int
+    version: int
+    rows_received: int = 0
+    rows_inserted: int = 0
+    rows_failed: int = 0
+    chunks: list[ChunkResult] = []
+    columns: list[ColumnErrors] = []
+
+
+class Page(BaseModel):
+    items: list[dict[str, Any]]
+    next_cursor: str | None = None
+
+
+class RecordFilter(BaseModel):
+    """Conditions on one field of a record query; all that are given hold.
+
+    ``eq`` and ``ne`` also take null. ``contains`` is a case-insensitive
+    substring match on str fields.
+    """
+
+    model_config = ConfigDict(extra="forbid", populate_by_name=True)
+
+    eq: Any = None
+    ne: Any = None
+    gt: Any = None
+    gte: Any = None
+    lt: Any = None
+    lte: Any = None
+    in_: Optional[list[Any]] = PydanticField(default=None, alias="in")
+    contains: Optional[str] = None
+
+
+class RecordQuery(BaseModel):
+    """Filter, sort and projection for the records of a generated database.
+
+    ``sort`` lists field names, each prefixed with ``-`` to sort descending;
+    id breaks ties. ``fields`` picks the returned fields, all by default.
+    """
+
+    model_config = ConfigDict(extra="forbid")
+
+    where: dict[str, RecordFilter] = {}
+    sort: list[str] = []
+    fields: Optional[list[str]] = None
+    # The page size bounds of the list endpoints.
+    limit: int = PydanticField(default=50, ge=1, le=500)
+    offset: int = PydanticField(default=0, ge=0)
+
+
+class DbTagsForm(BaseModel):
+    tag_names: list[str]
+
+
+class InferredField(BaseModel):
+    name: str
+    data_type: str
+
 
-SQLModel.metadata.create_all(db_engine)
+class SpreadsheetImportResult(BaseModel):
+    db_id: int
+    fields: list[InferredField]
+    ingest: BulkIngestResult
@@ -0,0 +1,50 @@
+from sqlalchemy import Connection, Table, inspect, text
+from sqlalchemy.schema import CreateColumn
+
+
+def _add_column_sql(connection: Connection, table: Table, name: str) -> str:
+    column = table.c[name]
+    quote = connection.dialect.identifier_preparer.quote
+    spec = str(CreateColumn(column).compile(dialect=connection.dialect))
+    if not column.nullable and column.server_default is None:
+        # SQLite cannot add a NOT NULL column without a default to existing rows.
+        spec = f"{quote(column.name)} {column.type.compile(connection.dialect)}"
+    for key in column.foreign_keys:
+        # CREATE TABLE puts keys at the end; an added column carries its own.
+        spec += f" REFERENCES {quote(key.column.table.name)} ({quote(key.column.name)})"
+        if key.ondelete:
+            spec += f" ON DELETE {key.ondelete}"
+    return f"ALTER TABLE {quote(table.name)} ADD COLUMN {spec}"
+
+
+def sync_table(connection: Connection, table: Table) -> None:
+    """Create ``table``, or bring an existing one up to its definition.
+
+    Missing columns are added, and the ``ix_<table>_`` indexes are created,
+    dropped or rebuilt to match ``table.indexes``. Other columns and indexes
+    are left alone.
+    """
+    table.create(connection, checkfirst=True)
+    inspector = inspect(connection)
+    existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+    for column in table.columns:
+        if column.name not in existing_columns:
+            connection.execute(text(_add_column_sql(connection, table, column.name)))
+
+    managed = f"ix_{table.name}_"
+    quote = connection.dialect.identifier_preparer.quote
+    existing = {
+        index["name"]: bool(index["unique"])
+        for index in inspector.get_indexes(table.name)
+        if index["name"]
+    }
+    defined = {str(index.name): index for index in table.indexes}
+    for name, unique in list(existing.items()):
+        index = defined.get(name)
+        stale = index is None and name.startswith(managed)
+        if stale or (index is not None and bool(index.unique) != unique):
+            connection.execute(text(f"DROP INDEX {quote(name)}"))
+            del existing[name]
+    for name, index in defined.items():
+        if name not in existing:
+            index.create(connection)
@@ -0,0 +1,137 @@
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import datetime as dt
+from pathlib import Path
+from typing import Any
+from sqlalchemy import Engine, event, make_url
+
+
+@dataclass(frozen=True)
+class StorageProfile:
+    """PRAGMAs run on every new SQLite connection; None keeps SQLite's default."""
+
+    journal_mode: str | None = None
+    synchronous: str | None = None
+    # Bytes of the file read through a memory map instead of read() calls.
+    mmap_size: int | None = None
+    # Negative: KiB of page cache per connection, positive: pages.
+    cache_size: int | None = None
+    busy_timeout: int | None = None
+    foreign_keys: bool | None = None
+
+    def pragmas(self) -> list[str]:
+        values: dict[str, Any] = {
+            "journal_mode": self.journal_mode,
+            "synchronous": self.synchronous,
+            "mmap_size": self.mmap_size,
+            "cache_size": self.cache_size,
+            "busy_timeout": self.busy_timeout,
+            "foreign_keys": None
+            if self.foreign_keys is None
+            else int(self.foreign_keys),
+        }
+        return [
+            f"PRAGMA {name}={value}"
+            for name, value in values.items()
+            if value is not None
+        ]
+
+
+STORAGE_PROFILES = {
+    # Rollback journal, full sync, 2 MB of cache: what a bare connection gets.
+    "default": StorageProfile(),
+    # WAL lets readers run next to the one writer, and NORMAL only syncs at
+    # checkpoints, which in WAL mode cannot corrupt the file, only lose the
+    # last commits on power loss.
+    "tuned": StorageProfile(
+        journal_mode="wal",
+        synchronous="normal",
+        mmap_size=256 * 1024 * 1024,
+        cache_size=-64 * 1024,
+        busy_timeout=5000,
+        foreign_keys=True,
+    ),
+}
+
+
+def apply_storage_profile(engine: Engine, profile: StorageProfile) -> None:
+    pragmas = profile.pragmas()
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection: Any, connection_record: Any) -> None:
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+def sqlite_path(url: str) -> Path | None:
+    """The file behind a SQLite URL; None for in-memory databases."""
+    database = make_url(url).database
+    if not database or database == ":memory:":
+        return None
+    return Path(database)
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    path: Path
+    pages: int
+    seconds: float
+
+
+def backup_database(
+    source: Path,
+    directory: Path,
+    pages_per_step: int,
+    step_sleep: float,
+    keep: int,
+) -> Snapshot:
+    """Copy the database into ``directory`` while it stays in use.
+
+    The sqlite3 backup API copies ``pages_per_step`` pages at a time, and
+    the copy pauses ``step_sleep`` seconds between steps. A commit from
+    another connection restarts a backup, so under steady writes an
+    unpinned one never finishes. In WAL mode the copy therefore runs inside
+    one read transaction: it sees a single snapshot and never restarts, and
+    writers are not blocked. With a rollback journal that transaction would
+    block writers, so it is not pinned and the pauses let writes through.
+    The copy is written beside the target and renamed into place, and only
+    the ``keep`` newest snapshots are kept.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    stamp = dt.now().strftime("%Y%m%dT%H%M%S%f")
+    target = directory / f"{source.stem}-{stamp}{source.suffix}"
+    partial = target.with_name(target.name + ".partial")
+    pages = 0
+
+    def progress(status: int, remaining: int, total: int) -> None:
+        nonlocal pages
+        pages = total
+        if remaining:
+            time.sleep(step_sleep)
+
+    start = time.perf_counter()
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(partial)
+    try:
+        if src.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+            src.execute("BEGIN")
+            src.execute("SELECT 1 FROM sqlite_master").fetchall()
+        src.backup(dst, pages=pages_per_step, progress=progress)
+    except BaseException:
+        dst.close()
+        partial.unlink()
+        raise
+    finally:
+        src.close()
+    dst.close()
+    partial.replace(target)
+    snapshot = Snapshot(target, pages, time.perf_counter() - start)
+    pattern = f"{source.stem}-*{source.suffix}"
+    for old in sorted(directory.glob(pattern), reverse=True)[keep:]:
+        old.unlink()
+    return snapshot
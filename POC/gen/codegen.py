@@ -0,0 +1,377 @@
+"""Ahead-of-time code generation of record models.
+
+``write_model_files`` renders the applied schema of every database as
+source: the record table and validator that ``compile_db`` would build, into
+``generated_db_models.py``. Each database is one region of the file,
+tagged with its schema version and a fingerprint of its fields, and a
+region is only rendered again when those change.
+
+Every region is a builder function rather than module-level classes, so
+importing a module with thousands of databases stays cheap and a database
+pays for its classes on first use only. ``load_generated`` is what the
+record hot path calls instead of reading the fields and compiling them.
+
+The modules are part of the package, so they are written at build time,
+before it is installed, and never by the running app:
+
+    python -m POC.gen.codegen
+"""
+
+import asyncio
+import hashlib
+import importlib.util
+import json
+import os
+import py_compile
+import re
+import sys
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Callable, Iterable
+from POC.db.models.stock_models.db_models import CodegenResult, SchemaVersionModel
+from POC.gen.compiler import (
+    CompiledDb,
+    ComputedField,
+    Relation,
+    compile_computed,
+    compile_relations,
+    field_default,
+    input_columns,
+    record_table_name,
+)
+from POC.gen.migrate import fields_from_specs
+
+GENERATED_DIR = Path(__file__).parents[1] / "db" / "models" / "generated_models"
+DB_MODELS_FILE = "generated_db_models.py"
+DB_MODELS_MODULE = "POC.db.models.generated_models.generated_db_models"
+
+SQL_TYPES = {
+    "str": "String",
+    "int": "Integer",
+    "float": "Float",
+    "bool": "Boolean",
+    "date": "Date",
+    "datetime": "DateTime",
+    "time": "Time",
+    "json": "JSON",
+    "list": "JSON",
+    "dict": "JSON",
+}
+# Validators parse JSON text the way compile_db's do.
+VALIDATOR_TYPES = {
+    "str": "str",
+    "int": "int",
+    "float": "float",
+    "bool": "bool",
+    "date": "datetime.date",
+    "datetime": "datetime.datetime",
+    "time": "datetime.time",
+    "json": "JsonValue",
+    "list": "JsonList",
+    "dict": "JsonDict",
+}
+
+HEADER = """\
+# Generated by POC.gen.codegen from the applied schema of every database.
+# Do not edit: a region is rewritten when its database's schema changes.
+# ruff: noqa
+# fmt: off
+"""
+
+DB_MODELS_HEADER = f"""{HEADER}import datetime
+from typing import Callable, Optional
+from pydantic import BaseModel, ConfigDict, Field
+from sqlalchemy import (
+    JSON,
+    Boolean,
+    Column,
+    Computed,
+    Date,
+    DateTime,
+    Float,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Time,
+)
+from POC.gen.compiler import JsonDict, JsonList, JsonValue, Relation, foreign_key
+
+# (schema version, fingerprint, builder of the table and validator, columns)
+GeneratedDb = tuple[
+    int, str, Callable[[], tuple[Table, type[BaseModel]]], tuple[str, ...]
+]
+"""
+
+REGION = re.compile(
+    r"^# region db (?P<db_id>\d+) v(?P<version>\d+) (?P<fingerprint>\w+)\n"
+    r".*?^# endregion db (?P=db_id)\n",
+    re.MULTILINE | re.DOTALL,
+)
+
+
+def schema_fingerprint(fields: list[dict[str, Any]]) -> str:
+    # Versions restart with a new database file; this tells the schemas apart.
+    payload = json.dumps(fields, sort_keys=True, default=str).encode()
+    return hashlib.sha1(payload).hexdigest()[:12]
+
+
+def _region_start(schema: SchemaVersionModel) -> str:
+    return (
+        f"# region db {schema.db_id} v{schema.version}"
+        f" {schema_fingerprint(schema.fields)}"
+    )
+
+
+def _optional(annotation: str, required: bool) -> str:
+    return annotation if required else f"Optional[{annotation}]"
+
+
+def _columns(schema: SchemaVersionModel) -> list[tuple[int, dict[str, Any], Any]]:
+    # (index, spec, parsed default) for every field, as compile_db numbers them.
+    fields = fields_from_specs(schema.fields)
+    return [
+        (i, spec, field_default(field, spec["data_type"]))
+        for i, (spec, field) in enumerate(zip(schema.fields, fields))
+    ]
+
+
+def _computed(schema: SchemaVersionModel) -> dict[str, ComputedField]:
+    return {
+        field.column: field
+        for field in compile_computed(
+            fields_from_specs(schema.fields),
+            [spec["column"] for spec in schema.fields],
+        )
+    }
+
+
+def _relations(schema: SchemaVersionModel) -> dict[str, Relation]:
+    return {
+        relation.column: relation
+        for relation in compile_relations(
+            fields_from_specs(schema.fields),
+            [spec["column"] for spec in schema.fields],
+        )
+    }
+
+
+def render_db_region(schema: SchemaVersionModel) -> str:
+    db_id, table = schema.db_id, record_table_name(schema.db_id)
+    computed = _computed(schema)
+    relations = _relations(schema)
+    lines = [
+        _region_start(schema),
+        f"def db_{db_id}() -> tuple[Table, type[BaseModel]]:",
+        f"    class Db{db_id}V{schema.version}Record(BaseModel):",
+        '        model_config = ConfigDict(coerce_numbers_to_str=True, extra="ignore")',
+    ]
+    columns = ['        Column("id", Integer, primary_key=True),']
+    for i, spec, default in _columns(schema):
+        sql_type = SQL_TYPES[spec["data_type"]]
+        field = computed.get(spec["column"])
+        relation = relations.get(spec["column"])
+        if relation is not None and relation.kind == "child":
+            continue
+        if field is not None and field.generated:
+            columns.append(
+                f"        Column({spec['column']!r}, {sql_type},"
+                f" Computed({field.sql()!r}, persisted=False), nullable=True),"
+            )
+        elif field is not None:
+            columns.append(
+                f"        Column({spec['column']!r}, {sql_type}, nullable=True),"
+            )
+        else:
+            annotation = _optional(VALIDATOR_TYPES[spec["data_type"]], spec["required"])
+            value = "..." if spec["required"] else repr(default)
+            lines.append(
+                f"        field_{i}: {annotation} = Field("
+                f"default={value}, alias={spec['column']!r})"
+            )
+            key = (
+                f" foreign_key(metadata, {table!r}, {relation!r}, {sql_type}),"
+                if relation is not None
+                else ""
+            )
+            columns.append(
+                f"        Column({spec['column']!r}, {sql_type},{key}"
+                f" nullable={not spec['required']!r}),"
+            )
+        if spec["indexed"] or spec["unique"] or relation is not None:
+            columns.append(
+                f"        Index({f'ix_{table}_' + spec['column']!r},"
+                f" {spec['column']!r}, unique={spec['unique']!r}),"
+            )
+    lines += [
+        "",
+        "    metadata = MetaData()",
+        "    table = Table(",
+        f"        {table!r},",
+        "        metadata,",
+        *columns,
+        "    )",
+        f"    return table, Db{db_id}V{schema.version}Record",
+        f"# endregion db {db_id}",
+        "",
+    ]
+    return "\n".join(lines)
+
+
+def _registry(declaration: str, entries: list[str]) -> str:
+    if not entries:
+        return f"{declaration} = {{}}\n"
+    return "\n".join([f"{declaration} = {{", *entries, "}", ""])
+
+
+def _db_registry(schemas: list[SchemaVersionModel]) -> str:
+    return _registry(
+        "DB_MODELS: dict[int, GeneratedDb]",
+        [
+            f"    {s.db_id}: ({s.version}, {schema_fingerprint(s.fields)!r},"
+            f" db_{s.db_id}, {tuple(spec['column'] for spec in s.fields)!r}),"
+            for s in schemas
+        ],
+    )
+
+
+def read_regions(path: Path) -> dict[int, str]:
+    # The region of each database in a generated file, by db_id.
+    if not path.exists():
+        return {}
+    return {int(m["db_id"]): m.group(0) for m in REGION.finditer(path.read_text())}
+
+
+def _write_if_changed(path: Path, content: str) -> None:
+    if path.exists() and path.read_text() == content:
+        return
+    # Replace atomically so a concurrent import never sees half a module.
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(content)
+    os.replace(tmp, path)
+    # Compiling a few MB of source costs more than importing it, so the
+    # bytecode is written now, checked by hash rather than by mtime.
+    py_compile.compile(
+        str(path),
+        doraise=True,
+        invalidation_mode=py_compile.PycInvalidationMode.CHECKED_HASH,
+    )
+
+
+def _render_file(
+    path: Path,
+    header: str,
+    schemas: list[SchemaVersionModel],
+    render: Callable[[SchemaVersionModel], str],
+    registry: str,
+    result: CodegenResult,
+) -> None:
+    existing = read_regions(path)
+    regions = []
+    for schema in schemas:
+        current = existing.get(schema.db_id)
+        if current is not None and current.startswith(_region_start(schema) + "\n"):
+            regions.append(current)
+            result.reused.append(schema.db_id)
+        else:
+            regions.append(render(schema))
+            result.rendered.append(schema.db_id)
+    result.removed = sorted(set(existing) - {schema.db_id for schema in schemas})
+    _write_if_changed(path, "\n\n".join([header, *regions, registry]))
+
+
+def write_model_files(
+    schemas: Iterable[SchemaVersionModel], directory: Path | None = None
+) -> CodegenResult:
+    """Write the generated module for these applied schemas, one region per
+    database. Regions whose version and fields are unchanged are copied over
+    as they are, and a file whose content is unchanged is not touched."""
+    directory = directory or GENERATED_DIR
+    ordered = sorted(schemas, key=lambda schema: schema.db_id)
+    result = CodegenResult()
+    _render_file(
+        directory / DB_MODELS_FILE,
+        DB_MODELS_HEADER,
+        ordered,
+        render_db_region,
+        _db_registry(ordered),
+        result,
+    )
+    return result
+
+
+def generated_module() -> ModuleType:
+    # Loaded from GENERATED_DIR on first use, not at start-up, then kept in
+    # sys.modules like any import.
+    module = sys.modules.get(DB_MODELS_MODULE)
+    if module is None:
+        spec = importlib.util.spec_from_file_location(
+            DB_MODELS_MODULE, GENERATED_DIR / DB_MODELS_FILE
+        )
+        assert spec is not None and spec.loader is not None
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[DB_MODELS_MODULE] = module
+        spec.loader.exec_module(module)
+    return module
+
+
+def load_generated(schema: SchemaVersionModel) -> CompiledDb | None:
+    """The generated table and validator for this schema, if they were
+    generated from it."""
+    entry = generated_module().DB_MODELS.get(schema.db_id)
+    if entry is None or entry[:2] != (
+        schema.version,
+        schema_fingerprint(schema.fields),
+    ):
+        return None
+    _, _, build, columns = entry
+    table, validator = build()
+    computed = tuple(_computed(schema).values())
+    relations = tuple(_relations(schema).values())
+    searchable = tuple(
+        spec["column"] for spec in schema.fields if spec.get("searchable")
+    )
+    skip = {field.column for field in computed}
+    skip |= {relation.column for relation in relations if relation.kind == "child"}
+    inputs = input_columns(
+        fields_from_specs(schema.fields),
+        [spec["column"] for spec in schema.fields],
+        skip,
+    )
+    return CompiledDb(
+        schema.db_id,
+        schema.version,
+        table,
+        validator,
+        columns,
+        computed,
+        relations,
+        searchable,
+        inputs,
+    )
+
+
+def reload_generated() -> None:
+    # The next load_generated imports the freshly written file.
+    sys.modules.pop(DB_MODELS_MODULE, None)
+
+
+async def main() -> None:
+    from POC.core.config import Settings
+    from POC.db.database import Database
+    from POC.helpers.db_helpers import generate_db_model_file
+
+    database = Database(Settings.from_env())
+    await database.prepare()
+    async with database.session() as session:
+        result = await generate_db_model_file(session)
+    await database.dispose()
+    print(
+        f"rendered {len(result.rendered)}, reused {len(result.reused)},"
+        f" removed {len(result.removed)} databases"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
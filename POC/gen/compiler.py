@@ -0,0 +1,511 @@
+from __future__ import annotations
+import json
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import cached_property
+from graphlib import CycleError, TopologicalSorter
+from datetime import date, datetime as dt, time
+from typing import TYPE_CHECKING, Annotated, Any, Iterable, Mapping, Optional
+from typing import Sequence
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field, TypeAdapter
+from pydantic import ValidationError, create_model
+from sqlalchemy import (
+    JSON,
+    Boolean,
+    Column,
+    Computed,
+    Date,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Time,
+)
+from sqlalchemy.types import TypeEngine
+from POC.db.models.stock_models.db_models import FieldInfo
+from POC.gen.expressions import Expression, parse
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+def _parse_json(v: Any) -> Any:
+    if isinstance(v, (str, bytes)):
+        return json.loads(v)
+    return v
+
+
+JsonValue = Annotated[Any, BeforeValidator(_parse_json)]
+JsonList = Annotated[list, BeforeValidator(_parse_json)]
+JsonDict = Annotated[dict, BeforeValidator(_parse_json)]
+
+COLUMN_TYPES: dict[str, type[TypeEngine]] = {
+    "str": String,
+    "int": Integer,
+    "float": Float,
+    "bool": Boolean,
+    "date": Date,
+    "datetime": DateTime,
+    "time": Time,
+    "json": JSON,
+    "list": JSON,
+    "dict": JSON,
+}
+
+PYTHON_TYPES: dict[str, Any] = {
+    "str": str,
+    "int": int,
+    "float": float,
+    "bool": bool,
+    "date": date,
+    "datetime": dt,
+    "time": time,
+    "json": JsonValue,
+    "list": JsonList,
+    "dict": JsonDict,
+}
+
+DATA_TYPE_ALIASES = {
+    "string": "str",
+    "text": "str",
+    "integer": "int",
+    "number": "float",
+    "decimal": "float",
+    "boolean": "bool",
+}
+
+RESERVED_COLUMNS = {"id"}
+COMPUTED_TYPES = {"int", "float"}
+
+
+def normalize_data_type(data_type: str) -> str:
+    key = data_type.strip().lower()
+    key = DATA_TYPE_ALIASES.get(key, key)
+    if key not in COLUMN_TYPES:
+        raise ValueError(f"Unsupported data type: {data_type}")
+    return key
+
+
+def record_table_name(db_id: int) -> str:
+    return f"db_{db_id}_records"
+
+
+def unique_column_name(name: str, taken: Iterable[str]) -> str:
+    # Field names are not unique per database, so repeats get a numeric suffix.
+    taken = set(taken) | RESERVED_COLUMNS
+    unique, n = name, 1
+    while unique in taken:
+        n += 1
+        unique = f"{name}_{n}"
+    return unique
+
+
+@dataclass(frozen=True)
+class ComputedField:
+    """A field whose value is an expression over other numeric fields.
+
+    ``generated`` fields are SQLite generated columns, computed by SQLite
+    when read. The others are stored columns filled in on every write.
+    """
+
+    column: str
+    data_type: str
+    expression: Expression
+    generated: bool
+
+    def finish(self, value: float | None) -> float | int | None:
+        if value is None or self.data_type == "float":
+            return value
+        # Whatever does not fit SQLite's 64-bit integers is NULL, as in NumPy.
+        return int(value) if abs(value) < 2.0**63 else None
+
+    def finish_array(self, values: np.ndarray) -> np.ndarray:
+        import numpy as np
+
+        return np.trunc(values) if self.data_type == "int" else values
+
+    def sql(self) -> str:
+        sql = self.expression.to_sql()
+        return f"CAST({sql} AS INTEGER)" if self.data_type == "int" else sql
+
+
+def compile_computed(
+    fields: Sequence[FieldInfo], columns: Sequence[str]
+) -> tuple[ComputedField, ...]:
+    """The computed fields among ``fields``, in the order they can be
+    computed in, with their references resolved to ``columns``."""
+    data_types = {
+        column: normalize_data_type(field.data_type)
+        for field, column in zip(fields, columns)
+    }
+    computed: dict[str, ComputedField] = {}
+    for field, column in zip(fields, columns):
+        if not field.expression:
+            continue
+        if data_types[column] not in COMPUTED_TYPES:
+            raise ValueError(f"Computed field {field.name!r} must be int or float")
+        expression = parse(field.expression).resolve({c: c for c in columns})
+        for reference in expression.references:
+            if data_types[reference] not in COMPUTED_TYPES:
+                raise ValueError(
+                    f"Computed field {field.name!r} uses {reference!r},"
+                    " which is not a number"
+                )
+        generated = expression.sql_only
+        computed[column] = ComputedField(
+            column, data_types[column], expression, generated
+        )
+    graph = TopologicalSorter(
+        {
+            column: [ref for ref in field.expression.references if ref in computed]
+            for column, field in computed.items()
+        }
+    )
+    try:
+        order = list(graph.static_order())
+    except CycleError as e:
+        cycle = ", ".join(dict.fromkeys(e.args[1]))
+        raise ValueError(f"Computed fields depend on each other: {cycle}")
+    return tuple(computed[column] for column in order)
+
+
+@dataclass(frozen=True)
+class Relation:
+    """A relationship field, joining ``local`` to ``key`` of ``db_id``.
+
+    A parent field is a column holding the key of one related record; a
+    child field has no column and stands for the related records whose
+    ``key`` column holds this record's id.
+    """
+
+    column: str
+    kind: str
+    db_id: int
+    key: str
+
+    @property
+    def local(self) -> str:
+        return self.column if self.kind == "parent" else "id"
+
+
+def compile_relations(
+    fields: Sequence[FieldInfo], columns: Sequence[str]
+) -> tuple[Relation, ...]:
+    """The relationship fields among ``fields``, checked on their own; that
+    the related database has the key is checked where fields are saved."""
+    relations = []
+    for field, column in zip(fields, columns):
+        if field.relationship is None:
+            continue
+        if field.related_db_id is None:
+            raise ValueError(f"Relationship field {field.name!r} needs a database")
+        if field.expression:
+            raise ValueError(f"Relationship field {field.name!r} cannot be computed")
+        data_type = normalize_data_type(field.data_type)
+        if field.relationship == "child":
+            if not field.related_key:
+                raise ValueError(
+                    f"Child field {field.name!r} needs the related field"
+                    " that refers back"
+                )
+            if data_type != "list":
+                raise ValueError(f"Child field {field.name!r} must be a list")
+        elif not field.related_key and data_type != "int":
+            raise ValueError(f"Parent field {field.name!r} must be an int to hold ids")
+        key = field.related_key or "id"
+        relations.append(Relation(column, field.relationship, field.related_db_id, key))
+    return tuple(relations)
+
+
+def foreign_key(
+    metadata: MetaData, table_name: str, relation: Relation, column_type: Any
+) -> ForeignKey:
+    """The key of a parent field's column in ``table_name``. Another table
+    it refers to is only declared in ``metadata``, so the key resolves
+    without loading that database."""
+    table = record_table_name(relation.db_id)
+    if table == table_name:
+        return ForeignKey(f"{table}.{relation.key}", ondelete="SET NULL")
+    if table not in metadata.tables:
+        Table(table, metadata, Column("id", Integer, primary_key=True))
+    if relation.key not in metadata.tables[table].c:
+        metadata.tables[table].append_column(Column(relation.key, column_type))
+    return ForeignKey(f"{table}.{relation.key}", ondelete="SET NULL")
+
+
+def compute_row(
+    computed: Sequence[ComputedField], values: dict[str, Any]
+) -> dict[str, Any]:
+    """Fill in the stored computed columns of one row."""
+    scope = dict(values)
+    for field in computed:
+        scope[field.column] = field.finish(field.expression.evaluate_row(scope))
+        if not field.generated:
+            values[field.column] = scope[field.column]
+    return values
+
+
+def compute_columns(
+    computed: Sequence[ComputedField], inputs: Mapping[str, Sequence[Any]], n: int
+) -> dict[str, list[Any]]:
+    """The stored computed columns of ``n`` rows, evaluated over whole
+    columns at a time; ``inputs`` holds the columns they read."""
+    import numpy as np
+
+    arrays = {name: np.array(values, dtype=float) for name, values in inputs.items()}
+    results: dict[str, list[Any]] = {}
+    for field in computed:
+        array = field.finish_array(field.expression.evaluate(arrays, n))
+        arrays[field.column] = array
+        if field.generated:
+            continue
+        missing = np.isnan(array)
+        if field.data_type == "int":
+            missing |= np.abs(array) >= 2.0**63
+            array = np.where(missing, 0, array).astype(np.int64)
+        column = array.astype(object)
+        column[missing] = None
+        results[field.column] = column.tolist()
+    return results
+
+
+def computed_inputs(computed: Sequence[ComputedField]) -> list[str]:
+    # The plain columns the computed fields read.
+    columns = {field.column for field in computed}
+    return list(
+        dict.fromkeys(
+            ref
+            for field in computed
+            for ref in field.expression.references
+            if ref not in columns
+        )
+    )
+
+
+@dataclass(frozen=True)
+class InputColumn:
+    """A field the record supplies, as bulk validation checks it.
+
+    Plain data, unlike the validator, so it can go to a worker process.
+    """
+
+    column: str
+    data_type: str
+    required: bool
+    # The parsed default of an optional field, or None.
+    default: Any = None
+
+
+@dataclass(frozen=True)
+class CompiledDb:
+    """A user database's active fields turned into a table and a validator."""
+
+    db_id: int
+    version: int
+    table: Table
+    validator: type[BaseModel]
+    columns: tuple[str, ...]
+    # Computed fields in dependency order.
+    computed: tuple[ComputedField, ...] = ()
+    relations: tuple[Relation, ...] = ()
+    # Text columns mirrored into the database's full-text index.
+    searchable: tuple[str, ...] = ()
+    # The fields the validator takes, for column-wise bulk validation.
+    inputs: tuple[InputColumn, ...] = ()
+
+    def relation(self, column: str) -> Relation | None:
+        return next((r for r in self.relations if r.column == column), None)
+
+    def validate(self, row: dict[str, Any]) -> dict[str, Any]:
+        values = self.validator.model_validate(row).model_dump(by_alias=True)
+        return compute_row(self.computed, values)
+
+    @cached_property
+    def batch_validator(self) -> TypeAdapter[list[BaseModel]]:
+        return TypeAdapter(list[self.validator])  # type: ignore[name-defined]
+
+    def validate_many(
+        self, rows: list[dict[str, Any]]
+    ) -> tuple[list[dict[str, Any]], dict[int, str]]:
+        """Validate a batch in one pass, returning the valid rows and the
+        errors of the invalid ones keyed by their index in ``rows``."""
+        errors: dict[int, str] = {}
+        try:
+            models = self.batch_validator.validate_python(rows)
+        except ValidationError as e:
+            for error in e.errors(include_url=False):
+                index, *loc = error["loc"]
+                column = self._alias(loc[0]) if loc else ""
+                errors.setdefault(int(index), f"{column}: {error['msg']}")
+            rows = [row for i, row in enumerate(rows) if i not in errors]
+            models = self.batch_validator.validate_python(rows)
+        valid = self.batch_validator.dump_python(models, by_alias=True)
+        return self.compute_many(valid), errors
+
+    def compute_many(self, rows: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Fill in the stored computed fields of validated ``rows``."""
+        if rows and any(not field.generated for field in self.computed):
+            inputs = {
+                name: [row[name] for row in rows]
+                for name in computed_inputs(self.computed)
+            }
+            results = compute_columns(self.computed, inputs, len(rows))
+            for name, values in results.items():
+                for row, value in zip(rows, values):
+                    row[name] = value
+        return rows
+
+    def _alias(self, key: Any) -> str:
+        field = self.validator.model_fields.get(str(key))
+        return field.alias if field is not None and field.alias else str(key)
+
+
+def field_default(field: FieldInfo, data_type: str) -> Any:
+    if field.required:
+        return ...
+    if field.default in (None, ""):
+        return None
+    try:
+        return TypeAdapter(PYTHON_TYPES[data_type]).validate_python(field.default)
+    except (ValidationError, ValueError):
+        return None
+
+
+def input_columns(
+    fields: Iterable[FieldInfo], names: Iterable[str], skip: set[str]
+) -> tuple[InputColumn, ...]:
+    # The fields compile_db gives the validator: all but those in ``skip``,
+    # the computed and child relationship fields.
+    inputs = []
+    for field, name in zip(fields, names):
+        if name not in skip:
+            data_type = normalize_data_type(field.data_type)
+            default = None if field.required else field_default(field, data_type)
+            inputs.append(InputColumn(name, data_type, field.required, default))
+    return tuple(inputs)
+
+
+def column_names(fields: Iterable[FieldInfo]) -> list[str]:
+    names: list[str] = []
+    for field in fields:
+        names.append(unique_column_name(field.name, names))
+    return names
+
+
+def compile_db(db_id: int, version: int, fields: Iterable[FieldInfo]) -> CompiledDb:
+    metadata = MetaData()
+    table_name = record_table_name(db_id)
+    columns: list[Column] = [Column("id", Integer, primary_key=True)]
+    indexes: list[Index] = []
+    definitions: dict[str, Any] = {}
+    fields = list(fields)
+    names = column_names(fields)
+    computed = {field.column: field for field in compile_computed(fields, names)}
+    relations = {r.column: r for r in compile_relations(fields, names)}
+    skip = set(computed) | {r.column for r in relations.values() if r.kind == "child"}
+    searchable: list[str] = []
+    for i, (field, name) in enumerate(zip(fields, names)):
+        data_type = normalize_data_type(field.data_type)
+        column_type = COLUMN_TYPES[data_type]
+        relation = relations.get(name)
+        if field.searchable:
+            if data_type != "str":
+                raise ValueError(f"Searchable field {field.name!r} must be a str")
+            searchable.append(name)
+        if relation is not None and relation.kind == "child":
+            # Read from the related table; there is nothing to store.
+            continue
+        if name in computed:
+            # Computed values are never taken from the record.
+            generated = (
+                [Computed(computed[name].sql(), persisted=False)]
+                if computed[name].generated
+                else []
+            )
+            columns.append(Column(name, column_type, *generated, nullable=True))
+        else:
+            python_type = PYTHON_TYPES[data_type]
+            if not field.required:
+                python_type = Optional[python_type]
+            definitions[f"field_{i}"] = (
+                python_type,
+                Field(default=field_default(field, data_type), alias=name),
+            )
+            keys = (
+                [foreign_key(metadata, table_name, relation, column_type)]
+                if relation is not None
+                else []
+            )
+            columns.append(
+                Column(name, column_type, *keys, nullable=not field.required)
+            )
+        # Parent fields are indexed for child lookups and ON DELETE.
+        if field.indexed or field.unique or relation is not None:
+            index_name = f"ix_{table_name}_{name}"
+            indexes.append(Index(index_name, columns[-1], unique=field.unique))
+
+    table = Table(table_name, metadata, *columns, *indexes)
+    validator = create_model(  # type: ignore[call-overload]
+        f"Db{db_id}V{version}Record",
+        __config__=ConfigDict(coerce_numbers_to_str=True, extra="ignore"),
+        **definitions,
+    )
+    return CompiledDb(
+        db_id,
+        version,
+        table,
+        validator,
+        tuple(names),
+        tuple(computed.values()),
+        tuple(relations.values()),
+        tuple(searchable),
+        input_columns(fields, names, skip),
+    )
+
+
+class CompiledDbCache:
+    """LRU cache of compiled databases keyed by (db_id, version)."""
+
+    def __init__(self, maxsize: int = 256) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items: OrderedDict[tuple[int, int], CompiledDb] = OrderedDict()
+
+    def get(self, db_id: int, version: int) -> CompiledDb | None:
+        compiled = self._items.get((db_id, version))
+        if compiled is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._items.move_to_end((db_id, version))
+        return compiled
+
+    def put(self, compiled: CompiledDb) -> None:
+        self.invalidate(compiled.db_id)
+        self._items[(compiled.db_id, compiled.version)] = compiled
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, db_id: int) -> None:
+        for key in [key for key in self._items if key[0] == db_id]:
+            del self._items[key]
+
+    def clear(self) -> None:
+        self._items.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": len(self._items),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,132 @@
+import asyncio
+import csv
+import io
+import json
+import os
+import tempfile
+from datetime import date, datetime as dt, time
+from typing import Any, AsyncIterator, Literal, Sequence
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from POC.db.database import session_engine
+
+ExportFormat = Literal["csv", "ndjson", "xlsx"]
+
+YIELD_PER = 1000
+FILE_CHUNK = 64 * 1024
+
+MEDIA_TYPES: dict[str, str] = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def _json_default(v: Any) -> Any:
+    if isinstance(v, (dt, date, time)):
+        return v.isoformat()
+    raise TypeError(f"Object of type {type(v).__name__} is not JSON serializable")
+
+
+def _cell(v: Any) -> Any:
+    # JSON, list and dict fields have no native CSV or spreadsheet cell type.
+    if isinstance(v, (dict, list)):
+        return json.dumps(v, default=_json_default)
+    return v
+
+
+def _encode_csv(rows: Sequence[Sequence[Any]]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([_cell(v) for v in row] for row in rows)
+    return buffer.getvalue().encode()
+
+
+def _encode_ndjson(keys: list[str], rows: Sequence[Sequence[Any]]) -> bytes:
+    lines = (json.dumps(dict(zip(keys, row)), default=_json_default) for row in rows)
+    return ("\n".join(lines) + "\n").encode()
+
+
+async def _partitions(
+    engine: AsyncEngine, statement: Select, yield_per: int
+) -> AsyncIterator[tuple[list[str], Sequence[Sequence[Any]]]]:
+    # A server-side cursor fetched in yield_per batches keeps at most one
+    # partition of rows in memory, however large the table is.
+    async with engine.connect() as connection:
+        result = await connection.stream(
+            statement.execution_options(yield_per=yield_per)
+        )
+        keys = list(result.keys())
+        empty = True
+        async for partition in result.partitions():
+            empty = False
+            yield keys, partition
+        if empty:
+            yield keys, []
+
+
+async def stream_export(
+    engine: AsyncEngine,
+    statement: Select,
+    export_format: ExportFormat,
+    yield_per: int = YIELD_PER,
+) -> AsyncIterator[bytes]:
+    """Serialize the rows of ``statement`` as they are fetched."""
+    if export_format == "xlsx":
+        async for chunk in _stream_xlsx(engine, statement, yield_per):
+            yield chunk
+        return
+
+    header_sent = False
+    async for keys, rows in _partitions(engine, statement, yield_per):
+        if export_format == "csv":
+            if not header_sent:
+                yield _encode_csv([keys])
+                header_sent = True
+            if rows:
+                yield _encode_csv(rows)
+        elif rows:
+            yield _encode_ndjson(keys, rows)
+
+
+async def _stream_xlsx(
+    engine: AsyncEngine, statement: Select, yield_per: int
+) -> AsyncIterator[bytes]:
+    # An XLSX file is a zip whose directory is written last, so it cannot be
+    # sent as it is built. openpyxl's write-only mode spools rows to disk,
+    # which keeps memory flat; the finished file is then streamed back.
+    # Imported here: openpyxl is slow to import and only XLSX needs it.
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    header_sent = False
+    async for keys, rows in _partitions(engine, statement, yield_per):
+        if not header_sent:
+            sheet.append(keys)
+            header_sent = True
+        for row in rows:
+            sheet.append([_cell(v) for v in row])
+
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        await asyncio.to_thread(workbook.save, path)
+        with open(path, "rb") as f:
+            while chunk := await asyncio.to_thread(f.read, FILE_CHUNK):
+                yield chunk
+    finally:
+        os.unlink(path)
+
+
+def export_response(
+    session: AsyncSession, statement: Select, export_format: ExportFormat, name: str
+) -> StreamingResponse:
+    return StreamingResponse(
+        stream_export(session_engine(session), statement, export_format),
+        media_type=MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{name}.{export_format}"'
+        },
+    )
@@ -0,0 +1,493 @@
+"""The arithmetic language of computed fields.
+
+A computed field is defined by an expression over other numeric fields::
+
+    Field 1 plus Field 2
+    (Comp 1 times Field 3) divided by 100
+    round([Unit price] * 1.2, 2)
+
+Field names are written as they are, several words included, or in square
+brackets when they hold anything but letters, digits and underscores, or
+clash with an operator or function. Operators are ``+ - * /`` or the words
+plus, minus, times and divided by, case-insensitively.
+
+An expression is parsed once and then runs three ways: as SQL, for SQLite
+generated columns; over NumPy column arrays, for batches; and over one row
+of Python values. All three agree: NULL in gives NULL out, dividing by zero
+gives NULL, and so does any result that is not a finite number.
+"""
+
+from __future__ import annotations
+import math
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Callable, Mapping, Union
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Functions every SQLite build has. An expression using only these can be a
+# generated column; the others need SQLite's optional math functions, so
+# their results are computed in Python and stored.
+# (fewest, most) arguments of each function, None for no limit.
+SQL_FUNCTIONS: dict[str, tuple[int, int | None]] = {
+    "abs": (1, 1),
+    "round": (1, 2),
+    "min": (2, None),
+    "max": (2, None),
+    "coalesce": (2, None),
+}
+MATH_FUNCTIONS: dict[str, tuple[int, int | None]] = {
+    "sqrt": (1, 1),
+    "ln": (1, 1),
+    "exp": (1, 1),
+    "pow": (2, 2),
+    "floor": (1, 1),
+    "ceil": (1, 1),
+}
+FUNCTIONS = {**SQL_FUNCTIONS, **MATH_FUNCTIONS}
+WORD_OPERATORS = {"plus": "+", "minus": "-", "times": "*"}
+KEYWORDS = {*WORD_OPERATORS, "divided"}
+
+_TOKEN = re.compile(
+    r"\s*(?:(?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)"
+    r"|\[(?P<bracketed>[^\]]*)\]"
+    r"|(?P<word>[A-Za-z_][A-Za-z0-9_]*)"
+    r"|(?P<symbol>[-+*/(),]))"
+)
+
+
+class ExpressionError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Token:
+    kind: str
+    text: str
+    start: int
+    end: int
+
+
+def tokenize(text: str) -> list[Token]:
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if match is None or match.lastgroup is None:
+            raise ExpressionError(
+                f"Unexpected {text[position:].lstrip()[:10]!r} in {text!r}"
+            )
+        kind = match.lastgroup
+        tokens.append(Token(kind, match[kind], match.start(kind), match.end(kind)))
+        position = match.end()
+    return tokens
+
+
+@dataclass(frozen=True)
+class Number:
+    value: float | int
+
+
+@dataclass(frozen=True)
+class Ref:
+    name: str
+
+
+@dataclass(frozen=True)
+class Negate:
+    operand: Node
+
+
+@dataclass(frozen=True)
+class Binary:
+    operator: str
+    left: Node
+    right: Node
+
+
+@dataclass(frozen=True)
+class Call:
+    function: str
+    args: tuple[Node, ...]
+
+
+Node = Union[Number, Ref, Negate, Binary, Call]
+
+
+class _Parser:
+    """Recursive descent over ``expression := term (("+" | "-") term)*``,
+    ``term := factor (("*" | "/") factor)*`` and
+    ``factor := "-" factor | number | name | function "(" args ")" | "(" expression ")"``.
+    """
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.tokens = tokenize(text)
+        self.position = 0
+        # (start, end) in the text of every field reference, for renames.
+        self.spans: list[tuple[str, int, int]] = []
+
+    def peek(self, offset: int = 0) -> Token | None:
+        i = self.position + offset
+        return self.tokens[i] if i < len(self.tokens) else None
+
+    def next(self) -> Token:
+        token = self.peek()
+        if token is None:
+            raise ExpressionError(f"Unexpected end of {self.text!r}")
+        self.position += 1
+        return token
+
+    def expect(self, symbol: str) -> None:
+        token = self.next()
+        if token.text != symbol:
+            raise ExpressionError(f"Expected {symbol!r} at {token.text!r}")
+
+    def operator(self, operators: str) -> str | None:
+        token = self.peek()
+        if token is None:
+            return None
+        if token.kind == "symbol" and token.text in operators:
+            self.position += 1
+            return token.text
+        word = token.text.lower() if token.kind == "word" else ""
+        if WORD_OPERATORS.get(word, "") in operators.split():
+            self.position += 1
+            return WORD_OPERATORS[word]
+        after = self.peek(1)
+        if (
+            "/" in operators
+            and word == "divided"
+            and after is not None
+            and after.text.lower() == "by"
+        ):
+            self.position += 2
+            return "/"
+        return None
+
+    def parse(self) -> Node:
+        if not self.tokens:
+            raise ExpressionError("Empty expression")
+        node = self.expression()
+        token = self.peek()
+        if token is not None:
+            raise ExpressionError(f"Unexpected {token.text!r} in {self.text!r}")
+        return node
+
+    def expression(self) -> Node:
+        node = self.term()
+        while (operator := self.operator("+ -")) is not None:
+            node = Binary(operator, node, self.term())
+        return node
+
+    def term(self) -> Node:
+        node = self.factor()
+        while (operator := self.operator("* /")) is not None:
+            node = Binary(operator, node, self.factor())
+        return node
+
+    def factor(self) -> Node:
+        if self.operator("-") is not None:
+            return Negate(self.factor())
+        token = self.next()
+        if token.kind == "number":
+            value = float(token.text)
+            if not math.isfinite(value):
+                raise ExpressionError(f"Number out of range: {token.text}")
+            is_int = value.is_integer() and not set(token.text) & set(".eE")
+            return Number(int(token.text) if is_int else value)
+        if token.kind == "bracketed":
+            return self.reference(token.text.strip(), token.start - 1, token.end + 1)
+        if token.text == "(":
+            node = self.expression()
+            self.expect(")")
+            return node
+        if token.kind != "word" or token.text.lower() in KEYWORDS:
+            raise ExpressionError(f"Unexpected {token.text!r} in {self.text!r}")
+        after = self.peek()
+        if after is not None and after.text == "(":
+            return self.call(token)
+        # A name runs over words and numbers up to the next operator.
+        end = token.end
+        while (after := self.peek()) is not None and (
+            after.kind == "number"
+            or (after.kind == "word" and after.text.lower() not in KEYWORDS)
+        ):
+            end = self.next().end
+        return self.reference(
+            " ".join(self.text[token.start : end].split()), token.start, end
+        )
+
+    def reference(self, name: str, start: int, end: int) -> Ref:
+        if not name:
+            raise ExpressionError(f"Empty field name in {self.text!r}")
+        self.spans.append((name, start, end))
+        return Ref(name)
+
+    def call(self, token: Token) -> Call:
+        function = token.text.lower()
+        if function not in FUNCTIONS:
+            raise ExpressionError(f"Unknown function {token.text!r}")
+        self.expect("(")
+        args = [self.expression()]
+        while self.peek() is not None and self.peek().text == ",":  # type: ignore[union-attr]
+            self.position += 1
+            args.append(self.expression())
+        self.expect(")")
+        least, most = FUNCTIONS[function]
+        if len(args) < least or (most is not None and len(args) > most):
+            raise ExpressionError(f"Wrong number of arguments to {function}")
+        if function == "round" and len(args) == 2:
+            digits = args[1]
+            if not (isinstance(digits, Number) and isinstance(digits.value, int)):
+                raise ExpressionError("round takes a whole number of digits")
+        return Call(function, tuple(args))
+
+
+def _walk(node: Node) -> list[Node]:
+    nodes = [node]
+    if isinstance(node, Negate):
+        nodes += _walk(node.operand)
+    elif isinstance(node, Binary):
+        nodes += _walk(node.left) + _walk(node.right)
+    elif isinstance(node, Call):
+        for arg in node.args:
+            nodes += _walk(arg)
+    return nodes
+
+
+def references(node: Node) -> tuple[str, ...]:
+    """Field names in the order they first appear."""
+    names = [ref.name for ref in _walk(node) if isinstance(ref, Ref)]
+    return tuple(dict.fromkeys(names))
+
+
+def _normal(name: str) -> str:
+    return " ".join(name.split()).casefold()
+
+
+def quote_name(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _plain(name: str) -> bool:
+    # Whether the name reads back as itself without brackets.
+    try:
+        return _Parser(name).parse() == Ref(name)
+    except ExpressionError:
+        return False
+
+
+@dataclass(frozen=True)
+class Expression:
+    text: str
+    root: Node
+    spans: tuple[tuple[str, int, int], ...] = ()
+
+    @property
+    def references(self) -> tuple[str, ...]:
+        return references(self.root)
+
+    @property
+    def functions(self) -> set[str]:
+        return {node.function for node in _walk(self.root) if isinstance(node, Call)}
+
+    @property
+    def sql_only(self) -> bool:
+        """Whether SQLite can compute it in a generated column."""
+        return self.functions <= set(SQL_FUNCTIONS)
+
+    def resolve(self, columns: Mapping[str, str]) -> Expression:
+        """Replace field names with ``columns[name]``.
+
+        A name matches its key exactly or, failing that, ignoring case and
+        runs of spaces.
+        """
+        normal: dict[str, list[str]] = {}
+        for name in columns:
+            normal.setdefault(_normal(name), []).append(name)
+
+        def column(name: str) -> str:
+            if name in columns:
+                return columns[name]
+            matches = normal.get(_normal(name), [])
+            if len(matches) != 1:
+                problem = "Ambiguous" if matches else "Unknown"
+                raise ExpressionError(f"{problem} field {name!r} in {self.text!r}")
+            return columns[matches[0]]
+
+        def resolve(node: Node) -> Node:
+            if isinstance(node, Ref):
+                return Ref(column(node.name))
+            if isinstance(node, Negate):
+                return Negate(resolve(node.operand))
+            if isinstance(node, Binary):
+                return Binary(node.operator, resolve(node.left), resolve(node.right))
+            if isinstance(node, Call):
+                return Call(node.function, tuple(resolve(arg) for arg in node.args))
+            return node
+
+        return Expression(self.text, resolve(self.root))
+
+    def rename(self, old: str, new: str) -> str:
+        """The text with references to field ``old`` pointing at ``new``."""
+        text = self.text
+        for name, start, end in sorted(self.spans, key=lambda s: -s[1]):
+            if _normal(name) == _normal(old):
+                written = new if _plain(new) else f"[{new}]"
+                text = text[:start] + written + text[end:]
+        return text
+
+    def to_sql(self) -> str:
+        return _sql(self.root)
+
+    def evaluate(self, arrays: Mapping[str, np.ndarray], n: int) -> np.ndarray:
+        """Evaluate over float64 columns of ``n`` rows, NaN standing for NULL."""
+        import numpy as np
+
+        with np.errstate(all="ignore"):
+            return _finite(_evaluate(self.root, arrays, n))
+
+    def evaluate_row(self, values: Mapping[str, Any]) -> float | None:
+        result = _evaluate_row(self.root, values)
+        return result if result is None or math.isfinite(result) else None
+
+
+@lru_cache(maxsize=1024)
+def parse(text: str) -> Expression:
+    parser = _Parser(text)
+    root = parser.parse()
+    return Expression(text, root, tuple(parser.spans))
+
+
+def _sql(node: Node) -> str:
+    if isinstance(node, Number):
+        return repr(node.value)
+    if isinstance(node, Ref):
+        return quote_name(node.name)
+    if isinstance(node, Negate):
+        return f"(-{_sql(node.operand)})"
+    if isinstance(node, Binary):
+        left, right = _sql(node.left), _sql(node.right)
+        if node.operator == "/":
+            # SQLite divides integers as integers, and by zero into NULL.
+            left = f"CAST({left} AS REAL)"
+        return f"({left} {node.operator} {right})"
+    if node.function not in SQL_FUNCTIONS:
+        raise ExpressionError(f"{node.function} has no SQL form")
+    return f"{node.function}({', '.join(_sql(arg) for arg in node.args)})"
+
+
+def _finite(array: np.ndarray) -> np.ndarray:
+    import numpy as np
+
+    return np.where(np.isfinite(array), array, np.nan)
+
+
+def _round(values: Any, digits: int, floor: Callable[[Any], Any], sign: Any) -> Any:
+    # Half away from zero, as SQLite rounds; Python and NumPy round to even.
+    scale = 10.0**digits
+    return sign(values) * floor(abs(values) * scale + 0.5) / scale
+
+
+def _evaluate(node: Node, arrays: Mapping[str, np.ndarray], n: int) -> np.ndarray:
+    import numpy as np
+
+    if isinstance(node, Number):
+        return np.full(n, float(node.value))
+    if isinstance(node, Ref):
+        return arrays[node.name]
+    if isinstance(node, Negate):
+        return -_evaluate(node.operand, arrays, n)
+    if isinstance(node, Binary):
+        left = _evaluate(node.left, arrays, n)
+        right = _evaluate(node.right, arrays, n)
+        if node.operator == "+":
+            return left + right
+        if node.operator == "-":
+            return left - right
+        if node.operator == "*":
+            return left * right
+        return _finite(left / right)
+    args = [_evaluate(arg, arrays, n) for arg in node.args]
+    if node.function == "abs":
+        return np.abs(args[0])
+    if node.function == "round":
+        digits = node.args[1].value if len(node.args) > 1 else 0  # type: ignore[union-attr]
+        return _round(args[0], int(digits), np.floor, np.sign)
+    if node.function == "min":
+        return np.minimum.reduce(args)
+    if node.function == "max":
+        return np.maximum.reduce(args)
+    if node.function == "coalesce":
+        result = args[-1]
+        for arg in reversed(args[:-1]):
+            result = np.where(np.isnan(arg), result, arg)
+        return result
+    if node.function == "pow":
+        return _finite(np.power(args[0], args[1]))
+    functions: dict[str, Callable[[Any], Any]] = {
+        "sqrt": np.sqrt,
+        "ln": np.log,
+        "exp": np.exp,
+        "floor": np.floor,
+        "ceil": np.ceil,
+    }
+    return _finite(functions[node.function](args[0]))
+
+
+_ROW_FUNCTIONS: dict[str, Callable[..., float]] = {
+    "sqrt": math.sqrt,
+    "ln": math.log,
+    "exp": math.exp,
+    "pow": math.pow,
+    "floor": lambda x: float(math.floor(x)),
+    "ceil": lambda x: float(math.ceil(x)),
+}
+
+
+def _evaluate_row(node: Node, values: Mapping[str, Any]) -> float | None:
+    if isinstance(node, Number):
+        return node.value
+    if isinstance(node, Ref):
+        value = values.get(node.name)
+        return None if value is None else float(value)
+    if isinstance(node, Negate):
+        operand = _evaluate_row(node.operand, values)
+        return None if operand is None else -operand
+    if isinstance(node, Binary):
+        left = _evaluate_row(node.left, values)
+        right = _evaluate_row(node.right, values)
+        if left is None or right is None:
+            return None
+        if node.operator == "+":
+            return left + right
+        if node.operator == "-":
+            return left - right
+        if node.operator == "*":
+            return left * right
+        return left / right if right else None
+    if node.function == "round":
+        value = _evaluate_row(node.args[0], values)
+        digits = node.args[1].value if len(node.args) > 1 else 0  # type: ignore[union-attr]
+        if value is None:
+            return None
+        return _round(value, int(digits), math.floor, lambda x: math.copysign(1, x))
+    args = [_evaluate_row(arg, values) for arg in node.args]
+    if node.function == "coalesce":
+        return next((arg for arg in args if arg is not None), None)
+    if any(arg is None for arg in args):
+        return None
+    if node.function == "abs":
+        return abs(args[0])  # type: ignore[arg-type]
+    if node.function == "min":
+        return min(args)  # type: ignore[type-var]
+    if node.function == "max":
+        return max(args)  # type: ignore[type-var]
+    try:
+        return _ROW_FUNCTIONS[node.function](*args)
+    except (ValueError, OverflowError):
+        return None
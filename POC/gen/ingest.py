@@ -0,0 +1,232 @@
+import asyncio
+import codecs
+import csv
+import json
+from collections import deque
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Iterable
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel.ext.asyncio.session import AsyncSession
+from POC.db.models.stock_models.db_models import (
+    BulkIngestResult,
+    ChunkResult,
+    ColumnErrors,
+    RowError,
+)
+from POC.gen.compiler import CompiledDb
+from POC.gen.search import index_rows, pause_triggers, resume_triggers
+from POC.gen.validate import FieldError, ValidationPool
+from POC.workflows.queue import enqueue
+
+CHUNK_SIZE = 1000
+MAX_ERRORS_PER_CHUNK = 20
+# Rows and distinct values kept per field in the load's error summary.
+MAX_COLUMN_SAMPLES = 5
+
+
+async def iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[list[str]]:
+    """Decode a byte stream and yield the complete lines of each chunk."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        lines = pending.split("\n")
+        pending = lines.pop()
+        if lines:
+            yield lines
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield [pending]
+
+
+async def iter_ndjson_rows(
+    chunks: AsyncIterable[bytes],
+) -> AsyncIterator[dict[str, Any] | str]:
+    # Lines that are not a JSON object are passed through as the error text so
+    # they are reported against their row number instead of aborting the load.
+    async for lines in iter_lines(chunks):
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield f"Invalid JSON: {e.msg}"
+                continue
+            yield row if isinstance(row, dict) else "Expected a JSON object"
+
+
+async def iter_csv_rows(
+    chunks: AsyncIterable[bytes],
+) -> AsyncIterator[dict[str, Any] | str]:
+    # A quoted value may contain newlines, so lines are joined back together
+    # until their quotes balance before being handed to the csv module.
+    header: list[str] | None = None
+    record = ""
+    async for lines in iter_lines(chunks):
+        records: list[str] = []
+        for line in lines:
+            record = f"{record}\n{line}" if record else line
+            if record.count('"') % 2 == 0:
+                records.append(record.rstrip("\r"))
+                record = ""
+        for values in csv.reader(records):
+            if header is None:
+                header = values
+                continue
+            if not values:
+                continue
+            if len(values) > len(header):
+                yield f"Expected {len(header)} values, got {len(values)}"
+                continue
+            yield {key: value for key, value in zip(header, values) if value != ""}
+    if record:
+        yield "Unterminated quoted value"
+
+
+async def iter_batches(
+    rows: AsyncIterable[dict[str, Any] | str], size: int
+) -> AsyncIterator[list[dict[str, Any] | str]]:
+    batch: list[dict[str, Any] | str] = []
+    async for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _tally(columns: dict[str, ColumnErrors], error: FieldError, row: int) -> None:
+    summary = columns.get(error.column)
+    if summary is None:
+        summary = ColumnErrors(column=error.column, expected=error.expected)
+        columns[error.column] = summary
+    summary.count += 1
+    if len(summary.rows) < MAX_COLUMN_SAMPLES:
+        summary.rows.append(row)
+    if (
+        error.value
+        and len(summary.samples) < MAX_COLUMN_SAMPLES
+        and error.value not in summary.samples
+    ):
+        summary.samples.append(error.value)
+
+
+async def insert_chunk(
+    session: AsyncSession, compiled: CompiledDb, rows: list[dict[str, Any]]
+) -> None:
+    # A list of parameter sets runs as batched multi-row INSERTs; the chunk's
+    # new ids go to the workflow queue as one event, in the same transaction.
+    # The search index takes the chunk in one statement, not a trigger per row.
+    if compiled.searchable:
+        await session.execute(pause_triggers(compiled))
+    statement = insert(compiled.table).returning(compiled.table.c.id)
+    ids = (await session.execute(statement, rows)).scalars().all()
+    if compiled.searchable:
+        await session.execute(resume_triggers(compiled))
+        # New ids are above every existing one, so the range is this chunk.
+        await session.execute(
+            index_rows(compiled), {"first": min(ids), "last": max(ids)}
+        )
+    enqueue(session, compiled.db_id, "created", ids)
+    await session.commit()
+
+
+async def _load_chunk(
+    session: AsyncSession,
+    compiled: CompiledDb,
+    result: BulkIngestResult,
+    columns: dict[str, ColumnErrors],
+    chunk: ChunkResult,
+    batch: list[dict[str, Any] | str],
+    check: Awaitable[tuple[list[dict[str, Any]], list[FieldError]]],
+) -> None:
+    valid, field_errors = await check
+    valid = compiled.compute_many(valid)
+    errors = {
+        i: RowError(row=chunk.first_row + i, detail=row)
+        for i, row in enumerate(batch)
+        if isinstance(row, str)
+    }
+    positions = [i for i, row in enumerate(batch) if not isinstance(row, str)]
+    for error in field_errors:
+        i = positions[error.index]
+        _tally(columns, error, chunk.first_row + i)
+        errors.setdefault(
+            i,
+            RowError(
+                row=chunk.first_row + i,
+                detail=f"{error.column}: {error.message}",
+                column=error.column,
+                expected=error.expected,
+                value=error.value,
+            ),
+        )
+    if valid:
+        try:
+            await insert_chunk(session, compiled, valid)
+            chunk.inserted = len(valid)
+        except SQLAlchemyError as e:
+            await session.rollback()
+            chunk.detail = str(e.orig if hasattr(e, "orig") else e)
+    chunk.failed = len(batch) - chunk.inserted
+    chunk.errors = [errors[i] for i in sorted(errors)][:MAX_ERRORS_PER_CHUNK]
+    result.rows_inserted += chunk.inserted
+    result.rows_failed += chunk.failed
+    if chunk.failed:
+        result.chunks.append(chunk)
+
+
+async def ingest_rows(
+    session: AsyncSession,
+    compiled: CompiledDb,
+    rows: AsyncIterable[dict[str, Any] | str] | Iterable[dict[str, Any] | str],
+    chunk_size: int = CHUNK_SIZE,
+    pool: ValidationPool | None = None,
+) -> BulkIngestResult:
+    """Validate and insert rows one chunk per transaction.
+
+    A chunk that fails to insert is rolled back and reported; the load carries
+    on with the next chunk. Row numbers are 1-based data rows.
+
+    Chunks are checked a field at a time, see POC.gen.validate. Given a pool
+    with workers, that many chunks are checked ahead in worker processes
+    while the earlier ones insert.
+    """
+    if not isinstance(rows, AsyncIterable):
+        rows = _aiter(rows)
+    pool = pool or ValidationPool(0)
+    result = BulkIngestResult(db_id=compiled.db_id, version=compiled.version)
+    columns: dict[str, ColumnErrors] = {}
+    checking: deque[tuple[ChunkResult, list, asyncio.Future]] = deque()
+    try:
+        async for number, batch in _enumerate(iter_batches(rows, chunk_size)):
+            chunk = ChunkResult(chunk=number, first_row=result.rows_received + 1)
+            result.rows_received += len(batch)
+            candidates = [row for row in batch if not isinstance(row, str)]
+            check = asyncio.ensure_future(pool.validate(compiled.inputs, candidates))
+            checking.append((chunk, batch, check))
+            if len(checking) > pool.workers:
+                await _load_chunk(
+                    session, compiled, result, columns, *checking.popleft()
+                )
+        while checking:
+            await _load_chunk(session, compiled, result, columns, *checking.popleft())
+    finally:
+        for _, _, pending in checking:
+            pending.cancel()
+    result.columns = list(columns.values())
+    return result
+
+
+async def _aiter(rows: Iterable[Any]) -> AsyncIterator[Any]:
+    for row in rows:
+        yield row
+
+
+async def _enumerate(items: AsyncIterable[Any]) -> AsyncIterator[tuple[int, Any]]:
+    number = 0
+    async for item in items:
+        number += 1
+        yield number, item
@@ -0,0 +1,896 @@
+"""Move a record table from its applied field set to a new one.
+
+Adding a field is an ADD COLUMN and renaming one a RENAME COLUMN, both done
+in place. So is giving a stored computed field a new expression, after which
+its column, and those of the stored fields computed from it, are recomputed
+batch by batch; a generated column cannot be altered, so redefining one
+takes a copy. Changing a type or nullability needs a rewrite, which SQLite can
+only do by copying: the rows go to a shadow table in id-ordered batches,
+one short transaction each, while triggers on the live table mirror every
+write made in the meantime. The last batch is followed by a swap that drops
+the old table and renames the shadow in its place.
+
+A field whose data type changes is converted rather than cast: each batch
+is read into Python and the field's values checked a column at a time, as
+bulk loads check theirs. Rows with a value that does not convert are left
+out of the shadow and kept in ``QuarantinedRowModel`` as they were. While
+such a copy runs, the triggers only note which rows were written, and those
+are converted again from the live table.
+
+Progress is stored on the migration's ``SchemaVersionModel`` row in the same
+transaction as each batch, so a migration interrupted by a crash resumes
+from its last committed batch. A step that cannot get the write lock is
+rolled back and tried again; only other errors fail the migration.
+"""
+
+import asyncio
+import json
+import logging
+from dataclasses import dataclass, field as dataclass_field
+from datetime import date, datetime as dt, time
+from typing import Any, Sequence
+from pydantic_core import to_jsonable_python
+from sqlalchemy import (
+    Column,
+    Computed,
+    Connection,
+    Engine,
+    Float,
+    Integer,
+    MetaData,
+    Table,
+    bindparam,
+    delete,
+    func,
+    insert,
+    inspect,
+    literal,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.types import TypeEngine
+from POC.db.models.stock_models.db_models import (
+    FieldConversion,
+    FieldInfo,
+    MigrationProgress,
+    QuarantinedRowModel,
+    SchemaVersionModel,
+)
+from POC.db.database import Database
+from POC.db.schema import sync_table
+from POC.gen.compiler import (
+    COLUMN_TYPES,
+    CompiledDb,
+    InputColumn,
+    field_default,
+    foreign_key,
+    compile_computed,
+    compile_db,
+    compile_relations,
+    compute_columns,
+    computed_inputs,
+    normalize_data_type,
+    record_table_name,
+)
+from POC.gen.expressions import Node, parse, references
+from POC.gen.search import sync_search
+from POC.gen.validate import FieldError, check_column
+
+MIGRATION_BATCH_SIZE = 5000
+# A copy-and-swap is outstanding while its row is in one of these states.
+ACTIVE_STATUSES = ("pending", "copying")
+# Tries of a step that keeps finding the write lock taken, each after
+# twice the wait of the last, before the runner leaves it for a restart.
+MIGRATION_RETRIES = 8
+MIGRATION_RETRY_S = 0.5
+# SQLITE_BUSY and SQLITE_LOCKED, the primary result codes.
+LOCK_ERRORS = (5, 6)
+
+logger = logging.getLogger("POC.migrate")
+
+
+def field_specs(
+    compiled: CompiledDb, fields: Sequence[FieldInfo]
+) -> list[dict[str, Any]]:
+    # What a schema version stores: each field with the column it compiled to.
+    return [
+        {
+            "id": field.id,
+            "column": column,
+            "name": field.name,
+            "data_type": normalize_data_type(field.data_type),
+            "required": field.required,
+            "default": field.default,
+            "indexed": field.indexed,
+            "unique": field.unique,
+            "searchable": field.searchable,
+            "expression": field.expression,
+            "relationship": field.relationship,
+            "related_db_id": field.related_db_id,
+            "related_key": field.related_key,
+        }
+        for field, column in zip(fields, compiled.columns)
+    ]
+
+
+def fields_from_specs(specs: list[dict[str, Any]]) -> list[FieldInfo]:
+    return [
+        FieldInfo(**{key: value for key, value in spec.items() if key != "column"})
+        for spec in specs
+    ]
+
+
+def compile_version(
+    db_id: int, version: int, specs: list[dict[str, Any]]
+) -> CompiledDb:
+    return compile_db(db_id, version, fields_from_specs(specs))
+
+
+@dataclass
+class MigrationPlan:
+    renames: dict[str, str] = dataclass_field(default_factory=dict)
+    copy: bool = False
+    # Stored computed columns whose values are stale after the change.
+    recompute: list[str] = dataclass_field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class Definition:
+    # What a field's values depend on. References are field ids, so renames
+    # elsewhere leave it unchanged.
+    data_type: str
+    expression: Node | None = None
+    generated: bool = False
+
+    def references(self) -> set[str]:
+        return set() if self.expression is None else set(references(self.expression))
+
+
+def definitions(specs: list[dict[str, Any]]) -> dict[str, Definition]:
+    ids = {spec["column"]: str(spec["id"]) for spec in specs}
+    result = {}
+    for spec in specs:
+        text = spec.get("expression")
+        if text:
+            expression = parse(text)
+            result[str(spec["id"])] = Definition(
+                spec["data_type"], expression.resolve(ids).root, expression.sql_only
+            )
+        else:
+            result[str(spec["id"])] = Definition(spec["data_type"])
+    return result
+
+
+def recompute_columns(
+    applied: list[dict[str, Any]], target: list[dict[str, Any]]
+) -> list[str]:
+    """Stored computed columns of ``target`` to recompute after moving from
+    ``applied``: those that are new or changed, and those computed, directly
+    or not, from a field that is."""
+    before, after = definitions(applied), definitions(target)
+    stale = {id_ for id_, definition in after.items() if before.get(id_) != definition}
+    grew = True
+    while grew:
+        dependents = {
+            id_ for id_, definition in after.items() if definition.references() & stale
+        }
+        grew = not dependents <= stale
+        stale |= dependents
+    return [
+        spec["column"]
+        for spec in target
+        if str(spec["id"]) in stale
+        and after[str(spec["id"])].expression is not None
+        and not after[str(spec["id"])].generated
+    ]
+
+
+def plan_migration(
+    applied: list[dict[str, Any]],
+    target: list[dict[str, Any]],
+    existing_columns: set[str],
+) -> MigrationPlan:
+    """Diff two field sets by field id.
+
+    New fields become ADD COLUMNs (sync_table) and are not listed. Removed
+    fields keep their column. A rename whose new name is already taken, any
+    type, nullability or foreign key change, or a generated column defined
+    anew, turns the plan into a copy. Child relationship fields have no
+    column and are left out.
+    """
+    plan = MigrationPlan(recompute=recompute_columns(applied, target))
+    before = {spec["id"]: spec for spec in applied}
+    old_definitions, new_definitions = definitions(applied), definitions(target)
+    for spec in target:
+        if spec.get("relationship") == "child":
+            continue
+        old = before.get(spec["id"])
+        new_definition = new_definitions[str(spec["id"])]
+        if old is None:
+            # A leftover column of the same name cannot become generated.
+            if new_definition.generated and spec["column"] in existing_columns:
+                plan.copy = True
+            continue
+        old_definition = old_definitions[str(old["id"])]
+        generated = old_definition.generated or new_definition.generated
+        if old["data_type"] != spec["data_type"] or old["required"] != spec["required"]:
+            plan.copy = True
+        elif _references(old) != _references(spec):
+            # SQLite cannot add or drop a column's foreign key in place.
+            plan.copy = True
+        elif generated and old_definition != new_definition:
+            plan.copy = True
+        elif old["column"] != spec["column"]:
+            plan.renames[old["column"]] = spec["column"]
+    # Renames run one at a time, so a swap or chain of names needs a copy.
+    if set(plan.renames.values()) & existing_columns:
+        plan.copy = True
+    if plan.copy:
+        plan.renames = {}
+    return plan
+
+
+@dataclass(frozen=True)
+class Conversion:
+    column: str
+    from_type: str
+    to_type: str
+    required: bool
+
+    def prepare(self, value: Any) -> Any:
+        # Text is the one type every value has a form in; the validator
+        # only takes numbers for it.
+        if self.to_type != "str" or value is None or isinstance(value, str):
+            return value
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        if isinstance(value, (date, time)):
+            return value.isoformat()
+        if isinstance(value, (list, dict)):
+            return json.dumps(value)
+        return value
+
+
+def conversions(
+    applied: list[dict[str, Any]], target: list[dict[str, Any]]
+) -> list[Conversion]:
+    """Fields of ``target`` whose values change data type from ``applied``.
+
+    Computed fields are left out: their values are computed again.
+    """
+    before = {spec["id"]: spec for spec in applied}
+    result = []
+    for spec in target:
+        old = before.get(spec["id"])
+        if old is None or old["data_type"] == spec["data_type"]:
+            continue
+        if spec.get("expression") or spec.get("relationship") == "child":
+            continue
+        result.append(
+            Conversion(
+                spec["column"], old["data_type"], spec["data_type"], spec["required"]
+            )
+        )
+    return result
+
+
+def _references(spec: dict[str, Any]) -> tuple[Any, ...] | None:
+    if spec.get("relationship") != "parent":
+        return None
+    return (spec["related_db_id"], spec.get("related_key") or "id")
+
+
+def apply_in_place(
+    connection: Connection, compiled: CompiledDb, plan: MigrationPlan
+) -> None:
+    table = compiled.table
+    quote = connection.dialect.identifier_preparer.quote
+    for old, new in plan.renames.items():
+        connection.execute(
+            text(
+                f"ALTER TABLE {quote(table.name)}"
+                f" RENAME COLUMN {quote(old)} TO {quote(new)}"
+            )
+        )
+    sync_table(connection, table)
+    sync_search(connection, compiled)
+    recompute(connection, compiled, plan.recompute)
+
+
+def recompute(
+    connection: Connection,
+    compiled: CompiledDb,
+    columns: Sequence[str],
+    batch_size: int = MIGRATION_BATCH_SIZE,
+) -> int:
+    """Recompute the stored computed ``columns`` of every row.
+
+    Rows are read and written back in id-ordered batches, each batch's
+    values computed column-wise with NumPy. Returns the rows visited.
+    """
+    if not columns:
+        return 0
+    table = compiled.table
+    inputs = computed_inputs(compiled.computed)
+    statement = (
+        select(table.c.id, *(table.c[name] for name in inputs))
+        .where(table.c.id > bindparam("last"))
+        .order_by(table.c.id)
+        .limit(batch_size)
+    )
+    # Bound by position: a column may be called anything, "id" excepted.
+    write = (
+        update(table)
+        .where(table.c.id == bindparam("row_id"))
+        .values({table.c[name]: bindparam(f"v{i}") for i, name in enumerate(columns)})
+    )
+    last, visited = 0, 0
+    while rows := connection.execute(statement, {"last": last}).all():
+        values = compute_columns(
+            compiled.computed,
+            {name: [row[i + 1] for row in rows] for i, name in enumerate(inputs)},
+            len(rows),
+        )
+        connection.execute(
+            write,
+            [
+                {
+                    "row_id": row[0],
+                    **{f"v{i}": values[name][n] for i, name in enumerate(columns)},
+                }
+                for n, row in enumerate(rows)
+            ],
+        )
+        last = rows[-1][0]
+        visited += len(rows)
+    return visited
+
+
+def shadow_table_name(db_id: int, version: int) -> str:
+    return f"{record_table_name(db_id)}_v{version}"
+
+
+def _affinity(type_: type[TypeEngine]) -> str:
+    # Dates, times and JSON are stored as text by SQLAlchemy on SQLite.
+    if issubclass(type_, Integer):
+        return "INTEGER"
+    if issubclass(type_, Float):
+        return "REAL"
+    return "TEXT"
+
+
+@dataclass
+class CopySpec:
+    """Columns of the shadow table and, for each, an SQL expression over the
+    live row, with ``{row}`` standing for the row alias."""
+
+    shadow: Table
+    expressions: dict[str, str]
+    # Columns converted in Python, their expressions being the old values.
+    conversions: dict[str, Conversion] = dataclass_field(default_factory=dict)
+
+    def row_values(self, row: str) -> str:
+        return ", ".join(sql.format(row=row) for sql in self.expressions.values())
+
+
+def copy_spec(connection: Connection, migration: SchemaVersionModel) -> CopySpec:
+    dialect = connection.dialect
+    quote = dialect.identifier_preparer.quote
+    source_name = record_table_name(migration.db_id)
+    physical = {c["name"]: c for c in inspect(connection).get_columns(source_name)}
+    applied = _applied_specs(connection, migration)
+    before = {spec["id"]: spec for spec in applied}
+    converted = {
+        conversion.column: conversion
+        for conversion in conversions(applied, migration.fields)
+    }
+    converting: dict[str, Conversion] = {}
+    generated = {
+        field.column: field
+        for field in compile_computed(
+            fields_from_specs(migration.fields),
+            [spec["column"] for spec in migration.fields],
+        )
+        if field.generated
+    }
+
+    relations = {
+        relation.column: relation
+        for relation in compile_relations(
+            fields_from_specs(migration.fields),
+            [spec["column"] for spec in migration.fields],
+        )
+    }
+
+    metadata = MetaData()
+    shadow_name = shadow_table_name(migration.db_id, migration.version)
+    columns: list[Column] = [Column("id", Integer, primary_key=True)]
+    expressions = {"id": "{row}.id"}
+    targets = {spec["column"] for spec in migration.fields}
+    sources: set[str] = set()
+    for spec in migration.fields:
+        column_type = COLUMN_TYPES[spec["data_type"]]
+        relation = relations.get(spec["column"])
+        if relation is not None and relation.kind == "child":
+            continue
+        # The shadow is renamed into place, so its keys name the live
+        # table, self-references included.
+        keys = (
+            [foreign_key(metadata, shadow_name, relation, column_type)]
+            if relation is not None
+            else []
+        )
+        old = before.get(spec["id"])
+        if spec["column"] in generated:
+            # SQLite fills these in; the old column is not read.
+            computed = Computed(generated[spec["column"]].sql(), persisted=False)
+            columns.append(Column(spec["column"], column_type, computed))
+            continue
+        if old is None or old["column"] not in physical:
+            # New fields are nullable, as an ADD COLUMN would make them, and
+            # pick up a leftover column of the same name like one would.
+            columns.append(Column(spec["column"], column_type, *keys, nullable=True))
+            if spec["column"] in physical:
+                sources.add(spec["column"])
+                expressions[spec["column"]] = f"{{row}}.{quote(spec['column'])}"
+            continue
+        sources.add(old["column"])
+        sql = f"{{row}}.{quote(old['column'])}"
+        if spec["column"] in converted:
+            converting[spec["column"]] = converted[spec["column"]]
+        elif old["data_type"] != spec["data_type"]:
+            sql = f"CAST({sql} AS {_affinity(column_type)})"
+        # Rows left NULL by a field becoming required take its default.
+        optional = fields_from_specs([{**spec, "required": False}])[0]
+        default = field_default(optional, spec["data_type"])
+        if spec["required"] and isinstance(default, (str, int, float, bool)):
+            value = literal(default).compile(
+                dialect=dialect, compile_kwargs={"literal_binds": True}
+            )
+            sql = f"COALESCE({sql}, {value})"
+        columns.append(
+            Column(spec["column"], column_type, *keys, nullable=not spec["required"])
+        )
+        expressions[spec["column"]] = sql
+    # Columns of removed fields and older leftovers are carried over as-is.
+    for name, column in physical.items():
+        if name != "id" and name not in sources and name not in targets:
+            columns.append(Column(name, column["type"], nullable=True))
+            expressions[name] = f"{{row}}.{quote(name)}"
+
+    shadow = Table(shadow_name, metadata, *columns)
+    return CopySpec(shadow, expressions, converting)
+
+
+def _applied_specs(
+    connection: Connection, migration: SchemaVersionModel
+) -> list[dict[str, Any]]:
+    statement = select(SchemaVersionModel.fields).where(  # type: ignore[call-overload]
+        SchemaVersionModel.db_id == migration.db_id,
+        SchemaVersionModel.version == migration.from_version,
+    )
+    return connection.execute(statement).scalar_one()
+
+
+def dirty_table_name(shadow_name: str) -> str:
+    return f"{shadow_name}_dirty"
+
+
+def _trigger_sql(spec: CopySpec, source: str, quote: Any) -> list[str]:
+    shadow = quote(spec.shadow.name)
+    if spec.conversions:
+        # Converting takes Python, so writes are only logged here, in order.
+        dirty = quote(dirty_table_name(spec.shadow.name))
+        new, old = (
+            f"INSERT INTO {dirty} (id) VALUES ({row}.id);" for row in ("NEW", "OLD")
+        )
+        bodies = (("INSERT", new), ("UPDATE", old + " " + new), ("DELETE", old))
+    else:
+        columns = ", ".join(quote(name) for name in spec.expressions)
+        upsert = f"INSERT OR REPLACE INTO {shadow} ({columns}) VALUES ({spec.row_values('NEW')});"
+        bodies = (
+            ("INSERT", upsert),
+            ("UPDATE", upsert),
+            ("DELETE", f"DELETE FROM {shadow} WHERE id = OLD.id;"),
+        )
+    return [
+        f"CREATE TRIGGER {quote(spec.shadow.name + '_' + event.lower())}"
+        f" AFTER {event} ON {quote(source)} BEGIN {body} END"
+        for event, body in bodies
+    ]
+
+
+@dataclass
+class Converted:
+    """Live rows read and converted, to be written to the shadow."""
+
+    copies: list[tuple[Any, ...]] = dataclass_field(default_factory=list)
+    quarantined: list[dict[str, Any]] = dataclass_field(default_factory=list)
+
+
+def convert_rows(
+    connection: Connection,
+    migration: SchemaVersionModel,
+    spec: CopySpec,
+    where: str,
+    params: dict[str, Any],
+    converted: Converted,
+) -> None:
+    """Read the live rows matching ``where`` and convert the values of
+    ``spec.conversions``.
+
+    ``where`` is SQL over the live row ``src``. A row with a value that does
+    not convert goes to ``converted.quarantined``, the others to
+    ``converted.copies``, ready for the shadow.
+    """
+    dialect = connection.dialect
+    source = dialect.identifier_preparer.quote(record_table_name(migration.db_id))
+    rows = connection.exec_driver_sql(
+        f"SELECT {spec.row_values('src')} FROM {source} AS src WHERE {where}", params
+    ).all()
+    if not rows:
+        return
+    names = list(spec.expressions)
+    columns = [list(values) for values in zip(*rows)]
+    errors: list[FieldError] = []
+    for conversion in spec.conversions.values():
+        i = names.index(conversion.column)
+        # Read as the old type, checked as the new one and stored as that.
+        read = COLUMN_TYPES[conversion.from_type]().result_processor(dialect, None)
+        write = spec.shadow.c[conversion.column].type.bind_processor(dialect)
+        values = check_column(
+            InputColumn(conversion.column, conversion.to_type, conversion.required),
+            [conversion.prepare(read(v) if read else v) for v in columns[i]],
+            errors,
+        )
+        columns[i] = [write(v) for v in values] if write else values
+    failed: dict[int, list[FieldError]] = {}
+    for error in errors:
+        failed.setdefault(error.index, []).append(error)
+
+    now = dt.now()
+    for n, row in enumerate(zip(*columns)):
+        if n not in failed:
+            converted.copies.append(row)
+            continue
+        converted.quarantined.append(
+            {
+                "db_id": migration.db_id,
+                "version": migration.version,
+                "row_id": rows[n][0],
+                "record": to_jsonable_python(dict(zip(names, rows[n]))),
+                "errors": [
+                    {
+                        "column": error.column,
+                        "expected": error.expected,
+                        "message": error.message,
+                        "value": error.value,
+                    }
+                    for error in failed[n]
+                ],
+                "created_at": now,
+            }
+        )
+
+
+def _write_converted(
+    connection: Connection,
+    migration: SchemaVersionModel,
+    spec: CopySpec,
+    converted: Converted,
+    redo: str,
+    params: dict[str, Any],
+) -> None:
+    # Rows converted again, those of the subquery ``redo``, replace what the
+    # shadow and the quarantine hold for them.
+    quote = connection.dialect.identifier_preparer.quote
+    shadow = quote(spec.shadow.name)
+    quarantine = quote(QuarantinedRowModel.__table__.name)  # type: ignore[attr-defined]
+    connection.exec_driver_sql(f"DELETE FROM {shadow} WHERE id IN ({redo})", params)
+    connection.exec_driver_sql(
+        f"DELETE FROM {quarantine} WHERE db_id = :db_id AND version = :version"
+        f" AND row_id IN ({redo})",
+        {"db_id": migration.db_id, "version": migration.version, **params},
+    )
+    if converted.quarantined:
+        connection.execute(insert(QuarantinedRowModel), converted.quarantined)
+    if converted.copies:
+        columns = ", ".join(quote(name) for name in spec.expressions)
+        marks = ", ".join("?" * len(spec.expressions))
+        connection.exec_driver_sql(
+            f"INSERT OR REPLACE INTO {shadow} ({columns}) VALUES ({marks})",
+            converted.copies,
+        )
+
+
+def _quarantined(migration: SchemaVersionModel) -> Any:
+    # The rows quarantined so far, counted in the statement that stores it.
+    return (
+        select(func.count())
+        .select_from(QuarantinedRowModel)
+        .where(
+            QuarantinedRowModel.db_id == migration.db_id,  # type: ignore[arg-type]
+            QuarantinedRowModel.version == migration.version,  # type: ignore[arg-type]
+        )
+        .scalar_subquery()
+    )
+
+
+def _drop_triggers(connection: Connection, shadow_name: str) -> None:
+    quote = connection.dialect.identifier_preparer.quote
+    for event in ("insert", "update", "delete"):
+        trigger = quote(f"{shadow_name}_{event}")
+        connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+
+
+def _drop_shadow(connection: Connection, shadow_name: str) -> None:
+    _drop_triggers(connection, shadow_name)
+    quote = connection.dialect.identifier_preparer.quote
+    connection.execute(text(f"DROP TABLE IF EXISTS {quote(shadow_name)}"))
+    dirty = quote(dirty_table_name(shadow_name))
+    connection.execute(text(f"DROP TABLE IF EXISTS {dirty}"))
+
+
+def _set_progress(connection: Connection, migration_id: int, **values: Any) -> None:
+    # Also opens the transaction: the sqlite3 driver only begins one on DML,
+    # so each step writes this row before its DDL to keep them atomic.
+    connection.execute(
+        update(SchemaVersionModel)
+        .where(SchemaVersionModel.id == migration_id)  # type: ignore[arg-type]
+        .values(updated_at=dt.now(), **values)
+    )
+
+
+def lock_error(e: Exception) -> bool:
+    """Whether ``e`` is another connection holding a lock past the busy
+    timeout, which the same statement can get past later."""
+    if not isinstance(e, OperationalError):
+        return False
+    code = getattr(e.orig, "sqlite_errorcode", None)
+    if code is not None:
+        return code & 0xFF in LOCK_ERRORS
+    message = str(e.orig)
+    return "database is locked" in message or "database table is locked" in message
+
+
+def migration_step(
+    connection: Connection, db_id: int, batch_size: int = MIGRATION_BATCH_SIZE
+) -> bool:
+    """Run one step of the database's outstanding migration and commit it.
+
+    Returns True once there is nothing left to do. A step that hits a lock
+    error is rolled back and the error raised, leaving the migration as it
+    was for the next try.
+    """
+    statement = select(SchemaVersionModel).where(
+        SchemaVersionModel.db_id == db_id,  # type: ignore[arg-type]
+        SchemaVersionModel.status.in_(ACTIVE_STATUSES),  # type: ignore[attr-defined]
+    )
+    row = connection.execute(statement).first()
+    if row is None:
+        return True
+    migration = SchemaVersionModel.model_validate(row._mapping)
+    assert migration.id is not None
+    quote = connection.dialect.identifier_preparer.quote
+    source = record_table_name(db_id)
+    restore_keys = False
+    try:
+        spec = copy_spec(connection, migration)
+        shadow = quote(spec.shadow.name)
+        if migration.status == "pending":
+            total = connection.execute(text(f"SELECT count(*) FROM {quote(source)}"))
+            _set_progress(
+                connection,
+                migration.id,
+                status="copying",
+                total_rows=total.scalar(),
+                started_at=dt.now(),
+            )
+            spec.shadow.create(connection)
+            if spec.conversions:
+                dirty = quote(dirty_table_name(spec.shadow.name))
+                connection.execute(
+                    text(f"CREATE TABLE {dirty} (seq INTEGER PRIMARY KEY, id INTEGER)")
+                )
+            for sql in _trigger_sql(spec, source, quote):
+                connection.execute(text(sql))
+            connection.commit()
+            return False
+
+        upto = connection.execute(
+            text(
+                f"SELECT max(id) FROM (SELECT id FROM {quote(source)}"
+                " WHERE id > :last ORDER BY id LIMIT :batch)"
+            ),
+            {"last": migration.last_id, "batch": batch_size},
+        ).scalar()
+        if upto is not None:
+            where = "src.id > :last AND src.id <= :upto"
+            params = {"last": migration.last_id, "upto": upto}
+            progress: dict[str, Any] = {}
+            if spec.conversions:
+                # Rows are read and converted before the write lock is
+                # taken. Writes logged up to ``mark`` are converted here,
+                # later ones in the next step.
+                dirty = quote(dirty_table_name(spec.shadow.name))
+                params["mark"] = connection.exec_driver_sql(
+                    f"SELECT coalesce(max(seq), 0) FROM {dirty}"
+                ).scalar()
+                redo = f"SELECT id FROM {dirty} WHERE seq <= :mark AND id <= :last"
+                converted = Converted()
+                convert_rows(
+                    connection,
+                    migration,
+                    spec,
+                    f"src.id IN ({redo})",
+                    params,
+                    converted,
+                )
+                redone = len(converted.copies)
+                convert_rows(connection, migration, spec, where, params, converted)
+                copied = len(converted.copies) - redone
+                _set_progress(connection, migration.id, last_id=upto)
+                _write_converted(connection, migration, spec, converted, redo, params)
+                # The batch read its own rows after the mark.
+                connection.exec_driver_sql(
+                    f"DELETE FROM {dirty} WHERE seq <= :mark AND id <= :upto", params
+                )
+                progress["quarantined_rows"] = _quarantined(migration)
+            else:
+                _set_progress(connection, migration.id, last_id=upto)
+                columns = ", ".join(quote(name) for name in spec.expressions)
+                copied = connection.execute(
+                    text(
+                        f"INSERT OR REPLACE INTO {shadow} ({columns})"
+                        f" SELECT {spec.row_values('src')} FROM {quote(source)} AS src"
+                        f" WHERE {where}"
+                    ),
+                    params,
+                ).rowcount
+            _set_progress(
+                connection,
+                migration.id,
+                copied_rows=SchemaVersionModel.copied_rows + copied,
+                **progress,
+            )
+            connection.commit()
+            return False
+
+        # Dropping a table with foreign keys enforced first deletes its
+        # rows, which would null the parent fields referring to them. The
+        # pragma only takes outside a transaction, and this step has not
+        # written anything yet.
+        restore_keys = bool(connection.execute(text("PRAGMA foreign_keys")).scalar())
+        connection.execute(text("PRAGMA foreign_keys=OFF"))
+        _set_progress(connection, migration.id, status="applied")
+        if spec.conversions:
+            # With the write lock held, every row still logged, new ones
+            # included.
+            redo = f"SELECT id FROM {quote(dirty_table_name(spec.shadow.name))}"
+            converted = Converted()
+            convert_rows(
+                connection, migration, spec, f"src.id IN ({redo})", {}, converted
+            )
+            _write_converted(connection, migration, spec, converted, redo, {})
+            _set_progress(
+                connection, migration.id, quarantined_rows=_quarantined(migration)
+            )
+        _drop_triggers(connection, spec.shadow.name)
+        dirty = quote(dirty_table_name(spec.shadow.name))
+        connection.execute(text(f"DROP TABLE IF EXISTS {dirty}"))
+        connection.execute(text(f"DROP TABLE {quote(source)}"))
+        connection.execute(text(f"ALTER TABLE {shadow} RENAME TO {quote(source)}"))
+        target = compile_version(db_id, migration.version, migration.fields)
+        sync_table(connection, target.table)
+        # The index still holds the same ids; its triggers went with the table.
+        sync_search(connection, target)
+        stale = recompute_columns(
+            _applied_specs(connection, migration), migration.fields
+        )
+        recompute(connection, target, stale, batch_size)
+        connection.commit()
+        return True
+    except Exception as e:
+        connection.rollback()
+        if lock_error(e):
+            raise
+        # Leave the live table as it was, without triggers that could now
+        # reject its writes.
+        _set_progress(connection, migration.id, status="failed", error=str(e))
+        _drop_shadow(connection, shadow_table_name(db_id, migration.version))
+        # The live table keeps the rows, so nothing stays quarantined.
+        connection.execute(
+            delete(QuarantinedRowModel).where(
+                QuarantinedRowModel.db_id == db_id,  # type: ignore[arg-type]
+                QuarantinedRowModel.version == migration.version,  # type: ignore[arg-type]
+            )
+        )
+        connection.commit()
+        return True
+    finally:
+        if restore_keys:
+            connection.execute(text("PRAGMA foreign_keys=ON"))
+
+
+def _run_step(engine: Engine, db_id: int, batch_size: int) -> bool:
+    with engine.connect() as connection:
+        return migration_step(connection, db_id, batch_size)
+
+
+async def run_migration(
+    database: Database, db_id: int, batch_size: int = MIGRATION_BATCH_SIZE
+) -> None:
+    # Each step is its own short transaction; other requests get the write
+    # lock between them. Steps run in a worker thread, as converting a
+    # batch is Python work that would otherwise stall every request. Only
+    # one runner per database and app.
+    if db_id in database.migrating:
+        return
+    database.migrating.add(db_id)
+    try:
+        retries = 0
+        while True:
+            try:
+                if await asyncio.to_thread(
+                    _run_step, database.sync_engine, db_id, batch_size
+                ):
+                    break
+            except OperationalError as e:
+                if not lock_error(e) or retries == MIGRATION_RETRIES:
+                    raise
+                await asyncio.sleep(MIGRATION_RETRY_S * 2**retries)
+                retries += 1
+                continue
+            retries = 0
+        database.compiled.invalidate(db_id)
+    except OperationalError as e:
+        if not lock_error(e):
+            raise
+        # Still copying; the next start-up or generate picks it up again.
+        logger.warning("migration of database %s stalled on a lock: %s", db_id, e)
+    finally:
+        database.migrating.discard(db_id)
+
+
+def migration_progress(
+    migration: SchemaVersionModel, applied: list[dict[str, Any]]
+) -> MigrationProgress:
+    """How far a copy-and-swap from the ``applied`` field specs has got, with
+    its rate so far and the time left at that rate."""
+    assert migration.from_version is not None
+    done = migration.copied_rows + migration.quarantined_rows
+    total = migration.total_rows
+    if total:
+        progress = min(done / total, 1.0)
+    else:
+        progress = 1.0 if migration.status == "applied" else 0.0
+    rows_per_s = eta_s = None
+    if migration.started_at is not None and done:
+        elapsed = (migration.updated_at - migration.started_at).total_seconds()
+        if elapsed > 0:
+            rows_per_s = done / elapsed
+            if migration.status == "copying":
+                eta_s = max(total - done, 0) / rows_per_s
+    return MigrationProgress(
+        db_id=migration.db_id,
+        version=migration.version,
+        from_version=migration.from_version,
+        status=migration.status,
+        total_rows=total,
+        copied_rows=migration.copied_rows,
+        quarantined_rows=migration.quarantined_rows,
+        progress=progress,
+        rows_per_s=rows_per_s,
+        eta_s=eta_s,
+        conversions=[
+            FieldConversion(
+                column=conversion.column,
+                from_type=conversion.from_type,
+                to_type=conversion.to_type,
+            )
+            for conversion in conversions(applied, migration.fields)
+        ],
+        error=migration.error,
+    )
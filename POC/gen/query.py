@@ -0,0 +1,207 @@
+"""Record queries: a JSON filter, sort and projection compiled to SQL.
+
+The shape of a query decides its statement. The shape is which fields are
+filtered with which operators, the sort and the projection. The values only
+fill in bound parameters. Statements are built once per database version and
+shape and kept in an LRU. A repeated query reuses the same Select object, so
+SQLAlchemy neither builds it nor computes its cache key again, and finds the
+SQL in the engine's compiled cache.
+"""
+
+from collections import OrderedDict
+from typing import Any
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import (
+    JSON,
+    BindParameter,
+    Column,
+    ColumnElement,
+    Select,
+    String,
+    Table,
+    bindparam,
+    select,
+)
+from POC.db.models.stock_models.db_models import RecordQuery
+from POC.gen.compiler import CompiledDb
+
+OPERATORS = ("eq", "ne", "gt", "gte", "lt", "lte", "in", "contains")
+LIKE_ESCAPE = "\\"
+
+# (field, operator, value is null) per condition, sort, projection.
+QueryShape = tuple[
+    tuple[tuple[str, str, bool], ...], tuple[str, ...], tuple[str, ...] | None
+]
+
+_adapters: dict[type, TypeAdapter] = {}
+
+
+def _conditions(query: RecordQuery) -> list[tuple[str, str, Any]]:
+    conditions = []
+    for name, record_filter in sorted(query.where.items()):
+        given = record_filter.model_fields_set
+        for op in OPERATORS:
+            attribute = "in_" if op == "in" else op
+            if attribute in given:
+                conditions.append((name, op, getattr(record_filter, attribute)))
+    return conditions
+
+
+def query_shape(query: RecordQuery) -> QueryShape:
+    conditions = tuple(
+        (name, op, value is None) for name, op, value in _conditions(query)
+    )
+    fields = None if query.fields is None else tuple(query.fields)
+    return conditions, tuple(query.sort), fields
+
+
+def _column(compiled: CompiledDb, name: str) -> Column:
+    if name not in compiled.table.c:
+        raise ValueError(f"Unknown field {name!r}")
+    column = compiled.table.c[name]
+    if isinstance(column.type, JSON):
+        raise ValueError(f"Field {name!r} holds JSON and cannot be queried")
+    return column
+
+
+def _condition(column: Column, op: str, is_null: bool, param: str) -> Any:
+    if is_null:
+        if op == "eq":
+            return column.is_(None)
+        if op == "ne":
+            return column.is_not(None)
+        raise ValueError(f"{op} on {column.key!r} needs a value, not null")
+    if op == "contains":
+        if not isinstance(column.type, String):
+            raise ValueError(f"contains needs a str field, not {column.key!r}")
+        return column.contains(bindparam(param), escape=LIKE_ESCAPE)
+    if op == "in":
+        return column.in_(bindparam(param, expanding=True))
+    value: BindParameter = bindparam(param)
+    return {
+        "eq": column == value,
+        "ne": column.is_distinct_from(value),
+        "gt": column > value,
+        "gte": column >= value,
+        "lt": column < value,
+        "lte": column <= value,
+    }[op]
+
+
+def build_query(compiled: CompiledDb, shape: QueryShape) -> Select:
+    """The statement for queries of ``shape``, checked against the fields.
+
+    Condition values are the parameters ``p0``, ``p1``, ... in shape order,
+    followed by ``limit`` and ``offset``.
+    """
+    conditions, sort, fields = shape
+    table = compiled.table
+    if fields is None:
+        selected = list(table.c)
+    else:
+        if not fields:
+            raise ValueError("fields must name at least one field")
+        unknown = [name for name in fields if name not in table.c]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        selected = [table.c[name] for name in fields]
+
+    where = [
+        _condition(_column(compiled, name), op, is_null, f"p{i}")
+        for i, (name, op, is_null) in enumerate(conditions)
+    ]
+    order_by: list[ColumnElement] = []
+    for key in sort:
+        column = _column(compiled, key.removeprefix("-"))
+        order_by.append(column.desc() if key.startswith("-") else column.asc())
+    if "id" not in {key.removeprefix("-") for key in sort}:
+        order_by.append(table.c.id)
+    return (
+        select(*selected)
+        .where(*where)
+        .order_by(*order_by)
+        .limit(bindparam("limit"))
+        .offset(bindparam("offset"))
+    )
+
+
+def _coerce(column: Column, op: str, value: Any) -> Any:
+    python_type = column.type.python_type
+    adapter = _adapters.get(python_type)
+    if adapter is None:
+        adapter = _adapters[python_type] = TypeAdapter(python_type)
+    try:
+        if op == "in":
+            return [adapter.validate_python(item) for item in value]
+        if op == "contains":
+            for special in (LIKE_ESCAPE, "%", "_"):
+                value = value.replace(special, LIKE_ESCAPE + special)
+            return value
+        return adapter.validate_python(value)
+    except ValidationError as e:
+        detail = e.errors()[0]["msg"]
+        raise ValueError(f"{op} on {column.key!r}: {detail}")
+
+
+def query_params(compiled: CompiledDb, query: RecordQuery) -> dict[str, Any]:
+    params: dict[str, Any] = {"limit": query.limit, "offset": query.offset}
+    for i, (name, op, value) in enumerate(_conditions(query)):
+        if value is not None:
+            params[f"p{i}"] = _coerce(_column(compiled, name), op, value)
+    return params
+
+
+class QueryCache:
+    """LRU cache of built record queries keyed by (db_id, version, shape)."""
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items: OrderedDict[tuple[int, int, QueryShape], tuple[Table, Select]] = (
+            OrderedDict()
+        )
+
+    def statement(self, compiled: CompiledDb, query: RecordQuery) -> Select:
+        key = (compiled.db_id, compiled.version, query_shape(query))
+        cached = self._items.get(key)
+        # A statement is only reused with the table it was built from.
+        if cached is not None and cached[0] is compiled.table:
+            self.hits += 1
+            self._items.move_to_end(key)
+            return cached[1]
+        self.misses += 1
+        statement = build_query(compiled, key[2])
+        self._items[key] = (compiled.table, statement)
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+            self.evictions += 1
+        return statement
+
+    def clear(self) -> None:
+        self._items.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._items),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def compile_query(
+    compiled: CompiledDb, query: RecordQuery, cache: QueryCache
+) -> tuple[Select, dict[str, Any]]:
+    """The cached statement for ``query`` and its parameters.
+
+    Raises ValueError for unknown fields, operators a field does not take,
+    and values that do not fit their field.
+    """
+    return cache.statement(compiled, query), query_params(compiled, query)
@@ -0,0 +1,203 @@
+"""Full-text search over record tables with SQLite FTS5.
+
+The searchable fields of a database are indexed by an external-content
+FTS5 table, ``db_<id>_search``: it holds only the index, and reads the text
+back from the record table by id for highlighting. Triggers on the record
+table keep it in step with single-record writes. Bulk ingest turns them off
+for its own transaction and indexes each chunk with one INSERT ... SELECT.
+
+Matches are ranked by bm25, best first, and paged by (rank, id).
+Highlights come back as HTML: SQLite marks the matches with control
+characters, and they become ``<mark>`` tags only after the text is escaped.
+"""
+
+import html
+from typing import Sequence
+from sqlalchemy import (
+    ColumnElement,
+    Connection,
+    Delete,
+    Insert,
+    Select,
+    TextClause,
+    and_,
+    bindparam,
+    column,
+    delete,
+    func,
+    insert,
+    literal_column,
+    or_,
+    select,
+    table,
+    text,
+)
+from POC.db.models.stock_models.db_models import SearchPauseModel
+from POC.gen.compiler import CompiledDb, record_table_name
+
+TOKENIZER = "unicode61 remove_diacritics 2"
+HIGHLIGHT = ("<mark>", "</mark>")
+# What SQLite puts around the matches, as no record text has them.
+MARKERS = ("\x02", "\x03")
+TRIGGER_EVENTS = ("insert", "update", "delete")
+
+
+def search_table_name(db_id: int) -> str:
+    return f"db_{db_id}_search"
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _values(prefix: str, columns: Sequence[str]) -> str:
+    return ", ".join(f"{prefix}.{_quote(c)}" for c in columns)
+
+
+def search_ddl(compiled: CompiledDb) -> dict[str, str]:
+    """The search table and its triggers by name, as SQLite keeps them."""
+    source = record_table_name(compiled.db_id)
+    search = search_table_name(compiled.db_id)
+    names = ", ".join(_quote(c) for c in compiled.searchable)
+    add = (
+        f"INSERT INTO {_quote(search)}(rowid, {names})"
+        f" VALUES (new.id, {_values('new', compiled.searchable)});"
+    )
+    remove = (
+        f"INSERT INTO {_quote(search)}({_quote(search)}, rowid, {names})"
+        f" VALUES ('delete', old.id, {_values('old', compiled.searchable)});"
+    )
+    paused = (
+        f"WHEN NOT EXISTS (SELECT 1 FROM {SearchPauseModel.__tablename__}"
+        f" WHERE table_name = '{source}')"
+    )
+    ddl = {
+        search: (
+            f"CREATE VIRTUAL TABLE {_quote(search)} USING fts5({names},"
+            f" content='{source}', content_rowid='id', tokenize='{TOKENIZER}')"
+        )
+    }
+    for event, body in zip(TRIGGER_EVENTS, (add, f"{remove} {add}", remove)):
+        name = f"{search}_{event}"
+        # Updates that leave the searchable columns alone do not touch it.
+        on = f"UPDATE OF {names}" if event == "update" else event.upper()
+        ddl[name] = (
+            f"CREATE TRIGGER {_quote(name)} AFTER {on}"
+            f" ON {_quote(source)} {paused} BEGIN {body} END"
+        )
+    return ddl
+
+
+def drop_search(connection: Connection, db_id: int) -> None:
+    search = search_table_name(db_id)
+    for event in TRIGGER_EVENTS:
+        trigger = _quote(f"{search}_{event}")
+        connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+    connection.execute(text(f"DROP TABLE IF EXISTS {_quote(search)}"))
+
+
+def sync_search(connection: Connection, compiled: CompiledDb) -> None:
+    """Bring the search table and its triggers in line with ``compiled``.
+
+    A table over other columns is dropped and rebuilt from the records, and
+    missing or outdated triggers, such as a copy-and-swap leaves, are
+    created again. Without searchable fields both are dropped.
+    """
+    if not compiled.searchable:
+        drop_search(connection, compiled.db_id)
+        return
+    search = search_table_name(compiled.db_id)
+    ddl = search_ddl(compiled)
+    statement = text("SELECT name, sql FROM sqlite_master WHERE name IN :names")
+    statement = statement.bindparams(bindparam("names", expanding=True))
+    rows = connection.execute(statement, {"names": list(ddl)}).all()
+    existing: dict[str, str] = {row.name: row.sql for row in rows}
+    if existing.get(search) != ddl[search]:
+        drop_search(connection, compiled.db_id)
+        existing = {}
+        connection.execute(text(ddl[search]))
+        connection.execute(
+            text(f"INSERT INTO {_quote(search)}({_quote(search)}) VALUES ('rebuild')")
+        )
+    for name, sql in ddl.items():
+        if name != search and existing.get(name) != sql:
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {_quote(name)}"))
+            connection.execute(text(sql))
+
+
+def pause_triggers(compiled: CompiledDb) -> Insert:
+    return insert(SearchPauseModel).values(table_name=record_table_name(compiled.db_id))
+
+
+def resume_triggers(compiled: CompiledDb) -> Delete:
+    return delete(SearchPauseModel).where(
+        SearchPauseModel.table_name == record_table_name(compiled.db_id)  # type: ignore[arg-type]
+    )
+
+
+def index_rows(compiled: CompiledDb) -> TextClause:
+    """Index the records with ids from ``:first`` to ``:last`` in one go."""
+    search = _quote(search_table_name(compiled.db_id))
+    names = ", ".join(_quote(c) for c in compiled.searchable)
+    return text(
+        f"INSERT INTO {search}(rowid, {names}) SELECT id, {names}"
+        f" FROM {_quote(record_table_name(compiled.db_id))}"
+        " WHERE id BETWEEN :first AND :last"
+    )
+
+
+def match_query(q: str) -> str:
+    """Every word of ``q`` as an FTS5 string: all must appear, and none is
+    read as query syntax. The last one also matches as a prefix, for
+    search-as-you-type."""
+    terms = ['"' + term.replace('"', '""') + '"' for term in q.split()]
+    if terms:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def highlighted(value: str | None) -> str | None:
+    """A highlight from :func:`search_statement` as HTML, escaped."""
+    if value is None:
+        return None
+    escaped = html.escape(value)
+    for marker, tag in zip(MARKERS, HIGHLIGHT):
+        escaped = escaped.replace(marker, tag)
+    return escaped
+
+
+def search_statement(
+    compiled: CompiledDb, q: str, limit: int, after: Sequence[float | int] | None
+) -> Select:
+    """Records matching ``q``, best first, after the (rank, id) ``after``.
+
+    Each row is the record's columns, then its rank, then each searchable
+    column with the matched words between :data:`MARKERS`, for
+    :func:`highlighted`.
+    """
+    records = compiled.table
+    search = table(search_table_name(compiled.db_id), column("rowid"), column("rank"))
+    target: ColumnElement[str] = literal_column(_quote(search.name))
+    statement = (
+        select(
+            records,
+            search.c.rank,
+            *(
+                func.highlight(target, i, *MARKERS)
+                for i in range(len(compiled.searchable))
+            ),
+        )
+        .select_from(search.join(records, records.c.id == search.c.rowid))
+        .where(target.op("MATCH")(match_query(q)))
+        .order_by(search.c.rank, search.c.rowid)
+        .limit(limit)
+    )
+    if after is not None:
+        rank, last_id = after
+        statement = statement.where(
+            or_(
+                search.c.rank > rank,
+                and_(search.c.rank == rank, search.c.rowid > last_id),
+            )
+        )
+    return statement
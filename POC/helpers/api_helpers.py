@@ -1,3 +1,22 @@
+import base64
+import binascii
+import json
+from datetime import datetime as dt
+from typing import Any, Literal, Sequence
+from fastapi import HTTPException
+from sqlalchemy import ColumnElement, Select, select, tuple_
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from POC.db.models.stock_models.db_models import Page
+
+PageOrder = Literal["id", "updated_at"]
+# Search results are paged by bm25 rank instead of a column.
+CursorOrder = PageOrder | Literal["rank"]
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
 def get_api_data() -> str:
     # some code
     return "API Data"
@@ -6,3 +25,118 @@ def get_api_data() -> str:
 def get_api_data2() -> str:
     # some code
     return "API Data2"
+
+
+def encode_cursor(order: CursorOrder, key: list[Any]) -> str:
+    payload = json.dumps({"o": order, "k": key}, default=dt.isoformat)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, order: CursorOrder) -> list[Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded))
+        if payload["o"] != order:
+            raise ValueError("cursor was issued for a different order")
+        key = payload["k"]
+        if order == "updated_at":
+            return [dt.fromisoformat(key[0]), int(key[1])]
+        if order == "rank":
+            return [float(key[0]), int(key[1])]
+        return [int(key[0])]
+    except (binascii.Error, ValueError, KeyError, TypeError, IndexError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {e}")
+
+
+def parse_projection(model: type[SQLModel], fields: str | None) -> list[str]:
+    columns = list(model.__table__.columns.keys())  # type: ignore[attr-defined]
+    if not fields:
+        return columns
+    requested = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in requested if name not in columns]
+    if unknown:
+        raise HTTPException(
+            status_code=422, detail=f"Unknown fields: {', '.join(unknown)}"
+        )
+    return requested
+
+
+def _item(row: Any, names: list[str]) -> dict[str, Any]:
+    # Matches the datetime serializers on DbInfo and FieldInfo.
+    return {
+        name: value.replace(microsecond=0) if isinstance(value, dt) else value
+        for name, value in zip(row._fields, row)
+        if name in names
+    }
+
+
+def _loaded_item(row: SQLModel, names: list[str]) -> dict[str, Any]:
+    values = {name: getattr(row, name) for name in names}
+    return {
+        name: value.replace(microsecond=0) if isinstance(value, dt) else value
+        for name, value in values.items()
+    }
+
+
+def _sort_key(order: PageOrder) -> Any:
+    if order == "id":
+        return lambda row: [row.id]
+    return lambda row: [row.updated_at, row.id]
+
+
+async def paginate(
+    session: AsyncSession,
+    model: type[SQLModel],
+    filters: list[ColumnElement[bool]],
+    order: PageOrder = "id",
+    fields: str | None = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: str | None = None,
+) -> Page:
+    """Return one keyset page of ``model`` rows.
+
+    Filters, projection and the ``(order, id) > cursor`` seek all run in SQL,
+    so a page costs the same however deep into the table it is.
+    """
+    table = model.__table__  # type: ignore[attr-defined]
+    names = parse_projection(model, fields)
+    key_columns = [table.c.id] if order == "id" else [table.c.updated_at, table.c.id]
+    selected = [table.c[name] for name in names]
+    selected += [c for c in key_columns if c.key not in names]
+
+    statement: Select = select(*selected).where(*filters)
+    if cursor is not None:
+        last = decode_cursor(cursor, order)
+        statement = statement.where(tuple_(*key_columns) > tuple_(*last))
+    statement = statement.order_by(*key_columns).limit(limit + 1)
+
+    rows = (await session.execute(statement)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_row = rows[-1]._mapping
+        next_cursor = encode_cursor(order, [last_row[c.key] for c in key_columns])
+    return Page(items=[_item(row, names) for row in rows], next_cursor=next_cursor)
+
+
+def paginate_loaded(
+    model: type[SQLModel],
+    rows: Sequence[SQLModel],
+    order: PageOrder = "id",
+    fields: str | None = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: str | None = None,
+) -> Page:
+    # The same page and cursor as paginate, cut from rows already in memory.
+    names = parse_projection(model, fields)
+    key = _sort_key(order)
+    ordered = sorted(rows, key=key)
+    if cursor is not None:
+        last = decode_cursor(cursor, order)
+        ordered = [row for row in ordered if key(row) > last]
+    next_cursor = None
+    if len(ordered) > limit:
+        ordered = ordered[:limit]
+        next_cursor = encode_cursor(order, key(ordered[-1]))
+    items = [_loaded_item(row, names) for row in ordered]
+    return Page(items=items, next_cursor=next_cursor)
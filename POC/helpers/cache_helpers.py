@@ -0,0 +1,183 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from fastapi import Request, Response
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from POC.db.models.stock_models.db_models import DbInfoModel, FieldInfoModel
+
+METADATA_TTL = 30.0
+METADATA_MAXSIZE = 1024
+COMPONENT_MAXSIZE = 1024
+
+# (db_id, metadata ETag, view, page) of a rendered page.
+ComponentKey = tuple[int, str, str, int]
+
+
+@dataclass(frozen=True)
+class DbMetadata:
+    db: DbInfoModel
+    fields: tuple[FieldInfoModel, ...]
+    etag: str
+    expires: float
+
+
+def metadata_etag(db: DbInfoModel) -> str:
+    # updated_at alone misses field deletes, which only bump the version.
+    stamp = int(db.updated_at.timestamp() * 1_000_000)
+    return f'W/"{db.id}-{db.version}-{stamp}"'
+
+
+class MetadataCache:
+    """LRU cache of database rows and their fields, with a TTL.
+
+    Entries are detached from the session that loaded them, so handlers must
+    treat them as read-only. Writes call ``invalidate`` after committing; the
+    TTL bounds staleness from writers in other processes.
+    """
+
+    def __init__(self, maxsize: int = METADATA_MAXSIZE, ttl: float = METADATA_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        # Bumped on every invalidate so a load that raced a write is dropped.
+        self.generation = 0
+        self._items: OrderedDict[int, DbMetadata] = OrderedDict()
+
+    def get(self, db_id: int) -> DbMetadata | None:
+        entry = self._items.get(db_id)
+        if entry is not None and entry.expires <= time.monotonic():
+            del self._items[db_id]
+            self.expirations += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._items.move_to_end(db_id)
+        return entry
+
+    def put(self, entry: DbMetadata, generation: int) -> None:
+        if generation != self.generation:
+            return
+        self._items[entry.db.id] = entry  # type: ignore[index]
+        self._items.move_to_end(entry.db.id)  # type: ignore[arg-type]
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, db_id: int) -> None:
+        self.generation += 1
+        if self._items.pop(db_id, None) is not None:
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        self._items.clear()
+        self.hits = self.misses = self.evictions = 0
+        self.expirations = self.invalidations = 0
+
+    def stats(self) -> dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._items),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class ComponentCache:
+    """LRU cache of rendered FastUI pages, as the JSON sent for them.
+
+    Keys carry the database's metadata ETag, which changes with its schema
+    version, so a page is only served for the version it was rendered from.
+    Pages of older versions are never hit again and age out.
+    """
+
+    def __init__(self, maxsize: int = COMPONENT_MAXSIZE) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items: OrderedDict[ComponentKey, bytes] = OrderedDict()
+
+    def get(self, key: ComponentKey) -> bytes | None:
+        body = self._items.get(key)
+        if body is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._items.move_to_end(key)
+        return body
+
+    def put(self, key: ComponentKey, body: bytes) -> None:
+        self._items[key] = body
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._items.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._items),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+async def get_db_metadata(
+    session: AsyncSession, db_id: int, cache: MetadataCache
+) -> DbMetadata | None:
+    # Read-through: one database row and its fields (active or not, by id).
+    entry = cache.get(db_id)
+    if entry is not None:
+        return entry
+
+    generation = cache.generation
+    db = await session.get(DbInfoModel, db_id)
+    if db is None:
+        return None
+    statement = (
+        select(FieldInfoModel)
+        .where(FieldInfoModel.db_id == db_id)
+        .order_by(FieldInfoModel.id)  # type: ignore[arg-type]
+    )
+    fields = (await session.exec(statement)).all()
+    # Detach, so later changes in this session never reach the cached copies.
+    for instance in (db, *fields):
+        session.expunge(instance)
+    entry = DbMetadata(
+        db=db,
+        fields=tuple(fields),
+        etag=metadata_etag(db),
+        expires=time.monotonic() + cache.ttl,
+    )
+    cache.put(entry, generation)
+    return entry
+
+
+def not_modified(request: Request, response: Response, etag: str) -> bool:
+    # Sets the ETag and reports whether If-None-Match already has it.
+    response.headers["ETag"] = etag
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return "*" in tags or etag.removeprefix("W/") in tags
@@ -1,21 +1,216 @@
-def generate_db() -> None:
-    # Generate a new database
-    ...
+from sqlalchemy import func, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from POC.db.models.stock_models.db_models import (
+    CodegenResult,
+    DbInfoModel,
+    FieldInfoModel,
+    SchemaVersionModel,
+)
+from POC.gen.codegen import load_generated, reload_generated, write_model_files
+from POC.db.database import session_database
+from POC.gen.compiler import (
+    CompiledDb,
+    CompiledDbCache,
+    compile_db,
+    record_table_name,
+)
+from POC.gen.migrate import (
+    ACTIVE_STATUSES,
+    MigrationPlan,
+    apply_in_place,
+    compile_version,
+    field_specs,
+    plan_migration,
+)
 
 
-def genertate_new_db_version() -> None:
-    # Generate a new version of the database
-    ...
+async def generate_db(session: AsyncSession, db_id: int) -> CompiledDb | None:
+    # Compile the database's active fields into a table, creating it if needed.
+    # Only the DbInfoModel row is read on a cache hit; the field metadata is
+    # read once per (db_id, version).
+    db = await session.get(DbInfoModel, db_id)
+    if db is None:
+        return None
+    cache = session_database(session).compiled
+    compiled = cache.get(db_id, db.version)
+    if compiled is not None:
+        return compiled
 
+    applied = await applied_version(session, db_id)
+    if applied is not None and applied.version == db.version:
+        # The table already has this schema; with generated classes for it
+        # there is nothing to read, compile or sync.
+        generated = load_generated(applied)
+        if generated is not None:
+            cache.put(generated)
+            return generated
 
-def generate_db_api_file() -> None:
-    # Generate a new API file
-    ...
+    migration = await outstanding_migration(session, db_id)
+    # Read again after the migration: a swap committed between the two reads
+    # would otherwise look like a change no migration covers yet.
+    applied = await applied_version(session, db_id)
+    if applied is not None and migration is not None:
+        if migration.status in ACTIVE_STATUSES or migration.version == db.version:
+            # Until the copy is swapped in, records keep the applied schema.
+            return _compiled_version(applied, cache)
 
+    statement = (
+        select(FieldInfoModel)
+        .where(FieldInfoModel.db_id == db_id, FieldInfoModel.is_active)
+        .order_by(FieldInfoModel.id)  # type: ignore[arg-type]
+    )
+    fields = (await session.exec(statement)).all()
+    compiled = compile_db(db_id, db.version, fields)
+    specs = field_specs(compiled, fields)
+    return await generate_new_db_version(session, compiled, specs, applied)
 
-def generate_db_model_file() -> None:
-    # Generate a new model file
-    ...
+
+async def applied_version(
+    session: AsyncSession, db_id: int
+) -> SchemaVersionModel | None:
+    statement = (
+        select(SchemaVersionModel)
+        .where(
+            SchemaVersionModel.db_id == db_id, SchemaVersionModel.status == "applied"
+        )
+        .order_by(col(SchemaVersionModel.version).desc())
+    )
+    return (await session.exec(statement)).first()
+
+
+async def migrating_dbs(session: AsyncSession) -> list[int]:
+    # Databases with a copy-and-swap under way, or cut off by a restart.
+    statement = (
+        select(SchemaVersionModel.db_id)
+        .where(col(SchemaVersionModel.status).in_(ACTIVE_STATUSES))
+        .distinct()
+    )
+    return list((await session.exec(statement)).all())
+
+
+async def outstanding_migration(
+    session: AsyncSession, db_id: int
+) -> SchemaVersionModel | None:
+    # The latest copy-and-swap that has not been applied, running or failed.
+    statement = (
+        select(SchemaVersionModel)
+        .where(
+            SchemaVersionModel.db_id == db_id, SchemaVersionModel.status != "applied"
+        )
+        .order_by(col(SchemaVersionModel.version).desc())
+    )
+    migration = (await session.exec(statement)).first()
+    applied = await applied_version(session, db_id)
+    if migration is None or (
+        applied is not None and applied.version > migration.version
+    ):
+        return None
+    return migration
+
+
+def _compiled_version(schema: SchemaVersionModel, cache: CompiledDbCache) -> CompiledDb:
+    compiled = cache.get(schema.db_id, schema.version)
+    if compiled is None:
+        compiled = load_generated(schema) or compile_version(
+            schema.db_id, schema.version, schema.fields
+        )
+        cache.put(compiled)
+    return compiled
+
+
+async def generate_new_db_version(
+    session: AsyncSession,
+    compiled: CompiledDb,
+    specs: list[dict],
+    applied: SchemaVersionModel | None,
+) -> CompiledDb:
+    """Bring the record table from the applied schema to ``compiled``.
+
+    Additions and renames are applied here. A change that needs the rows
+    rewritten is recorded as a pending copy-and-swap for run_migration, and
+    the applied schema is returned until it completes.
+    """
+    cache = session_database(session).compiled
+    connection = await session.connection()
+    plan = MigrationPlan()
+    if applied is not None and applied.version != compiled.version:
+        existing = await connection.run_sync(
+            lambda sync: {
+                column["name"]
+                for column in inspect(sync).get_columns(
+                    record_table_name(compiled.db_id)
+                )
+            }
+        )
+        plan = plan_migration(applied.fields, specs, existing)
+    if plan.copy:
+        assert applied is not None
+        session.add(
+            SchemaVersionModel(
+                db_id=compiled.db_id,
+                version=compiled.version,
+                from_version=applied.version,
+                status="pending",
+                fields=specs,
+            )
+        )
+        try:
+            await session.commit()
+        except IntegrityError:
+            # Another request recorded the same migration first.
+            await session.rollback()
+            applied = await applied_version(session, compiled.db_id)
+            assert applied is not None
+        return _compiled_version(applied, cache)
+
+    try:
+        await connection.run_sync(apply_in_place, compiled, plan)
+    except IntegrityError as e:
+        await session.rollback()
+        raise ValueError(f"Cannot index database {compiled.db_id}: {e.orig}")
+    if applied is None or applied.version != compiled.version:
+        session.add(
+            SchemaVersionModel(
+                db_id=compiled.db_id, version=compiled.version, fields=specs
+            )
+        )
+    await session.commit()
+    cache.put(compiled)
+    return compiled
+
+
+async def applied_schemas(session: AsyncSession) -> list[SchemaVersionModel]:
+    # The latest applied schema of every database that is not deleted.
+    latest = (
+        select(
+            SchemaVersionModel.db_id,
+            func.max(SchemaVersionModel.version).label("version"),
+        )
+        .where(SchemaVersionModel.status == "applied")
+        .group_by(col(SchemaVersionModel.db_id))
+        .subquery()
+    )
+    statement = (
+        select(SchemaVersionModel)
+        .join(
+            latest,
+            (col(SchemaVersionModel.db_id) == latest.c.db_id)
+            & (col(SchemaVersionModel.version) == latest.c.version),
+        )
+        .join(DbInfoModel, col(DbInfoModel.id) == col(SchemaVersionModel.db_id))
+        .where(col(DbInfoModel.status).is_distinct_from("deleted"))
+        .order_by(col(SchemaVersionModel.db_id))
+    )
+    return list((await session.exec(statement)).all())
+
+
+async def generate_db_model_file(session: AsyncSession) -> CodegenResult:
+    # Generate the model files from the applied schemas, then load them.
+    result = write_model_files(await applied_schemas(session))
+    reload_generated()
+    return result
 
 
 def generate_db_test_file() -> None:
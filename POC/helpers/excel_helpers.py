@@ -0,0 +1,226 @@
+import asyncio
+import csv
+import io
+import json
+from datetime import date, datetime as dt, time
+from itertools import chain, islice
+from pathlib import Path
+from typing import IO, Any, AsyncIterator, Callable, Iterable, Iterator, get_args
+from sqlmodel.ext.asyncio.session import AsyncSession
+from POC.db.models.stock_models.db_models import (
+    DATA_TYPES,
+    DbInfo,
+    DbInfoModel,
+    FieldInfo,
+    FieldInfoModel,
+    InferredField,
+    SpreadsheetImportResult,
+)
+from POC.gen.compiler import unique_column_name
+from POC.gen.ingest import CHUNK_SIZE, ingest_rows
+from POC.gen.validate import ValidationPool
+from POC.helpers.db_helpers import generate_db
+
+SAMPLE_SIZE = 1000
+READ_BATCH = 2000
+
+Source = str | Path | IO[bytes]
+
+
+def iter_xlsx_rows(source: Source, sheet: str | None = None) -> Iterator[tuple]:
+    # Imported here, as openpyxl is slow to import and only XLSX needs it.
+    from openpyxl import load_workbook
+
+    # read_only streams the sheet XML instead of building the whole workbook.
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet else workbook.active
+        yield from worksheet.iter_rows(values_only=True)  # type: ignore[union-attr]
+    finally:
+        workbook.close()
+
+
+def iter_csv_file_rows(source: Source) -> Iterator[tuple]:
+    if isinstance(source, (str, Path)):
+        with open(source, newline="", encoding="utf-8-sig") as f:
+            yield from map(tuple, csv.reader(f))
+    else:
+        text = io.TextIOWrapper(source, newline="", encoding="utf-8-sig")
+        yield from map(tuple, csv.reader(text))
+
+
+def _is_bool(v: Any) -> bool:
+    if isinstance(v, str):
+        return v.strip().lower() in ("true", "false", "yes", "no")
+    return isinstance(v, bool)
+
+
+def _is_int(v: Any) -> bool:
+    if isinstance(v, str):
+        return v.strip().lstrip("+-").isdigit()
+    if isinstance(v, float):
+        return v.is_integer()
+    return isinstance(v, int) and not isinstance(v, bool)
+
+
+def _is_float(v: Any) -> bool:
+    if isinstance(v, str):
+        try:
+            float(v)
+        except ValueError:
+            return False
+        return True
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+
+def _parses(parser: Callable[[str], Any], *types: type) -> Callable[[Any], bool]:
+    def check(v: Any) -> bool:
+        if isinstance(v, str):
+            try:
+                parser(v.strip())
+            except ValueError:
+                return False
+            return True
+        return isinstance(v, types)
+
+    return check
+
+
+def _is_date(v: Any) -> bool:
+    # Excel stores dates as midnight datetimes.
+    if isinstance(v, dt):
+        return v.time() == time()
+    return _parses(date.fromisoformat, date)(v)
+
+
+def _is_json(kind: type) -> Callable[[Any], bool]:
+    def check(v: Any) -> bool:
+        if isinstance(v, str):
+            try:
+                return isinstance(json.loads(v), kind)
+            except ValueError:
+                return False
+        return isinstance(v, kind)
+
+    return check
+
+
+# Most specific first; "str" accepts anything.
+TYPE_CHECKS: dict[str, Callable[[Any], bool]] = {
+    "bool": _is_bool,
+    "int": _is_int,
+    "float": _is_float,
+    "date": _is_date,
+    "datetime": _parses(dt.fromisoformat, dt),
+    "time": _parses(time.fromisoformat, time),
+    "dict": _is_json(dict),
+    "list": _is_json(list),
+    "str": lambda v: True,
+}
+assert set(TYPE_CHECKS) <= set(get_args(DATA_TYPES))
+
+
+def infer_data_type(values: Iterable[Any]) -> str:
+    present = [v for v in values if v is not None and v != ""]
+    if not present:
+        return "str"
+    for data_type, check in TYPE_CHECKS.items():
+        if all(check(v) for v in present):
+            return data_type
+    return "str"
+
+
+def clean_headers(header: Iterable[Any]) -> list[str]:
+    names: list[str] = []
+    for i, value in enumerate(header):
+        name = str(value).strip() if value not in (None, "") else f"column_{i + 1}"
+        names.append(unique_column_name(name, names))
+    return names
+
+
+def infer_fields(
+    rows: Iterator[tuple], sample_size: int = SAMPLE_SIZE
+) -> tuple[list[InferredField], list[tuple]]:
+    """Infer one field per column from the first ``sample_size`` data rows.
+
+    Returns the fields and the sampled rows so the caller can load them
+    without re-reading the source.
+    """
+    header = clean_headers(next(rows, ()))
+    sample = list(islice(rows, sample_size))
+    fields = [
+        InferredField(
+            name=name,
+            data_type=infer_data_type(row[i] for row in sample if i < len(row)),
+        )
+        for i, name in enumerate(header)
+    ]
+    return fields, sample
+
+
+def row_to_record(columns: list[str], row: tuple) -> dict[str, Any]:
+    return {
+        name: value
+        for name, value in zip(columns, row)
+        if value is not None and value != ""
+    }
+
+
+async def iter_in_thread(
+    rows: Iterator[Any], size: int = READ_BATCH
+) -> AsyncIterator[Any]:
+    # Parsing a sheet is blocking CPU work, so rows are pulled in batches on a
+    # worker thread rather than on the event loop.
+    while batch := await asyncio.to_thread(list, islice(rows, size)):
+        for row in batch:
+            yield row
+
+
+async def import_spreadsheet(
+    session: AsyncSession,
+    source: Source,
+    name: str,
+    file_type: str = "xlsx",
+    sheet: str | None = None,
+    chunk_size: int = CHUNK_SIZE,
+    sample_size: int = SAMPLE_SIZE,
+    pool: ValidationPool | None = None,
+) -> SpreadsheetImportResult:
+    """Create a database from a spreadsheet and load its rows."""
+    if file_type == "csv":
+        rows = iter_csv_file_rows(source)
+    else:
+        rows = iter_xlsx_rows(source, sheet)
+    fields, sample = await asyncio.to_thread(infer_fields, rows, sample_size)
+
+    db_info = DbInfo(
+        name=name,
+        short_name=name,
+        display_name=name,
+        category=None,
+        alias=None,
+        description=f"Imported from {file_type.upper()}",
+    )
+    db = DbInfoModel(**db_info.model_dump())
+    session.add(db)
+    await session.flush()
+    assert db.id is not None
+    for field in fields:
+        field_info = FieldInfo(
+            name=field.name,
+            data_type=field.data_type,
+            required=False,
+            default="",
+            db_id=db.id,
+        )
+        session.add(FieldInfoModel(**field_info.model_dump()))
+    await session.commit()
+
+    compiled = await generate_db(session, db.id)
+    assert compiled is not None
+    columns = list(compiled.columns)
+    records = (row_to_record(columns, row) for row in chain(sample, rows))
+    ingest = await ingest_rows(
+        session, compiled, iter_in_thread(records), chunk_size, pool
+    )
+    return SpreadsheetImportResult(db_id=db.id, fields=fields, ingest=ingest)
@@ -0,0 +1,62 @@
+"""FastUI building blocks shared by the forms.
+
+``c.ModelForm`` builds its fields from the model's JSON schema each time it
+is sent, which pydantic generates afresh on every call. ``model_form`` sends
+the same form with the fields built once per model.
+
+Field tables are sent a page at a time, with ``c.Pagination`` below them.
+Pages that only depend on a database's metadata are rendered once per schema
+version and kept as JSON in the ``Database``'s ``components`` cache.
+"""
+
+from functools import cache
+from typing import Any, Sequence
+from fastapi import Response
+from fastui import FastUI, AnyComponent, components as c
+from fastui.components.forms import FormField
+from fastui.json_schema import model_json_schema_to_fields
+from pydantic import BaseModel
+
+FIELD_PAGE_SIZE = 50
+
+
+@cache
+def model_form_fields(model: type[BaseModel]) -> tuple[FormField, ...]:
+    return tuple(model_json_schema_to_fields(model))
+
+
+def model_form(model: type[BaseModel], **kwargs: Any) -> c.Form:
+    """The form a ``c.ModelForm`` of ``model`` would send."""
+    return c.Form(form_fields=list(model_form_fields(model)), **kwargs)
+
+
+def paged_table(
+    rows: Sequence[BaseModel],
+    data_model: type[BaseModel],
+    page: int,
+    total: int,
+    page_size: int = FIELD_PAGE_SIZE,
+) -> list[AnyComponent]:
+    # One page of ``total`` rows; pages past the end show an empty table.
+    if total == 0:
+        return [c.Text(text="No fields found")]
+    components: list[AnyComponent] = [
+        c.Table(data=rows, data_model=data_model, no_data_message="No fields found")
+    ]
+    if total > page_size:
+        components.append(c.Pagination(page=page, page_size=page_size, total=total))
+    return components
+
+
+def render(components: list[AnyComponent]) -> bytes:
+    # The body response_model=FastUI, response_model_exclude_none=True sends.
+    return (
+        FastUI(root=components)
+        .model_dump_json(by_alias=True, exclude_none=True)
+        .encode()
+    )
+
+
+def json_response(body: bytes, response: Response) -> Response:
+    # Keeps the headers, such as the ETag, set on the injected response.
+    return Response(body, media_type="application/json", headers=dict(response.headers))
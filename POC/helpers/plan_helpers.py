@@ -0,0 +1,101 @@
+import re
+from datetime import datetime as dt
+from typing import Any
+from sqlalchemy import Select, bindparam, tuple_
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from POC.db.database import session_engine
+from POC.db.models.stock_models.db_models import (
+    DbInfoModel,
+    DbTagLink,
+    FieldInfoModel,
+    QueryPlan,
+    TagsInfo,
+)
+from POC.gen.compiler import CompiledDb
+from POC.helpers.api_helpers import DEFAULT_PAGE_SIZE
+from POC.helpers.tag_helpers import tagged_db_filter
+
+# "SCAN t" reads every row; "SCAN t USING INDEX i" is an ordered, LIMITed walk.
+FULL_SCAN = re.compile(r"^SCAN (TABLE )?(?!CONSTANT ROW)\S+( AS \S+)?$")
+
+
+def hot_queries(db_id: int, compiled: CompiledDb | None = None) -> dict[str, Select]:
+    # The statements the API runs per request, with representative parameters.
+    page = DEFAULT_PAGE_SIZE + 1
+    cursor: list[Any] = [dt.now(), db_id]
+    db_key = tuple_(col(DbInfoModel.updated_at), col(DbInfoModel.id))
+    field_key = tuple_(col(FieldInfoModel.updated_at), col(FieldInfoModel.id))
+    queries: dict[str, Select] = {
+        "database_by_id": select(DbInfoModel).where(DbInfoModel.id == db_id),
+        "databases_by_status": select(DbInfoModel)
+        .where(DbInfoModel.status == "building")
+        .order_by(col(DbInfoModel.id))
+        .limit(page),
+        "databases_by_category": select(DbInfoModel)
+        .where(DbInfoModel.category == "")
+        .order_by(col(DbInfoModel.id))
+        .limit(page),
+        "databases_by_updated_at": select(DbInfoModel)
+        .where(db_key > tuple_(*cursor))
+        .order_by(col(DbInfoModel.updated_at), col(DbInfoModel.id))
+        .limit(page),
+        "database_fields": select(FieldInfoModel)
+        .where(FieldInfoModel.db_id == db_id)
+        .order_by(col(FieldInfoModel.id)),
+        "active_fields": select(FieldInfoModel)
+        .where(FieldInfoModel.db_id == db_id, FieldInfoModel.is_active)
+        .order_by(col(FieldInfoModel.id)),
+        "field_by_id": select(FieldInfoModel).where(
+            FieldInfoModel.id == db_id, FieldInfoModel.db_id == db_id
+        ),
+        "fields_by_updated_at": select(FieldInfoModel)
+        .where(field_key > tuple_(*cursor))
+        .order_by(col(FieldInfoModel.updated_at), col(FieldInfoModel.id))
+        .limit(page),
+        "tags_by_name": select(TagsInfo).where(col(TagsInfo.tag_name).in_(["a", "b"])),
+        "database_tags": select(TagsInfo.tag_name)
+        .join(DbTagLink, col(DbTagLink.tag_id) == col(TagsInfo.id))
+        .where(DbTagLink.db_id == db_id),
+        "databases_by_tags": select(DbInfoModel)
+        .where(tagged_db_filter(["a", "b"], "all"))
+        .order_by(col(DbInfoModel.id))
+        .limit(page),
+    }
+    if compiled is not None:
+        table = compiled.table
+        for index in table.indexes:
+            column = next(iter(index.columns))
+            queries[f"records_by_{column.name}"] = table.select().where(
+                column == bindparam("value", None, type_=column.type)
+            )
+    return queries
+
+
+async def explain(session: AsyncSession, statement: Select) -> tuple[str, list[str]]:
+    dialect = session_engine(session).dialect
+    compiled = statement.compile(
+        dialect=dialect, compile_kwargs={"render_postcompile": True}
+    )
+    names = compiled.positiontup or []
+    params = tuple(compiled.params[name] for name in names)
+    connection = await session.connection()
+    result = await connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params)
+    return str(compiled), [row[3] for row in result]
+
+
+async def explain_hot_queries(
+    session: AsyncSession, db_id: int, compiled: CompiledDb | None = None
+) -> list[QueryPlan]:
+    plans = []
+    for name, statement in hot_queries(db_id, compiled).items():
+        sql, plan = await explain(session, statement)
+        plans.append(
+            QueryPlan(
+                name=name,
+                sql=sql,
+                plan=plan,
+                full_scan=any(FULL_SCAN.match(step) for step in plan),
+            )
+        )
+    return plans
@@ -0,0 +1,107 @@
+from collections import defaultdict
+from typing import Any
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from POC.gen.compiler import CompiledDb
+from POC.helpers.db_helpers import generate_db
+
+# How many relationships one expand path may follow, e.g. Order.Customer.
+MAX_EXPAND_DEPTH = 3
+# Keys per IN list, well under SQLite's bound parameter limit.
+EXPAND_BATCH_SIZE = 500
+
+ExpandTree = dict[str, Any]
+
+
+def parse_expand(expand: str | None) -> ExpandTree:
+    """Turn ``Customer,Items.Product`` into the tree of relationship fields
+    to follow, checking the depth of every path."""
+    tree: ExpandTree = {}
+    if not expand:
+        return tree
+    for path in expand.split(","):
+        names = [name.strip() for name in path.split(".")]
+        if not all(names):
+            raise HTTPException(status_code=422, detail=f"Invalid expand: {path!r}")
+        if len(names) > MAX_EXPAND_DEPTH:
+            raise HTTPException(
+                status_code=422,
+                detail=f"expand follows at most {MAX_EXPAND_DEPTH} relationships: {path!r}",
+            )
+        node = tree
+        for name in names:
+            node = node.setdefault(name, {})
+    return tree
+
+
+async def _related_db(session: AsyncSession, db_id: int) -> CompiledDb:
+    try:
+        compiled = await generate_db(session, db_id)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if compiled is None:
+        raise HTTPException(
+            status_code=422, detail=f"Related database {db_id} not found"
+        )
+    return compiled
+
+
+async def expand_records(
+    session: AsyncSession,
+    compiled: CompiledDb,
+    records: list[dict[str, Any]],
+    tree: ExpandTree,
+) -> None:
+    """Replace the relationship fields named in ``tree`` with the records
+    they refer to: a parent field with its record or None, a child field
+    with the list of its records.
+
+    Like SQLAlchemy's selectinload, each relationship is one IN query over
+    the keys of all ``records`` together, per batch of EXPAND_BATCH_SIZE
+    keys, and the records it loads are expanded level by level the same
+    way. The queries follow the shape of ``tree``, not the number of rows.
+    """
+    for name, subtree in tree.items():
+        relation = compiled.relation(name)
+        if relation is None:
+            raise HTTPException(
+                status_code=422, detail=f"{name!r} is not a relationship field"
+            )
+        related = await _related_db(session, relation.db_id)
+        if relation.key not in related.table.c:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Database {relation.db_id} has no field {relation.key!r}",
+            )
+        table, key = related.table, related.table.c[relation.key]
+        keys = list(
+            dict.fromkeys(
+                record[relation.local]
+                for record in records
+                if record[relation.local] is not None
+            )
+        )
+        rows: list[dict[str, Any]] = []
+        for start in range(0, len(keys), EXPAND_BATCH_SIZE):
+            statement = (
+                select(table)
+                .where(key.in_(keys[start : start + EXPAND_BATCH_SIZE]))
+                .order_by(table.c.id)
+            )
+            result = await session.execute(statement)
+            rows.extend(dict(row._mapping) for row in result.all())
+
+        # Matched before the next level replaces keys with records.
+        if relation.kind == "parent":
+            by_key = {row[relation.key]: row for row in rows}
+            for record in records:
+                record[name] = by_key.get(record[name])
+        else:
+            children = defaultdict(list)
+            for row in rows:
+                children[row[relation.key]].append(row)
+            for record in records:
+                record[name] = children.get(record["id"], [])
+        if subtree:
+            await expand_records(session, related, rows, subtree)
@@ -0,0 +1,152 @@
+from bisect import bisect_left, insort
+from typing import Iterable, Literal
+from sqlalchemy import ColumnElement, func
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from POC.db.models.stock_models.db_models import (
+    DbInfoModel,
+    DbTagLink,
+    TagsInfo,
+)
+
+TagMatch = Literal["any", "all"]
+
+SEARCH_LIMIT = 20
+
+
+def _trigrams(key: str) -> set[str]:
+    return {key[i : i + 3] for i in range(len(key) - 2)}
+
+
+class TagIndex:
+    """In-memory tag name index for the select widget's search box.
+
+    Matches are ranked exact, then prefix, then prefix of a later word, then
+    any other substring, alphabetically within each rank. Prefix lookups
+    bisect a sorted list and substring lookups intersect trigram postings, so
+    a search never scans every tag.
+
+    Tag names are unique as written, so each one is its own entry; only the
+    matching and ranking ignore case.
+    """
+
+    def __init__(self) -> None:
+        self.loaded = False
+        # (lowercased name, name), sorted; and (later word, lowercased name,
+        # name) for each word after the first.
+        self._keys: list[tuple[str, str]] = []
+        self._words: list[tuple[str, str, str]] = []
+        self._trigrams: dict[str, set[tuple[str, str]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def clear(self) -> None:
+        self.loaded = False
+        self._keys.clear()
+        self._words.clear()
+        self._trigrams.clear()
+
+    def _index(self, entry: tuple[str, str]) -> None:
+        key = entry[0]
+        for trigram in _trigrams(key):
+            self._trigrams.setdefault(trigram, set()).add(entry)
+
+    def load(self, names: Iterable[str]) -> None:
+        self.clear()
+        self._keys = sorted({(name.lower(), name) for name in names})
+        for entry in self._keys:
+            self._words.extend((word, *entry) for word in entry[0].split()[1:])
+            self._index(entry)
+        self._words.sort()
+        self.loaded = True
+
+    def add(self, name: str) -> None:
+        entry = (name.lower(), name)
+        i = bisect_left(self._keys, entry)
+        if i < len(self._keys) and self._keys[i] == entry:
+            return
+        self._keys.insert(i, entry)
+        for word in entry[0].split()[1:]:
+            insort(self._words, (word, *entry))
+        self._index(entry)
+
+    def _prefixed(self, q: str, limit: int) -> list[tuple[str, str]]:
+        start = bisect_left(self._keys, (q, ""))
+        matches = []
+        for entry in self._keys[start : start + limit]:
+            if not entry[0].startswith(q):
+                break
+            matches.append(entry)
+        return matches
+
+    def _word_prefixed(self, q: str, limit: int) -> list[tuple[str, str]]:
+        start = bisect_left(self._words, (q, "", ""))
+        matches = []
+        for word, key, name in self._words[start : start + limit]:
+            if not word.startswith(q):
+                break
+            matches.append((key, name))
+        return sorted(set(matches))
+
+    def _containing(self, q: str) -> list[tuple[str, str]]:
+        if len(q) < 3:
+            return []
+        postings = sorted((self._trigrams.get(t, set()) for t in _trigrams(q)), key=len)
+        candidates = set.intersection(*postings) if postings else set()
+        return sorted(entry for entry in candidates if q in entry[0])
+
+    def search(self, q: str, limit: int = SEARCH_LIMIT) -> list[str]:
+        q = q.strip().lower()
+        if not q:
+            return [name for _, name in self._keys[:limit]]
+
+        ranked: dict[tuple[str, str], None] = {}
+        for tier in (
+            lambda: self._prefixed(q, limit),
+            lambda: self._word_prefixed(q, limit),
+            lambda: self._containing(q),
+        ):
+            for entry in tier():
+                ranked.setdefault(entry, None)
+            if len(ranked) >= limit:
+                break
+        return [name for _, name in list(ranked)[:limit]]
+
+
+async def get_tag_index(session: AsyncSession, index: TagIndex) -> TagIndex:
+    if not index.loaded:
+        names = (await session.exec(select(col(TagsInfo.tag_name)))).all()
+        index.load(names)
+    return index
+
+
+async def resolve_tags(session: AsyncSession, tag_names: list[str]) -> list[TagsInfo]:
+    # One IN (...) lookup for the whole selection, in the order requested.
+    names = list(dict.fromkeys(tag_names))
+    if not names:
+        return []
+    statement = select(TagsInfo).where(col(TagsInfo.tag_name).in_(names))
+    by_name = {tag.tag_name: tag for tag in (await session.exec(statement)).all()}
+    return [by_name[name] for name in names if name in by_name]
+
+
+def tagged_db_filter(
+    tag_names: list[str], match: TagMatch = "any"
+) -> ColumnElement[bool]:
+    """Filter on ``DbInfoModel.id`` for databases carrying the given tags.
+
+    The tag names are joined to the link table in a subquery, so listing by
+    one tag or by the intersection of several is still a single statement.
+    """
+    names = list(dict.fromkeys(tag_names))
+    tagged = (
+        select(col(DbTagLink.db_id))
+        .join(TagsInfo, col(TagsInfo.id) == col(DbTagLink.tag_id))
+        .where(col(TagsInfo.tag_name).in_(names))
+    )
+    if match == "all":
+        tagged = tagged.group_by(col(DbTagLink.db_id)).having(
+            func.count() == len(names)
+        )
+    return col(DbInfoModel.id).in_(tagged)
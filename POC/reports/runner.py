@@ -0,0 +1,185 @@
+"""What a report run does in a worker process.
+
+``run_report`` is submitted to the scheduler's process pool with a picklable
+``ReportJob``: it runs the report's query on its own connection, streams the
+rows into a CSV or XLSX file and mails the file. The API process only waits
+for the result, so a heavy aggregation never holds up its event loop or its
+GIL.
+"""
+
+import csv
+import json
+import smtplib
+import time
+from dataclasses import dataclass
+from email.message import EmailMessage
+from pathlib import Path
+from typing import Any, Callable, Iterable, Sequence
+from sqlalchemy import (
+    Column,
+    MetaData,
+    Select,
+    Table,
+    create_engine,
+    func,
+    select,
+)
+from sqlalchemy.pool import NullPool
+
+AGGREGATES: dict[str, Callable[..., Any]] = {
+    "count": func.count,
+    "sum": func.sum,
+    "avg": func.avg,
+    "min": func.min,
+    "max": func.max,
+}
+ATTACHMENT_TYPES = {
+    ".csv": ("text", "csv"),
+    ".xlsx": ("application", "vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+YIELD_PER = 1000
+
+
+@dataclass(frozen=True)
+class Delivery:
+    host: str
+    port: int
+    sender: str
+    to: tuple[str, ...]
+    cc: tuple[str, ...] = ()
+    bcc: tuple[str, ...] = ()
+    timeout: float = 30.0
+
+
+@dataclass(frozen=True)
+class ReportJob:
+    report_id: int
+    name: str
+    database_url: str
+    table: str
+    columns: tuple[str, ...]
+    group_by: tuple[str, ...]
+    aggregates: tuple[str, ...]
+    output: str
+    path: str
+    delivery: Delivery | None = None
+
+
+@dataclass(frozen=True)
+class ReportOutput:
+    path: str
+    rows: int
+    bytes: int
+    seconds: float
+    emailed: bool
+
+
+def _column(table: Table, name: str) -> Column:
+    if name not in table.c:
+        raise ValueError(f"{table.name} has no column {name!r}")
+    return table.c[name]
+
+
+def report_statement(
+    table: Table,
+    columns: Sequence[str],
+    group_by: Sequence[str],
+    aggregates: Sequence[str],
+) -> Select:
+    """The report's query: the listed columns of every row, or, with group
+    columns or aggregates, one row per group."""
+    if not group_by and not aggregates:
+        selected = [_column(table, name) for name in columns] or list(table.c)
+        return select(*selected).order_by(table.c.id)
+    groups = [_column(table, name) for name in group_by]
+    selected = list(groups)
+    for spec in aggregates:
+        name, _, argument = spec.partition(":")
+        function = AGGREGATES.get(name.strip().lower())
+        if function is None or (not argument and name.strip().lower() != "count"):
+            raise ValueError(f"Unknown aggregate {spec!r}")
+        value = function(_column(table, argument.strip())) if argument else function()
+        selected.append(value.label(spec))
+    return select(*selected).group_by(*groups).order_by(*groups)
+
+
+def _cell(v: Any) -> Any:
+    if isinstance(v, (dict, list)):
+        return json.dumps(v, default=str)
+    return v
+
+
+def _write_csv(path: Path, keys: list[str], rows: Iterable[Sequence[Any]]) -> int:
+    count = 0
+    with path.open("w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(keys)
+        for row in rows:
+            writer.writerow([_cell(v) for v in row])
+            count += 1
+    return count
+
+
+def _write_xlsx(path: Path, keys: list[str], rows: Iterable[Sequence[Any]]) -> int:
+    # Write-only mode spools rows to disk as they are appended.
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(keys)
+    count = 0
+    for row in rows:
+        sheet.append([_cell(v) for v in row])
+        count += 1
+    workbook.save(path)
+    return count
+
+
+def send_report(delivery: Delivery, subject: str, path: Path) -> None:
+    message = EmailMessage()
+    message["Subject"] = subject
+    message["From"] = delivery.sender
+    message["To"] = ", ".join(delivery.to)
+    if delivery.cc:
+        message["Cc"] = ", ".join(delivery.cc)
+    message.set_content(f"{subject} is attached.")
+    maintype, subtype = ATTACHMENT_TYPES[path.suffix]
+    message.add_attachment(
+        path.read_bytes(), maintype=maintype, subtype=subtype, filename=path.name
+    )
+    # Bcc recipients are envelope recipients only, never a header.
+    recipients = [*delivery.to, *delivery.cc, *delivery.bcc]
+    with smtplib.SMTP(delivery.host, delivery.port, timeout=delivery.timeout) as smtp:
+        smtp.send_message(message, to_addrs=recipients)
+
+
+def run_report(job: ReportJob) -> ReportOutput:
+    start = time.perf_counter()
+    path = Path(job.path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(path.name + ".partial")
+    engine = create_engine(job.database_url, poolclass=NullPool)
+    try:
+        with engine.connect() as connection:
+            table = Table(job.table, MetaData(), autoload_with=connection)
+            statement = report_statement(
+                table, job.columns, job.group_by, job.aggregates
+            )
+            result = connection.execution_options(yield_per=YIELD_PER).execute(
+                statement
+            )
+            write = _write_xlsx if job.output == "xlsx" else _write_csv
+            rows = write(partial, list(result.keys()), result)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+    finally:
+        engine.dispose()
+    partial.replace(path)
+    emailed = False
+    if job.delivery is not None:
+        send_report(job.delivery, f"Report {job.name}", path)
+        emailed = True
+    return ReportOutput(
+        str(path), rows, path.stat().st_size, time.perf_counter() - start, emailed
+    )
@@ -0,0 +1,69 @@
+import calendar
+from datetime import date, datetime as dt, time, timedelta
+from POC.db.models.stock_models.db_models import REPORT_WEEKDAYS, ReportForm
+
+# Occurrences counted when catching up; past this the backlog is skipped.
+MAX_CATCH_UP = 10_000
+
+
+def run_time(report: ReportForm) -> time:
+    hour, minute = report.at.split(":")
+    return time(int(hour), int(minute))
+
+
+def weekdays(report: ReportForm) -> set[int]:
+    days = {REPORT_WEEKDAYS.index(day) for day in report.days.split(",") if day}
+    if days:
+        return days
+    return {0} if report.schedule == "weekly" else set(range(7))
+
+
+def _on_day(year: int, month: int, day: int) -> date:
+    # Day 31 of a 30-day month is its last day.
+    return date(year, month, min(day, calendar.monthrange(year, month)[1]))
+
+
+def next_run(report: ReportForm, after: dt, real_time_s: float) -> dt | None:
+    """The first occurrence of the report's schedule later than ``after``."""
+    if report.schedule == "manual":
+        return None
+    if report.schedule == "real_time":
+        return after + timedelta(seconds=real_time_s)
+    at = run_time(report)
+    if report.schedule in ("daily", "weekly"):
+        days = weekdays(report)
+        for offset in range(8):
+            day = after.date() + timedelta(days=offset)
+            candidate = dt.combine(day, at)
+            if day.weekday() in days and candidate > after:
+                return candidate
+        raise ValueError(f"No weekday in {report.days!r}")
+    if report.schedule == "monthly":
+        year, month = after.year, after.month
+        while True:
+            candidate = dt.combine(_on_day(year, month, report.day), at)
+            if candidate > after:
+                return candidate
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    year = after.year
+    while True:
+        candidate = dt.combine(_on_day(year, report.month, report.day), at)
+        if candidate > after:
+            return candidate
+        year += 1
+
+
+def catch_up(
+    report: ReportForm, due: dt, now: dt, real_time_s: float
+) -> tuple[dt, int, dt | None]:
+    """From an occurrence ``due`` at or before ``now``: the latest occurrence
+    up to now, how many earlier ones it stands for, and the next one after
+    now."""
+    latest, missed = due, 0
+    upcoming = next_run(report, due, real_time_s)
+    while upcoming is not None and upcoming <= now and missed < MAX_CATCH_UP:
+        latest, missed = upcoming, missed + 1
+        upcoming = next_run(report, upcoming, real_time_s)
+    if upcoming is not None and upcoming <= now:
+        upcoming = next_run(report, now, real_time_s)
+    return latest, missed, upcoming
@@ -0,0 +1,298 @@
+"""Runs report definitions on their schedules, in a pool of worker processes.
+
+The scheduler lives in the API process and only decides what runs when: it
+looks for due reports every ``report_tick_s`` seconds and hands each run to
+``POC.reports.runner.run_report`` on a process pool. At most
+``report_concurrency`` runs are in flight and a report never overlaps
+itself, not even with a run that timed out but whose worker is still going.
+A report that fell due while the app was down runs once for its
+latest missed occurrence, and the run records how many it stood for.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import time
+from collections import Counter
+from concurrent.futures import Executor, ProcessPoolExecutor
+from datetime import datetime as dt
+from pathlib import Path
+from fastapi import Request
+from sqlmodel import col, select
+from POC.core.config import Settings
+from POC.db.database import Database
+from POC.db.instrumentation import Histogram
+from POC.db.models.stock_models.db_models import ReportModel, ReportRunModel
+from POC.db.storage import sqlite_path
+from POC.gen.compiler import record_table_name
+from POC.reports.runner import Delivery, ReportJob, ReportOutput, run_report
+from POC.reports.schedule import catch_up
+
+logger = logging.getLogger("POC.reports")
+
+REPORT_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+
+
+class ReportMetrics:
+    """Per-report run times and outcomes, in the Prometheus text format."""
+
+    def __init__(self) -> None:
+        self.seconds: dict[int, Histogram] = {}
+        self.runs: Counter[tuple[int, str]] = Counter()
+        self.rows: Counter[int] = Counter()
+
+    def observe(self, report_id: int, status: str, seconds: float, rows: int) -> None:
+        histogram = self.seconds.get(report_id)
+        if histogram is None:
+            histogram = self.seconds[report_id] = Histogram(REPORT_BUCKETS)
+        histogram.observe(seconds)
+        self.runs[(report_id, status)] += 1
+        self.rows[report_id] += rows
+
+    def clear(self) -> None:
+        self.seconds.clear()
+        self.runs.clear()
+        self.rows.clear()
+
+    def render(self) -> str:
+        lines = [
+            "# HELP dynamic_db_report_seconds Time a report run took, query to delivery.",
+            "# TYPE dynamic_db_report_seconds histogram",
+        ]
+        for report_id, histogram in sorted(self.seconds.items()):
+            lines.extend(
+                histogram.samples("dynamic_db_report_seconds", f'report="{report_id}"')
+            )
+        lines += [
+            "# HELP dynamic_db_report_runs_total Report runs by outcome.",
+            "# TYPE dynamic_db_report_runs_total counter",
+        ]
+        for (report_id, status), count in sorted(self.runs.items()):
+            lines.append(
+                f'dynamic_db_report_runs_total{{report="{report_id}",status="{status}"}}'
+                f" {count}"
+            )
+        lines += [
+            "# HELP dynamic_db_report_rows_total Rows written by report runs.",
+            "# TYPE dynamic_db_report_rows_total counter",
+        ]
+        for report_id, rows in sorted(self.rows.items()):
+            lines.append(f'dynamic_db_report_rows_total{{report="{report_id}"}} {rows}')
+        return "\n".join(lines) + "\n"
+
+
+report_metrics = ReportMetrics()
+
+
+def _addresses(value: str) -> tuple[str, ...]:
+    return tuple(address.strip() for address in value.split(",") if address.strip())
+
+
+class ReportScheduler:
+    def __init__(
+        self,
+        settings: Settings,
+        database: Database,
+        metrics: ReportMetrics = report_metrics,
+    ) -> None:
+        self.settings = settings
+        self.database = database
+        self.metrics = metrics
+        self._pool: Executor | None = None
+        self._slots = asyncio.Semaphore(settings.report_concurrency)
+        self._running: set[int] = set()
+        # Reports whose run timed out while its worker keeps going.
+        self._overrunning: set[int] = set()
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def pool(self) -> Executor:
+        if self._pool is None:
+            # Spawned, not forked: the API process has threads of its own.
+            self._pool = ProcessPoolExecutor(
+                self.settings.report_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    def directory(self) -> Path:
+        if self.settings.report_dir:
+            return Path(self.settings.report_dir)
+        path = sqlite_path(self.settings.database_url)
+        return (path.parent if path else Path.cwd()) / "reports"
+
+    def report_path(self, report: ReportModel, started: dt) -> Path:
+        """Where a run's file goes. The save location is a folder under the
+        reports directory; it cannot lead out of it."""
+        base = self.directory().resolve()
+        folder = (base / report.save_location).resolve()
+        if not folder.is_relative_to(base):
+            raise ValueError(
+                f"Save location {report.save_location!r} is outside {base}"
+            )
+        name = "".join(c if c.isalnum() or c in "-_" else "_" for c in report.name)
+        stamp = started.strftime("%Y%m%dT%H%M%S%f")
+        return folder / f"{name}-{stamp}.{report.output}"
+
+    def job(self, report: ReportModel, started: dt) -> ReportJob:
+        if sqlite_path(self.settings.database_url) is None:
+            raise ValueError("Reports read the database file from another process")
+        assert report.id is not None
+        delivery = None
+        to = _addresses(report.email_to)
+        cc, bcc = _addresses(report.email_cc), _addresses(report.email_bcc)
+        if to or cc or bcc:
+            delivery = Delivery(
+                self.settings.smtp_host,
+                self.settings.smtp_port,
+                self.settings.smtp_sender,
+                to,
+                cc,
+                bcc,
+            )
+        return ReportJob(
+            report.id,
+            report.name,
+            # The worker reads with a plain, blocking engine.
+            self.settings.database_url.replace("+aiosqlite", "", 1),
+            record_table_name(report.db_id),
+            tuple(report.columns),
+            tuple(report.group_by),
+            tuple(report.aggregates),
+            report.output,
+            str(self.report_path(report, started)),
+            delivery,
+        )
+
+    def is_running(self, report_id: int) -> bool:
+        return report_id in self._running
+
+    async def run(
+        self, report: ReportModel, scheduled_for: dt | None = None, missed: int = 0
+    ) -> ReportRunModel:
+        """Run the report once and record the run, whatever its outcome."""
+        assert report.id is not None
+        if report.id in self._running:
+            raise ValueError(f"Report {report.id} is already running")
+        self._running.add(report.id)
+        try:
+            async with self._slots:
+                return await self._run(report, scheduled_for, missed)
+        finally:
+            if report.id not in self._overrunning:
+                self._running.discard(report.id)
+
+    def _overran(self, report_id: int, worker: asyncio.Future) -> None:
+        # A worker process cannot be stopped mid-run, so the report counts
+        # as running until it finishes; what it returns is dropped.
+        self._overrunning.add(report_id)
+
+        def finished(worker: asyncio.Future) -> None:
+            if not worker.cancelled() and worker.exception() is not None:
+                logger.warning(
+                    "report %s finished after timing out: %s",
+                    report_id,
+                    worker.exception(),
+                )
+            self._overrunning.discard(report_id)
+            self._running.discard(report_id)
+
+        worker.add_done_callback(finished)
+
+    async def _run(
+        self, report: ReportModel, scheduled_for: dt | None, missed: int
+    ) -> ReportRunModel:
+        assert report.id is not None
+        run = ReportRunModel(
+            report_id=report.id, scheduled_for=scheduled_for, missed=missed
+        )
+        async with self.database.session() as session:
+            session.add(run)
+            await session.commit()
+        start = time.perf_counter()
+        output: ReportOutput | None = None
+        worker: asyncio.Future[ReportOutput] | None = None
+        try:
+            job = self.job(report, run.started_at)
+            loop = asyncio.get_running_loop()
+            worker = loop.run_in_executor(self.pool, run_report, job)
+            # Shielded, so a timeout leaves the future to say when the
+            # worker is done.
+            output = await asyncio.wait_for(
+                asyncio.shield(worker), self.settings.report_timeout_s
+            )
+        except Exception as e:
+            if worker is not None and not worker.done():
+                self._overran(report.id, worker)
+            run.status = "failed"
+            run.error = str(e) or type(e).__name__
+            logger.warning("report %s failed: %s", report.id, run.error)
+        else:
+            run.status = "succeeded"
+            run.path, run.rows, run.bytes = output.path, output.rows, output.bytes
+            run.emailed = output.emailed
+        run.seconds = time.perf_counter() - start
+        run.finished_at = dt.now()
+        self.metrics.observe(report.id, run.status, run.seconds, run.rows)
+        async with self.database.session() as session:
+            session.add(run)
+            await session.commit()
+        return run
+
+    async def run_due(self, now: dt | None = None) -> list[asyncio.Task]:
+        """Start a run of every report due by ``now`` and move each on to
+        its next occurrence. Returns the started runs."""
+        now = now or dt.now()
+        await self.database.prepare()
+        async with self.database.session() as session:
+            statement = (
+                select(ReportModel)
+                .where(
+                    col(ReportModel.is_active),
+                    col(ReportModel.next_run_at) <= now,
+                )
+                .order_by(col(ReportModel.next_run_at))
+            )
+            due = [
+                report
+                for report in (await session.exec(statement)).all()
+                if report.id not in self._running
+            ]
+            runs = []
+            for report in due:
+                assert report.next_run_at is not None
+                scheduled_for, missed, upcoming = catch_up(
+                    report, report.next_run_at, now, self.settings.report_real_time_s
+                )
+                report.next_run_at = upcoming
+                session.add(report)
+                runs.append((report, scheduled_for, missed))
+            # Moved on before running, so a crash mid-run does not repeat it.
+            await session.commit()
+        tasks = []
+        for report, scheduled_for, missed in runs:
+            task = asyncio.create_task(self.run(report, scheduled_for, missed))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            tasks.append(task)
+        return tasks
+
+    async def run_forever(self) -> None:
+        while True:
+            try:
+                await self.run_due()
+            except Exception:
+                logger.exception("scheduling reports failed")
+            await asyncio.sleep(self.settings.report_tick_s)
+
+    async def close(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+def get_reports(request: Request) -> ReportScheduler:
+    reports: ReportScheduler = request.app.state.reports
+    return reports
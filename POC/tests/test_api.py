@@ -1,13 +1,32 @@
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any
+from uuid import uuid4
 from fastapi.testclient import TestClient
+from fastui import components as c
+from sqlalchemy import event
 from json.decoder import JSONDecodeError
-from POC.api.main import app
+from POC.api.main import app, create_app
+from POC.db.database import Database
 from POC.db.models.stock_models.db_models import (
+    CodegenResult,
     DbInfoForm,
     FieldInfoForm,
     DbInfo,
     FieldInfo,
+    GeneratedDbInfo,
     MethodNotAllowedResponse,
 )
+from POC.api.routes.backend import field_apis, generated_apis
+from POC.api.routes.backend.generated_apis import DbRouters
+from POC.api.routes.base import LANDING_MAX_AGE
+from POC.core.config import Settings
+from POC.gen import codegen
+from POC.helpers.db_helpers import generate_db_model_file
+from POC.helpers.form_helpers import FIELD_PAGE_SIZE, model_form
 
 import pytest
 
@@ -116,11 +135,11 @@ def test_create_database_field(
 @pytest.mark.parametrize(
     "url, expected_status, expected_response",
     [
-        ("databases/read", 200, list),
+        ("databases/read", 200, dict),
         ("databases/read/does/not/exist", 400, JSONDecodeError),
         ("databases/read/1", 200, dict),
         ("databases/read/1/does/not/exist", 400, JSONDecodeError),
-        ("fields/read", 200, list),
+        ("fields/read", 200, dict),
         ("fields/read/does/not/exist", 400, JSONDecodeError),
     ],
 )
@@ -137,6 +156,44 @@ def test_list_databases(
             data = response.json()
 
 
+@pytest.mark.parametrize("url", ["databases/read", "fields/read", "fields/read/1"])
+@pytest.mark.parametrize("order", ["id", "updated_at"])
+def test_list_pagination(
+    db_info_form: DbInfoForm, backend_url: str, url: str, order: str
+) -> None:
+    client.post(f"{backend_url}databases/create", json=db_info_form.model_dump())
+    client.post(f"{backend_url}databases/create", json=db_info_form.model_dump())
+    full = client.get(f"{backend_url}{url}", params={"order": order}).json()
+    assert full["next_cursor"] is None
+
+    ids: list[int] = []
+    params: dict[str, str | int] = {"limit": 1, "fields": "id", "order": order}
+    while True:
+        page = client.get(f"{backend_url}{url}", params=params).json()
+        assert len(page["items"]) <= 1
+        ids.extend(item["id"] for item in page["items"])
+        assert all(list(item) == ["id"] for item in page["items"])
+        if page["next_cursor"] is None:
+            break
+        params["cursor"] = page["next_cursor"]
+    assert ids == [item["id"] for item in full["items"]]
+
+
+@pytest.mark.parametrize(
+    "params, expected_status",
+    [
+        ({"cursor": "not-a-cursor"}, 400),
+        ({"fields": "id,nope"}, 422),
+        ({"limit": 0}, 422),
+    ],
+)
+def test_list_pagination_errors(
+    backend_url: str, params: dict[str, str | int], expected_status: int
+) -> None:
+    response = client.get(f"{backend_url}databases/read", params=params)
+    assert response.status_code == expected_status
+
+
 @pytest.mark.parametrize(
     "url, expected_status, expected_response",
     [
@@ -177,6 +234,1325 @@ def test_update_database_field(
     expected_response(**data)
 
 
+@pytest.mark.parametrize(
+    "url, expected_status",
+    [
+        ("databases/generate/1", 200),
+        ("databases/generate/999999", 404),
+    ],
+)
+def test_generate_database(backend_url: str, url: str, expected_status: int) -> None:
+    response = client.post(f"{backend_url}{url}")
+    assert response.status_code == expected_status
+    if expected_status == 200:
+        generated = GeneratedDbInfo(**response.json())
+        assert generated.table_name == "db_1_records"
+
+
+@pytest.mark.parametrize(
+    "content, content_type",
+    [
+        (
+            b'{"TestField": "a"}\n{"TestField": 2}\n{}\nnot json\n',
+            "application/x-ndjson",
+        ),
+        (b'TestField,Other\n"multi\nline",1\nb,2\n,3\nc,4,5\n', "text/csv"),
+    ],
+)
+def test_bulk_ingest_records(
+    db_info_form: DbInfoForm,
+    db_field_form: FieldInfoForm,
+    backend_url: str,
+    content: bytes,
+    content_type: str,
+) -> None:
+    db = client.post(f"{backend_url}databases/create", json=db_info_form.model_dump())
+    database_id = db.json()["id"]
+    client.post(
+        f"{backend_url}fields/create/{database_id}", json=db_field_form.model_dump()
+    )
+    response = client.post(
+        f"{backend_url}databases/{database_id}/records/bulk?chunk_size=2",
+        content=content,
+        headers={"content-type": content_type},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["rows_received"] == 4
+    assert data["rows_inserted"] == 2
+    assert data["rows_failed"] == 2
+    assert [e["row"] for e in data["chunks"][0]["errors"]] == [3, 4]
+    assert data["columns"] == [
+        {
+            "column": "TestField",
+            "expected": "str",
+            "count": 1,
+            "rows": [3],
+            "samples": [],
+        }
+    ]
+
+
+@pytest.mark.parametrize(
+    "url, export_format, content_type",
+    [
+        ("databases/export", "csv", "text/csv"),
+        ("fields/export", "ndjson", "application/x-ndjson"),
+        ("databases/1/records/export", "csv", "text/csv"),
+        ("databases/1/records/export", "xlsx", "application/vnd.openxmlformats"),
+    ],
+)
+def test_export(
+    backend_url: str, url: str, export_format: str, content_type: str
+) -> None:
+    response = client.get(f"{backend_url}{url}", params={"format": export_format})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith(content_type)
+    if export_format == "csv":
+        assert response.text.splitlines()[0].startswith(("name,", "id,"))
+
+
+def test_tag_search(frontend_url: str) -> None:
+    for tag_name in ("PyTest Alpha", "PyTest Beta", "Other PyTest"):
+        client.post(f"{frontend_url}tags/create", data={"tag_name": tag_name})
+    response = client.get(f"{frontend_url}tags/search", params={"q": "pytest b"})
+    assert response.status_code == 200
+    assert [o["value"] for o in response.json()["options"]] == ["PyTest Beta"]
+
+    response = client.get(
+        f"{frontend_url}tags/search", params={"q": "pytest", "limit": 2}
+    )
+    assert [o["value"] for o in response.json()["options"]] == [
+        "PyTest Alpha",
+        "PyTest Beta",
+    ]
+
+
+def test_databases_by_tag(
+    db_info_form: DbInfoForm, backend_url: str, frontend_url: str
+) -> None:
+    for tag_name in ("Linked Red", "Linked Blue"):
+        client.post(f"{frontend_url}tags/create", data={"tag_name": tag_name})
+    both, red = (
+        client.post(
+            f"{backend_url}databases/create", json=db_info_form.model_dump()
+        ).json()["id"]
+        for _ in range(2)
+    )
+    response = client.put(
+        f"{backend_url}tags/databases/{both}",
+        json={"tag_names": ["Linked Red", "Linked Blue"]},
+    )
+    assert response.json() == ["Linked Blue", "Linked Red"]
+    client.put(f"{backend_url}tags/databases/{red}", json={"tag_names": ["Linked Red"]})
+    assert client.get(f"{backend_url}tags/databases/{red}").json() == ["Linked Red"]
+
+    def tagged(match: str) -> set[int]:
+        params = {"tag": ["Linked Red", "Linked Blue"], "match": match, "fields": "id"}
+        page = client.get(f"{backend_url}tags/databases", params=params).json()
+        return {item["id"] for item in page["items"]} & {both, red}
+
+    assert tagged("any") == {both, red}
+    assert tagged("all") == {both}
+
+    response = client.put(
+        f"{backend_url}tags/databases/{red}", json={"tag_names": ["Linked Missing"]}
+    )
+    assert response.status_code == 422
+    response = client.post(
+        f"{frontend_url}tags/select", data={"tag_name": ["Linked Red", "Linked Blue"]}
+    )
+    assert response.status_code == 200
+
+
+def test_metadata_etag(
+    db_info_form: DbInfoForm, db_field_form: FieldInfoForm, backend_url: str
+) -> None:
+    db_id = client.post(
+        f"{backend_url}databases/create", json=db_info_form.model_dump()
+    ).json()["id"]
+    for url in (f"databases/read/{db_id}", f"fields/read/{db_id}"):
+        response = client.get(f"{backend_url}{url}")
+        etag = response.headers["etag"]
+        response = client.get(f"{backend_url}{url}", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+
+    hits = client.get(f"{backend_url}databases/metadata/stats").json()["hits"]
+    client.post(f"{backend_url}fields/create/{db_id}", json=db_field_form.model_dump())
+    response = client.get(
+        f"{backend_url}fields/read/{db_id}", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert [item["name"] for item in response.json()["items"]] == ["TestField"]
+
+    client.get(f"{backend_url}fields/read/{db_id}")
+    stats = client.get(f"{backend_url}databases/metadata/stats").json()
+    assert stats["hits"] == hits + 1
+    assert 0 < stats["hit_ratio"] <= 1
+
+
+def test_hot_queries_use_indexes(
+    db_info_form: DbInfoForm, db_field_form: FieldInfoForm, backend_url: str
+) -> None:
+    db_id = client.post(
+        f"{backend_url}databases/create", json=db_info_form.model_dump()
+    ).json()["id"]
+    for name, option in (("Email", "unique"), ("Age", "indexed")):
+        update = {"name": name, "required": False, option: True}
+        field = db_field_form.model_copy(update=update)
+        client.post(f"{backend_url}fields/create/{db_id}", json=field.model_dump())
+
+    response = client.get(
+        f"{backend_url}admin/query-plans", params={"database_id": db_id}
+    )
+    assert response.status_code == 200
+    plans = {plan["name"]: plan for plan in response.json()}
+    assert {"records_by_Email", "records_by_Age", "active_fields"} <= set(plans)
+    assert [name for name, plan in plans.items() if plan["full_scan"]] == []
+
+    response = client.post(
+        f"{backend_url}databases/{db_id}/records/bulk",
+        content=b'{"TestField": "a", "Email": "x@example.com"}\n'
+        b'{"TestField": "b", "Email": "x@example.com"}\n',
+        headers={"content-type": "application/x-ndjson"},
+    )
+    assert response.json()["rows_failed"] == 2
+    assert "UNIQUE" in response.json()["chunks"][0]["detail"]
+
+
+def test_field_lookup_checks_database(backend_url: str) -> None:
+    field = client.get(f"{backend_url}fields/read/1", params={"limit": 1})
+    field_id = field.json()["items"][0]["id"]
+    assert client.get(f"{backend_url}fields/read/1/{field_id}").status_code == 200
+    response = client.get(f"{backend_url}fields/read/999999/{field_id}")
+    assert response.status_code == 404
+
+
+def test_create_field_checks_data_type(
+    db_info_form: DbInfoForm, backend_url: str, frontend_url: str
+) -> None:
+    form = db_info_form.model_copy(update={"short_name": f"Type{uuid4().hex[:8]}"})
+    db_id = client.post(
+        f"{backend_url}databases/create", json=form.model_dump()
+    ).json()["id"]
+    field = {"name": "Price", "data_type": "money", "required": False, "default": ""}
+    response = client.post(f"{backend_url}fields/create/{db_id}", json=field)
+    assert response.status_code == 422
+    assert response.json()["detail"] == "Unsupported data type: money"
+    response = client.post(
+        f"{frontend_url}fields/create/{db_id}",
+        data={
+            "name": "Price",
+            "data_type": "money",
+            "required": "false",
+            "default": "0",
+        },
+    )
+    assert response.json() == [{"type": "Text", "text": "Unsupported data type: money"}]
+    assert client.get(f"{backend_url}fields/read/{db_id}").json()["items"] == []
+    assert client.post(f"{backend_url}databases/generate/{db_id}").status_code == 200
+
+
+def test_schema_migration(db_info_form: DbInfoForm, backend_url: str) -> None:
+    db_id = client.post(
+        f"{backend_url}databases/create", json=db_info_form.model_dump()
+    ).json()["id"]
+    field_ids = [
+        client.post(
+            f"{backend_url}fields/create/{db_id}",
+            json={"name": name, "data_type": "str", "required": False, "default": ""},
+        ).json()["id"]
+        for name in ("Count", "Name")
+    ]
+    client.post(
+        f"{backend_url}databases/{db_id}/records/bulk",
+        content=b'{"Count": "1", "Name": "a"}\n{"Count": "22", "Name": "b"}\n'
+        b'{"Count": "many", "Name": "c"}\n',
+        headers={"content-type": "application/x-ndjson"},
+    )
+
+    # Renaming Name and retyping Count take one copy-and-swap together,
+    # started by the update that retypes.
+    client.put(
+        f"{backend_url}fields/update/{db_id}/{field_ids[1]}",
+        json={"name": "Title", "data_type": "str", "required": False, "default": ""},
+    )
+    response = client.put(
+        f"{backend_url}fields/update/{db_id}/{field_ids[0]}",
+        json={"name": "Count", "data_type": "int", "required": False, "default": ""},
+    )
+    assert response.status_code == 200
+    response = client.put(
+        f"{backend_url}fields/update/{db_id}/{field_ids[0]}",
+        json={"name": "Count", "data_type": "money", "required": False, "default": ""},
+    )
+    assert response.status_code == 422
+    generated = client.post(f"{backend_url}databases/generate/{db_id}").json()
+    assert generated["migrating_to"] is None
+
+    migrations = client.get(f"{backend_url}databases/migrations/{db_id}").json()
+    assert migrations[-1]["status"] == "applied"
+    assert migrations[-1]["copied_rows"] == 2
+    assert migrations[-1]["total_rows"] == 3
+    progress = client.get(f"{backend_url}databases/migrations/{db_id}/progress").json()
+    assert progress["progress"] == 1.0
+    assert progress["quarantined_rows"] == 1
+    assert progress["eta_s"] is None
+    assert progress["conversions"] == [
+        {"column": "Count", "from_type": "str", "to_type": "int"}
+    ]
+    quarantine = client.get(
+        f"{backend_url}databases/migrations/{db_id}/quarantine",
+        params={"fields": "row_id,record,errors"},
+    ).json()
+    assert quarantine["items"] == [
+        {
+            "row_id": 3,
+            "record": {"id": 3, "Count": "many", "Title": "c"},
+            "errors": [
+                {
+                    "column": "Count",
+                    "expected": "int",
+                    "message": "Input should be a valid integer, unable to parse string as an integer",
+                    "value": "'many'",
+                }
+            ],
+        }
+    ]
+    response = client.get(f"{backend_url}databases/migrations/999999/progress")
+    assert response.status_code == 404
+    response = client.get(
+        f"{backend_url}databases/{db_id}/records/export", params={"format": "ndjson"}
+    )
+    assert [json.loads(line) for line in response.text.splitlines()] == [
+        {"id": 1, "Count": 1, "Title": "a"},
+        {"id": 2, "Count": 22, "Title": "b"},
+    ]
+
+
+def test_generated_models_serve_records(
+    db_info_form: DbInfoForm,
+    backend_url: str,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    db_id = client.post(
+        f"{backend_url}databases/create", json=db_info_form.model_dump()
+    ).json()["id"]
+    client.post(
+        f"{backend_url}fields/create/{db_id}",
+        json={"name": "Title", "data_type": "str", "required": True, "default": ""},
+    )
+    version = client.post(f"{backend_url}databases/generate/{db_id}").json()["version"]
+
+    async def generate() -> CodegenResult:
+        # What python -m POC.gen.codegen runs at build time.
+        database = Database(app.state.settings)
+        async with database.session() as session:
+            result = await generate_db_model_file(session)
+        await database.dispose()
+        return result
+
+    # Generate into a scratch directory rather than the source tree.
+    monkeypatch.setattr(codegen, "GENERATED_DIR", tmp_path)
+    monkeypatch.setitem(sys.modules, codegen.DB_MODELS_MODULE, None)
+    assert db_id in asyncio.run(generate()).rendered
+    assert asyncio.run(generate()).rendered == []
+
+    app.state.database.compiled.clear()
+    response = client.post(
+        f"{backend_url}databases/{db_id}/records/bulk",
+        content=b'{"Title": "a"}\n{}\n',
+        headers={"content-type": "application/x-ndjson"},
+    )
+    assert response.json()["rows_inserted"] == 1
+    compiled = app.state.database.compiled.get(db_id, version)
+    assert compiled is not None
+    assert compiled.validator.__module__ == codegen.DB_MODELS_MODULE
+
+
+def test_mounted_record_routes(db_info_form: DbInfoForm, backend_url: str) -> None:
+    # Unique per run, as mounts last for the process and the database file.
+    short_name = f"Mounted{uuid4().hex[:8]}"
+    form = db_info_form.model_copy(update={"short_name": short_name})
+    db_id = client.post(
+        f"{backend_url}databases/create", json=form.model_dump()
+    ).json()["id"]
+    for name, data_type in (("Title", "str"), ("Count", "int")):
+        client.post(
+            f"{backend_url}fields/create/{db_id}",
+            json={
+                "name": name,
+                "data_type": data_type,
+                "required": False,
+                "default": "",
+            },
+        )
+    path = client.post(f"{backend_url}databases/generate/{db_id}").json()["api_path"]
+    assert path == f"/api/db/{short_name}"
+
+    created = client.post(f"{path}/records", json={"Title": "a", "Count": "2"})
+    assert created.status_code == 201
+    record = created.json()
+    assert record == {"id": record["id"], "Title": "a", "Count": 2}
+    client.post(f"{path}/records", json={"Title": "b"})
+    assert client.post(f"{path}/records", json={"Count": "x"}).status_code == 422
+
+    page = client.get(f"{path}/records", params={"limit": 1}).json()
+    assert page["items"] == [record]
+    rest = client.get(f"{path}/records", params={"cursor": page["next_cursor"]})
+    assert [item["Title"] for item in rest.json()["items"]] == ["b"]
+
+    url = f"{path}/records/{record['id']}"
+    assert client.put(url, json={"Title": "c"}).json()["Count"] is None
+    assert client.get(url).json()["Title"] == "c"
+    assert client.delete(url).json()["Title"] == "c"
+    assert client.get(url).status_code == 404
+    assert client.get(f"{path}/nothing").status_code == 404
+
+    # Start-up mounts every generated database again.
+    db_routers = app.state.db_routers
+    db_routers.clear()
+    with TestClient(app) as started:
+        assert started.get(f"{path}/records").status_code == 200
+    db_routers.mount(db_id, short_name)
+
+    # Another database cannot take the name while this one holds it.
+    other = client.post(f"{backend_url}databases/create", json=form.model_dump())
+    other_id = other.json()["id"]
+    generated = client.post(f"{backend_url}databases/generate/{other_id}").json()
+    assert generated["api_path"] is None
+
+    client.delete(f"{backend_url}databases/delete/{db_id}")
+    assert db_routers.path(db_id) is None
+    # The name passes to the other database, as it would at start-up.
+    assert client.get(f"{path}/records").json() == {"items": [], "next_cursor": None}
+    assert db_routers.path(other_id) == path
+    client.delete(f"{backend_url}databases/delete/{other_id}")
+    assert client.get(f"{path}/records").json() == {"detail": "Database not found"}
+
+
+def test_db_routers_mount() -> None:
+    routers = DbRouters()
+    assert routers.mount(1, "one") == "/api/db/one"
+    assert routers.mount(1, "one") == "/api/db/one"
+    assert routers.mount(2, "one") is None
+    assert routers.mount(2, "two words") is None
+    assert routers.mount(1, "uno") == "/api/db/uno"
+    assert routers.mount(2, "one") == "/api/db/one"
+    routers.unmount(1)
+    assert (len(routers), routers.path(1), routers.path(2)) == (1, None, "/api/db/one")
+
+
+def test_create_app(
+    db_info_form: DbInfoForm, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path = tmp_path / "app.sqlite3"
+    monkeypatch.setenv("DYNAMIC_DB_DATABASE_URL", f"sqlite:///{path}")
+    monkeypatch.setenv("DYNAMIC_DB_FRONTEND", "false")
+    settings = Settings.from_env()
+    assert not settings.frontend
+    api_only = create_app(settings)
+    # Nothing is opened until the app starts.
+    assert not path.exists()
+    with TestClient(api_only) as started:
+        assert path.exists()
+        created = started.post("/api/databases/create", json=db_info_form.model_dump())
+        assert created.json()["id"] == 1
+        assert started.get("/forms/welcome").status_code == 404
+        for _ in range(2):
+            backup = started.post("/api/admin/backup").json()
+        assert Path(backup["path"]).parent == tmp_path / "backups"
+        assert backup["pages"] > 0
+        # Both kept: fewer than backup_keep snapshots.
+        assert len(list((tmp_path / "backups").iterdir())) == 2
+    assert client.get("/forms/welcome").status_code == 200
+
+
+def test_apps_keep_their_own_state(db_info_form: DbInfoForm, tmp_path: Path) -> None:
+    def settings(name: str) -> Settings:
+        return Settings(
+            database_url=f"sqlite:///{tmp_path / name}.sqlite3",
+            frontend=False,
+            workflow_poll_s=0,
+            report_tick_s=0,
+        )
+
+    first, second = create_app(settings("first")), create_app(settings("second"))
+    with TestClient(first) as one, TestClient(second) as two:
+        for started, name in ((one, "First"), (two, "Second")):
+            form = db_info_form.model_copy(update={"name": name, "short_name": name})
+            db_id = started.post(
+                "/api/databases/create", json=form.model_dump()
+            ).json()["id"]
+            started.post(
+                f"/api/fields/create/{db_id}",
+                json={
+                    "name": "Title",
+                    "data_type": "str",
+                    "required": False,
+                    "default": "",
+                },
+            )
+            started.post(f"/api/databases/generate/{db_id}")
+            started.post(f"/api/db/{name}/records", json={"Title": name})
+        # Both are database 1, each cached by its own app.
+        assert one.get("/api/databases/read/1").json()["name"] == "First"
+        assert two.get("/api/databases/read/1").json()["name"] == "Second"
+        assert one.get("/api/db/Second/records").status_code == 404
+        assert second.state.database.compiled.stats()["size"] == 1
+    # Stopping one app leaves the other's record routes mounted.
+    with TestClient(second) as two:
+        with TestClient(first):
+            pass
+        page = two.get("/api/db/Second/records").json()
+        assert [item["Title"] for item in page["items"]] == ["Second"]
+
+
+def test_generated_by_another_worker_is_mounted(
+    db_info_form: DbInfoForm, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # Two apps on one database file, as two worker processes would be.
+    settings = Settings(
+        database_url=f"sqlite:///{tmp_path / 'app.sqlite3'}",
+        frontend=False,
+        workflow_poll_s=0,
+        report_tick_s=0,
+    )
+    first, second = create_app(settings), create_app(settings)
+    with TestClient(first) as one, TestClient(second) as two:
+        assert two.get("/api/db/Shared/records").status_code == 404
+        form = db_info_form.model_copy(update={"short_name": "Shared"})
+        db_id = one.post("/api/databases/create", json=form.model_dump()).json()["id"]
+        one.post(
+            f"/api/fields/create/{db_id}",
+            json={
+                "name": "Title",
+                "data_type": "str",
+                "required": False,
+                "default": "",
+            },
+        )
+        one.post(f"/api/databases/generate/{db_id}")
+        one.post("/api/db/Shared/records", json={"Title": "From one"})
+        # Not there a moment ago, so not looked up again yet.
+        assert two.get("/api/db/Shared/records").status_code == 404
+        monkeypatch.setattr(generated_apis, "NOT_FOUND_TTL", 0.0)
+        page = two.get("/api/db/Shared/records").json()
+        assert [item["Title"] for item in page["items"]] == ["From one"]
+        assert second.state.db_routers.path(db_id) == "/api/db/Shared"
+
+
+def test_startup_resumes_migrations(
+    db_info_form: DbInfoForm, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    app = create_app(
+        Settings(
+            database_url=f"sqlite:///{tmp_path / 'app.sqlite3'}",
+            frontend=False,
+            workflow_poll_s=0,
+            report_tick_s=0,
+        )
+    )
+
+    async def stopped(*args: Any) -> None:
+        # Stands in for a runner cut off by a shutdown.
+        pass
+
+    with TestClient(app) as started, monkeypatch.context() as patch:
+        patch.setattr(field_apis, "run_migration", stopped)
+        db_id = started.post(
+            "/api/databases/create", json=db_info_form.model_dump()
+        ).json()["id"]
+        field_id = started.post(
+            f"/api/fields/create/{db_id}",
+            json={
+                "name": "Count",
+                "data_type": "str",
+                "required": False,
+                "default": "",
+            },
+        ).json()["id"]
+        started.post(
+            f"/api/databases/{db_id}/records/bulk",
+            content=b'{"Count": "1"}\n{"Count": "2"}\n',
+            headers={"content-type": "application/x-ndjson"},
+        )
+        started.put(
+            f"/api/fields/update/{db_id}/{field_id}",
+            json={
+                "name": "Count",
+                "data_type": "int",
+                "required": False,
+                "default": "",
+            },
+        )
+        migration = started.get(f"/api/databases/migrations/{db_id}").json()[-1]
+        assert migration["status"] == "pending"
+
+    with TestClient(app) as started:
+        for _ in range(100):
+            migration = started.get(f"/api/databases/migrations/{db_id}").json()[-1]
+            if migration["status"] == "applied":
+                break
+            time.sleep(0.05)
+        assert (migration["status"], migration["copied_rows"]) == ("applied", 2)
+
+
+def test_metrics(backend_url: str) -> None:
+    client.get(f"{backend_url}databases/read/1")
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain")
+    route = 'route="/api/databases/read/{database_id}"'
+    assert f"dynamic_db_sql_queries_per_request_count{{{route}}}" in response.text
+    assert "# TYPE dynamic_db_sql_statement_seconds histogram" in response.text
+
+
+def test_computed_fields(db_info_form: DbInfoForm, backend_url: str) -> None:
+    short_name = f"Computed{uuid4().hex[:8]}"
+    form = db_info_form.model_copy(update={"short_name": short_name})
+    db_id = client.post(
+        f"{backend_url}databases/create", json=form.model_dump()
+    ).json()["id"]
+    field = {"required": False, "default": ""}
+    field_ids = [
+        client.post(
+            f"{backend_url}fields/create/{db_id}",
+            json={**field, "name": name, "data_type": data_type, "expression": expr},
+        ).json()["id"]
+        for name, data_type, expr in (
+            ("Field 1", "int", None),
+            ("Field 2", "int", None),
+            ("Field 3", "float", None),
+            ("Comp 1", "int", "Field 1 Plus Field 2"),
+            ("Comp 2", "float", "Comp 1 Times Field 3"),
+            ("Root", "float", "sqrt(Comp 2)"),
+        )
+    ]
+    for expression in ("Field 1 plus", "Nothing + 1"):
+        response = client.post(
+            f"{backend_url}fields/create/{db_id}",
+            json={**field, "name": "Bad", "data_type": "int", "expression": expression},
+        )
+        assert response.status_code == 422
+    # The form refuses them too, instead of saving a field nothing compiles.
+    form_field = {"data_type": "int", "required": "false", "default": "0"}
+    for name, expression in (("Loop", "Loop plus 1"), ("Bad", "Field 1 plus")):
+        response = client.post(
+            f"/forms/fields/create/{db_id}",
+            data={**form_field, "name": name, "expression": expression},
+        )
+        [message] = response.json()
+        assert message["type"] == "Text"
+        assert message["text"] != ""
+    response = client.put(
+        f"{backend_url}fields/update/{db_id}/{field_ids[3]}",
+        json={**field, "name": "Comp 1", "data_type": "int", "expression": "Root + 1"},
+    )
+    assert response.status_code == 422
+
+    path = client.post(f"{backend_url}databases/generate/{db_id}").json()["api_path"]
+    record = client.post(
+        f"{path}/records", json={"Field 1": 1, "Field 2": 3, "Field 3": 4, "Root": 0}
+    ).json()
+    assert record == {
+        "id": record["id"],
+        "Field 1": 1,
+        "Field 2": 3,
+        "Field 3": 4.0,
+        "Comp 1": 4,
+        "Comp 2": 16.0,
+        "Root": 4.0,
+    }
+    client.post(
+        f"{backend_url}databases/{db_id}/records/bulk",
+        content=b'{"Field 1": 2, "Field 2": 7, "Field 3": 1}\n{"Field 1": 1}\n',
+        headers={"content-type": "application/x-ndjson"},
+    )
+
+    # A rename carries over to the expressions; a used field cannot go.
+    client.put(
+        f"{backend_url}fields/update/{db_id}/{field_ids[0]}",
+        json={**field, "name": "Amount", "data_type": "int"},
+    )
+    comp = client.get(f"{backend_url}fields/read/{db_id}/{field_ids[3]}").json()
+    assert comp["expression"] == "Amount Plus Field 2"
+    response = client.delete(f"{backend_url}fields/delete/{db_id}/{field_ids[1]}")
+    assert response.status_code == 409
+
+    # A new expression for a stored field recomputes it in place.
+    client.put(
+        f"{backend_url}fields/update/{db_id}/{field_ids[5]}",
+        json={
+            **field,
+            "name": "Root",
+            "data_type": "float",
+            "expression": "floor(Comp 2 / 4)",
+        },
+    )
+    generated = client.post(f"{backend_url}databases/generate/{db_id}").json()
+    assert generated["migrating_to"] is None
+    rows = client.get(f"{path}/records").json()["items"]
+    assert [(row["Amount"], row["Comp 1"], row["Root"]) for row in rows] == [
+        (1, 4, 4.0),
+        (2, 9, 2.0),
+        (1, None, None),
+    ]
+
+    # A generated column cannot be altered, so this one takes a copy, after
+    # which the stored field computed from it is brought up to date.
+    client.put(
+        f"{backend_url}fields/update/{db_id}/{field_ids[3]}",
+        json={
+            **field,
+            "name": "Comp 1",
+            "data_type": "int",
+            "expression": "Amount times Field 2",
+        },
+    )
+    generated = client.post(f"{backend_url}databases/generate/{db_id}").json()
+    assert generated["migrating_to"] is not None
+    rows = client.get(f"{path}/records").json()["items"]
+    assert [(row["Comp 1"], row["Comp 2"], row["Root"]) for row in rows] == [
+        (3, 12.0, 3.0),
+        (14, 14.0, 3.0),
+        (None, None, None),
+    ]
+
+
+def test_reports(db_info_form: DbInfoForm, tmp_path: Path, backend_url: str) -> None:
+    settings = Settings(
+        database_url=f"sqlite:///{tmp_path / 'app.sqlite3'}",
+        frontend=False,
+        report_tick_s=0,
+        report_workers=1,
+    )
+    with TestClient(create_app(settings)) as started:
+        db_id = started.post(
+            f"{backend_url}databases/create", json=db_info_form.model_dump()
+        ).json()["id"]
+        for name, data_type in (("Region", "str"), ("Amount", "float")):
+            started.post(
+                f"{backend_url}fields/create/{db_id}",
+                json={
+                    "name": name,
+                    "data_type": data_type,
+                    "required": False,
+                    "default": "",
+                },
+            )
+        started.post(f"{backend_url}databases/generate/{db_id}")
+        started.post(
+            f"{backend_url}databases/{db_id}/records/bulk",
+            content=b'{"Region": "North", "Amount": 2}\n'
+            b'{"Region": "South", "Amount": 5}\n'
+            b'{"Region": "North", "Amount": 3}\n',
+            headers={"content-type": "application/x-ndjson"},
+        )
+        report = {
+            "name": "By region",
+            "db_id": db_id,
+            "group_by": ["Region"],
+            "aggregates": ["count", "sum:Amount"],
+        }
+        for bad in ({"aggregates": ["median:Amount"]}, {"group_by": ["Nope"]}):
+            response = started.post(
+                f"{backend_url}reports/create", json={**report, **bad}
+            )
+            assert response.status_code == 422
+        response = started.post(
+            f"{backend_url}reports/create", json={**report, "schedule": "daily"}
+        )
+        assert response.json()["next_run_at"] is not None
+        created = started.post(f"{backend_url}reports/create", json=report).json()
+        assert created["next_run_at"] is None
+
+        run = started.post(f"{backend_url}reports/run/{created['id']}").json()
+        assert (run["status"], run["rows"]) == ("succeeded", 2)
+        assert Path(run["path"]).parent == tmp_path / "reports"
+        assert Path(run["path"]).read_text().splitlines() == [
+            "Region,count,sum:Amount",
+            "North,2,5.0",
+            "South,1,5.0",
+        ]
+        runs = started.get(f"{backend_url}reports/runs/{created['id']}").json()
+        assert [r["id"] for r in runs] == [run["id"]]
+        metrics = started.get("/metrics").text
+        label = f'report="{created["id"]}",status="succeeded"'
+        assert f"dynamic_db_report_runs_total{{{label}}} 1" in metrics
+
+        deleted = started.delete(f"{backend_url}reports/delete/{created['id']}")
+        assert not deleted.json()["is_active"]
+        assert started.get(f"{backend_url}reports/run/404").status_code == 405
+        assert started.post(f"{backend_url}reports/run/404").status_code == 404
+
+
+def test_workflows(db_info_form: DbInfoForm, tmp_path: Path, backend_url: str) -> None:
+    settings = Settings(
+        database_url=f"sqlite:///{tmp_path / 'app.sqlite3'}",
+        frontend=False,
+        workflow_poll_s=0,
+    )
+    api = create_app(settings)
+    with TestClient(api) as started:
+        db_id = started.post(
+            f"{backend_url}databases/create", json=db_info_form.model_dump()
+        ).json()["id"]
+        for name, data_type in (
+            ("Title", "str"),
+            ("Status", "str"),
+            ("Closed At", "datetime"),
+        ):
+            started.post(
+                f"{backend_url}fields/create/{db_id}",
+                json={
+                    "name": name,
+                    "data_type": data_type,
+                    "required": False,
+                    "default": "",
+                },
+            )
+        path = started.post(f"{backend_url}databases/generate/{db_id}").json()[
+            "api_path"
+        ]
+        url = f"{backend_url}workflows"
+        for workflow in (
+            {
+                "name": "Open",
+                "is_default": True,
+                "next_workflows": ["Review"],
+                "auto_change": {"Status": "open"},
+            },
+            {"name": "Review", "required_fields": ["Title"]},
+            {
+                "name": "Closed",
+                "auto_change": {"Status": "closed"},
+                "timestamp_field": "Closed At",
+                "notify": ["toast"],
+            },
+        ):
+            response = started.post(f"{url}/create", json={**workflow, "db_id": db_id})
+            assert response.status_code == 200
+        for bad, status_code in (
+            ({"name": "Open"}, 409),
+            ({"name": "New", "required_fields": ["Nope"]}, 422),
+            ({"name": "New", "notify": ["sms"]}, 422),
+        ):
+            response = started.post(f"{url}/create", json={**bad, "db_id": db_id})
+            assert response.status_code == status_code
+        started.post(
+            f"{url}/triggers/create",
+            json={
+                "name": "To review",
+                "db_id": db_id,
+                "event": "updated",
+                "field": "Status",
+                "value": "review",
+                "workflow": "Review",
+            },
+        )
+
+        def drain() -> None:
+            while started.portal.call(api.state.workflows.drain):  # type: ignore[union-attr]
+                pass
+
+        # The record is created at once; workflows apply when the queue
+        # is drained.
+        record = started.post(f"{path}/records", json={"Title": "Bug"}).json()
+        assert record["Status"] is None
+        drain()
+        state = started.get(f"{url}/state/{db_id}/{record['id']}").json()
+        assert state["name"] == "Open"
+        record = started.get(f"{path}/records/{record['id']}").json()
+        assert record["Status"] == "open"
+
+        response = started.post(
+            f"{url}/transition/{db_id}/{record['id']}", json={"workflow": "Closed"}
+        )
+        assert response.status_code == 202
+        drain()
+        event = started.get(f"{url}/events/{response.json()['id']}").json()
+        assert event["status"] == "failed"
+        assert event["error"] == (
+            f"Record {record['id']}: Open cannot move on to Closed"
+        )
+
+        started.put(
+            f"{path}/records/{record['id']}", json={**record, "Status": "review"}
+        )
+        drain()
+        state = started.get(f"{url}/state/{db_id}/{record['id']}").json()
+        assert state["name"] == "Review"
+        started.post(
+            f"{url}/transition/{db_id}/{record['id']}", json={"workflow": "Closed"}
+        )
+        drain()
+        record = started.get(f"{path}/records/{record['id']}").json()
+        assert record["Status"] == "closed" and record["Closed At"] is not None
+        [toast] = started.get(f"{url}/notifications?unread=true").json()
+        assert toast["message"] == f"Record {record['id']} entered Closed"
+        response = started.post(
+            f"{url}/transition/{db_id}/{record['id']}", json={"workflow": "Nope"}
+        )
+        assert response.status_code == 404
+
+
+def test_query_records(db_info_form: DbInfoForm, backend_url: str) -> None:
+    short_name = f"Queried{uuid4().hex[:8]}"
+    form = db_info_form.model_copy(update={"short_name": short_name})
+    db_id = client.post(
+        f"{backend_url}databases/create", json=form.model_dump()
+    ).json()["id"]
+    for name, data_type in (("Title", "str"), ("Count", "int")):
+        client.post(
+            f"{backend_url}fields/create/{db_id}",
+            json={
+                "name": name,
+                "data_type": data_type,
+                "required": False,
+                "default": "",
+            },
+        )
+    path = client.post(f"{backend_url}databases/generate/{db_id}").json()["api_path"]
+    for i in range(6):
+        client.post(f"{path}/records", json={"Title": f"t{i % 3}", "Count": i})
+
+    stats = client.get(f"{backend_url}databases/queries/stats").json()
+    query: dict[str, Any] = {
+        "where": {"Count": {"gte": 1}, "Title": {"in": ["t1", "t2"]}},
+        "sort": ["-Count"],
+        "fields": ["Title", "Count"],
+        "limit": 2,
+    }
+    page = client.post(f"{path}/records/query", json=query).json()
+    assert page["items"] == [{"Title": "t2", "Count": 5}, {"Title": "t1", "Count": 4}]
+    query["where"]["Count"] = {"gte": 5}
+    page = client.post(f"{path}/records/query", json=query).json()
+    assert page["items"] == [{"Title": "t2", "Count": 5}]
+    after = client.get(f"{backend_url}databases/queries/stats").json()
+    assert (after["misses"], after["hits"]) == (
+        stats["misses"] + 1,
+        stats["hits"] + 1,
+    )
+
+    for bad in (
+        {"where": {"Nope": {"eq": 1}}},
+        {"where": {"Count": {"eq": "x"}}},
+        {"where": {"Count": {"like": 1}}},
+        {"limit": 0},
+    ):
+        assert client.post(f"{path}/records/query", json=bad).status_code == 422
+
+
+def test_relationships(
+    db_info_form: DbInfoForm, tmp_path: Path, backend_url: str
+) -> None:
+    settings = Settings(
+        database_url=f"sqlite:///{tmp_path / 'app.sqlite3'}",
+        frontend=False,
+        workflow_poll_s=0,
+        report_tick_s=0,
+    )
+    api = create_app(settings)
+    statements: list[str] = []
+
+    def record_statement(conn: Any, cursor: Any, statement: str, *args: Any) -> None:
+        statements.append(statement)
+
+    with TestClient(api) as started:
+
+        def add_field(db_id: int, **field: Any) -> Any:
+            return started.post(
+                f"{backend_url}fields/create/{db_id}",
+                json={"required": False, "default": "", **field},
+            )
+
+        def create_db(short_name: str, *fields: dict) -> tuple[int, str]:
+            form = db_info_form.model_copy(update={"short_name": short_name})
+            db_id = started.post(
+                f"{backend_url}databases/create", json=form.model_dump()
+            ).json()["id"]
+            add_field(db_id, name="Name", data_type="str")
+            for field in fields:
+                add_field(db_id, **field)
+            generated = started.post(f"{backend_url}databases/generate/{db_id}")
+            return db_id, generated.json()["api_path"]
+
+        def parent(name: str, db_id: int) -> dict:
+            return dict(
+                name=name,
+                data_type="int",
+                relationship="parent",
+                related_db_id=db_id,
+            )
+
+        customers_id, customers = create_db("Customers")
+        orders_id, orders = create_db("Orders", parent("Customer", customers_id))
+        items_id, items = create_db("Items", parent("Order", orders_id))
+        # A child field names the parent field that refers back to it.
+        for db_id, name, related_db_id, key, status in (
+            (customers_id, "Orders", orders_id, "Customer", 200),
+            (orders_id, "Items", items_id, "Order", 200),
+            (customers_id, "Names", orders_id, "Name", 422),
+        ):
+            response = add_field(
+                db_id,
+                name=name,
+                data_type="list",
+                relationship="child",
+                related_db_id=related_db_id,
+                related_key=key,
+            )
+            assert response.status_code == status
+        not_unique = {**parent("Named", customers_id), "related_key": "Name"}
+        not_unique["data_type"] = "str"
+        assert add_field(orders_id, **not_unique).status_code == 422
+        assert add_field(orders_id, **parent("Gone", 99999)).status_code == 422
+
+        customer_ids = [
+            started.post(f"{customers}/records", json={"Name": f"C{i}"}).json()["id"]
+            for i in range(3)
+        ]
+        order_ids = []
+        for i in range(9):
+            order = {"Name": f"O{i}", "Customer": customer_ids[i % 3]}
+            order_ids.append(started.post(f"{orders}/records", json=order).json()["id"])
+            for j in range(2):
+                item = {"Name": f"I{i}.{j}", "Order": order_ids[-1]}
+                started.post(f"{items}/records", json=item)
+        response = started.post(f"{orders}/records", json={"Customer": 99999})
+        assert response.status_code == 409
+
+        order = started.get(
+            f"{orders}/records/{order_ids[0]}", params={"expand": "Customer,Items"}
+        ).json()
+        assert order["Customer"] == {"id": customer_ids[0], "Name": "C0"}
+        assert [item["Name"] for item in order["Items"]] == ["I0.0", "I0.1"]
+
+        expand = {"expand": "Orders.Items.Order"}
+        started.get(f"{customers}/records", params=expand)
+        engine = api.state.database.engine.sync_engine
+        event.listen(engine, "before_cursor_execute", record_statement)
+        counts = []
+        try:
+            for limit in (1, 3):
+                statements.clear()
+                page = started.get(
+                    f"{customers}/records", params={"limit": limit, **expand}
+                )
+                counts.append(len(statements))
+        finally:
+            event.remove(engine, "before_cursor_execute", record_statement)
+        # One IN query per relationship followed, however many records.
+        assert counts[0] == counts[1]
+        assert sum(" IN (" in statement for statement in statements) == 3
+        first = page.json()["items"][0]
+        assert [o["Name"] for o in first["Orders"]] == ["O0", "O3", "O6"]
+        assert first["Orders"][1]["Items"][0]["Order"]["Name"] == "O3"
+        for bad in ("Name", "Orders.Nope", "Orders.Items.Order.Customer", "x,"):
+            response = started.get(f"{customers}/records", params={"expand": bad})
+            assert response.status_code == 422
+
+        # Deleting a parent clears the fields that referred to it.
+        started.delete(f"{customers}/records/{customer_ids[2]}")
+        order = started.get(f"{orders}/records/{order_ids[2]}").json()
+        assert order["Customer"] is None
+
+        # Rewriting the parent table keeps the references to its rows.
+        fields = started.get(f"{backend_url}fields/read/{customers_id}").json()
+        started.put(
+            f"{backend_url}fields/update/{customers_id}/{fields['items'][0]['id']}",
+            json={
+                "name": "Name",
+                "data_type": "str",
+                "required": True,
+                "default": "x",
+            },
+        )
+        started.post(f"{backend_url}databases/generate/{customers_id}")
+        migrations = started.get(
+            f"{backend_url}databases/migrations/{customers_id}"
+        ).json()
+        assert migrations[-1]["status"] == "applied"
+        order = started.get(f"{orders}/records/{order_ids[0]}").json()
+        assert order["Customer"] == customer_ids[0]
+        response = started.post(f"{orders}/records", json={"Customer": 99999})
+        assert response.status_code == 409
+
+
+def test_field_form_checks_relationships(
+    db_info_form: DbInfoForm, backend_url: str, frontend_url: str
+) -> None:
+    form = db_info_form.model_copy(update={"short_name": f"Rel{uuid4().hex[:8]}"})
+    db_id = client.post(
+        f"{backend_url}databases/create", json=form.model_dump()
+    ).json()["id"]
+    response = client.post(
+        f"{frontend_url}fields/create/{db_id}",
+        data={
+            "name": "Gone",
+            "data_type": "int",
+            "required": "false",
+            "default": "0",
+            "relationship": "parent",
+            "related_db_id": "99999",
+        },
+    )
+    assert response.json() == [{"type": "Text", "text": "Database 99999 not found"}]
+    assert client.get(f"{backend_url}fields/read/{db_id}").json()["items"] == []
+
+
+def test_search_records(
+    db_info_form: DbInfoForm, tmp_path: Path, backend_url: str
+) -> None:
+    settings = Settings(
+        database_url=f"sqlite:///{tmp_path / 'app.sqlite3'}",
+        frontend=False,
+        workflow_poll_s=0,
+        report_tick_s=0,
+    )
+    api = create_app(settings)
+    with TestClient(api) as started:
+        db_id = started.post(
+            f"{backend_url}databases/create", json=db_info_form.model_dump()
+        ).json()["id"]
+        field_ids = [
+            started.post(
+                f"{backend_url}fields/create/{db_id}",
+                json={
+                    "name": name,
+                    "data_type": "str",
+                    "required": False,
+                    "default": "",
+                    "searchable": name == "Title",
+                },
+            ).json()["id"]
+            for name in ("Title", "Notes")
+        ]
+        records = started.post(f"{backend_url}databases/generate/{db_id}").json()[
+            "api_path"
+        ]
+        search = f"{backend_url}databases/{db_id}/search"
+        rows = [{"Title": f"Report {i}", "Notes": "quarterly"} for i in range(5)]
+        rows.append({"Title": "Report report summary", "Notes": ""})
+        started.post(
+            f"{backend_url}databases/{db_id}/records/bulk?chunk_size=4",
+            content="\n".join(json.dumps(row) for row in rows),
+            headers={"content-type": "application/x-ndjson"},
+        )
+
+        page = started.get(search, params={"q": "repo", "limit": 4}).json()
+        first = page["items"][0]
+        assert first["highlights"] == {
+            "Title": "<mark>Report</mark> <mark>report</mark> summary"
+        }
+        assert first["record"]["Title"] == "Report report summary"
+        rest = started.get(
+            search, params={"q": "repo", "limit": 4, "cursor": page["next_cursor"]}
+        ).json()
+        assert rest["next_cursor"] is None
+        ids = [item["id"] for item in page["items"] + rest["items"]]
+        assert sorted(ids) == list(range(1, 7))
+
+        started.put(
+            f"{records}/records/1", json={"Title": "Memo <b>&</b>", "Notes": ""}
+        )
+        started.delete(f"{records}/records/2")
+        [memo] = started.get(search, params={"q": "memo"}).json()["items"]
+        assert memo["id"] == 1
+        # The record's own text is escaped; only the marks are markup.
+        assert memo["highlights"] == {
+            "Title": "<mark>Memo</mark> &lt;b&gt;&amp;&lt;/b&gt;"
+        }
+        assert len(started.get(search, params={"q": "report"}).json()["items"]) == 4
+        assert started.get(search, params={"q": "quarterly"}).json()["items"] == []
+        for q in (" ", ""):
+            assert started.get(search, params={"q": q}).status_code == 422
+
+        # Marking another field searchable indexes what is already there.
+        started.put(
+            f"{backend_url}fields/update/{db_id}/{field_ids[1]}",
+            json={
+                "name": "Notes",
+                "data_type": "str",
+                "required": False,
+                "default": "",
+                "searchable": True,
+            },
+        )
+        started.post(f"{backend_url}databases/generate/{db_id}")
+        items = started.get(search, params={"q": "quarterly"}).json()["items"]
+        assert [item["id"] for item in items] == [3, 4, 5]
+        assert items[0]["highlights"]["Notes"] == "<mark>quarterly</mark>"
+
+
+def test_bulk_ingest_in_worker_processes(
+    db_info_form: DbInfoForm, tmp_path: Path, backend_url: str
+) -> None:
+    settings = Settings(
+        database_url=f"sqlite:///{tmp_path / 'app.sqlite3'}",
+        frontend=False,
+        workflow_poll_s=0,
+        report_tick_s=0,
+        validation_workers=2,
+    )
+    api = create_app(settings)
+    with TestClient(api) as started:
+        db_id = started.post(
+            f"{backend_url}databases/create", json=db_info_form.model_dump()
+        ).json()["id"]
+        started.post(
+            f"{backend_url}fields/create/{db_id}",
+            json={"name": "N", "data_type": "int", "required": True, "default": ""},
+        )
+        path = started.post(f"{backend_url}databases/generate/{db_id}").json()[
+            "api_path"
+        ]
+        rows = [{"N": "x" if i % 1000 == 7 else i} for i in range(3500)]
+        response = started.post(
+            f"{backend_url}databases/{db_id}/records/bulk",
+            content="\n".join(json.dumps(row) for row in rows),
+            headers={"content-type": "application/x-ndjson"},
+        )
+        data = response.json()
+        # Chunks are checked ahead in the workers but land in order.
+        assert data["rows_inserted"] == 3496
+        assert [c["errors"][0]["row"] for c in data["chunks"]] == [
+            8,
+            1008,
+            2008,
+            3008,
+        ]
+        assert data["columns"][0]["count"] == 4
+        assert data["columns"][0]["samples"] == ["'x'"]
+        page = started.get(f"{path}/records", params={"limit": 3}).json()
+        assert [item["N"] for item in page["items"]] == [0, 1, 2]
+
+
+def find_components(tree: Any, kind: str) -> list[dict[str, Any]]:
+    # Every component of type ``kind`` in a FastUI response, depth first.
+    if isinstance(tree, list):
+        return [found for item in tree for found in find_components(item, kind)]
+    if not isinstance(tree, dict):
+        return []
+    found = [tree] if tree.get("type") == kind else []
+    return found + find_components(list(tree.values()), kind)
+
+
+def check_form_pages(
+    client: TestClient, db_info_form: DbInfoForm, frontend_url: str, backend_url: str
+) -> None:
+    db_id = client.post(
+        f"{backend_url}databases/create", json=db_info_form.model_dump()
+    ).json()["id"]
+    for i in range(FIELD_PAGE_SIZE + 3):
+        client.post(
+            f"{backend_url}fields/create/{db_id}",
+            json={
+                "name": f"F{i}",
+                "data_type": "str",
+                "required": False,
+                "default": "",
+            },
+        )
+    stats = client.get(f"{backend_url}databases/components/stats").json()
+    for url in (f"databases/read/{db_id}", f"fields/read/{db_id}"):
+        first = client.get(f"{frontend_url}{url}")
+        [table] = find_components(first.json(), "Table")
+        assert [row["name"] for row in table["data"][:2]] == ["F0", "F1"]
+        assert len(table["data"]) == FIELD_PAGE_SIZE
+        [pagination] = find_components(first.json(), "Pagination")
+        assert (pagination["page"], pagination["total"]) == (1, FIELD_PAGE_SIZE + 3)
+        # Rendered once per version and page.
+        again = client.get(f"{frontend_url}{url}")
+        assert again.content == first.content
+        last = client.get(f"{frontend_url}{url}", params={"page": 2}).json()
+        [table] = find_components(last, "Table")
+        assert [row["name"] for row in table["data"]] == ["F50", "F51", "F52"]
+        response = client.get(
+            f"{frontend_url}{url}", headers={"If-None-Match": first.headers["etag"]}
+        )
+        assert response.status_code == 304
+    after = client.get(f"{backend_url}databases/components/stats").json()
+    assert (after["hits"], after["misses"]) == (stats["hits"] + 2, stats["misses"] + 4)
+
+    # A new field is a new version, rendered afresh.
+    client.post(
+        f"{backend_url}fields/create/{db_id}",
+        json={"name": "Late", "data_type": "str", "required": False, "default": ""},
+    )
+    page = client.get(f"{frontend_url}databases/read/{db_id}").json()
+    [pagination] = find_components(page, "Pagination")
+    assert pagination["total"] == FIELD_PAGE_SIZE + 4
+    [form] = find_components(page, "Form")
+    assert form["initial"]["short_name"] == db_info_form.short_name
+
+    everything = client.get(f"{frontend_url}fields/read", params={"page": 1}).json()
+    [table] = find_components(everything, "Table")
+    assert len(table["data"]) == FIELD_PAGE_SIZE
+    assert client.get(f"{frontend_url}fields/read?page=0").status_code == 422
+    assert client.get(f"{frontend_url}databases/read/999999").status_code == 404
+
+
+def test_form_pages_paginated(
+    db_info_form: DbInfoForm, tmp_path: Path, frontend_url: str, backend_url: str
+) -> None:
+    # Its own database, as the other tests count every field.
+    settings = Settings(
+        database_url=f"sqlite:///{tmp_path / 'app.sqlite3'}",
+        workflow_poll_s=0,
+        report_tick_s=0,
+    )
+    api = create_app(settings)
+    with TestClient(api) as started:
+        check_form_pages(started, db_info_form, frontend_url, backend_url)
+
+
+def test_model_form_matches_model_form() -> None:
+    kwargs: dict[str, Any] = {"submit_url": "/forms/x", "display_mode": "inline"}
+    cached = model_form(DbInfo, **kwargs).model_dump(by_alias=True, exclude_none=True)
+    built = c.ModelForm(model=DbInfo, **kwargs).model_dump(
+        by_alias=True, exclude_none=True
+    )
+    assert cached.pop("type") == "Form"
+    assert built.pop("type") == "ModelForm"
+    assert cached == built
+
+
+def test_landing_page() -> None:
+    plain = client.get("/databases/read/1", headers={"Accept-Encoding": "identity"})
+    assert plain.headers["content-type"].startswith("text/html")
+    assert "content-encoding" not in plain.headers
+    assert plain.headers["cache-control"] == f"public, max-age={LANDING_MAX_AGE}"
+    assert plain.headers["vary"] == "Accept-Encoding"
+
+    compressed = client.get("/tags/search", headers={"Accept-Encoding": "br, gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    # httpx decodes it; the bytes sent are the precompressed page.
+    assert compressed.text == plain.text
+    assert compressed.num_bytes_downloaded < len(plain.content)
+    assert compressed.headers["etag"] == plain.headers["etag"]
+
+    response = client.get("/welcome", headers={"If-None-Match": plain.headers["etag"]})
+    assert response.status_code == 304
+    assert response.headers["cache-control"] == plain.headers["cache-control"]
+
+    for refused in ("gzip;q=0, identity", "br, gzip; q=0", "*;q=0", "deflate"):
+        response = client.get("/welcome", headers={"Accept-Encoding": refused})
+        assert "content-encoding" not in response.headers
+    response = client.get("/welcome", headers={"Accept-Encoding": "gzip;q=0.5"})
+    assert response.headers["content-encoding"] == "gzip"
+
+    # Any other path still gets the page, but not for the browser to keep.
+    unknown = client.get("/anything", headers={"If-None-Match": plain.headers["etag"]})
+    assert unknown.status_code == 200
+    assert unknown.text == plain.text
+    assert unknown.headers["cache-control"] == "no-cache"
+    assert "etag" not in unknown.headers
+
+
 ### ADD DELETE TESTS ###
 
 
@@ -0,0 +1,43 @@
+from POC.db.models.stock_models.db_models import DbInfoModel
+from POC.helpers.cache_helpers import DbMetadata, MetadataCache, metadata_etag
+
+import time
+
+
+def metadata(db_id: int, ttl: float = 60.0) -> DbMetadata:
+    db = DbInfoModel(
+        id=db_id, name="db", short_name="db", display_name="db", category=None
+    )
+    return DbMetadata(
+        db=db, fields=(), etag=metadata_etag(db), expires=time.monotonic() + ttl
+    )
+
+
+def test_metadata_cache_lru_and_ttl() -> None:
+    cache = MetadataCache(maxsize=2)
+    for db_id in (1, 2):
+        cache.put(metadata(db_id), cache.generation)
+    assert cache.get(1) is not None
+    cache.put(metadata(3), cache.generation)
+    assert cache.get(2) is None
+    assert cache.get(1) is not None
+
+    cache.put(metadata(4, ttl=0.0), cache.generation)
+    assert cache.get(4) is None
+    stats = cache.stats()
+    assert (stats["evictions"], stats["expirations"]) == (2, 1)
+    assert stats["hit_ratio"] == 0.5
+
+
+def test_metadata_cache_drops_loads_that_raced_a_write() -> None:
+    cache = MetadataCache()
+    generation = cache.generation
+    cache.invalidate(1)
+    cache.put(metadata(1), generation)
+    assert cache.get(1) is None
+
+
+def test_metadata_etag_tracks_version() -> None:
+    entry = metadata(1)
+    entry.db.version += 1
+    assert metadata_etag(entry.db) != entry.etag
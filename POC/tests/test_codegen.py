@@ -0,0 +1,203 @@
+import importlib.util
+import sys
+from pathlib import Path
+from types import ModuleType
+from POC.db.models.stock_models.db_models import FieldInfo, SchemaVersionModel
+from POC.gen import codegen
+from POC.gen.codegen import (
+    DB_MODELS_FILE,
+    DB_MODELS_MODULE,
+    load_generated,
+    write_model_files,
+)
+from POC.gen.compiler import compile_db
+from POC.gen.migrate import field_specs
+
+import pytest
+
+
+def schema(db_id: int, version: int, fields: list[FieldInfo]) -> SchemaVersionModel:
+    compiled = compile_db(db_id, version, fields)
+    return SchemaVersionModel(
+        db_id=db_id, version=version, fields=field_specs(compiled, fields)
+    )
+
+
+@pytest.fixture
+def fields() -> list[FieldInfo]:
+    return [
+        FieldInfo(id=1, name="Name", data_type="str", required=True, default=""),
+        FieldInfo(id=2, name="Count", data_type="int", required=False, default="3"),
+        FieldInfo(
+            id=3,
+            name="Born On",
+            data_type="date",
+            required=False,
+            default="",
+            indexed=True,
+        ),
+        FieldInfo(id=4, name="Tags", data_type="list", required=False, default="[1]"),
+        FieldInfo(id=5, name="Name", data_type="str", required=False, default="x"),
+        FieldInfo(
+            id=6,
+            name="Code",
+            data_type="string",
+            required=False,
+            default="",
+            unique=True,
+        ),
+    ]
+
+
+def import_file(path: Path, name: str) -> ModuleType:
+    spec = importlib.util.spec_from_file_location(name, path)
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_generated_models_match_compiled(
+    tmp_path: Path, fields: list[FieldInfo]
+) -> None:
+    schemas = [schema(7, 2, fields), schema(8, 1, [])]
+    result = write_model_files(schemas, tmp_path)
+    assert result.rendered == [7, 8]
+
+    models = import_file(tmp_path / DB_MODELS_FILE, "generated_db_models_test")
+    compiled = compile_db(7, 2, fields)
+    version, _, build, columns = models.DB_MODELS[7]
+    table, validator = build()
+
+    assert (version, columns) == (2, compiled.columns)
+    assert [(c.name, type(c.type), c.nullable) for c in table.columns] == [
+        (c.name, type(c.type), c.nullable) for c in compiled.table.columns
+    ]
+    assert {(i.name, i.unique) for i in table.indexes} == {
+        (i.name, i.unique) for i in compiled.table.indexes
+    }
+    row = {"Name": 5, "Born On": "2024-01-31", "Tags": "[2, 3]", "Code": "a"}
+    assert validator.model_validate(row).model_dump(by_alias=True) == (
+        compiled.validate(row)
+    )
+    assert compiled.validate({"Name": "n"}) == validator.model_validate(
+        {"Name": "n"}
+    ).model_dump(by_alias=True)
+    assert compiled.validate({"Name": "n"})["Born On"] is None
+    assert models.DB_MODELS[8][3] == ()
+    assert [c.name for c in models.DB_MODELS[8][2]()[0].columns] == ["id"]
+
+
+def test_regenerates_changed_databases_only(
+    tmp_path: Path, fields: list[FieldInfo]
+) -> None:
+    write_model_files([schema(1, 1, fields), schema(2, 1, fields[:2])], tmp_path)
+    path = tmp_path / DB_MODELS_FILE
+    before = path.stat().st_mtime_ns
+
+    unchanged = write_model_files(
+        [schema(1, 1, fields), schema(2, 1, fields[:2])], tmp_path
+    )
+    assert (unchanged.rendered, unchanged.reused) == ([], [1, 2])
+    assert path.stat().st_mtime_ns == before
+
+    changed = write_model_files([schema(1, 1, fields), schema(2, 2, fields)], tmp_path)
+    assert (changed.rendered, changed.reused) == ([2], [1])
+
+    # Same version number, different fields: a schema from another database file.
+    renamed = [field.model_copy(update={"name": "Other"}) for field in fields[:1]]
+    changed = write_model_files([schema(1, 1, renamed)], tmp_path)
+    assert (changed.rendered, changed.removed) == ([1], [2])
+    assert "class Db2Records" not in path.read_text()
+
+
+def test_load_generated(
+    tmp_path: Path, fields: list[FieldInfo], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    current = schema(3, 4, fields)
+    write_model_files([current], tmp_path)
+    monkeypatch.setattr(codegen, "GENERATED_DIR", tmp_path)
+    monkeypatch.setitem(sys.modules, DB_MODELS_MODULE, None)
+
+    compiled = load_generated(current)
+    assert compiled is not None
+    assert (compiled.db_id, compiled.version) == (3, 4)
+    assert compiled.table.name == "db_3_records"
+    assert compiled.validate_many([{"Name": "a"}, {"Count": "x"}])[1].keys() == {1}
+    assert load_generated(schema(3, 5, fields)) is None
+    assert load_generated(schema(3, 4, fields[:1])) is None
+    assert load_generated(schema(9, 1, fields)) is None
+
+
+def test_generated_computed_fields(
+    tmp_path: Path, fields: list[FieldInfo], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    computed = [
+        FieldInfo(
+            id=7,
+            name="Double",
+            data_type="int",
+            required=False,
+            default="",
+            expression="Count times 2",
+        ),
+        FieldInfo(
+            id=8,
+            name="Root",
+            data_type="float",
+            required=False,
+            default="",
+            expression="sqrt(Double)",
+        ),
+    ]
+    current = schema(3, 1, fields + computed)
+    write_model_files([current], tmp_path)
+    monkeypatch.setattr(codegen, "GENERATED_DIR", tmp_path)
+    monkeypatch.setitem(sys.modules, DB_MODELS_MODULE, None)
+
+    compiled = load_generated(current)
+    expected = compile_db(3, 1, fields + computed)
+    assert compiled is not None
+    assert compiled.table.c["Double"].computed is not None
+    assert str(compiled.table.c["Double"].computed.sqltext) == str(  # type: ignore[union-attr]
+        expected.table.c["Double"].computed.sqltext  # type: ignore[union-attr]
+    )
+    assert compiled.table.c["Root"].computed is None
+    row = {"Name": "n", "Count": 8, "Double": 1}
+    assert compiled.validate(row) == expected.validate(row)
+    assert compiled.validate(row)["Root"] == 4.0
+
+
+def test_generated_relationships(tmp_path: Path) -> None:
+    fields = [
+        FieldInfo(id=1, name="Name", data_type="str", required=True, default=""),
+        FieldInfo(
+            id=2,
+            name="Owner",
+            data_type="int",
+            required=False,
+            default="",
+            relationship="parent",
+            related_db_id=3,
+        ),
+        FieldInfo(
+            id=3,
+            name="Parts",
+            data_type="list",
+            required=False,
+            default="",
+            relationship="child",
+            related_db_id=7,
+            related_key="Owner",
+        ),
+    ]
+    write_model_files([schema(7, 1, fields)], tmp_path)
+    models = import_file(tmp_path / DB_MODELS_FILE, "generated_relationships_test")
+    compiled = compile_db(7, 1, fields)
+    table, _ = models.DB_MODELS[7][2]()
+
+    assert [c.name for c in table.columns] == ["id", "Name", "Owner"]
+    assert {(k.parent.name, k.target_fullname) for k in table.foreign_keys} == {
+        (k.parent.name, k.target_fullname) for k in compiled.table.foreign_keys
+    }
+    assert {i.name for i in table.indexes} == {i.name for i in compiled.table.indexes}
@@ -0,0 +1,179 @@
+from datetime import date
+from pydantic import ValidationError
+from POC.db.models.stock_models.db_models import FieldInfo
+from POC.gen.compiler import (
+    CompiledDbCache,
+    Relation,
+    compile_db,
+    normalize_data_type,
+)
+
+import pytest
+
+
+@pytest.fixture
+def fields() -> list[FieldInfo]:
+    return [
+        FieldInfo(name="Name", data_type="str", required=True, default=""),
+        FieldInfo(name="Count", data_type="int", required=False, default="3"),
+        FieldInfo(name="Born On", data_type="date", required=False, default=""),
+    ]
+
+
+@pytest.mark.parametrize(
+    "data_type, expected",
+    [("str", "str"), ("String", "str"), ("integer", "int"), ("dict", "dict")],
+)
+def test_normalize_data_type(data_type: str, expected: str) -> None:
+    assert normalize_data_type(data_type) == expected
+
+
+def test_normalize_data_type_rejects_unknown() -> None:
+    with pytest.raises(ValueError):
+        normalize_data_type("blob")
+
+
+def test_compile_db(fields: list[FieldInfo]) -> None:
+    compiled = compile_db(7, 2, fields)
+
+    assert compiled.table.name == "db_7_records"
+    assert [c.name for c in compiled.table.columns] == [
+        "id",
+        "Name",
+        "Count",
+        "Born On",
+    ]
+    assert compiled.columns == ("Name", "Count", "Born On")
+    assert compiled.validate({"Name": 5, "Born On": "2024-01-31"}) == {
+        "Name": "5",
+        "Count": 3,
+        "Born On": date(2024, 1, 31),
+    }
+    with pytest.raises(ValidationError):
+        compiled.validate({"Count": "x"})
+
+
+def test_compile_db_renames_duplicate_names(fields: list[FieldInfo]) -> None:
+    id_field = FieldInfo(name="id", data_type="int", required=False, default="")
+    compiled = compile_db(1, 1, [*fields, fields[0], id_field])
+
+    assert compiled.columns == ("Name", "Count", "Born On", "Name_2", "id_2")
+
+
+def test_compiled_db_cache(fields: list[FieldInfo]) -> None:
+    cache = CompiledDbCache(maxsize=2)
+    assert cache.get(1, 1) is None
+    cache.put(compile_db(1, 1, fields))
+    cache.put(compile_db(2, 1, fields))
+    assert cache.get(1, 1) is not None
+    cache.put(compile_db(3, 1, fields))
+
+    assert cache.get(2, 1) is None
+    assert cache.get(1, 1) is not None
+    cache.put(compile_db(1, 2, fields))
+    assert cache.get(1, 1) is None
+    assert cache.stats() == {
+        "size": 2,
+        "maxsize": 2,
+        "hits": 2,
+        "misses": 3,
+        "evictions": 1,
+    }
+
+
+def test_compile_db_indexes(fields: list[FieldInfo]) -> None:
+    fields[0].unique = True
+    fields[1].indexed = True
+    compiled = compile_db(7, 2, fields)
+
+    indexes = {index.name: index.unique for index in compiled.table.indexes}
+    assert indexes == {"ix_db_7_records_Name": True, "ix_db_7_records_Count": False}
+
+
+def test_compile_db_relationships(fields: list[FieldInfo]) -> None:
+    parent = dict(required=False, default="", relationship="parent")
+    child = dict(required=False, default="", relationship="child")
+    compiled = compile_db(
+        7,
+        2,
+        [
+            *fields,
+            FieldInfo(name="Owner", data_type="int", related_db_id=3, **parent),
+            FieldInfo(
+                name="Code",
+                data_type="str",
+                related_db_id=4,
+                related_key="Code",
+                **parent,
+            ),
+            FieldInfo(name="Boss", data_type="int", related_db_id=7, **parent),
+            FieldInfo(
+                name="Items",
+                data_type="list",
+                related_db_id=5,
+                related_key="Owner",
+                **child,
+            ),
+        ],
+    )
+
+    assert compiled.relations == (
+        Relation("Owner", "parent", 3, "id"),
+        Relation("Code", "parent", 4, "Code"),
+        Relation("Boss", "parent", 7, "id"),
+        Relation("Items", "child", 5, "Owner"),
+    )
+    # Child fields are read from the other table and have no column.
+    assert "Items" not in compiled.table.c
+    assert "Items" not in compiled.validate({"Name": "n", "Items": [1]})
+    keys = {
+        (key.parent.name, key.target_fullname, key.ondelete)
+        for key in compiled.table.foreign_keys
+    }
+    assert keys == {
+        ("Owner", "db_3_records.id", "SET NULL"),
+        ("Code", "db_4_records.Code", "SET NULL"),
+        ("Boss", "db_7_records.id", "SET NULL"),
+    }
+    assert {"ix_db_7_records_Owner", "ix_db_7_records_Boss"} <= {
+        index.name for index in compiled.table.indexes
+    }
+
+
+@pytest.mark.parametrize(
+    "field, message",
+    [
+        (dict(data_type="int", relationship="parent"), "needs a database"),
+        (
+            dict(data_type="str", relationship="parent", related_db_id=3),
+            "must be an int",
+        ),
+        (dict(data_type="list", relationship="child", related_db_id=3), "refers back"),
+        (
+            dict(
+                data_type="int", relationship="child", related_db_id=3, related_key="A"
+            ),
+            "must be a list",
+        ),
+        (
+            dict(
+                data_type="int",
+                relationship="parent",
+                related_db_id=3,
+                expression="1 plus 2",
+            ),
+            "cannot be computed",
+        ),
+    ],
+)
+def test_compile_db_checks_relationships(field: dict, message: str) -> None:
+    with pytest.raises(ValueError, match=message):
+        compile_db(1, 1, [FieldInfo(name="R", required=False, default="", **field)])
+    with pytest.raises(ValidationError):
+        FieldInfo(
+            name="R",
+            data_type="int",
+            required=False,
+            default="",
+            relationship="sibling",
+        )
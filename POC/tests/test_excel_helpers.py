@@ -0,0 +1,46 @@
+from datetime import datetime, time
+from typing import Any
+from POC.helpers.excel_helpers import clean_headers, infer_data_type, infer_fields
+
+import pytest
+
+
+@pytest.mark.parametrize(
+    "values, expected",
+    [
+        (["1", "-2", "", None], "int"),
+        ([1, 2.0], "int"),
+        (["1.5", "2"], "float"),
+        (["true", "No"], "bool"),
+        ([True, False], "bool"),
+        (["2024-01-31", "2024-02-01"], "date"),
+        ([datetime(2024, 1, 31)], "date"),
+        (["2024-01-31", "2024-01-31T10:30"], "datetime"),
+        ([time(10, 30)], "time"),
+        (['{"a": 1}'], "dict"),
+        (["[1, 2]"], "list"),
+        (["1", "x"], "str"),
+        ([None, ""], "str"),
+    ],
+)
+def test_infer_data_type(values: list[Any], expected: str) -> None:
+    assert infer_data_type(values) == expected
+
+
+def test_clean_headers() -> None:
+    assert clean_headers(["Name", None, "Name", "id", " Qty "]) == [
+        "Name",
+        "column_2",
+        "Name_2",
+        "id_2",
+        "Qty",
+    ]
+
+
+def test_infer_fields_only_reads_sample() -> None:
+    rows = iter([("a", "b"), ("1", "x"), ("2", "y"), ("oops", "z")])
+    fields, sample = infer_fields(rows, sample_size=2)
+
+    assert [(f.name, f.data_type) for f in fields] == [("a", "int"), ("b", "str")]
+    assert sample == [("1", "x"), ("2", "y")]
+    assert list(rows) == [("oops", "z")]
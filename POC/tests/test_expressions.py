@@ -0,0 +1,194 @@
+import math
+import random
+import numpy as np
+from sqlalchemy import create_engine, insert, select
+from POC.db.models.stock_models.db_models import FieldInfo
+from POC.gen.compiler import compile_computed, compile_db
+from POC.gen.expressions import ExpressionError, parse
+from POC.gen.migrate import field_specs, plan_migration, recompute
+
+import pytest
+
+
+def numbers(*names: str, **expressions: str) -> list[FieldInfo]:
+    fields = [
+        FieldInfo(id=i, name=name, data_type="float", required=False, default="")
+        for i, name in enumerate(names, 1)
+    ]
+    for name, expression in expressions.items():
+        fields.append(
+            FieldInfo(
+                id=len(fields) + 1,
+                name=name.replace("_", " "),
+                data_type="float",
+                required=False,
+                default="",
+                expression=expression,
+            )
+        )
+    return fields
+
+
+@pytest.mark.parametrize(
+    "text, sql",
+    [
+        ("Field 1 Plus Field 2", '("Field 1" + "Field 2")'),
+        ("Comp 1 times Field 3", '("Comp 1" * "Field 3")'),
+        ("a plus b TIMES c", '("a" + ("b" * "c"))'),
+        ("(a minus b) divided by 2", '(CAST(("a" - "b") AS REAL) / 2)'),
+        ("-[Unit price] * 1.5", '((-"Unit price") * 1.5)'),
+        ("round(a / 3, 2)", 'round((CAST("a" AS REAL) / 3), 2)'),
+        ("coalesce(a, b, 0)", 'coalesce("a", "b", 0)'),
+    ],
+)
+def test_parse(text: str, sql: str) -> None:
+    assert parse(text).to_sql() == sql
+
+
+@pytest.mark.parametrize(
+    "text",
+    ["", "a +", "(a", "a $ b", "plus", "foo(a)", "min(a)", "round(a, b)", "[]"],
+)
+def test_parse_errors(text: str) -> None:
+    with pytest.raises(ExpressionError):
+        parse(text)
+
+
+def test_references_and_rename() -> None:
+    expression = parse("field 1 plus [Field 1] times sqrt(Other)")
+    assert expression.references == ("field 1", "Field 1", "Other")
+    assert not expression.sql_only
+    assert expression.rename("Field  1", "Net (EUR)") == (
+        "[Net (EUR)] plus [Net (EUR)] times sqrt(Other)"
+    )
+    assert expression.rename("Other", "Rate") == (
+        "field 1 plus [Field 1] times sqrt(Rate)"
+    )
+    resolved = parse("field 1 plus b").resolve({"Field 1": "x", "b": "y"})
+    assert resolved.references == ("x", "y")
+    with pytest.raises(ExpressionError, match="Unknown field"):
+        parse("c").resolve({"a": "a"})
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "a plus b",
+        "a minus b times 2",
+        "a divided by b",
+        "-a / (b - b)",
+        "abs(a) + round(b, 1)",
+        "round(a * 10) / 10",
+        "min(a, b, 3)",
+        "max(a, b)",
+        "coalesce(a / b, b, 0)",
+    ],
+)
+def test_sql_numpy_and_rows_agree(text: str) -> None:
+    expression = parse(text)
+    rng = random.Random(text)
+    rows = [
+        {
+            "a": rng.choice([None, 0, 2.5, -2.5, rng.uniform(-100, 100)]),
+            "b": rng.choice([None, 0, 4, rng.uniform(-100, 100)]),
+        }
+        for _ in range(200)
+    ]
+    engine = create_engine("sqlite://")
+    fields = numbers("a", "b", c=text)
+    compiled = compile_db(1, 1, fields)
+    compiled.table.create(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(compiled.table), rows)
+        statement = select(compiled.table.c.c).order_by(compiled.table.c.id)
+        in_sql = connection.execute(statement).scalars().all()
+    arrays = {name: np.array([row[name] for row in rows], dtype=float) for name in "ab"}
+    in_numpy = expression.evaluate(arrays, len(rows))
+    in_rows = [expression.evaluate_row(row) for row in rows]
+    for sql, vectorized, row in zip(in_sql, in_numpy, in_rows):
+        if sql is None:
+            assert math.isnan(vectorized) and row is None
+        else:
+            assert vectorized == pytest.approx(sql) and row == pytest.approx(sql)
+
+
+def test_compile_computed_orders_dependencies() -> None:
+    fields = numbers("Field 1", "Field 2", Comp_2="Comp 1 * 2", Comp_1="Field 1 + 1")
+    computed = compile_computed(fields, [field.name for field in fields])
+    assert [field.column for field in computed] == ["Comp 1", "Comp 2"]
+
+    with pytest.raises(ValueError, match="depend on each other"):
+        fields = numbers(A="B + 1", B="A + 1")
+        compile_computed(fields, [field.name for field in fields])
+    with pytest.raises(ValueError, match="not a number"):
+        fields = [
+            FieldInfo(name="Name", data_type="str", required=False, default=""),
+            *numbers(Length="Name + 1"),
+        ]
+        compile_computed(fields, [field.name for field in fields])
+
+
+def test_stored_computed_fields() -> None:
+    # ln and pow have no SQL form, so Comp 2 and Comp 3 are stored.
+    fields = numbers(
+        "a", "b", Comp_1="a + b", Comp_2="ln(Comp 1)", Comp_3="pow(Comp 2, 2) * 2"
+    )
+    fields[-1].data_type = "int"
+    compiled = compile_db(1, 1, fields)
+    assert compiled.table.c["Comp 1"].computed is not None
+    assert compiled.table.c["Comp 2"].computed is None
+    assert compiled.table.c["Comp 3"].computed is None
+    assert "Comp 1" not in compiled.validate({"a": 1, "Comp 1": 5})
+
+    row = compiled.validate({"a": 1, "b": math.e - 1})
+    assert row["Comp 2"] == pytest.approx(1.0) and row["Comp 3"] == 2
+    valid, errors = compiled.validate_many(
+        [{"a": 1, "b": math.e - 1}, {"a": "x"}, {"a": -1, "b": 0}, {"a": 1}]
+    )
+    assert list(errors) == [1]
+    assert [(r["Comp 2"], r["Comp 3"]) for r in valid] == [
+        (pytest.approx(1.0), 2),
+        (None, None),
+        (None, None),
+    ]
+
+
+def test_recompute_changed_expression() -> None:
+    before = numbers("a", Stored="exp(a)", Twice="floor(Stored * 2)")
+    after = numbers("a", Stored="sqrt(a)", Twice="floor(Stored * 2)")
+    applied = field_specs(compile_db(1, 1, before), before)
+    compiled = compile_db(1, 2, after)
+    target = field_specs(compiled, after)
+    plan = plan_migration(applied, target, {"id", "a", "Stored", "Twice"})
+    assert (plan.copy, plan.recompute) == (False, ["Stored", "Twice"])
+
+    engine = create_engine("sqlite://")
+    compiled.table.create(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(compiled.table), [{"a": n} for n in (4, 9, None)])
+        assert recompute(connection, compiled, plan.recompute, batch_size=2) == 3
+        rows = connection.execute(select(compiled.table)).all()
+    assert [tuple(row)[2:] for row in rows] == [(2, 4), (3, 6), (None, None)]
+
+
+@pytest.mark.parametrize(
+    "expression, copy",
+    [("a * 2", False), ("a * 3", True), ("sqrt(a)", True), (None, True)],
+)
+def test_plan_migration_of_generated_columns(
+    expression: str | None, copy: bool
+) -> None:
+    before = numbers("a", Comp="a * 2")
+    after = numbers("a", Comp="a * 2")
+    after[-1].expression = expression
+    applied = field_specs(compile_db(1, 1, before), before)
+    target = field_specs(compile_db(1, 2, after), after)
+    plan = plan_migration(applied, target, {"id", "a", "Comp"})
+    assert plan.copy == copy
+    assert plan.recompute == (["Comp"] if expression == "sqrt(a)" else [])
+
+    # A renamed input leaves the generated column as it is.
+    renamed = numbers("b", Comp="b * 2")
+    target = field_specs(compile_db(1, 2, renamed), renamed)
+    plan = plan_migration(applied, target, {"id", "a", "Comp"})
+    assert (plan.copy, plan.renames) == (False, {"a": "b"})
@@ -0,0 +1,44 @@
+from sqlalchemy import create_engine, text
+from POC.db.instrumentation import (
+    RequestQueries,
+    SqlInstrumentation,
+    SqlMetrics,
+    current_queries,
+    statement_shape,
+)
+
+
+def test_statement_shape() -> None:
+    assert statement_shape("SELECT a\n  FROM t WHERE id IN (?, ?,?)") == (
+        "SELECT a FROM t WHERE id IN (?)"
+    )
+    assert statement_shape("INSERT INTO t (a) VALUES (?), (?), (?)") == (
+        "INSERT INTO t (a) VALUES (?)"
+    )
+
+
+def test_instrumentation_counts_requests_and_repeats() -> None:
+    engine = create_engine("sqlite://")
+    metrics = SqlMetrics()
+    SqlInstrumentation(slow_query_ms=0, metrics=metrics).attach(engine)
+    queries = RequestQueries()
+    token = current_queries.set(queries)
+    try:
+        with engine.connect() as connection:
+            for i in range(12):
+                connection.execute(text("SELECT :i"), {"i": i})
+            connection.execute(text("SELECT 1, 2"))
+    finally:
+        current_queries.reset(token)
+    assert queries.count == 13
+    assert queries.repeated(10) == [("SELECT ?", 12)]
+    assert queries.repeated(20) == []
+    assert metrics.statements["select"].count == 13
+    assert metrics.slow["select"] == 13
+
+    rendered = metrics.render()
+    assert 'dynamic_db_sql_statement_seconds_count{operation="select"} 13' in rendered
+    assert (
+        'dynamic_db_sql_statement_seconds_bucket{operation="select",le="+Inf"} 13'
+        in rendered
+    )
@@ -0,0 +1,244 @@
+import sqlite3
+from pathlib import Path
+from sqlalchemy import Engine, create_engine, select, text
+from sqlalchemy.exc import OperationalError
+from sqlmodel import SQLModel, col
+from POC.db.models.stock_models.db_models import (
+    FieldInfo,
+    QuarantinedRowModel,
+    SchemaVersionModel,
+)
+from POC.gen.compiler import compile_db
+from POC.gen.migrate import (
+    field_specs,
+    lock_error,
+    migration_progress,
+    migration_step,
+    plan_migration,
+)
+
+import pytest
+
+
+def specs(*fields: tuple[int, str, str, bool]) -> list[dict]:
+    infos = [
+        FieldInfo(
+            id=id_, name=name, data_type=data_type, required=required, default="0"
+        )
+        for id_, name, data_type, required in fields
+    ]
+    return field_specs(compile_db(1, 1, infos), infos)
+
+
+@pytest.mark.parametrize(
+    "target, renames, copy",
+    [
+        (specs((1, "Count", "str", False), (2, "Name", "str", False)), {}, False),
+        (
+            specs((1, "Count", "str", False), (2, "Title", "str", False)),
+            {"Name": "Title"},
+            False,
+        ),
+        (specs((1, "Count", "int", False), (2, "Name", "str", False)), {}, True),
+        (specs((1, "Count", "str", True), (2, "Name", "str", False)), {}, True),
+        (specs((1, "Name", "str", False), (2, "Count", "str", False)), {}, True),
+    ],
+)
+def test_plan_migration(target: list[dict], renames: dict, copy: bool) -> None:
+    applied = specs((1, "Count", "str", False), (2, "Name", "str", False))
+    plan = plan_migration(applied, target, {"id", "Count", "Name"})
+    assert (plan.renames, plan.copy) == (renames, copy)
+
+
+@pytest.fixture
+def engine(tmp_path: Path) -> Engine:
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrate.sqlite3'}")
+    SQLModel.metadata.create_all(
+        engine,
+        tables=[SchemaVersionModel.__table__, QuarantinedRowModel.__table__],  # type: ignore[attr-defined]
+    )
+    applied = specs((1, "Count", "str", False), (2, "Name", "str", False))
+    target = specs((1, "Count", "int", True), (2, "Name", "str", False))
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                'CREATE TABLE db_1_records (id INTEGER PRIMARY KEY, "Count" VARCHAR, "Name" VARCHAR, "Old" VARCHAR)'
+            )
+        )
+        connection.execute(
+            text(
+                'INSERT INTO db_1_records ("Count", "Name", "Old") VALUES (:c, :n, :o)'
+            ),
+            [{"c": str(i), "n": f"row {i}", "o": "kept"} for i in range(1, 8)],
+        )
+        for row in (
+            SchemaVersionModel(db_id=1, version=1, fields=applied),
+            SchemaVersionModel(
+                db_id=1, version=2, from_version=1, status="pending", fields=target
+            ),
+        ):
+            connection.execute(
+                SchemaVersionModel.__table__.insert(),  # type: ignore[attr-defined]
+                row.model_dump(exclude={"id"}),
+            )
+    return engine
+
+
+def test_migration_copies_in_batches_and_resumes(engine: Engine) -> None:
+    with engine.connect() as connection:
+        assert migration_step(connection, 1, batch_size=3) is False  # shadow
+        assert migration_step(connection, 1, batch_size=3) is False  # rows 1-3
+        # Writes during the copy reach the shadow through the triggers.
+        connection.execute(
+            text("UPDATE db_1_records SET \"Count\" = '20' WHERE id = 2")
+        )
+        connection.execute(text("DELETE FROM db_1_records WHERE id = 5"))
+        connection.execute(text('INSERT INTO db_1_records ("Count") VALUES (NULL)'))
+        connection.commit()
+
+    # A new connection picks up from the last committed batch.
+    with engine.connect() as connection:
+        progress = connection.execute(
+            text(
+                "SELECT status, last_id, total_rows FROM schemaversionmodel WHERE version = 2"
+            )
+        ).one()
+        assert tuple(progress) == ("copying", 3, 7)
+        steps = 0
+        while not migration_step(connection, 1, batch_size=3):
+            steps += 1
+        assert steps == 2
+
+        rows = connection.execute(
+            text('SELECT id, "Count", "Name", "Old" FROM db_1_records ORDER BY id')
+        ).all()
+        status = connection.execute(
+            text("SELECT status, copied_rows FROM schemaversionmodel WHERE version = 2")
+        ).one()
+        tables = connection.execute(
+            text("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+        ).scalars()
+    assert [row[1] for row in rows] == [1, 20, 3, 4, 6, 7, 0]
+    assert [row.id for row in rows] == [1, 2, 3, 4, 6, 7, 8]
+    assert rows[0][2:] == ("row 1", "kept")
+    assert tuple(status) == ("applied", 7)
+    assert set(tables) == {"schemaversionmodel", "quarantinedrowmodel", "db_1_records"}
+
+
+def test_lock_error_leaves_migration_copying(engine: Engine) -> None:
+    with engine.connect() as connection:
+        # Give up on the lock at once rather than after the busy timeout.
+        connection.exec_driver_sql("PRAGMA busy_timeout=0")
+        assert migration_step(connection, 1, batch_size=3) is False  # shadow
+        writer = sqlite3.connect(str(engine.url.database), isolation_level=None)
+        writer.execute("BEGIN IMMEDIATE")
+        with pytest.raises(OperationalError) as raised:
+            migration_step(connection, 1, batch_size=3)
+        assert lock_error(raised.value)
+        writer.execute("ROLLBACK")
+        writer.close()
+        progress = connection.execute(
+            text("SELECT status, last_id FROM schemaversionmodel WHERE version = 2")
+        ).one()
+        assert tuple(progress) == ("copying", 0)
+
+        # The next try carries on from where the migration was.
+        while not migration_step(connection, 1, batch_size=3):
+            pass
+        status = connection.execute(
+            text("SELECT status, copied_rows FROM schemaversionmodel WHERE version = 2")
+        ).one()
+    assert tuple(status) == ("applied", 7)
+
+
+def test_lock_error_keeps_quarantined_rows(engine: Engine) -> None:
+    with engine.connect() as connection:
+        connection.exec_driver_sql("PRAGMA busy_timeout=0")
+        connection.execute(
+            text("UPDATE db_1_records SET \"Count\" = 'three' WHERE id = 3")
+        )
+        connection.commit()
+        assert migration_step(connection, 1, batch_size=3) is False  # shadow
+        assert migration_step(connection, 1, batch_size=3) is False  # rows 1-3
+        writer = sqlite3.connect(str(engine.url.database), isolation_level=None)
+        writer.execute("BEGIN IMMEDIATE")
+        with pytest.raises(OperationalError):
+            migration_step(connection, 1, batch_size=3)
+        writer.execute("ROLLBACK")
+        writer.close()
+        quarantined = connection.execute(select(col(QuarantinedRowModel.row_id))).all()
+        tables = connection.execute(
+            text("SELECT name FROM sqlite_master WHERE name = 'db_1_records_v2'")
+        ).scalars()
+    assert [row.row_id for row in quarantined] == [3]
+    assert list(tables) == ["db_1_records_v2"]
+
+
+def test_conversion_quarantines_rows(engine: Engine) -> None:
+    with engine.connect() as connection:
+        connection.execute(
+            text(
+                "UPDATE db_1_records SET \"Count\" = CASE id WHEN 3 THEN 'three'"
+                " WHEN 6 THEN '6.5' ELSE \"Count\" END"
+            )
+        )
+        connection.commit()
+        assert migration_step(connection, 1, batch_size=3) is False  # shadow
+        assert migration_step(connection, 1, batch_size=3) is False  # rows 1-3
+        migration = SchemaVersionModel.model_validate(
+            connection.execute(
+                select(SchemaVersionModel).where(col(SchemaVersionModel.version) == 2)
+            )
+            .one()
+            ._mapping
+        )
+        applied = connection.execute(
+            select(SchemaVersionModel).where(col(SchemaVersionModel.version) == 1)
+        ).one()
+        progress = migration_progress(migration, applied.fields)
+        assert (progress.copied_rows, progress.quarantined_rows) == (2, 1)
+        assert progress.progress == pytest.approx(3 / 7)
+        assert progress.eta_s is not None and progress.eta_s > 0
+        assert [c.model_dump() for c in progress.conversions] == [
+            {"column": "Count", "from_type": "str", "to_type": "int"}
+        ]
+
+        # Rows written since their batch are converted again.
+        connection.execute(
+            text("UPDATE db_1_records SET \"Count\" = '30' WHERE id = 3")
+        )
+        connection.execute(
+            text("UPDATE db_1_records SET \"Count\" = 'one' WHERE id = 1")
+        )
+        connection.commit()
+        while not migration_step(connection, 1, batch_size=3):
+            pass
+
+        rows = connection.execute(
+            text('SELECT id, "Count" FROM db_1_records ORDER BY id')
+        ).all()
+        quarantined = connection.execute(
+            select(QuarantinedRowModel).order_by(col(QuarantinedRowModel.row_id))
+        ).all()
+        status = connection.execute(
+            text(
+                "SELECT status, quarantined_rows FROM schemaversionmodel WHERE version = 2"
+            )
+        ).one()
+    assert [tuple(row) for row in rows] == [(2, 2), (3, 30), (4, 4), (5, 5), (7, 7)]
+    assert [row.row_id for row in quarantined] == [1, 6]
+    assert quarantined[0].record == {
+        "id": 1,
+        "Count": "one",
+        "Name": "row 1",
+        "Old": "kept",
+    }
+    assert quarantined[1].errors == [
+        {
+            "column": "Count",
+            "expected": "int",
+            "message": "Input should be a valid integer, unable to parse string as an integer",
+            "value": "'6.5'",
+        }
+    ]
+    assert tuple(status) == ("applied", 2)
@@ -0,0 +1,132 @@
+from datetime import date
+from typing import Any
+from sqlalchemy import Engine, create_engine, insert
+from POC.db.models.stock_models.db_models import FieldInfo, RecordQuery
+from POC.gen.compiler import CompiledDb, compile_db
+from POC.gen.query import QueryCache, compile_query
+
+import pytest
+
+
+@pytest.fixture
+def compiled() -> CompiledDb:
+    fields = [
+        ("Name", "str"),
+        ("Price", "float"),
+        ("Stock", "int"),
+        ("Added", "date"),
+        ("Tags", "list"),
+    ]
+    return compile_db(
+        1,
+        1,
+        [
+            FieldInfo(id=i, name=name, data_type=data_type, required=False, default="")
+            for i, (name, data_type) in enumerate(fields, start=1)
+        ],
+    )
+
+
+@pytest.fixture
+def engine(compiled: CompiledDb) -> Engine:
+    engine = create_engine("sqlite://")
+    compiled.table.create(engine)
+    rows = [
+        ("Apple", 1.5, 10, date(2024, 1, 5)),
+        ("Pear", 2.0, None, date(2024, 2, 1)),
+        ("100% juice", 3.25, 4, date(2024, 3, 9)),
+        ("Plum_red", 2.0, 0, None),
+    ]
+    with engine.begin() as connection:
+        connection.execute(
+            insert(compiled.table),
+            [dict(zip(("Name", "Price", "Stock", "Added"), row)) for row in rows],
+        )
+    return engine
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ({}, [1, 2, 3, 4]),
+        ({"where": {"Price": {"gte": 2, "lt": 3.25}}}, [2, 4]),
+        ({"where": {"Stock": {"eq": None}}}, [2]),
+        ({"where": {"Stock": {"ne": 10}}}, [2, 3, 4]),
+        ({"where": {"Name": {"in": ["Pear", "Apple"]}}}, [1, 2]),
+        ({"where": {"Name": {"in": []}}}, []),
+        ({"where": {"Name": {"contains": "P"}}}, [1, 2, 4]),
+        ({"where": {"Name": {"contains": "%"}}}, [3]),
+        ({"where": {"Name": {"contains": "_"}}}, [4]),
+        ({"where": {"Added": {"gt": "2024-01-31"}}}, [2, 3]),
+        ({"sort": ["-Price"]}, [3, 2, 4, 1]),
+        ({"sort": ["Price", "-id"], "limit": 2, "offset": 1}, [4, 2]),
+    ],
+)
+def test_compile_query(
+    compiled: CompiledDb, engine: Engine, query: dict[str, Any], expected: list[int]
+) -> None:
+    statement, params = compile_query(compiled, RecordQuery(**query), QueryCache())
+    with engine.connect() as connection:
+        ids = [row.id for row in connection.execute(statement, params)]
+    assert ids == expected
+
+
+def test_compile_query_projection(compiled: CompiledDb, engine: Engine) -> None:
+    query = RecordQuery.model_validate(
+        {"fields": ["Name"], "where": {"Stock": {"eq": 0}}}
+    )
+    statement, params = compile_query(compiled, query, QueryCache())
+    with engine.connect() as connection:
+        rows = [dict(row._mapping) for row in connection.execute(statement, params)]
+    assert rows == [{"Name": "Plum_red"}]
+
+
+@pytest.mark.parametrize(
+    "query, message",
+    [
+        ({"where": {"Nope": {"eq": 1}}}, "Unknown field 'Nope'"),
+        ({"where": {"Tags": {"eq": "x"}}}, "holds JSON"),
+        ({"where": {"Price": {"contains": "1"}}}, "contains needs a str field"),
+        ({"where": {"Price": {"gt": None}}}, "needs a value"),
+        ({"where": {"Stock": {"eq": "many"}}}, "eq on 'Stock'"),
+        ({"where": {"Added": {"in": ["soon"]}}}, "in on 'Added'"),
+        ({"sort": ["-Nope"]}, "Unknown field 'Nope'"),
+        ({"fields": ["Name", "Nope"]}, "Unknown fields: Nope"),
+        ({"fields": []}, "at least one field"),
+    ],
+)
+def test_compile_query_checks(
+    compiled: CompiledDb, query: dict[str, Any], message: str
+) -> None:
+    with pytest.raises(ValueError, match=message):
+        compile_query(compiled, RecordQuery(**query), QueryCache())
+
+
+def test_query_cache(compiled: CompiledDb) -> None:
+    cache = QueryCache(maxsize=2)
+
+    def query(**fields: Any) -> RecordQuery:
+        return RecordQuery.model_validate(fields)
+
+    first, params = compile_query(compiled, query(where={"Stock": {"gt": 1}}), cache)
+    # Other values and pages reuse the statement; other operators do not.
+    again, other = compile_query(
+        compiled, query(where={"Stock": {"gt": 5}}, limit=5), cache
+    )
+    assert again is first
+    assert (params["p0"], other["p0"], other["limit"]) == (1, 5, 5)
+    compile_query(compiled, query(where={"Stock": {"gte": 1}}), cache)
+    compile_query(compiled, query(where={"Stock": {"eq": None}}), cache)
+    assert cache.stats() == {
+        "size": 2,
+        "maxsize": 2,
+        "hits": 1,
+        "misses": 3,
+        "evictions": 1,
+        "hit_ratio": 0.25,
+    }
+
+    # Another table with the same id and version gets a statement of its own.
+    compile_query(compiled, RecordQuery(), cache)
+    statement, _ = compile_query(compile_db(1, 1, []), RecordQuery(), cache)
+    assert statement.selected_columns.keys() == ["id"]
@@ -0,0 +1,274 @@
+import asyncio
+import csv
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime as dt
+from email import message_from_bytes, policy
+from email.message import EmailMessage
+from pathlib import Path
+from typing import Any
+from aiosmtpd.controller import Controller
+from openpyxl import load_workbook
+from sqlalchemy import create_engine, insert
+from POC.core.config import Settings
+from POC.db.database import Database
+from POC.db.models.stock_models.db_models import FieldInfo, ReportForm, ReportModel
+from POC.gen.compiler import compile_db
+from POC.reports.runner import Delivery, ReportJob, report_statement, run_report
+from POC.reports.schedule import catch_up, next_run
+from POC.reports.scheduler import ReportMetrics, ReportScheduler
+
+import pytest
+
+
+def report(**values: Any) -> ReportForm:
+    return ReportForm(name="Sales", db_id=1, **values)
+
+
+@pytest.mark.parametrize(
+    "values, after, expected",
+    [
+        ({"schedule": "manual"}, "2024-05-01 10:00", None),
+        ({"schedule": "real_time"}, "2024-05-01 10:00", "2024-05-01 10:01"),
+        ({"schedule": "daily", "at": "9:30"}, "2024-05-01 09:00", "2024-05-01 09:30"),
+        ({"schedule": "daily", "at": "09:30"}, "2024-05-01 09:30", "2024-05-02 09:30"),
+        # 2024-05-03 is a Friday.
+        ({"schedule": "daily", "days": "M,T,W,Th,F"}, "2024-05-03 01:00", "2024-05-06 00:00"),
+        ({"schedule": "weekly"}, "2024-05-01 00:00", "2024-05-06 00:00"),
+        ({"schedule": "weekly", "days": "Su"}, "2024-05-05 00:00", "2024-05-12 00:00"),
+        ({"schedule": "monthly", "day": 31}, "2024-05-31 00:00", "2024-06-30 00:00"),
+        ({"schedule": "yearly", "month": 2, "day": 29}, "2024-03-01 00:00", "2025-02-28 00:00"),
+    ],
+)  # fmt: skip
+def test_next_run(values: dict[str, Any], after: str, expected: str | None) -> None:
+    result = next_run(report(**values), dt.fromisoformat(after), 60)
+    assert result == (dt.fromisoformat(expected) if expected else None)
+
+
+def test_catch_up() -> None:
+    daily = report(schedule="daily", at="06:00")
+    due, now = dt(2024, 5, 1, 6), dt(2024, 5, 4, 12)
+    assert catch_up(daily, due, now, 60) == (dt(2024, 5, 4, 6), 3, dt(2024, 5, 5, 6))
+    assert catch_up(daily, due, due, 60) == (due, 0, dt(2024, 5, 2, 6))
+
+
+def test_report_form_checks() -> None:
+    assert report(at="7:05", days="M, F").at == "07:05"
+    assert report(days="M, F").days == "M,F"
+    for values in ({"schedule": "hourly"}, {"output": "pdf"}, {"at": "24:00"}):
+        with pytest.raises(ValueError):
+            report(**values)
+    with pytest.raises(ValueError, match="not Mo"):
+        report(days="Mo")
+
+
+@pytest.fixture
+def sales(tmp_path: Path) -> tuple[str, str]:
+    fields = [
+        FieldInfo(id=1, name="Region", data_type="str", required=False, default=""),
+        FieldInfo(id=2, name="Amount", data_type="float", required=False, default=""),
+    ]
+    compiled = compile_db(1, 1, fields)
+    url = f"sqlite:///{tmp_path / 'sales.sqlite3'}"
+    engine = create_engine(url)
+    compiled.table.create(engine)
+    with engine.begin() as connection:
+        connection.execute(
+            insert(compiled.table),
+            [
+                {"Region": region, "Amount": amount}
+                for region, amount in (("North", 2), ("South", 5), ("North", 3))
+            ],
+        )
+    engine.dispose()
+    return url, compiled.table.name
+
+
+def test_report_statement() -> None:
+    table = compile_db(
+        1,
+        1,
+        [FieldInfo(name="Amount", data_type="float", required=False, default="")],
+    ).table
+    assert "GROUP BY" not in str(report_statement(table, ["Amount"], [], []))
+    for group_by, aggregates in (
+        (["Nope"], []),
+        ([], ["median:Amount"]),
+        ([], ["sum"]),
+    ):
+        with pytest.raises(ValueError):
+            report_statement(table, [], group_by, aggregates)
+
+
+@pytest.mark.parametrize("output", ["csv", "xlsx"])
+def test_run_report(sales: tuple[str, str], tmp_path: Path, output: str) -> None:
+    url, table = sales
+    path = tmp_path / "out" / f"sales.{output}"
+    job = ReportJob(
+        1, "Sales", url, table, ("Region", "Amount"), (), (), output, str(path)
+    )
+    result = run_report(job)
+    assert (result.rows, result.path, result.emailed) == (3, str(path), False)
+    assert result.bytes == path.stat().st_size
+    if output == "csv":
+        rows = list(csv.reader(path.open()))
+    else:
+        rows = list(load_workbook(path).active.values)  # type: ignore[union-attr]
+    assert list(rows[0]) == ["Region", "Amount"]
+    assert [(region, float(amount)) for region, amount in rows[1:]] == [
+        ("North", 2.0),
+        ("South", 5.0),
+        ("North", 3.0),
+    ]
+    assert list(path.parent.iterdir()) == [path]
+
+
+class Inbox:
+    def __init__(self) -> None:
+        self.messages: list[tuple[list[str], bytes]] = []
+
+    async def handle_DATA(self, server: Any, session: Any, envelope: Any) -> str:
+        self.messages.append((envelope.rcpt_tos, envelope.content))
+        return "250 OK"
+
+
+def test_run_report_sends_email(sales: tuple[str, str], tmp_path: Path) -> None:
+    url, table = sales
+    inbox = Inbox()
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    controller = Controller(inbox, hostname="127.0.0.1", port=port)
+    controller.start()
+    try:
+        delivery = Delivery(
+            "127.0.0.1",
+            port,
+            "reports@example.com",
+            ("to@example.com",),
+            ("cc@example.com",),
+            ("bcc@example.com",),
+        )
+        job = ReportJob(
+            1,
+            "Sales",
+            url,
+            table,
+            (),
+            ("Region",),
+            ("count",),
+            "csv",
+            str(tmp_path / "sales.csv"),
+            delivery,
+        )
+        assert run_report(job).emailed
+    finally:
+        controller.stop()
+    [(recipients, content)] = inbox.messages
+    assert recipients == ["to@example.com", "cc@example.com", "bcc@example.com"]
+    message = message_from_bytes(content, policy=policy.default)
+    assert (message["To"], message["Cc"], message["Bcc"]) == (
+        "to@example.com",
+        "cc@example.com",
+        None,
+    )
+    assert isinstance(message, EmailMessage)
+    [attachment] = list(message.iter_attachments())
+    assert attachment.get_filename() == "sales.csv"
+    assert (
+        attachment.get_payload(decode=True) == b"Region,count\r\nNorth,2\r\nSouth,1\r\n"
+    )
+
+
+def test_scheduler_catches_up(sales: tuple[str, str], tmp_path: Path) -> None:
+    url, _ = sales
+    settings = Settings(database_url=url, report_workers=1, report_concurrency=1)
+    metrics = ReportMetrics()
+
+    async def scenario() -> list[Any]:
+        database = Database(settings)
+        scheduler = ReportScheduler(settings, database, metrics)
+        try:
+            async with database.session() as session:
+                await database.prepare()
+                for name, next_run_at in (
+                    ("Daily", dt(2024, 5, 1, 6)),
+                    ("Later", dt(2024, 5, 5, 6)),
+                ):
+                    session.add(
+                        ReportModel(
+                            name=name,
+                            db_id=1,
+                            schedule="daily",
+                            at="06:00",
+                            next_run_at=next_run_at,
+                        )
+                    )
+                await session.commit()
+            now = dt(2024, 5, 4, 12)
+            tasks = await scheduler.run_due(now)
+            # Already moved on, so the next tick does not run it again.
+            assert await scheduler.run_due(now) == []
+            runs = await asyncio.gather(*tasks)
+            async with database.session() as session:
+                daily = await session.get(ReportModel, 1)
+            assert daily is not None and daily.next_run_at == dt(2024, 5, 5, 6)
+            return runs
+        finally:
+            await scheduler.close()
+            await database.dispose()
+
+    # Three missed days, and the fourth, make one run.
+    runs = asyncio.run(scenario())
+    assert [(r.report_id, r.status, r.missed) for r in runs] == [(1, "succeeded", 3)]
+    assert runs[0].scheduled_for == dt(2024, 5, 4, 6)
+    assert Path(runs[0].path).parent == tmp_path / "reports"
+    assert 'dynamic_db_report_runs_total{report="1",status="succeeded"} 1' in (
+        metrics.render()
+    )
+
+
+def test_timed_out_run_blocks_the_next(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    release = threading.Event()
+
+    def stuck(job: ReportJob) -> None:
+        release.wait(10)
+
+    monkeypatch.setattr("POC.reports.scheduler.run_report", stuck)
+    settings = Settings(
+        database_url=f"sqlite:///{tmp_path / 'reports.sqlite3'}",
+        report_timeout_s=0.05,
+    )
+
+    async def scenario() -> None:
+        database = Database(settings)
+        scheduler = ReportScheduler(settings, database, ReportMetrics())
+        # A thread stands in for the worker process, which is as unstoppable.
+        scheduler._pool = ThreadPoolExecutor(1)
+        try:
+            await database.prepare()
+            async with database.session() as session:
+                sales = ReportModel(name="Sales", db_id=1)
+                session.add(sales)
+                await session.commit()
+            run = await scheduler.run(sales)
+            assert (run.status, run.error) == ("failed", "TimeoutError")
+            # The worker still holds the report: no second run overlaps it.
+            assert scheduler.is_running(1)
+            with pytest.raises(ValueError, match="already running"):
+                await scheduler.run(sales)
+            release.set()
+            for _ in range(100):
+                if not scheduler.is_running(1):
+                    break
+                await asyncio.sleep(0.01)
+            assert not scheduler.is_running(1)
+        finally:
+            release.set()
+            await scheduler.close()
+            await database.dispose()
+
+    asyncio.run(scenario())
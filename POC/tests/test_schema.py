@@ -0,0 +1,38 @@
+from sqlalchemy import create_engine, inspect, text
+from POC.db.models.stock_models.db_models import FieldInfoModel
+from POC.db.schema import sync_table
+
+
+def test_sync_table_upgrades_existing_table() -> None:
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "CREATE TABLE fieldinfomodel (id INTEGER PRIMARY KEY,"
+                " name VARCHAR NOT NULL, data_type VARCHAR NOT NULL,"
+                ' required BOOLEAN NOT NULL, "default" VARCHAR NOT NULL,'
+                " db_id INTEGER, created_at DATETIME NOT NULL,"
+                " updated_at DATETIME NOT NULL, is_active BOOLEAN NOT NULL)"
+            )
+        )
+        connection.execute(
+            text(
+                "INSERT INTO fieldinfomodel VALUES"
+                " (1, 'a', 'str', 1, '', 1, '2024-01-01', '2024-01-01', 1)"
+            )
+        )
+        connection.execute(
+            text("CREATE INDEX ix_fieldinfomodel_old ON fieldinfomodel (name)")
+        )
+
+        sync_table(connection, FieldInfoModel.__table__)  # type: ignore[attr-defined]
+
+        row = connection.execute(text('SELECT indexed, "unique" FROM fieldinfomodel'))
+        assert tuple(row.one()) == (0, 0)
+        indexes = {
+            index["name"] for index in inspect(connection).get_indexes("fieldinfomodel")
+        }
+        assert indexes == {
+            "ix_fieldinfomodel_db_id_is_active",
+            "ix_fieldinfomodel_updated_at_id",
+        }
@@ -0,0 +1,96 @@
+from pathlib import Path
+from sqlalchemy import Connection, create_engine, insert, select, text, update
+from sqlmodel import SQLModel
+from POC.db.models.stock_models.db_models import FieldInfo, SearchPauseModel
+from POC.gen.compiler import CompiledDb, compile_db
+from POC.gen.search import (
+    highlighted,
+    index_rows,
+    match_query,
+    pause_triggers,
+    resume_triggers,
+    search_statement,
+    sync_search,
+)
+
+import pytest
+
+
+def compiled(*searchable: str) -> CompiledDb:
+    return compile_db(
+        1,
+        1,
+        [
+            FieldInfo(
+                id=i,
+                name=name,
+                data_type="str",
+                required=False,
+                default="",
+                searchable=name in searchable,
+            )
+            for i, name in enumerate(("Title", "Body"), start=1)
+        ],
+    )
+
+
+def found(connection: Connection, db: CompiledDb, q: str) -> list[int]:
+    rows = connection.execute(search_statement(db, q, 10, None)).all()
+    return [row.id for row in rows]
+
+
+@pytest.mark.parametrize(
+    "q, expected",
+    [
+        ("red fox", '"red" "fox"*'),
+        ('say "hi" OR', '"say" """hi""" "OR"*'),
+        ("   ", ""),
+    ],
+)
+def test_match_query(q: str, expected: str) -> None:
+    assert match_query(q) == expected
+
+
+def test_search_sync(tmp_path: Path) -> None:
+    engine = create_engine(f"sqlite:///{tmp_path / 'search.sqlite3'}")
+    SQLModel.metadata.create_all(engine, tables=[SearchPauseModel.__table__])  # type: ignore[attr-defined]
+    title = compiled("Title")
+    title.table.create(engine)
+    with engine.begin() as connection:
+        records = title.table
+        connection.execute(insert(records), [{"Title": "Red fox", "Body": "Cafe"}])
+        sync_search(connection, title)
+        # Existing records are indexed; the triggers follow later writes.
+        connection.execute(insert(records), [{"Title": "Brown bear", "Body": "x"}])
+        assert found(connection, title, "re") == [1]
+        assert found(connection, title, "bear") == [2]
+        connection.execute(update(records).where(records.c.id == 1).values(Title="Owl"))
+        assert found(connection, title, "fox") == []
+        connection.execute(records.delete().where(records.c.id == 2))
+        assert found(connection, title, "bear") == []
+
+        # While paused, rows are left for index_rows to add in one statement.
+        connection.execute(pause_triggers(title))
+        statement = insert(records).returning(records.c.id)
+        rows = [{"Title": "Red deer"}, {"Title": "Red"}]
+        deer, red = connection.execute(statement, rows).scalars().all()
+        connection.execute(resume_triggers(title))
+        assert found(connection, title, "red") == []
+        connection.execute(index_rows(title), {"first": deer, "last": red})
+        assert found(connection, title, "red") == [red, deer]
+
+        both = compiled("Title", "Body")
+        sync_search(connection, both)
+        sync_search(connection, both)
+        assert found(connection, both, "café") == [1]
+        row = connection.execute(search_statement(both, "owl", 10, None)).one()
+        assert [highlighted(value) for value in row[-2:]] == [
+            "<mark>Owl</mark>",
+            "Cafe",
+        ]
+
+        sync_search(connection, compiled())
+        names = connection.execute(
+            select(text("name")).select_from(text("sqlite_master"))
+        ).scalars()
+        assert not [name for name in names if name.startswith("db_1_search")]
@@ -0,0 +1,46 @@
+import sqlite3
+from pathlib import Path
+from sqlalchemy import create_engine, text
+from POC.db.storage import (
+    STORAGE_PROFILES,
+    apply_storage_profile,
+    backup_database,
+    sqlite_path,
+)
+
+
+def test_tuned_profile_applies_on_connect(tmp_path: Path) -> None:
+    engine = create_engine(f"sqlite:///{tmp_path / 'tuned.sqlite3'}")
+    apply_storage_profile(engine, STORAGE_PROFILES["tuned"])
+    with engine.connect() as connection:
+
+        def pragma(name: str) -> object:
+            return connection.execute(text(f"PRAGMA {name}")).scalar()
+
+        assert pragma("journal_mode") == "wal"
+        assert (pragma("synchronous"), pragma("foreign_keys")) == (1, 1)
+        assert (pragma("cache_size"), pragma("busy_timeout")) == (-65536, 5000)
+    assert STORAGE_PROFILES["default"].pragmas() == []
+
+
+def test_sqlite_path() -> None:
+    assert sqlite_path("sqlite:///data/db.sqlite3") == Path("data/db.sqlite3")
+    assert sqlite_path("sqlite://") is None
+    assert sqlite_path("sqlite:///:memory:") is None
+
+
+def test_backup_database_in_steps(tmp_path: Path) -> None:
+    source = tmp_path / "source.sqlite3"
+    with sqlite3.connect(source) as connection:
+        connection.execute("PRAGMA journal_mode=wal")
+        connection.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, body TEXT)")
+        connection.executemany("INSERT INTO t (body) VALUES (?)", [("x" * 1000,)] * 200)
+    connection.close()
+    snapshots = [
+        backup_database(source, tmp_path / "backups", 8, 0.0, keep=2) for _ in range(3)
+    ]
+    assert snapshots[-1].pages > 8
+    assert sorted((tmp_path / "backups").iterdir()) == [s.path for s in snapshots[1:]]
+    with sqlite3.connect(snapshots[-1].path) as copy:
+        assert copy.execute("SELECT count(*) FROM t").fetchone() == (200,)
+    copy.close()
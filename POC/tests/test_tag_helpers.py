@@ -0,0 +1,36 @@
+from POC.helpers.tag_helpers import TagIndex
+
+import pytest
+
+
+@pytest.fixture
+def index() -> TagIndex:
+    index = TagIndex()
+    index.load(["Finance", "Fin", "Human Resources", "Refinery", "Fish", "fish"])
+    return index
+
+
+@pytest.mark.parametrize(
+    "q, expected",
+    [
+        ("fin", ["Fin", "Finance", "Refinery"]),
+        # Tags that differ only in case are both kept.
+        ("FI", ["Fin", "Finance", "Fish", "fish"]),
+        ("res", ["Human Resources"]),
+        ("urce", ["Human Resources"]),
+        ("zzz", []),
+        ("", ["Fin", "Finance", "Fish", "fish", "Human Resources", "Refinery"]),
+    ],
+)
+def test_tag_index_search(index: TagIndex, q: str, expected: list[str]) -> None:
+    assert index.search(q) == expected
+
+
+def test_tag_index_limit_and_add(index: TagIndex) -> None:
+    assert index.search("f", limit=2) == ["Fin", "Finance"]
+    index.add("Fa")
+    assert index.search("f", limit=2) == ["Fa", "Fin"]
+    index.add("Fa")
+    index.add("FA")
+    assert index.search("fa") == ["FA", "Fa"]
+    assert len(index) == 8
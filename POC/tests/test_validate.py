@@ -0,0 +1,86 @@
+import asyncio
+from datetime import date, time
+from typing import Any
+from POC.db.models.stock_models.db_models import FieldInfo
+from POC.gen.compiler import CompiledDb, compile_db
+from POC.gen.validate import PARALLEL_MIN_ROWS, ValidationPool, validate_columns
+
+import pytest
+
+
+@pytest.fixture
+def compiled() -> CompiledDb:
+    fields = [
+        ("Name", "str", True, ""),
+        ("Count", "int", False, "7"),
+        ("Price", "float", False, ""),
+        ("Active", "bool", False, "false"),
+        ("Day", "date", False, ""),
+        ("At", "time", False, ""),
+        ("Tags", "list", False, ""),
+        ("Total", "float", False, ""),
+    ]
+    infos = [
+        FieldInfo(
+            id=i,
+            name=name,
+            data_type=data_type,
+            required=required,
+            default=default,
+            # pow has no SQL form, so Total is stored.
+            expression="pow(Count, 2)" if name == "Total" else None,
+        )
+        for i, (name, data_type, required, default) in enumerate(fields, start=1)
+    ]
+    return compile_db(1, 1, infos)
+
+
+ROWS: list[dict[str, Any]] = [
+    {"Name": "a", "Count": "3", "Price": "1.5", "Active": "yes", "Day": "2024-01-02"},
+    {"Name": 12, "At": "10:30", "Tags": '["x"]', "Extra": "ignored"},
+    {"Name": "b", "Count": "many", "Day": "someday"},
+    {"Count": 1},
+    {"Name": None},
+    {"Name": "c", "Price": None, "Tags": "not json"},
+]
+
+
+def test_validate_columns_matches_validate_many(compiled: CompiledDb) -> None:
+    valid, errors = validate_columns(compiled.inputs, ROWS)
+    expected, invalid = compiled.validate_many(ROWS)
+    valid = compiled.compute_many(valid)
+    assert valid == expected
+    assert sorted({error.index for error in errors}) == sorted(invalid)
+
+    assert valid[0]["Active"] is True and valid[0]["Day"] == date(2024, 1, 2)
+    assert (valid[1]["Name"], valid[1]["Count"], valid[1]["At"]) == (
+        "12",
+        7,
+        time(10, 30),
+    )
+    assert valid[1]["Tags"] == ["x"] and "Extra" not in valid[1]
+    assert valid[0]["Total"] == 9
+
+
+def test_validate_columns_errors(compiled: CompiledDb) -> None:
+    _, errors = validate_columns(compiled.inputs, ROWS)
+    found = [(e.index, e.column, e.expected, e.value) for e in errors]
+    assert found == [
+        (2, "Count", "int", "'many'"),
+        (2, "Day", "date", "'someday'"),
+        (3, "Name", "str", ""),
+        (4, "Name", "str", "None"),
+        (5, "Tags", "list", "'not json'"),
+    ]
+    assert errors[2].message == "Field required"
+
+
+def test_validation_pool(compiled: CompiledDb) -> None:
+    rows = ROWS * (PARALLEL_MIN_ROWS // len(ROWS) + 1)
+    pool = ValidationPool(1)
+    try:
+        valid, errors = asyncio.run(pool.validate(compiled.inputs, rows))
+    finally:
+        pool.close()
+    assert (valid, errors) == validate_columns(compiled.inputs, rows)
+    assert len(valid) == len(rows) // 3
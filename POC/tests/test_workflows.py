@@ -0,0 +1,198 @@
+import asyncio
+import socket
+import time
+from datetime import datetime as dt, timedelta
+from email import message_from_bytes, policy
+from email.message import EmailMessage
+from pathlib import Path
+from typing import Any
+from aiosmtpd.controller import Controller
+from sqlmodel import select
+from POC.core.config import Settings
+from POC.db.database import Database
+from POC.db.models.stock_models.db_models import (
+    EventModel,
+    NotificationModel,
+    TriggerModel,
+)
+from POC.workflows import engine as engine_module
+from POC.workflows.engine import WorkflowEngine, matches
+from POC.workflows.queue import claim, enqueue, fail, finish, prune
+
+import pytest
+
+
+@pytest.fixture
+def settings(tmp_path: Path) -> Settings:
+    return Settings(
+        database_url=f"sqlite:///{tmp_path / 'queue.sqlite3'}",
+        workflow_poll_s=0,
+        workflow_batch_size=3,
+        workflow_retry_s=10,
+        workflow_max_attempts=2,
+    )
+
+
+def test_claim_leases_and_retries(settings: Settings) -> None:
+    async def scenario() -> None:
+        database = Database(settings)
+        await database.prepare()
+        try:
+            async with database.session() as session:
+                for record_id in range(1, 6):
+                    enqueue(session, 1, "created", [record_id])
+                await session.commit()
+                now = dt.now() + timedelta(seconds=1)
+                first = await claim(session, 3, 60, now)
+                second = await claim(session, 3, 60, now)
+                assert [e.record_ids for e in first] == [[1], [2], [3]]
+                assert [e.record_ids for e in second] == [[4], [5]]
+                assert {e.status for e in first} == {"processing"}
+                # Everything is leased; nothing more until a lease runs out.
+                assert await claim(session, 3, 60, now) == []
+
+                await finish(session, [e.id for e in first if e.id], now)
+                await fail(session, second[0], "busy", now + timedelta(seconds=5), now)
+                await session.commit()
+                later = now + timedelta(seconds=61)
+                again = await claim(session, 3, 60, later)
+                # The retried event, and the one whose lease ran out.
+                assert [(e.record_ids, e.attempts) for e in again] == [
+                    ([4], 2),
+                    ([5], 2),
+                ]
+                assert await prune(session, later) == 3
+                with pytest.raises(ValueError):
+                    enqueue(session, 1, "renamed", [1])
+        finally:
+            await database.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_trigger_matches() -> None:
+    trigger = TriggerModel(name="t", db_id=1, event="updated", field="Done", value=True)
+    assert matches(trigger, {"Done": True})
+    assert matches(trigger, {"Done": "true"})
+    assert not matches(trigger, {"Done": False})
+    assert matches(TriggerModel(name="t", db_id=1, event="updated"), {})
+
+
+class Inbox:
+    def __init__(self) -> None:
+        self.messages: list[tuple[list[str], bytes]] = []
+
+    async def handle_DATA(self, server: Any, session: Any, envelope: Any) -> str:
+        self.messages.append((envelope.rcpt_tos, envelope.content))
+        return "250 OK"
+
+
+def test_concurrent_deliveries_send_each_email_once(
+    settings: Settings, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    sends: list[list[str]] = []
+
+    def send_digest(
+        settings: Settings, recipients: list[str], messages: list[str]
+    ) -> None:
+        # Slow enough for the other delivery to run in the meantime.
+        time.sleep(0.2)
+        sends.append(messages)
+
+    monkeypatch.setattr(engine_module, "send_digest", send_digest)
+
+    async def scenario() -> None:
+        database = Database(settings)
+        engines = [WorkflowEngine(settings, database) for _ in range(2)]
+        await database.prepare()
+        try:
+            async with database.session() as session:
+                for n in range(4):
+                    session.add(
+                        NotificationModel(
+                            db_id=1,
+                            channel="email",
+                            message=f"Record {n} deleted",
+                            recipients=f"{n % 2}@example.com",
+                        )
+                    )
+                await session.commit()
+            counts = await asyncio.gather(*(e.deliver() for e in engines))
+            assert sorted(counts) == [0, 4]
+            async with database.session() as session:
+                notifications = (await session.exec(select(NotificationModel))).all()
+                assert all(n.sent_at for n in notifications)
+                assert not any(n.locked_until for n in notifications)
+        finally:
+            await database.dispose()
+
+    asyncio.run(scenario())
+    assert sorted(sends) == [
+        ["Record 0 deleted", "Record 2 deleted"],
+        ["Record 1 deleted", "Record 3 deleted"],
+    ]
+
+
+def test_failed_events_and_email_digest(settings: Settings) -> None:
+    inbox = Inbox()
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    settings = settings.model_copy(update={"smtp_host": "127.0.0.1", "smtp_port": port})
+    controller = Controller(inbox, hostname="127.0.0.1", port=port)
+
+    async def scenario() -> list[EventModel]:
+        database = Database(settings)
+        engine = WorkflowEngine(settings, database)
+        await database.prepare()
+        try:
+            async with database.session() as session:
+                session.add(
+                    TriggerModel(
+                        name="Gone",
+                        db_id=1,
+                        event="deleted",
+                        notify=["toast", "email"],
+                        email_to="a@example.com, b@example.com",
+                    )
+                )
+                events = [
+                    enqueue(session, 1, "deleted", [n], {"rows": [{"id": n}]})
+                    for n in (1, 2)
+                ]
+                # No database 2: fails for good, without holding up the rest.
+                events.append(enqueue(session, 2, "transition", [1], {}))
+                await session.commit()
+            assert await engine.drain() == 3
+            assert await engine.drain() == 0
+            async with database.session() as session:
+                notifications = await session.exec(select(NotificationModel))
+                assert len(notifications.all()) == 4
+                return [
+                    event
+                    for event in [await session.get(EventModel, e.id) for e in events]
+                    if event is not None
+                ]
+        finally:
+            await database.dispose()
+
+    controller.start()
+    try:
+        events = asyncio.run(scenario())
+    finally:
+        controller.stop()
+    assert [(e.status, e.error) for e in events] == [
+        ("done", None),
+        ("done", None),
+        ("failed", "Database 2 not found"),
+    ]
+    # Both deletes in one message to the one recipient list.
+    [(recipients, content)] = inbox.messages
+    assert recipients == ["a@example.com", "b@example.com"]
+    message = message_from_bytes(content, policy=policy.default)
+    assert message["Subject"] == "2 workflow notifications"
+    assert isinstance(message, EmailMessage)
+    assert message.get_content().splitlines() == [
+        "Record 1 deleted",
+        "Record 2 deleted",
+    ]
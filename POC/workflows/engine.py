@@ -0,0 +1,490 @@
+"""Applies workflows and triggers to record changes, off the request path.
+
+A request that changes records writes one event to the queue and returns;
+how many triggers fire only changes how long the background workers take.
+Each worker claims a batch of events and applies all of it in one
+transaction: it moves records between workflows, sets their auto-change
+and timestamp fields, and writes toast and email notifications. Emails
+are an outbox: they are sent after the commit, one message per recipient
+list for everything a batch produced.
+"""
+
+import asyncio
+import logging
+import smtplib
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime as dt, timedelta
+from email.message import EmailMessage
+from typing import Any, Iterator, Sequence
+from fastapi import Request
+from sqlalchemy import delete, insert, update
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from POC.core.config import Settings
+from POC.db.database import Database
+from POC.db.models.stock_models.db_models import (
+    EventModel,
+    NotificationModel,
+    RecordWorkflowModel,
+    TriggerModel,
+    WorkflowModel,
+)
+from POC.gen.compiler import CompiledDb
+from POC.helpers.db_helpers import generate_db
+from POC.workflows.queue import claim, claim_emails, fail, finish, prune
+
+logger = logging.getLogger("POC.workflows")
+
+# Unsent emails delivered per pass of the outbox.
+EMAIL_BATCH = 500
+# Record ids per IN (...) list, well under SQLite's limit on parameters.
+IN_LIST_SIZE = 5000
+
+
+@dataclass
+class Rules:
+    """The active workflows and triggers of the databases in a batch."""
+
+    workflows: dict[int, WorkflowModel] = field(default_factory=dict)
+    by_name: dict[tuple[int, str], WorkflowModel] = field(default_factory=dict)
+    defaults: dict[int, WorkflowModel] = field(default_factory=dict)
+    triggers: dict[tuple[int, str], list[TriggerModel]] = field(
+        default_factory=lambda: defaultdict(list)
+    )
+
+    @classmethod
+    async def load(cls, session: AsyncSession, db_ids: set[int]) -> "Rules":
+        rules = cls()
+        workflows = await session.exec(
+            select(WorkflowModel)
+            .where(col(WorkflowModel.db_id).in_(db_ids), col(WorkflowModel.is_active))
+            .order_by(col(WorkflowModel.id))
+        )
+        for workflow in workflows:
+            assert workflow.id is not None
+            rules.workflows[workflow.id] = workflow
+            rules.by_name.setdefault((workflow.db_id, workflow.name), workflow)
+            if workflow.is_default:
+                rules.defaults.setdefault(workflow.db_id, workflow)
+        triggers = await session.exec(
+            select(TriggerModel)
+            .where(col(TriggerModel.db_id).in_(db_ids), col(TriggerModel.is_active))
+            .order_by(col(TriggerModel.id))
+        )
+        for trigger in triggers:
+            rules.triggers[(trigger.db_id, trigger.event)].append(trigger)
+        return rules
+
+
+def matches(trigger: TriggerModel, row: dict[str, Any]) -> bool:
+    if trigger.field is None:
+        return True
+    # Values compare as text, so "5" matches 5 and true matches "True".
+    return str(row.get(trigger.field)).lower() == str(trigger.value).lower()
+
+
+def _addresses(value: str) -> list[str]:
+    return [address.strip() for address in value.split(",") if address.strip()]
+
+
+def _chunks(ids: Sequence[int], size: int = IN_LIST_SIZE) -> Iterator[Sequence[int]]:
+    for start in range(0, len(ids), size):
+        yield ids[start : start + size]
+
+
+@dataclass
+class Batch:
+    """Applies a batch of events in one transaction.
+
+    The records the batch touches, and the workflows they are in, are read
+    up front, a query or two per database, and its notifications are
+    written in one statement at the end.
+    """
+
+    session: AsyncSession
+    rules: Rules
+    compiled: dict[int, CompiledDb]
+    now: dt
+    rows: dict[int, dict[int, dict[str, Any]]] = field(default_factory=dict)
+    states: dict[int, dict[int, RecordWorkflowModel]] = field(default_factory=dict)
+    notifications: list[dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def emails(self) -> int:
+        return sum(n["channel"] == "email" for n in self.notifications)
+
+    async def load(self, events: Sequence[EventModel]) -> None:
+        wanted: dict[int, set[int]] = defaultdict(set)
+        for event in events:
+            if event.kind != "deleted" and event.db_id in self.compiled:
+                wanted[event.db_id].update(event.record_ids)
+        for db_id, ids in wanted.items():
+            table = self.compiled[db_id].table
+            rows: dict[int, dict[str, Any]] = {}
+            states: dict[int, RecordWorkflowModel] = {}
+            self.rows[db_id], self.states[db_id] = rows, states
+            for chunk in _chunks(sorted(ids)):
+                result = await self.session.execute(
+                    table.select().where(table.c.id.in_(chunk))
+                )
+                rows.update((row.id, dict(row._mapping)) for row in result)
+                found = await self.session.exec(
+                    select(RecordWorkflowModel).where(
+                        col(RecordWorkflowModel.db_id) == db_id,
+                        col(RecordWorkflowModel.record_id).in_(chunk),
+                    )
+                )
+                states.update((state.record_id, state) for state in found)
+
+    async def save(self) -> None:
+        if self.notifications:
+            await self.session.execute(insert(NotificationModel), self.notifications)
+
+    def notify(
+        self,
+        channels: Sequence[str],
+        db_id: int,
+        record_id: int | None,
+        message: str,
+        email_to: str,
+    ) -> None:
+        for channel in channels:
+            recipients = ",".join(_addresses(email_to)) if channel == "email" else ""
+            if channel == "email" and not recipients:
+                continue
+            self.notifications.append(
+                {
+                    "db_id": db_id,
+                    "record_id": record_id,
+                    "channel": channel,
+                    "message": message,
+                    "recipients": recipients,
+                    "created_at": self.now,
+                    "sent_at": None,
+                    "read": False,
+                }
+            )
+
+    async def enter(
+        self,
+        compiled: CompiledDb,
+        row: dict[str, Any],
+        target: WorkflowModel,
+        strict: bool,
+    ) -> bool:
+        """Move the record into ``target``. A move the workflows do not
+        allow raises ValueError when ``strict``; otherwise it is skipped."""
+        record_id = row["id"]
+        states = self.states[compiled.db_id]
+        state = states.get(record_id)
+        current = None if state is None else self.rules.workflows.get(state.workflow_id)
+        if current is not None and current.id == target.id:
+            return False
+        problem = None
+        if (
+            current is not None
+            and current.next_workflows
+            and target.name not in current.next_workflows
+        ):
+            problem = f"{current.name} cannot move on to {target.name}"
+        else:
+            missing = [
+                name for name in target.required_fields if row.get(name) in (None, "")
+            ]
+            if missing:
+                problem = f"{target.name} requires {', '.join(missing)}"
+        if problem is not None:
+            if strict:
+                raise ValueError(f"Record {record_id}: {problem}")
+            logger.info(
+                "record %s of database %s: %s", record_id, compiled.db_id, problem
+            )
+            return False
+
+        changes = dict(target.auto_change)
+        if target.timestamp_field:
+            changes[target.timestamp_field] = self.now
+        if changes:
+            generated = {f.column for f in compiled.computed if f.generated}
+            unknown = [
+                n for n in changes if n not in compiled.table.c or n in generated
+            ]
+            if unknown:
+                raise ValueError(f"{target.name} cannot set {', '.join(unknown)}")
+            values = compiled.validate({**row, **changes})
+            # Stored computed fields follow the fields they are computed from.
+            stored = [f.column for f in compiled.computed if not f.generated]
+            values = {name: values[name] for name in [*changes, *stored]}
+            table = compiled.table
+            await self.session.execute(
+                update(table).where(table.c.id == record_id).values(values)
+            )
+            row.update(values)
+
+        assert target.id is not None
+        if state is None:
+            state = states[record_id] = RecordWorkflowModel(
+                db_id=compiled.db_id, record_id=record_id, workflow_id=target.id
+            )
+            self.session.add(state)
+        state.workflow_id = target.id
+        state.entered_at = self.now
+        self.notify(
+            target.notify,
+            compiled.db_id,
+            record_id,
+            f"Record {record_id} entered {target.name}",
+            target.email_to,
+        )
+        return True
+
+    async def apply(self, event: EventModel) -> None:
+        db_id, ids = event.db_id, event.record_ids
+        triggers = self.rules.triggers.get((db_id, event.kind), [])
+        if event.kind == "deleted":
+            states = self.states.get(db_id, {})
+            for record_id in ids:
+                state = states.pop(record_id, None)
+                if state is not None and state in self.session:
+                    self.session.expunge(state)
+            for chunk in _chunks(ids):
+                await self.session.execute(
+                    delete(RecordWorkflowModel).where(
+                        col(RecordWorkflowModel.db_id) == db_id,
+                        col(RecordWorkflowModel.record_id).in_(chunk),
+                    )
+                )
+            for row in event.payload.get("rows", []):
+                for trigger in triggers:
+                    if matches(trigger, row):
+                        self.notify(
+                            trigger.notify,
+                            db_id,
+                            row.get("id"),
+                            trigger.message or f"Record {row.get('id')} deleted",
+                            trigger.email_to,
+                        )
+            return
+
+        compiled = self.compiled.get(db_id)
+        if compiled is None:
+            raise ValueError(f"Database {db_id} not found")
+        rows, states = self.rows[db_id], self.states[db_id]
+        if event.kind == "transition":
+            name = event.payload.get("workflow", "")
+            target = self.rules.by_name.get((db_id, name))
+            if target is None:
+                raise ValueError(f"No workflow {name!r} in database {db_id}")
+            for record_id in ids:
+                if record_id not in rows:
+                    raise ValueError(f"Record {record_id} not found")
+                await self.enter(compiled, rows[record_id], target, True)
+            return
+
+        default = self.rules.defaults.get(db_id) if event.kind == "created" else None
+        for record_id in ids:
+            # Deleted again before its event was processed.
+            row = rows.get(record_id)
+            if row is None:
+                continue
+            if default is not None and record_id not in states:
+                await self.enter(compiled, row, default, False)
+            for trigger in triggers:
+                if not matches(trigger, row):
+                    continue
+                if trigger.workflow is not None:
+                    target = self.rules.by_name.get((db_id, trigger.workflow))
+                    if target is not None:
+                        await self.enter(compiled, row, target, False)
+                self.notify(
+                    trigger.notify,
+                    db_id,
+                    record_id,
+                    trigger.message or f"Record {record_id} {event.kind}",
+                    trigger.email_to,
+                )
+
+
+class WorkflowEngine:
+    def __init__(self, settings: Settings, database: Database) -> None:
+        self.settings = settings
+        self.database = database
+        self._wake = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self._pruned = 0.0
+
+    def wake(self) -> None:
+        """Have an idle worker look at the queue now, not at its next poll."""
+        self._wake.set()
+
+    async def drain(self) -> int:
+        """Claim and apply one batch of events; returns how many there were."""
+        await self.database.prepare()
+        async with self.database.session() as session:
+            events = await claim(
+                session,
+                self.settings.workflow_batch_size,
+                self.settings.workflow_lease_s,
+            )
+            if not events:
+                return 0
+            db_ids = {event.db_id for event in events}
+            rules = await Rules.load(session, db_ids)
+            compiled = {}
+            for db_id in db_ids:
+                try:
+                    db = await generate_db(session, db_id)
+                except ValueError:
+                    db = None
+                if db is not None:
+                    compiled[db_id] = db
+            await session.commit()
+            # Detached, the claimed events keep their values through the
+            # rollbacks below.
+            session.expunge_all()
+
+            emails = 0
+            try:
+                emails = await self._apply(session, rules, compiled, events)
+            except Exception:
+                # One bad event must not hold up the rest: apply them one
+                # transaction each, recording each failure on its event.
+                await session.rollback()
+                for event in events:
+                    try:
+                        emails += await self._apply(session, rules, compiled, [event])
+                    except Exception as e:
+                        await session.rollback()
+                        await self._failed(session, event, e)
+        if emails:
+            await self.deliver()
+        return len(events)
+
+    async def _apply(
+        self,
+        session: AsyncSession,
+        rules: Rules,
+        compiled: dict[int, CompiledDb],
+        events: list[EventModel],
+    ) -> int:
+        now = dt.now()
+        batch = Batch(session, rules, compiled, now)
+        await batch.load(events)
+        for event in events:
+            await batch.apply(event)
+        await batch.save()
+        await finish(session, [event.id for event in events if event.id], now)
+        await session.commit()
+        return batch.emails
+
+    async def _failed(
+        self, session: AsyncSession, event: EventModel, e: Exception
+    ) -> None:
+        now = dt.now()
+        error = str(e) or type(e).__name__
+        retry_at = None
+        # A ValueError is the event's own fault and fails the same way again.
+        if (
+            not isinstance(e, ValueError)
+            and event.attempts < self.settings.workflow_max_attempts
+        ):
+            delay = self.settings.workflow_retry_s * 2 ** (event.attempts - 1)
+            retry_at = now + timedelta(seconds=delay)
+        logger.warning(
+            "event %s %s: %s", event.id, "retried" if retry_at else "failed", error
+        )
+        await fail(session, event, error, retry_at, now)
+        await session.commit()
+
+    async def deliver(self) -> int:
+        """Send unsent email notifications, one message per recipient list.
+
+        The emails are claimed first, so workers delivering at the same time
+        never send the same one twice.
+        """
+        async with self.database.session() as session:
+            pending = await claim_emails(
+                session, EMAIL_BATCH, self.settings.workflow_lease_s
+            )
+            by_recipients: dict[str, list[NotificationModel]] = defaultdict(list)
+            for notification in pending:
+                by_recipients[notification.recipients].append(notification)
+            sent = 0
+            for recipients, notifications in by_recipients.items():
+                try:
+                    await asyncio.to_thread(
+                        send_digest,
+                        self.settings,
+                        recipients.split(","),
+                        [n.message for n in notifications],
+                    )
+                except (OSError, smtplib.SMTPException):
+                    # Left unsent and released; the next pass tries again.
+                    logger.exception("sending notifications to %s failed", recipients)
+                    for notification in notifications:
+                        notification.locked_until = None
+                        session.add(notification)
+                    await session.commit()
+                    continue
+                now = dt.now()
+                for notification in notifications:
+                    notification.sent_at = now
+                    notification.locked_until = None
+                    session.add(notification)
+                sent += len(notifications)
+                await session.commit()
+        return sent
+
+    async def maintain(self) -> None:
+        """Prune processed events and retry unsent emails, now and then."""
+        if time.monotonic() - self._pruned < self.settings.workflow_maintenance_s:
+            return
+        self._pruned = time.monotonic()
+        before = dt.now() - timedelta(seconds=self.settings.workflow_retention_s)
+        async with self.database.session() as session:
+            await prune(session, before)
+        await self.deliver()
+
+    async def run_forever(self) -> None:
+        while True:
+            try:
+                while await self.drain():
+                    pass
+                await self.maintain()
+            except Exception:
+                logger.exception("draining workflow events failed")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.settings.workflow_poll_s)
+            except TimeoutError:
+                pass
+            self._wake.clear()
+
+    def start(self) -> None:
+        self._tasks = [
+            asyncio.create_task(self.run_forever())
+            for _ in range(self.settings.workflow_workers)
+        ]
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+
+def send_digest(settings: Settings, recipients: list[str], messages: list[str]) -> None:
+    message = EmailMessage()
+    message["Subject"] = (
+        messages[0] if len(messages) == 1 else f"{len(messages)} workflow notifications"
+    )
+    message["From"] = settings.smtp_sender
+    message["To"] = ", ".join(recipients)
+    message.set_content("\n".join(messages))
+    with smtplib.SMTP(settings.smtp_host, settings.smtp_port, timeout=30) as smtp:
+        smtp.send_message(message)
+
+
+def get_workflows(request: Request) -> WorkflowEngine:
+    workflows: WorkflowEngine = request.app.state.workflows
+    return workflows
@@ -0,0 +1,144 @@
+"""The durable event queue behind workflows and triggers.
+
+Record changes ``enqueue`` one event in the session that makes the change,
+so the event commits, or rolls back, with it. Workers ``claim`` a batch of
+due events in one UPDATE ... RETURNING, which hands each event to one
+worker; the claim is a lease, and an event whose worker died is claimed
+again once it runs out. Unsent emails are claimed the same way by whichever
+worker sends them.
+"""
+
+from datetime import datetime as dt, timedelta
+from typing import Any, Sequence, cast
+from sqlalchemy import CursorResult, and_, delete, or_, select, update
+from sqlmodel import col
+from sqlmodel.ext.asyncio.session import AsyncSession
+from POC.db.models.stock_models.db_models import (
+    EVENT_KINDS,
+    EventModel,
+    NotificationModel,
+)
+
+
+def enqueue(
+    session: AsyncSession,
+    db_id: int,
+    kind: str,
+    record_ids: Sequence[int],
+    payload: dict[str, Any] | None = None,
+) -> EventModel:
+    if kind not in EVENT_KINDS:
+        raise ValueError(f"Unknown event kind {kind!r}")
+    event = EventModel(
+        db_id=db_id, kind=kind, record_ids=list(record_ids), payload=payload or {}
+    )
+    session.add(event)
+    return event
+
+
+async def claim(
+    session: AsyncSession, batch_size: int, lease_s: float, now: dt | None = None
+) -> list[EventModel]:
+    """Take up to ``batch_size`` due events, oldest first, and commit."""
+    now = now or dt.now()
+    due = (
+        select(col(EventModel.id))
+        .where(
+            or_(
+                and_(
+                    col(EventModel.status) == "pending",
+                    col(EventModel.available_at) <= now,
+                ),
+                and_(
+                    col(EventModel.status) == "processing",
+                    col(EventModel.locked_until) < now,
+                ),
+            )
+        )
+        .order_by(col(EventModel.id))
+        .limit(batch_size)
+    )
+    statement = (
+        update(EventModel)
+        .where(col(EventModel.id).in_(due.scalar_subquery()))
+        .values(
+            status="processing",
+            locked_until=now + timedelta(seconds=lease_s),
+            attempts=col(EventModel.attempts) + 1,
+        )
+        .returning(EventModel)
+        # Events already in the session take the claimed values.
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+    events = list((await session.scalars(statement)).all())
+    await session.commit()
+    return sorted(events, key=lambda event: event.id or 0)
+
+
+async def finish(session: AsyncSession, ids: Sequence[int], now: dt) -> None:
+    await session.execute(
+        update(EventModel)
+        .where(col(EventModel.id).in_(ids), col(EventModel.status) == "processing")
+        .values(status="done", locked_until=None, error=None, processed_at=now)
+    )
+
+
+async def fail(
+    session: AsyncSession,
+    event: EventModel,
+    error: str,
+    retry_at: dt | None,
+    now: dt,
+) -> None:
+    """Put the event back for ``retry_at``, or, with None, give up on it."""
+    values: dict[str, Any] = {"locked_until": None, "error": error}
+    if retry_at is None:
+        values.update(status="failed", processed_at=now)
+    else:
+        values.update(status="pending", available_at=retry_at)
+    await session.execute(
+        update(EventModel)
+        .where(col(EventModel.id) == event.id, col(EventModel.status) == "processing")
+        .values(**values)
+    )
+
+
+async def claim_emails(
+    session: AsyncSession, batch_size: int, lease_s: float, now: dt | None = None
+) -> list[NotificationModel]:
+    """Take up to ``batch_size`` unsent emails, oldest first, and commit."""
+    now = now or dt.now()
+    unsent = (
+        select(col(NotificationModel.id))
+        .where(
+            col(NotificationModel.channel) == "email",
+            col(NotificationModel.sent_at).is_(None),
+            or_(
+                col(NotificationModel.locked_until).is_(None),
+                col(NotificationModel.locked_until) < now,
+            ),
+        )
+        .order_by(col(NotificationModel.id))
+        .limit(batch_size)
+    )
+    statement = (
+        update(NotificationModel)
+        .where(col(NotificationModel.id).in_(unsent.scalar_subquery()))
+        .values(locked_until=now + timedelta(seconds=lease_s))
+        .returning(NotificationModel)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+    emails = list((await session.scalars(statement)).all())
+    await session.commit()
+    return sorted(emails, key=lambda email: email.id or 0)
+
+
+async def prune(session: AsyncSession, before: dt) -> int:
+    """Delete events processed before ``before``; failed ones are kept."""
+    result = await session.execute(
+        delete(EventModel).where(
+            col(EventModel.status) == "done", col(EventModel.processed_at) < before
+        )
+    )
+    await session.commit()
+    return cast(CursorResult, result).rowcount